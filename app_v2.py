@@ -4,7 +4,9 @@
 """
 from flask import Flask
 from flask_wtf.csrf import CSRFProtect
-from models_v2 import init_database
+from schema_migrations import ensure_schema
+import sql_trace
+import db_maintenance
 from datetime import timedelta
 import os
 import secrets
@@ -14,17 +16,6 @@ import threading
 
 app = Flask(__name__)
 
-# 安全配置：从文件加载持久化密钥，避免重启后session失效
-_secret_key_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.secret_key')
-if os.path.exists(_secret_key_path):
-    with open(_secret_key_path, 'r') as f:
-        app.secret_key = f.read().strip()
-else:
-    app.secret_key = secrets.token_hex(32)
-    with open(_secret_key_path, 'w') as f:
-        f.write(app.secret_key)
-    os.chmod(_secret_key_path, 0o600)
-
 app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(days=7)  # Session有效期7天
 app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 文件上传限制50MB
 app.config['SESSION_COOKIE_HTTPONLY'] = True
@@ -33,36 +24,6 @@ app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
 # CSRF保护
 csrf = CSRFProtect(app)
 
-# 初始化数据库
-init_database()
-
-# ==================== 注册蓝图 ====================
-from blueprints.auth_bp import auth_bp
-from blueprints.company_bp import company_bp
-from blueprints.customer_bp import customer_bp
-from blueprints.sample_indicator_bp import sample_indicator_bp
-from blueprints.report_bp import report_bp
-from blueprints.report_template_bp import report_template_bp
-from blueprints.report_workflow_bp import report_workflow_bp
-from blueprints.import_bp import import_bp
-from blueprints.raw_data_bp import raw_data_bp
-from blueprints.backup_bp import backup_bp
-from blueprints.export_template_bp import export_template_bp
-from blueprints.pages_bp import pages_bp
-
-app.register_blueprint(auth_bp)
-app.register_blueprint(company_bp)
-app.register_blueprint(customer_bp)
-app.register_blueprint(sample_indicator_bp)
-app.register_blueprint(report_bp)
-app.register_blueprint(report_template_bp)
-app.register_blueprint(report_workflow_bp)
-app.register_blueprint(import_bp)
-app.register_blueprint(raw_data_bp)
-app.register_blueprint(backup_bp)
-app.register_blueprint(export_template_bp)
-app.register_blueprint(pages_bp)
-
 # ==================== 临时文件清理 ====================
 
 def cleanup_temp_files(max_age_hours=24):
@@ -91,15 +52,73 @@ def periodic_cleanup(interval_hours=6):
         except Exception:
             pass
 
-# 启动时清理一次
-cleanup_temp_files()
-# 启动后台清理线程
-_cleanup_thread = threading.Thread(target=periodic_cleanup, daemon=True)
-_cleanup_thread.start()
+# ==================== 启动流程 ====================
+
+def init_app():
+    """加载密钥、检查数据库结构、注册蓝图并启动后台线程（导入本模块时执行一次）"""
+    # 安全配置：从文件加载持久化密钥，避免重启后session失效
+    secret_key_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.secret_key')
+    if os.path.exists(secret_key_path):
+        with open(secret_key_path, 'r') as f:
+            app.secret_key = f.read().strip()
+    else:
+        app.secret_key = secrets.token_hex(32)
+        with open(secret_key_path, 'w') as f:
+            f.write(app.secret_key)
+        os.chmod(secret_key_path, 0o600)
+
+    # 检查数据库结构版本（迁移由 schema_migrations.py 在启动 worker 前执行）
+    ensure_schema()
+
+    # 注册蓝图
+    from blueprints.auth_bp import auth_bp
+    from blueprints.company_bp import company_bp
+    from blueprints.customer_bp import customer_bp
+    from blueprints.sample_indicator_bp import sample_indicator_bp
+    from blueprints.report_bp import report_bp
+    from blueprints.report_template_bp import report_template_bp
+    from blueprints.report_workflow_bp import report_workflow_bp
+    from blueprints.import_bp import import_bp
+    from blueprints.raw_data_bp import raw_data_bp
+    from blueprints.backup_bp import backup_bp
+    from blueprints.export_template_bp import export_template_bp
+    from blueprints.pages_bp import pages_bp
+    from blueprints.metrics_bp import metrics_bp
+
+    app.register_blueprint(auth_bp)
+    app.register_blueprint(company_bp)
+    app.register_blueprint(customer_bp)
+    app.register_blueprint(sample_indicator_bp)
+    app.register_blueprint(report_bp)
+    app.register_blueprint(report_template_bp)
+    app.register_blueprint(report_workflow_bp)
+    app.register_blueprint(import_bp)
+    app.register_blueprint(raw_data_bp)
+    app.register_blueprint(backup_bp)
+    app.register_blueprint(export_template_bp)
+    app.register_blueprint(pages_bp)
+    app.register_blueprint(metrics_bp)
+
+    # SQL 追踪（SQL_TRACE=1 或 --debug 时开启，见 sql_trace）
+    sql_trace.init_app(app)
+
+    # 启动时清理一次，并启动后台清理线程
+    cleanup_temp_files()
+    threading.Thread(target=periodic_cleanup, daemon=True).start()
+    # 启动数据库维护线程（检查点、optimize、导入后 ANALYZE，见 db_maintenance）
+    db_maintenance.start_scheduler()
+
+
+# 以 python3 app_v2.py 启动时，spawn 方式的子进程（如并行校核的进程池）会以 __mp_main__
+# 重新导入本模块；子进程只需要模块中的定义，不重复执行启动流程
+if __name__ != '__mp_main__':
+    init_app()
 
 
 if __name__ == '__main__':
     # 仅用于本地开发调试，生产环境使用 gunicorn 启动
     import sys
     debug_mode = '--debug' in sys.argv
+    if debug_mode:
+        sql_trace.enable()
     app.run(debug=debug_mode, host='0.0.0.0', port=5000)
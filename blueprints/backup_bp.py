@@ -1,13 +1,47 @@
 from flask import Blueprint, request, jsonify, session, send_file
 from auth import login_required, admin_required, log_operation, get_operation_logs
-from models_v2 import get_db, DATABASE_PATH
+from models_v2 import get_db, DATABASE_PATH, bump_cache_versions, reset_pools
 from datetime import datetime
+import db_backend
 import json
 import os
+import read_snapshot
 import shutil
+import sqlite3
 
 backup_bp = Blueprint('backup_bp', __name__)
 
+
+def _save_database_copy(target_path):
+    """用 SQLite 在线备份 API 将当前数据库（含 WAL 中尚未检查点的内容）复制到文件"""
+    live = db_backend.connect(DATABASE_PATH, timeout=30.0)
+    try:
+        target = sqlite3.connect(target_path)
+        try:
+            live.backup(target)
+        finally:
+            target.close()
+    finally:
+        live.close()
+
+
+def _load_database_copy(source_path):
+    """
+    用 SQLite 在线备份 API 将文件内容整体写入当前数据库。
+    写入经正常的写事务进行，其他进程已打开的连接与 -wal/-shm 保持一致（不直接覆盖数据库文件）；
+    完成后检查点并截断 WAL
+    """
+    source = sqlite3.connect(source_path)
+    try:
+        live = db_backend.connect(DATABASE_PATH, timeout=30.0)
+        try:
+            source.backup(live)
+            live.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        finally:
+            live.close()
+    finally:
+        source.close()
+
 # ==================== 数据备份与恢复 API ====================
 @backup_bp.route('/api/backup/create', methods=['POST'])
 @admin_required
@@ -39,8 +73,8 @@ def api_create_backup():
             description = '包含：' + '、'.join(description_parts) if description_parts else '数据库完整备份'
 
             # 备份数据库文件
-            if os.path.exists(DATABASE_PATH):
-                shutil.copy2(DATABASE_PATH, f'{backup_dir}/water_quality_v2.db')
+            if db_backend.exists(DATABASE_PATH):
+                _save_database_copy(f'{backup_dir}/water_quality_v2.db')
 
             # 创建备份信息文件
             backup_info = {
@@ -210,23 +244,33 @@ def api_restore_backup():
     if not os.path.exists(backup_path):
         return jsonify({'error': '备份不存在'}), 404
 
+    before_restore = f'{DATABASE_PATH}.before_restore'
     try:
         # 备份当前数据库(防止恢复失败)
-        if os.path.exists(DATABASE_PATH):
-            shutil.copy2(DATABASE_PATH, f'{DATABASE_PATH}.before_restore')
+        if db_backend.exists(DATABASE_PATH):
+            if os.path.exists(before_restore):
+                os.remove(before_restore)
+            _save_database_copy(before_restore)
 
-        # 恢复数据库文件
+        # 恢复数据库内容
         backup_db = os.path.join(backup_path, 'water_quality_v2.db')
         if os.path.exists(backup_db):
-            shutil.copy2(backup_db, DATABASE_PATH)
+            _load_database_copy(backup_db)
+            # 各进程丢弃恢复前的连接，限值等缓存需重建
+            reset_pools()
+            read_snapshot.invalidate()
+            with get_db() as conn:
+                bump_cache_versions(conn)
 
         log_operation('恢复数据备份', f'恢复备份:{backup_name}')
         return jsonify({'message': '数据恢复成功'})
 
     except Exception as e:
         # 恢复失败,回滚
-        if os.path.exists(f'{DATABASE_PATH}.before_restore'):
-            shutil.copy2(f'{DATABASE_PATH}.before_restore', DATABASE_PATH)
+        if os.path.exists(before_restore):
+            _load_database_copy(before_restore)
+            reset_pools()
+            read_snapshot.invalidate()
         return jsonify({'error': f'恢复失败: {str(e)}'}), 500
 
 # ==================== 操作日志 API ====================
@@ -1,6 +1,9 @@
 from flask import Blueprint, request, jsonify, session, send_file
 from auth import login_required, log_operation
+from db_maintenance import request_analyze
 from models_v2 import get_db
+from pagination import PaginationError, cached_count, keyset_page, page_args
+from storage_profiles import bulk_import
 from datetime import datetime
 import os
 import openpyxl
@@ -9,6 +12,13 @@ from openpyxl.styles import Font, Alignment, Border, Side, PatternFill
 customer_bp = Blueprint('customer_bp', __name__)
 
 # ==================== 客户管理 API ====================
+CUSTOMER_LIST_SELECT = '''
+    SELECT id, inspected_unit, water_plant, unit_address,
+           contact_person, contact_phone, email, remark,
+           created_at, updated_at
+    FROM customers
+'''
+
 @customer_bp.route('/api/customers', methods=['GET', 'POST'])
 @login_required
 def api_customers():
@@ -44,14 +54,19 @@ def api_customers():
             except Exception as e:
                 return jsonify({'error': f'添加客户失败: {str(e)}'}), 400
 
-        # GET请求
-        customers = conn.execute('''
-            SELECT id, inspected_unit, water_plant, unit_address,
-                   contact_person, contact_phone, email, remark,
-                   created_at, updated_at
-            FROM customers
-            ORDER BY created_at DESC
-        ''').fetchall()
+        # GET请求：带 limit / cursor 参数时按 (created_at, id) 游标分页（见 pagination），
+        # 否则返回全部客户（下拉选择等场景）
+        if 'limit' in request.args or 'cursor' in request.args:
+            try:
+                limit, cursor = page_args(request.args)
+            except PaginationError as e:
+                return jsonify({'error': str(e)}), 400
+            page = keyset_page(conn, CUSTOMER_LIST_SELECT, [], [], limit, cursor)
+            if request.args.get('count') == '1':
+                page['total'] = cached_count(conn, 'entities', 'FROM customers', [], [])
+            return jsonify(page)
+
+        customers = conn.execute(CUSTOMER_LIST_SELECT + ' ORDER BY created_at DESC').fetchall()
 
         return jsonify([dict(customer) for customer in customers])
 
@@ -248,7 +263,7 @@ def api_customers_import():
             return jsonify({'error': '未找到"被检单位"列，请检查模板格式'}), 400
 
         # Load existing customers for duplicate check
-        with get_db() as conn:
+        with bulk_import(), get_db() as conn:
             existing = {}
             rows = conn.execute('SELECT id, inspected_unit, water_plant FROM customers').fetchall()
             for r in rows:
@@ -341,6 +356,8 @@ def api_customers_import():
                     success_count += 1
 
             log_operation('导入客户', f'导入客户信息: 共{total_rows}行, 成功{success_count}, 跳过{skip_count}, 错误{len(errors)}', conn=conn)
+            # 大批量导入后由维护线程更新查询规划器统计信息
+            request_analyze(success_count)
 
             # Clean up
             try:
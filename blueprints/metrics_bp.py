@@ -0,0 +1,27 @@
+from flask import Blueprint, jsonify, request
+from auth import admin_required
+from models_v2 import pool_stats
+import db_maintenance
+import os
+import read_snapshot
+import sql_trace
+import write_queue
+
+metrics_bp = Blueprint('metrics_bp', __name__)
+
+# ==================== 运行指标 API ====================
+@metrics_bp.route('/api/metrics', methods=['GET'])
+@admin_required
+def api_metrics():
+    """本 worker 进程的运行指标：SQL 追踪汇总、连接池、写队列与数据库维护状态（?reset=1 读取后清零追踪汇总）"""
+    result = {
+        'pid': os.getpid(),
+        'sql': sql_trace.metrics(),
+        'pool': pool_stats(),
+        'write_queue': write_queue.stats(),
+        'maintenance': db_maintenance.stats(),
+        'snapshot': read_snapshot.stats(),
+    }
+    if request.args.get('reset') == '1':
+        sql_trace.reset_metrics()
+    return jsonify(result)
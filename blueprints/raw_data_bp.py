@@ -2,19 +2,26 @@
 原始数据管理 API Blueprint
 从 app_v2.py 提取的原始数据管理相关路由
 """
-from flask import Blueprint, request, jsonify, send_file, session
+from flask import Blueprint, request, jsonify, send_file, session, Response
 from models_v2 import get_db, get_db_connection
 from auth import login_required, admin_required, log_operation
 from raw_data_importer import RawDataImporter
 from raw_data_converter import convert_raw_excel
-from raw_data_validator import RawDataValidator, validate_samples, validate_from_database
+from raw_data_validator import RawDataValidator, validate_samples, count_stored_levels, SQL_BATCH_SIZE
+from indicator_resolver import get_indicator_resolver
+from raw_data_matcher import RawDataMatcher
+from raw_data_baseline import rebuild_indicator_stats
+from write_queue import run_write
+from columnar_export import (EXPORT_FORMATS, RAW_DATA_EXPORT_COLUMNS, iter_csv,
+                             parquet_available, write_parquet)
 from raw_data_template_generator import generate_raw_data_template
+import read_snapshot
 from werkzeug.utils import secure_filename
 import os
 import json
-import re
 import openpyxl
 import pandas as pd
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Font, Alignment, Border, Side, PatternFill
 from datetime import datetime
 
@@ -790,6 +797,18 @@ def api_raw_data_detail(record_id):
         except Exception as e:
             return jsonify({'error': f'获取详情失败: {str(e)}'}), 500
 
+def _rebuild_baseline(groups):
+    """
+    重建受影响 (水厂, 样品类型) 的历史基线统计。记录修改已提交，重建失败只返回提示
+    （可稍后运行 python raw_data_baseline.py rebuild）
+    """
+    try:
+        run_write(rebuild_indicator_stats, groups)
+    except Exception as e:
+        return {'warning': f'历史基线统计更新失败: {e}'}
+    return {}
+
+
 @raw_data_bp.route('/api/raw-data/update/<int:record_id>', methods=['PUT'])
 @login_required
 def api_raw_data_update(record_id):
@@ -812,8 +831,9 @@ def api_raw_data_update(record_id):
         cursor = conn.cursor()
 
         # 检查记录是否存在
-        cursor.execute('SELECT id FROM raw_data_records WHERE id = ?', (record_id,))
-        if not cursor.fetchone():
+        cursor.execute('SELECT id, plant_name, sample_type FROM raw_data_records WHERE id = ?', (record_id,))
+        old = cursor.fetchone()
+        if not old:
             conn.close()
             return jsonify({'error': '记录不存在'}), 404
 
@@ -832,8 +852,9 @@ def api_raw_data_update(record_id):
             WHERE id = ?
         ''', (sample_number, company_name, plant_name, sample_type, sampling_date, record_id))
 
-        # 删除旧的检测值数据
+        # 删除旧的检测值数据及已保存的校核结果
         cursor.execute('DELETE FROM raw_data_values WHERE record_id = ?', (record_id,))
+        cursor.execute('DELETE FROM raw_data_validation_results WHERE record_id = ?', (record_id,))
 
         # 插入新的检测值数据
         for column_name, value in indicators.items():
@@ -845,8 +866,12 @@ def api_raw_data_update(record_id):
 
         conn.commit()
         conn.close()
+        read_snapshot.invalidate()
+        # 修改前后所属 (水厂, 样品类型) 的历史基线统计从库中重建
+        result = {'message': '更新成功'}
+        result.update(_rebuild_baseline([(old['plant_name'], old['sample_type']), (plant_name, sample_type)]))
 
-        return jsonify({'message': '更新成功'})
+        return jsonify(result)
 
     except Exception as e:
         if conn:
@@ -863,7 +888,8 @@ def api_raw_data_delete(record_id):
         cursor = conn.cursor()
 
         # 检查记录是否存在
-        cursor.execute('SELECT sample_number FROM raw_data_records WHERE id = ?', (record_id,))
+        cursor.execute('SELECT sample_number, plant_name, sample_type FROM raw_data_records WHERE id = ?',
+                       (record_id,))
         record = cursor.fetchone()
 
         if not record:
@@ -875,8 +901,12 @@ def api_raw_data_delete(record_id):
 
         conn.commit()
         conn.close()
+        read_snapshot.invalidate()
+        # 撤销该记录计入的历史基线统计
+        result = {'message': f'已删除样品编号"{record[0]}"的记录'}
+        result.update(_rebuild_baseline([(record['plant_name'], record['sample_type'])]))
 
-        return jsonify({'message': f'已删除样品编号"{record[0]}"的记录'})
+        return jsonify(result)
 
     except Exception as e:
         if conn:
@@ -1085,7 +1115,8 @@ def api_raw_data_filter_export():
         if not selected_sample_ids:
             return jsonify({'error': '请至少选择一个样品'}), 400
 
-        with get_db() as conn:
+        # 大批量导出读取只读快照，不在主库上长时间持有读事务
+        with read_snapshot.snapshot_db() as (conn, snapshot):
             cursor = conn.cursor()
 
             # 获取模板配置的检测指标
@@ -1101,156 +1132,155 @@ def api_raw_data_filter_export():
             if not template_indicators:
                 return jsonify({'error': '模板配置错误：未包含任何检测指标'}), 400
 
-            # 查询选中的样品记录
-            placeholders = ','.join(['?'] * len(selected_sample_ids))
-            query = f'''
-                SELECT id, sample_number, report_number, company_name, plant_name,
-                       sample_type, sampling_date
-                FROM raw_data_records
-                WHERE id IN ({placeholders})
-                ORDER BY sampling_date, sample_number
-            '''
-
-            cursor.execute(query, selected_sample_ids)
-            records = cursor.fetchall()
+            # 查询选中的样品记录（分批 IN 查询，合并后统一排序）
+            selected_sample_ids = list(dict.fromkeys(selected_sample_ids))
+            records = []
+            for i in range(0, len(selected_sample_ids), SQL_BATCH_SIZE):
+                chunk = selected_sample_ids[i:i + SQL_BATCH_SIZE]
+                cursor.execute(f'''
+                    SELECT id, sample_number, report_number, company_name, plant_name,
+                           sample_type, sampling_date
+                    FROM raw_data_records
+                    WHERE id IN ({','.join(['?'] * len(chunk))})
+                ''', chunk)
+                records.extend(cursor.fetchall())
+            records.sort(key=lambda r: (r[6] or '', r[1] or ''))
 
             if not records:
                 return jsonify({'error': '未找到选中的样品数据'}), 404
 
-            # 复用 raw_data_field_mapping + for-report 同款匹配逻辑
-            # 反向查找：indicator_name → raw列名
-
-            # 1) 获取指标信息（name → id, unit）
-            cursor.execute('SELECT id, name, unit FROM indicators')
-            ind_rows = cursor.fetchall()
-            ind_name_to_id = {row[1]: row[0] for row in ind_rows}
-            ind_id_to_name = {row[0]: row[1] for row in ind_rows}
-            ind_name_to_unit = {row[1]: row[2] for row in ind_rows}
-
-            # 2) 加载已固化的字段映射（raw_field_name → indicator_id），构建反向索引
-            cursor.execute('SELECT raw_field_name, indicator_id FROM raw_data_field_mapping')
-            raw_to_ind_id = {row[0]: row[1] for row in cursor.fetchall()}
-            # 反向：indicator_id → raw_field_name
-            ind_id_to_raw = {}
-            for raw_name, ind_id in raw_to_ind_id.items():
-                if ind_id not in ind_id_to_raw:
-                    ind_id_to_raw[ind_id] = raw_name
-
-            # 3) 获取所有raw列名，构建模糊匹配索引
-            cursor.execute('SELECT DISTINCT column_name FROM raw_data_values')
-            all_raw_columns = [row[0] for row in cursor.fetchall()]
-            # raw列名 → 逐层去括号的基础名列表
-            raw_base_index = {}  # base_name → raw_col
-            for rc in all_raw_columns:
-                name = rc
-                while True:
-                    stripped = re.sub(r'\([^)]*\)\s*$', '', name).strip()
-                    if stripped != name:
-                        raw_base_index[stripped] = rc
-                        name = stripped
-                    else:
-                        raw_base_index[name] = rc
-                        break
-
-            # 与 for-report 一致的别名映射（raw常见名 → 系统指标名）
-            alias_map = {
-                '六价铬': '铬(六价)',
-                '挥发酚': '挥发酚类(以苯酚计)',
-                '总α': '总α放射性',
-                '总β': '总β放射性',
-            }
-            # 反向别名：系统指标名 → raw常见名
-            reverse_alias = {v: k for k, v in alias_map.items()}
+            # 为每个模板指标找到对应的raw列名（共用进程级解析器，一次批量反查）：
+            # 已固化映射 → 列名完全相同 → 逐层去括号 → 反向别名
+            resolver = get_indicator_resolver()
+            record_ids = [record[0] for record in records]
+            raw_columns = set()
+            for i in range(0, len(record_ids), SQL_BATCH_SIZE):
+                chunk = record_ids[i:i + SQL_BATCH_SIZE]
+                cursor.execute(f'''
+                    SELECT DISTINCT column_name
+                    FROM raw_data_values
+                    WHERE record_id IN ({','.join(['?'] * len(chunk))})
+                ''', chunk)
+                raw_columns.update(row[0] for row in cursor.fetchall())
+            indicator_to_raw = resolver.match_columns(template_indicators, sorted(raw_columns))
 
-            # 4) 为每个模板指标找到对应的raw列名
-            indicator_to_raw = {}
             indicator_display = {}
-
             for indicator in template_indicators:
-                matched_raw = None
-                ind_id = ind_name_to_id.get(indicator)
-
-                # 策略1：通过 raw_data_field_mapping 反查
-                if ind_id and ind_id in ind_id_to_raw:
-                    matched_raw = ind_id_to_raw[ind_id]
-
-                # 策略2：精确匹配raw列名
-                if not matched_raw and indicator in all_raw_columns:
-                    matched_raw = indicator
-
-                # 策略3：逐层去括号匹配（与for-report的match_indicator同逻辑）
-                if not matched_raw:
-                    name = indicator
-                    while True:
-                        stripped = re.sub(r'\([^)]*\)\s*$', '', name).strip()
-                        if stripped in raw_base_index:
-                            matched_raw = raw_base_index[stripped]
-                            break
-                        if stripped == name:
-                            break
-                        name = stripped
-
-                # 策略4：反向别名匹配
-                if not matched_raw:
-                    base = re.sub(r'\([^)]*\)', '', indicator).strip()
-                    alias_key = reverse_alias.get(indicator) or reverse_alias.get(base)
-                    if alias_key and alias_key in raw_base_index:
-                        matched_raw = raw_base_index[alias_key]
-
-                if matched_raw:
-                    indicator_to_raw[indicator] = matched_raw
-                    indicator_display[indicator] = matched_raw
+                if indicator in indicator_to_raw:
+                    indicator_display[indicator] = indicator_to_raw[indicator]
+                    continue
+                ind_id = resolver.name_to_id.get(indicator)
+                unit = resolver.indicators[ind_id]['unit'] if ind_id is not None else ''
+                if unit and unit != '/':
+                    indicator_display[indicator] = f'{indicator}({unit})'
                 else:
-                    unit = ind_name_to_unit.get(indicator, '')
-                    if unit and unit != '/':
-                        indicator_display[indicator] = f'{indicator}({unit})'
-                    else:
-                        indicator_display[indicator] = indicator
-
-            # 准备导出数据：转置格式 - 行为检测项目，列为样品编号
-            sample_numbers = []
-            sample_values = {}
-
-            for record in records:
-                record_id = record[0]
-                sample_number = record[1]
-                sample_numbers.append(sample_number)
+                    indicator_display[indicator] = indicator
+
+            # 转置矩阵：行=检测项目（模板顺序），列=样品（records 顺序）
+            # 同一 raw 列可能对应多个模板指标，按列名登记全部行号
+            raw_col_rows = {}
+            for row_idx, indicator in enumerate(template_indicators):
+                raw_col_rows.setdefault(indicator_to_raw.get(indicator, indicator), []).append(row_idx)
+            record_pos = {record_id: col_idx for col_idx, record_id in enumerate(record_ids)}
+            matrix = [[''] * len(record_ids) for _ in template_indicators]
+
+            # 取回所需列的全部取值，直接从游标写入矩阵。列名与样品 ID 都分批，
+            # 每条语句的参数不超过 SQL_BATCH_SIZE（模板列数很多时也不超出 SQLite 的变量上限）
+            wanted_columns = list(raw_col_rows)
+            column_batch = SQL_BATCH_SIZE // 2
+            for j in range(0, len(wanted_columns), column_batch):
+                columns = wanted_columns[j:j + column_batch]
+                batch = SQL_BATCH_SIZE - len(columns)
+                column_placeholders = ','.join(['?'] * len(columns))
+                for i in range(0, len(record_ids), batch):
+                    chunk = record_ids[i:i + batch]
+                    cursor.execute(f'''
+                        SELECT record_id, column_name, value
+                        FROM raw_data_values
+                        WHERE record_id IN ({','.join(['?'] * len(chunk))})
+                          AND column_name IN ({column_placeholders})
+                    ''', chunk + columns)
+                    for record_id, column_name, value in cursor:
+                        col_idx = record_pos[record_id]
+                        for row_idx in raw_col_rows[column_name]:
+                            matrix[row_idx][col_idx] = value
+
+            # 生成文件（只写模式逐行写出，不在内存中保留整张工作表）
+            timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
+            filename = f'导出数据_{timestamp}.xlsx'
+            filepath = os.path.join('exports', filename)
 
-                cursor.execute('''
-                    SELECT column_name, value
-                    FROM raw_data_values
-                    WHERE record_id = ?
-                ''', (record_id,))
+            wb = openpyxl.Workbook(write_only=True)
+            ws = wb.create_sheet()
+            header_font = Font(bold=True)
+            header_alignment = Alignment(horizontal='center', vertical='top')
+            header_border = Border(left=Side(style='thin'), right=Side(style='thin'),
+                                   top=Side(style='thin'), bottom=Side(style='thin'))
+            header = []
+            for title in ['检测项目'] + [record[1] for record in records]:
+                cell = WriteOnlyCell(ws, value=title)
+                cell.font = header_font
+                cell.alignment = header_alignment
+                cell.border = header_border
+                header.append(cell)
+            ws.append(header)
+            for indicator, values in zip(template_indicators, matrix):
+                ws.append([indicator_display[indicator]] + values)
+            wb.save(filepath)
 
-                raw_values = dict(cursor.fetchall())
+            log_operation('筛选导出原始数据', f'导出{len(records)}条记录，包含{len(template_indicators)}个检测指标')
 
-                values = {}
-                for indicator in template_indicators:
-                    raw_col = indicator_to_raw.get(indicator, indicator)
-                    values[indicator] = raw_values.get(raw_col, '')
-                sample_values[sample_number] = values
+            response = send_file(filepath, as_attachment=True, download_name=filename)
+            response.headers.update(read_snapshot.headers(snapshot))
+            return response
 
-            # 构建转置DataFrame：行=检测项目（带单位），列=样品编号
-            transposed_data = []
-            for indicator in template_indicators:
-                row = {'检测项目': indicator_display[indicator]}
-                for sn in sample_numbers:
-                    row[sn] = sample_values[sn].get(indicator, '')
-                transposed_data.append(row)
+    except Exception as e:
+        return jsonify({'error': f'导出失败: {str(e)}'}), 500
 
-            columns = ['检测项目'] + sample_numbers
-            df = pd.DataFrame(transposed_data, columns=columns)
+@raw_data_bp.route('/api/raw-data/export', methods=['GET'])
+@login_required
+def api_raw_data_export():
+    """按筛选条件导出原始数据长表（format=csv 流式返回，format=parquet 需安装 pyarrow）"""
+    export_format = request.args.get('format', 'csv').strip().lower()
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f'不支持的导出格式: {export_format}'}), 400
+    if export_format == 'parquet' and not parquet_available():
+        return jsonify({'error': '服务器未安装 pyarrow，无法导出 Parquet'}), 400
+
+    where, params = _validation_filter_conditions(request.args)
+    query = f'''
+        SELECT r.id, r.sample_number, r.report_number, r.company_name, r.plant_name,
+               r.sample_type, r.sampling_date, v.column_name, v.value
+        FROM raw_data_records r
+        JOIN raw_data_values v ON v.record_id = r.id
+        WHERE {where}
+        ORDER BY r.sampling_date, r.sample_number, v.id
+    '''
+    timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
+    filename = f'raw_data_{timestamp}.{export_format}'
 
-            # 生成文件
-            timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-            filename = f'导出数据_{timestamp}.xlsx'
+    try:
+        if export_format == 'parquet':
             filepath = os.path.join('exports', filename)
-            df.to_excel(filepath, index=False, engine='openpyxl')
+            with read_snapshot.snapshot_db() as (conn, snapshot):
+                total = write_parquet(filepath, conn.execute(query, params), RAW_DATA_EXPORT_COLUMNS)
+            log_operation('导出原始数据', f'Parquet，{total}个检测值')
+            response = send_file(filepath, as_attachment=True, download_name=filename)
+            response.headers.update(read_snapshot.headers(snapshot))
+            return response
 
-            log_operation('筛选导出原始数据', f'导出{len(records)}条记录，包含{len(template_indicators)}个检测指标')
-
-            return send_file(filepath, as_attachment=True, download_name=filename)
+        conn, snapshot = read_snapshot.connect()
 
+        def generate():
+            try:
+                yield from iter_csv(conn.execute(query, params), RAW_DATA_EXPORT_COLUMNS)
+            finally:
+                conn.close()
+
+        log_operation('导出原始数据', 'CSV')
+        return Response(generate(), mimetype='text/csv',
+                        headers={'Content-Disposition': f'attachment; filename={filename}',
+                                 **read_snapshot.headers(snapshot)})
     except Exception as e:
         return jsonify({'error': f'导出失败: {str(e)}'}), 500
 
@@ -1357,217 +1387,16 @@ def api_raw_data_for_report():
             return jsonify({'error': '请提供样品编号'}), 400
 
         with get_db() as conn:
-            cursor = conn.cursor()
-
-            # 1. 查询原始数据记录
-            cursor.execute('''
-                SELECT id, sample_number, company_name, plant_name, sample_type, sampling_date
-                FROM raw_data_records
-                WHERE sample_number = ?
-            ''', (sample_number,))
-
-            record = cursor.fetchone()
-            if not record:
+            # 客户、样品类型与检测项目匹配规则与批量建稿（/api/reports/draft-from-raw）共用
+            matcher = RawDataMatcher(conn.cursor())
+            found = matcher.load_records([sample_number]).get(sample_number)
+            if not found:
                 return jsonify({'error': f'未找到样品编号为 {sample_number} 的原始数据'}), 404
 
-            record_id = record[0]
-            company_name = record[2]
-            plant_name = record[3]
-            sample_type = record[4]
-            sampling_date = record[5]
-
-            # 2. 查询原始数据检测值
-            cursor.execute('''
-                SELECT column_name, value
-                FROM raw_data_values
-                WHERE record_id = ?
-                ORDER BY id
-            ''', (record_id,))
-
-            raw_values = cursor.fetchall()
-
-            # 3. 匹配客户信息 -> customer_id
-            #    优先按 被检单位+水厂 精确匹配 customers 表，回退按被检单位匹配
-            customer_id = None
-            if company_name and plant_name:
-                cursor.execute('SELECT id FROM customers WHERE inspected_unit = ? AND water_plant = ?',
-                               (company_name, plant_name))
-                cust_row = cursor.fetchone()
-                if cust_row:
-                    customer_id = cust_row[0]
-            if not customer_id and company_name:
-                cursor.execute('SELECT id FROM customers WHERE inspected_unit = ? LIMIT 1',
-                               (company_name,))
-                cust_row = cursor.fetchone()
-                if cust_row:
-                    customer_id = cust_row[0]
-            # 兼容旧 companies 表
-            company_id = None
-            if not customer_id and company_name:
-                cursor.execute('SELECT id FROM companies WHERE name = ?', (company_name,))
-                company_row = cursor.fetchone()
-                if company_row:
-                    company_id = company_row[0]
-
-            # 4. 匹配样品类型 -> sample_type_id
-            #    支持 "名称|代码" 格式（优先按代码精确匹配）和纯名称格式
-            sample_type_id = None
-            if sample_type and '|' in sample_type:
-                st_name, st_code = sample_type.split('|', 1)
-                cursor.execute('SELECT id FROM sample_types WHERE name = ? AND code = ?', (st_name, st_code))
-                type_row = cursor.fetchone()
-                if type_row:
-                    sample_type_id = type_row[0]
-                sample_type = st_name  # 存入数据库时只保留名称
-            elif sample_type:
-                cursor.execute('SELECT id FROM sample_types WHERE name = ?', (sample_type,))
-                type_row = cursor.fetchone()
-                if type_row:
-                    sample_type_id = type_row[0]
-
-            # 5. 预加载指标，优先使用该样品类型关联的指标
-            all_indicators = {}
-            if sample_type_id:
-                cursor.execute('''
-                    SELECT i.id, i.name, i.unit,
-                        COALESCE(ti.limit_value, i.limit_value) as limit_value,
-                        i.detection_method
-                    FROM template_indicators ti
-                    JOIN indicators i ON ti.indicator_id = i.id
-                    WHERE ti.sample_type_id = ?
-                ''', (sample_type_id,))
-            else:
-                cursor.execute('''
-                    SELECT id, name, unit, limit_value, detection_method
-                    FROM indicators
-                ''')
-            for ind_row in cursor.fetchall():
-                all_indicators[ind_row[1]] = {
-                    'indicator_id': ind_row[0],
-                    'indicator_name': ind_row[1],
-                    'unit': ind_row[2],
-                    'limit_value': ind_row[3],
-                    'detection_method': ind_row[4]
-                }
-
-            # 构建模糊匹配索引：去除单位括号后的名称 -> 指标信息
-            import re as _re
-            fuzzy_index = {}
-            for ind_name, ind_info in all_indicators.items():
-                # 去掉末尾的(单位)部分，如 "硝酸盐(以N计)" -> "硝酸盐"
-                base = _re.sub(r'\([^)]*\)\s*$', '', ind_name).strip()
-                if base and base not in fuzzy_index:
-                    fuzzy_index[base] = ind_info
-                # 也保留原名
-                fuzzy_index[ind_name] = ind_info
-
-            # 已知别名映射：原始记录常见名称 -> 系统指标名称
-            alias_map = {
-                '六价铬': '铬(六价)',
-                '挥发酚': '挥发酚类(以苯酚计)',
-                '总α放射性': '总α放射性',
-                '总β放射性': '总β放射性',
-                '总α': '总α放射性',
-                '总β': '总β放射性',
-            }
-
-            def match_indicator(col_name):
-                """尝试将原始数据字段名匹配到系统指标"""
-                # 1. 精确匹配
-                if col_name in all_indicators:
-                    return all_indicators[col_name]
-                # 2. 去掉原始字段名中的单位括号后匹配
-                base = _re.sub(r'\([^)]*\)\s*$', '', col_name).strip()
-                # 可能有多层括号，如 "硝酸盐(以N计)(mg/L)" -> "硝酸盐(以N计)" -> "硝酸盐"
-                while base != col_name:
-                    if base in all_indicators:
-                        return all_indicators[base]
-                    if base in fuzzy_index:
-                        return fuzzy_index[base]
-                    col_name = base
-                    base = _re.sub(r'\([^)]*\)\s*$', '', base).strip()
-                # 3. 别名映射
-                if base in alias_map and alias_map[base] in all_indicators:
-                    return all_indicators[alias_map[base]]
-                # 4. Unicode下标归一化后匹配 (₃->3, ₂->2)
-                normalized = base.replace('₃', '3').replace('₂', '2').replace('₁', '1')
-                if normalized in all_indicators:
-                    return all_indicators[normalized]
-                if normalized in fuzzy_index:
-                    return fuzzy_index[normalized]
-                return None
-
-            # 6. 加载已固化的字段映射
-            cursor.execute('SELECT raw_field_name, indicator_id, indicator_name FROM raw_data_field_mapping')
-            saved_mappings = {row[0]: row[1] for row in cursor.fetchall()}
-
-            # 7. 为每个检测值尝试匹配指标
-            detection_items = []
-            unmatched_items = []
-            new_mappings = []  # 新发现的映射，待保存
-
-            for rv in raw_values:
-                col_name = rv[0]
-                value = rv[1]
-
-                ind_info = None
-                # 优先查已固化映射
-                if col_name in saved_mappings:
-                    ind_id = saved_mappings[col_name]
-                    for info in all_indicators.values():
-                        if info['indicator_id'] == ind_id:
-                            ind_info = info
-                            break
-
-                # 未命中则走模糊匹配
-                if not ind_info:
-                    ind_info = match_indicator(col_name)
-                    # 模糊匹配成功且非精确匹配，保存映射
-                    if ind_info and col_name not in all_indicators:
-                        new_mappings.append((col_name, ind_info['indicator_id'], ind_info['indicator_name']))
-
-                if ind_info:
-                    detection_items.append({
-                        'indicator_name': ind_info['indicator_name'],
-                        'indicator_id': ind_info['indicator_id'],
-                        'measured_value': value or '',
-                        'unit': ind_info['unit'] or '',
-                        'limit_value': ind_info['limit_value'] or '',
-                        'detection_method': ind_info['detection_method'] or ''
-                    })
-                else:
-                    unmatched_items.append({
-                        'indicator_name': col_name,
-                        'indicator_id': None,
-                        'measured_value': value or '',
-                        'unit': '',
-                        'limit_value': '',
-                        'detection_method': ''
-                    })
-
-            # 8. 持久化新发现的映射
-            for raw_name, ind_id, ind_name in new_mappings:
-                try:
-                    cursor.execute(
-                        'INSERT OR IGNORE INTO raw_data_field_mapping (raw_field_name, indicator_id, indicator_name) VALUES (?, ?, ?)',
-                        (raw_name, ind_id, ind_name)
-                    )
-                except Exception:
-                    pass
-
-            # 收集结果到局部变量，确保在 with 块内完成所有数据库操作
-            result_data = {
-                'sample_number': sample_number,
-                'company_name': company_name,
-                'company_id': company_id,
-                'customer_id': customer_id,
-                'plant_name': plant_name,
-                'sample_type': sample_type,
-                'sample_type_id': sample_type_id,
-                'sampling_date': sampling_date,
-                'detection_items': detection_items,
-                'unmatched_items': unmatched_items
-            }
+            record, raw_values = found
+            result_data = matcher.match(record, raw_values)
+            # 新发现的映射立即生效，攒批回写数据库
+            matcher.queue_mappings()
 
         # 在 with 块外返回响应，连接已安全关闭
         return jsonify(result_data)
@@ -1578,10 +1407,40 @@ def api_raw_data_for_report():
 
 # ── 数据校核 API ─────────────────────────────────────────────────────────
 
+def _validation_filter_conditions(data):
+    """由筛选参数构建 raw_data_records 的查询条件"""
+    company_name = data.get('company_name', '').strip()
+    plant_name = data.get('plant_name', '').strip()
+    sample_type = data.get('sample_type', '').strip()
+    date_from = data.get('date_from', '').strip()
+    date_to = data.get('date_to', '').strip()
+
+    conditions = []
+    query_params = []
+    if company_name:
+        conditions.append("company_name LIKE ?")
+        query_params.append(f"%{company_name}%")
+    if plant_name:
+        conditions.append("plant_name LIKE ?")
+        query_params.append(f"%{plant_name}%")
+    if sample_type:
+        conditions.append("sample_type = ?")
+        query_params.append(sample_type)
+    if date_from:
+        conditions.append("sampling_date >= ?")
+        query_params.append(date_from)
+    if date_to:
+        conditions.append("sampling_date <= ?")
+        query_params.append(date_to)
+
+    where = " AND ".join(conditions) if conditions else "1=1"
+    return where, query_params
+
+
 @raw_data_bp.route('/api/raw-data/validate', methods=['POST'])
 @login_required
 def api_raw_data_validate():
-    """对已导入的原始数据执行校核"""
+    """对已导入的原始数据执行校核（逐样品结果优先取已保存的结果）"""
     try:
         data = request.get_json()
         if not data:
@@ -1593,7 +1452,8 @@ def api_raw_data_validate():
         if not sample_numbers:
             return jsonify({'error': '请指定样品编号'}), 400
 
-        results = validate_from_database(sample_numbers, detection_date)
+        validator = RawDataValidator()
+        results = validator.validate_from_db(sample_numbers, detection_date)
 
         # 统计
         counts = {'error': 0, 'warning': 0, 'notice': 0}
@@ -1605,6 +1465,7 @@ def api_raw_data_validate():
             'total': len(results),
             'counts': counts,
             'results': results,
+            'cache': validator.last_run,
         })
 
     except Exception as e:
@@ -1620,35 +1481,13 @@ def api_raw_data_validate_by_filters():
         if not data:
             return jsonify({'error': '缺少请求参数'}), 400
 
-        company_name = data.get('company_name', '').strip()
-        plant_name = data.get('plant_name', '').strip()
-        sample_type = data.get('sample_type', '').strip()
-        date_from = data.get('date_from', '').strip()
-        date_to = data.get('date_to', '').strip()
         detection_date = data.get('detection_date', None)
 
         # 构建查询
-        conditions = []
-        query_params = []
-        if company_name:
-            conditions.append("company_name LIKE ?")
-            query_params.append(f"%{company_name}%")
-        if plant_name:
-            conditions.append("plant_name LIKE ?")
-            query_params.append(f"%{plant_name}%")
-        if sample_type:
-            conditions.append("sample_type = ?")
-            query_params.append(sample_type)
-        if date_from:
-            conditions.append("sampling_date >= ?")
-            query_params.append(date_from)
-        if date_to:
-            conditions.append("sampling_date <= ?")
-            query_params.append(date_to)
-
-        where = " AND ".join(conditions) if conditions else "1=1"
-        query = f"SELECT sample_number FROM raw_data_records WHERE {where} ORDER BY sampling_date DESC LIMIT 200"
+        where, query_params = _validation_filter_conditions(data)
+        query = f"SELECT sample_number FROM raw_data_records WHERE {where} ORDER BY sampling_date DESC"
 
+        # 选样读取主库（不用只读快照）：刚导入的样品需要立即参与校核
         with get_db() as conn:
             rows = conn.execute(query, query_params).fetchall()
 
@@ -1663,7 +1502,8 @@ def api_raw_data_validate_by_filters():
                 'sample_count': 0,
             })
 
-        results = validate_from_database(sample_numbers, detection_date)
+        validator = RawDataValidator()
+        results = validator.validate_from_db(sample_numbers, detection_date)
 
         counts = {'error': 0, 'warning': 0, 'notice': 0}
         for r in results:
@@ -1675,7 +1515,31 @@ def api_raw_data_validate_by_filters():
             'counts': counts,
             'results': results,
             'sample_count': len(sample_numbers),
+            'cache': validator.last_run,
         })
 
     except Exception as e:
         return jsonify({'error': f'校核失败: {str(e)}'}), 500
+
+
+@raw_data_bp.route('/api/raw-data/validation-summary', methods=['POST'])
+@login_required
+def api_raw_data_validation_summary():
+    """按筛选条件汇总已保存的逐样品校核结果（预聚合计数，不触发校核）"""
+    try:
+        data = request.get_json() or {}
+        where, query_params = _validation_filter_conditions(data)
+
+        with get_db() as conn:
+            summary = count_stored_levels(conn, where, query_params)
+
+        return jsonify({
+            'success': True,
+            'counts': summary['counts'],
+            'validated_count': summary['validated'],
+            'pending_count': summary['total'] - summary['validated'],
+            'sample_count': summary['total'],
+        })
+
+    except Exception as e:
+        return jsonify({'error': f'查询校核汇总失败: {str(e)}'}), 500
@@ -1,6 +1,12 @@
-from flask import Blueprint, request, jsonify, session, send_file
+from flask import Blueprint, request, jsonify, session, send_file, Response
 from auth import login_required, admin_required, log_operation
+from db_maintenance import request_analyze
 from models_v2 import get_db
+from raw_data_matcher import RawDataMatcher, SQL_BATCH_SIZE
+from columnar_export import (EXPORT_FORMATS, REPORT_EXPORT_COLUMNS, iter_csv,
+                             parquet_available, write_parquet)
+import read_snapshot
+import report_repository
 from datetime import datetime
 import json
 import os
@@ -136,6 +142,201 @@ def api_reports():
 
         return jsonify([dict(report) for report in reports])
 
+@report_bp.route('/api/reports/draft-from-raw', methods=['POST'])
+@login_required
+def api_reports_draft_from_raw():
+    """
+    由原始数据批量生成报告草稿。
+    请求: {sample_numbers: [...], report_numbers: {样品编号: 报告编号}（可选，缺省取原始数据中的报告编号）,
+           detection_date, template_id（可选）}
+    与新建报告页导入原始数据一致：匹配到客户时 remark 填入该客户的全部 customer_* 信息，
+    未匹配时只填被检单位与水厂；同一指标有多个原始值时取最后一个。
+    所有草稿、检测数据与生成成功的样品新发现的字段映射在同一事务内写入，返回逐样品结果。
+    """
+    data = request.json or {}
+    sample_numbers = [str(sn).strip() for sn in data.get('sample_numbers', []) if str(sn).strip()]
+    if not sample_numbers:
+        return jsonify({'error': '请提供样品编号'}), 400
+    report_numbers = data.get('report_numbers') or {}
+    detection_date = data.get('detection_date') or datetime.now().strftime('%Y-%m-%d')
+    template_id = data.get('template_id')
+
+    try:
+        with get_db() as conn:
+            cursor = conn.cursor()
+            if template_id and not cursor.execute(
+                    'SELECT 1 FROM excel_report_templates WHERE id = ?', (template_id,)).fetchone():
+                return jsonify({'error': f'报告模板 {template_id} 不存在'}), 400
+            matcher = RawDataMatcher(cursor)
+            records = matcher.load_records(sample_numbers)
+
+            # 目标报告编号一次查重
+            wanted = {}
+            for sn in sample_numbers:
+                record = records.get(sn)
+                number = str(report_numbers.get(sn) or (record[0][6] if record else '') or '').strip()
+                wanted[sn] = number
+            existing = set()
+            numbers = [n for n in set(wanted.values()) if n]
+            for i in range(0, len(numbers), SQL_BATCH_SIZE):
+                chunk = numbers[i:i + SQL_BATCH_SIZE]
+                cursor.execute(
+                    f"SELECT report_number FROM reports WHERE report_number IN ({','.join(['?'] * len(chunk))})",
+                    chunk)
+                existing.update(row[0] for row in cursor.fetchall())
+
+            results = []
+            report_data_rows = []
+            used_numbers = set()
+            for sn in dict.fromkeys(sample_numbers):
+                outcome = {'sample_number': sn, 'report_number': wanted[sn]}
+                results.append(outcome)
+                if sn not in records:
+                    outcome.update(status='failed', message='未找到原始数据')
+                    continue
+                report_number = wanted[sn]
+                if not report_number:
+                    outcome.update(status='failed', message='缺少报告编号')
+                    continue
+                if report_number in existing or report_number in used_numbers:
+                    outcome.update(status='skipped', message=f'报告编号 {report_number} 已存在')
+                    continue
+
+                record, raw_values = records[sn]
+                # 未生成草稿的样品不保存其匹配中新发现的字段映射
+                pending_mappings = dict(matcher.new_mappings)
+                matched = matcher.match(record, raw_values)
+                if not matched['sample_type_id']:
+                    matcher.new_mappings = pending_mappings
+                    outcome.update(status='failed', message=f'样品类型"{matched["sample_type"] or ""}"未匹配')
+                    continue
+
+                customer = matcher.customer_info(matched['customer_id']) or {
+                    'customer_unit': matched['company_name'] or '',
+                    'customer_plant': matched['plant_name'] or '',
+                }
+                remark = json.dumps(customer, ensure_ascii=False)
+                cursor.execute(
+                    'INSERT INTO reports (report_number, sample_number, company_id, sample_type_id, '
+                    'detection_person, review_person, detection_date, remark, template_id, review_status, '
+                    'created_by, sampling_date) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    (report_number, sn, matched['company_id'], matched['sample_type_id'], '', '',
+                     detection_date, remark, template_id, 'draft', session['user_id'], matched['sampling_date'])
+                )
+                report_id = cursor.lastrowid
+                used_numbers.add(report_number)
+
+                # 按模板检测项目填入检测值，原始数据未提供的取指标默认值
+                measured = {}
+                for item in matched['detection_items']:
+                    measured[item['indicator_id']] = item['measured_value']
+                for ind_id, info in matcher.template_indicators(matched['sample_type_id']).items():
+                    value = measured[ind_id] if ind_id in measured else (info['default_value'] or '')
+                    report_data_rows.append((report_id, ind_id, value, ''))
+
+                outcome.update(
+                    status='created', report_id=report_id,
+                    matched_count=len(matched['detection_items']),
+                    unmatched_items=[item['indicator_name'] for item in matched['unmatched_items']],
+                    customer_matched=bool(matched['customer_id']),
+                    company_matched=bool(matched['company_id']),
+                )
+
+            if report_data_rows:
+                cursor.executemany(
+                    'INSERT INTO report_data (report_id, indicator_id, measured_value, remark) VALUES (?, ?, ?, ?)',
+                    report_data_rows
+                )
+            saved_mappings = matcher.save_mappings()
+
+            created = sum(1 for r in results if r['status'] == 'created')
+            if created:
+                log_operation('批量生成报告草稿', f'样品{len(results)}个，生成草稿{created}份', conn=conn)
+
+        # 大批量建稿后由维护线程更新查询规划器统计信息
+        request_analyze(created + len(report_data_rows))
+
+        return jsonify({
+            'created': created,
+            'total': len(results),
+            'saved_mappings': saved_mappings,
+            'results': results,
+        })
+    except Exception as e:
+        return jsonify({'error': f'生成报告草稿失败: {str(e)}'}), 500
+
+@report_bp.route('/api/reports/export', methods=['GET'])
+@login_required
+def api_reports_export():
+    """按筛选条件导出报告检测数据长表（format=csv 流式返回，format=parquet 需安装 pyarrow）"""
+    export_format = request.args.get('format', 'csv').strip().lower()
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f'不支持的导出格式: {export_format}'}), 400
+    if export_format == 'parquet' and not parquet_available():
+        return jsonify({'error': '服务器未安装 pyarrow，无法导出 Parquet'}), 400
+
+    conditions = []
+    params = []
+    search_sample_number = request.args.get('sample_number', '').strip()
+    if search_sample_number:
+        conditions.append('r.sample_number LIKE ?')
+        params.append(f'%{search_sample_number}%')
+    for arg, column in (('company_id', 'r.company_id'), ('sample_type_id', 'r.sample_type_id'),
+                        ('review_status', 'r.review_status')):
+        value = request.args.get(arg, '').strip()
+        if value:
+            conditions.append(f'{column} = ?')
+            params.append(value)
+    date_from = request.args.get('date_from', '').strip()
+    if date_from:
+        conditions.append('r.detection_date >= ?')
+        params.append(date_from)
+    date_to = request.args.get('date_to', '').strip()
+    if date_to:
+        conditions.append('r.detection_date <= ?')
+        params.append(date_to)
+    where = ' AND '.join(conditions) if conditions else '1=1'
+
+    query = f'''
+        SELECT r.id, r.report_number, r.sample_number, c.name, st.name,
+               r.detection_date, r.review_status, i.name, i.unit, rd.remark, rd.measured_value
+        FROM reports r
+        JOIN report_data rd ON rd.report_id = r.id
+        LEFT JOIN indicators i ON rd.indicator_id = i.id
+        LEFT JOIN companies c ON r.company_id = c.id
+        LEFT JOIN sample_types st ON r.sample_type_id = st.id
+        WHERE {where}
+        ORDER BY r.id, rd.id
+    '''
+    timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
+    filename = f'reports_{timestamp}.{export_format}'
+
+    try:
+        if export_format == 'parquet':
+            filepath = os.path.join('exports', filename)
+            with read_snapshot.snapshot_db() as (conn, snapshot):
+                total = write_parquet(filepath, conn.execute(query, params), REPORT_EXPORT_COLUMNS)
+            log_operation('导出报告数据', f'Parquet，{total}个检测值')
+            response = send_file(filepath, as_attachment=True, download_name=filename)
+            response.headers.update(read_snapshot.headers(snapshot))
+            return response
+
+        conn, snapshot = read_snapshot.connect()
+
+        def generate():
+            try:
+                yield from iter_csv(conn.execute(query, params), REPORT_EXPORT_COLUMNS)
+            finally:
+                conn.close()
+
+        log_operation('导出报告数据', 'CSV')
+        return Response(generate(), mimetype='text/csv',
+                        headers={'Content-Disposition': f'attachment; filename={filename}',
+                                 **read_snapshot.headers(snapshot)})
+    except Exception as e:
+        return jsonify({'error': f'导出失败: {str(e)}'}), 500
+
 @report_bp.route('/api/reports/<int:id>', methods=['GET', 'PUT', 'DELETE'])
 @login_required
 def api_report_detail(id):
@@ -246,44 +447,18 @@ def api_report_detail(id):
                 return jsonify({'error': str(e)}), 500
 
         # GET请求 - 获取报告详情
-        report = conn.execute(
-            'SELECT r.*, st.name as sample_type_name, st.code as sample_type_code, '
-            'c.name as company_name, u.username as creator_name '
-            'FROM reports r '
-            'LEFT JOIN sample_types st ON r.sample_type_id = st.id '
-            'LEFT JOIN companies c ON r.company_id = c.id '
-            'LEFT JOIN users u ON r.created_by = u.id '
-            'WHERE r.id = ?',
-            (id,)
-        ).fetchone()
+        report = report_repository.get_report(conn, id)
 
         if not report:
             return jsonify({'error': '报告不存在'}), 404
 
         # 获取报告数据
-        data = conn.execute(
-            'SELECT rd.*, i.name as indicator_name, i.unit, '
-            'COALESCE(ti.limit_value, i.limit_value) as limit_value, i.detection_method, '
-            'i.group_id, g.name as group_name '
-            'FROM report_data rd '
-            'LEFT JOIN indicators i ON rd.indicator_id = i.id '
-            'LEFT JOIN indicator_groups g ON i.group_id = g.id '
-            'LEFT JOIN template_indicators ti '
-            '    ON ti.indicator_id = rd.indicator_id AND ti.sample_type_id = ? '
-            'WHERE rd.report_id = ? '
-            'ORDER BY ti.sort_order, g.sort_order, i.sort_order',
-            (report['sample_type_id'], id,)
-        ).fetchall()
+        data = report_repository.get_detection_data(conn, id)
 
         # 获取模板字段值
         template_fields = []
         if report['template_id']:
-            template_fields = conn.execute('''
-                SELECT rfv.*, tfm.field_name, tfm.field_display_name
-                FROM report_field_values rfv
-                LEFT JOIN template_field_mappings tfm ON rfv.field_mapping_id = tfm.id
-                WHERE rfv.report_id = ?
-            ''', (id,)).fetchall()
+            template_fields = report_repository.get_template_field_values(conn, id)
 
 
         result = dict(report)
@@ -432,29 +607,12 @@ def api_export_excel(id):
     """导出Excel报告"""
     with get_db() as conn:
 
-        report = conn.execute(
-            'SELECT r.*, st.name as sample_type_name, c.name as company_name '
-            'FROM reports r '
-            'LEFT JOIN sample_types st ON r.sample_type_id = st.id '
-            'LEFT JOIN companies c ON r.company_id = c.id '
-            'WHERE r.id = ?',
-            (id,)
-        ).fetchone()
+        report = report_repository.get_report(conn, id)
 
         if not report:
             return jsonify({'error': '报告不存在'}), 404
 
-        data = conn.execute(
-            'SELECT rd.*, i.name as indicator_name, i.unit, g.name as group_name '
-            'FROM report_data rd '
-            'LEFT JOIN indicators i ON rd.indicator_id = i.id '
-            'LEFT JOIN indicator_groups g ON i.group_id = g.id '
-            'LEFT JOIN template_indicators ti '
-            '    ON ti.indicator_id = rd.indicator_id AND ti.sample_type_id = ? '
-            'WHERE rd.report_id = ? '
-            'ORDER BY ti.sort_order, g.sort_order, i.sort_order',
-            (report['sample_type_id'], id,)
-        ).fetchall()
+        data = report_repository.get_detection_data(conn, id)
 
 
         # 创建Excel工作簿
@@ -553,29 +711,12 @@ def api_export_word(id):
     """导出Word报告"""
     with get_db() as conn:
 
-        report = conn.execute(
-            'SELECT r.*, st.name as sample_type_name, c.name as company_name '
-            'FROM reports r '
-            'LEFT JOIN sample_types st ON r.sample_type_id = st.id '
-            'LEFT JOIN companies c ON r.company_id = c.id '
-            'WHERE r.id = ?',
-            (id,)
-        ).fetchone()
+        report = report_repository.get_report(conn, id)
 
         if not report:
             return jsonify({'error': '报告不存在'}), 404
 
-        data = conn.execute(
-            'SELECT rd.*, i.name as indicator_name, i.unit, g.name as group_name '
-            'FROM report_data rd '
-            'LEFT JOIN indicators i ON rd.indicator_id = i.id '
-            'LEFT JOIN indicator_groups g ON i.group_id = g.id '
-            'LEFT JOIN template_indicators ti '
-            '    ON ti.indicator_id = rd.indicator_id AND ti.sample_type_id = ? '
-            'WHERE rd.report_id = ? '
-            'ORDER BY ti.sort_order, g.sort_order, i.sort_order',
-            (report['sample_type_id'], id,)
-        ).fetchall()
+        data = report_repository.get_detection_data(conn, id)
 
 
         # 创建Word文档
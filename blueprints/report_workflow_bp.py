@@ -1,6 +1,9 @@
 from flask import Blueprint, request, jsonify, send_file, session
 from models_v2 import get_db
 from auth import login_required, admin_required, log_operation
+from write_queue import run_write
+import report_repository
+from pagination import PaginationError, cached_count, day_range, keyset_page, page_args
 from datetime import datetime
 import json
 import os
@@ -8,132 +11,104 @@ import traceback
 
 report_workflow_bp = Blueprint('report_workflow_bp', __name__)
 
+# 报告列表只返回列表页使用的列；三个列表共用同一语句文本（条件不同）。
+# remark 中客户信息 JSON 只取列表显示的被检单位与水厂（非 JSON 的 remark 取 NULL），不返回整个 remark
+REPORT_LIST_SELECT = '''
+    SELECT r.id, r.report_number, r.sample_number, r.sample_type_id, r.company_id, r.template_id,
+           r.review_status, r.review_comment, r.review_person, r.review_time,
+           r.detection_date, r.generated_report_path, r.created_by, r.created_at,
+           CASE WHEN json_valid(r.remark) THEN json_extract(r.remark, '$.customer_unit') END as customer_unit,
+           CASE WHEN json_valid(r.remark) THEN json_extract(r.remark, '$.customer_plant') END as customer_plant,
+           st.name as sample_type_name,
+           c.name as company_name,
+           t.name as template_name
+    FROM reports r
+    LEFT JOIN sample_types st ON r.sample_type_id = st.id
+    LEFT JOIN companies c ON r.company_id = c.id
+    LEFT JOIN excel_report_templates t ON r.template_id = t.id
+'''
+
+
+def _report_list(conn, conditions, params):
+    """
+    按 (created_at, id) 游标分页返回报告列表（见 pagination）。
+    公共筛选：sample_number（模糊）、company_id、date（创建日期）、date_from / date_to（创建日期范围）
+    """
+    sample_number = request.args.get('sample_number', '')
+    company_id = request.args.get('company_id', '')
+    if sample_number:
+        conditions.append('r.sample_number LIKE ?')
+        params.append(f'%{sample_number}%')
+    if company_id:
+        conditions.append('r.company_id = ?')
+        params.append(company_id)
+
+    try:
+        # 日期转换为 created_at 的半开区间，可以使用 (…, created_at) 索引
+        date = request.args.get('date', '')
+        if date:
+            conditions.append('r.created_at >= ? AND r.created_at < ?')
+            params.extend(day_range(date))
+        date_from = request.args.get('date_from', '')
+        if date_from:
+            conditions.append('r.created_at >= ?')
+            params.append(day_range(date_from)[0])
+        date_to = request.args.get('date_to', '')
+        if date_to:
+            conditions.append('r.created_at < ?')
+            params.append(day_range(date_to)[1])
+        limit, cursor = page_args(request.args)
+    except PaginationError as e:
+        return jsonify({'error': str(e)}), 400
+
+    page = keyset_page(conn, REPORT_LIST_SELECT, conditions, params, limit, cursor,
+                       sort=('r.created_at', 'r.id'))
+    if request.args.get('count') == '1':
+        page['total'] = cached_count(conn, 'reports', 'FROM reports r', conditions, params)
+    return jsonify(page)
+
+
 @report_workflow_bp.route('/api/reports/pending-submit', methods=['GET'])
 @login_required
 def api_reports_pending_submit():
-    """获取待提交报告列表（草稿和被拒绝的报告）"""
+    """获取待提交报告列表（当前用户创建的草稿和被拒绝的报告）"""
     with get_db() as conn:
-
-        # 获取筛选条件
-        sample_number = request.args.get('sample_number', '')
-        company_id = request.args.get('company_id', '')
-
-        # 构建SQL - 查询当前用户创建的draft和rejected状态的报告
-        sql = '''
-            SELECT r.*,
-                   st.name as sample_type_name,
-                   c.name as company_name,
-                   t.name as template_name
-            FROM reports r
-            LEFT JOIN sample_types st ON r.sample_type_id = st.id
-            LEFT JOIN companies c ON r.company_id = c.id
-            LEFT JOIN excel_report_templates t ON r.template_id = t.id
-            WHERE r.created_by = ? AND (r.review_status = 'draft' OR r.review_status = 'rejected' OR r.review_status IS NULL)
-        '''
-        params = [session['user_id']]
-
-        if sample_number:
-            sql += ' AND r.sample_number LIKE ?'
-            params.append(f'%{sample_number}%')
-
-        if company_id:
-            sql += ' AND r.company_id = ?'
-            params.append(company_id)
-
-        sql += ' ORDER BY r.created_at DESC'
-
-        reports = conn.execute(sql, params).fetchall()
-
-        return jsonify([dict(r) for r in reports])
+        return _report_list(
+            conn,
+            ["r.created_by = ?",
+             "(r.review_status = 'draft' OR r.review_status = 'rejected' OR r.review_status IS NULL)"],
+            [session['user_id']],
+        )
 
 @report_workflow_bp.route('/api/reports/submitted', methods=['GET'])
 @login_required
 def api_reports_submitted():
-    """获取已提交报告列表（pending、approved、rejected状态的报告）"""
+    """获取已提交报告列表（当前用户创建的 pending、approved、rejected 状态的报告）"""
     with get_db() as conn:
-
-        # 获取筛选条件
-        sample_number = request.args.get('sample_number', '')
-        status = request.args.get('status', '')
-        company_id = request.args.get('company_id', '')
-        date = request.args.get('date', '')
-
-        # 构建SQL - 查询当前用户创建的已提交报告
-        sql = '''
-            SELECT r.*,
-                   st.name as sample_type_name,
-                   c.name as company_name,
-                   t.name as template_name
-            FROM reports r
-            LEFT JOIN sample_types st ON r.sample_type_id = st.id
-            LEFT JOIN companies c ON r.company_id = c.id
-            LEFT JOIN excel_report_templates t ON r.template_id = t.id
-            WHERE r.created_by = ? AND r.review_status IN ('pending', 'approved', 'rejected')
-        '''
+        conditions = ["r.created_by = ?", "r.review_status IN ('pending', 'approved', 'rejected')"]
         params = [session['user_id']]
 
-        if sample_number:
-            sql += ' AND r.sample_number LIKE ?'
-            params.append(f'%{sample_number}%')
-
+        status = request.args.get('status', '')
         if status:
-            sql += ' AND r.review_status = ?'
+            conditions.append('r.review_status = ?')
             params.append(status)
 
-        if company_id:
-            sql += ' AND r.company_id = ?'
-            params.append(company_id)
-
-        if date:
-            sql += ' AND DATE(r.created_at) = ?'
-            params.append(date)
-
-        sql += ' ORDER BY r.created_at DESC'
-
-        reports = conn.execute(sql, params).fetchall()
-
-        return jsonify([dict(r) for r in reports])
+        return _report_list(conn, conditions, params)
 
 @report_workflow_bp.route('/api/reports/review', methods=['GET'])
 @login_required
 def api_reports_review():
     """获取报告列表（用于审核）"""
     with get_db() as conn:
-
-        # 获取筛选条件
-        status = request.args.get('status', '')
-        sample_number = request.args.get('sample_number', '')
-        company_id = request.args.get('company_id', '')
-
-        # 构建SQL
-        sql = '''
-            SELECT r.*,
-                   st.name as sample_type_name,
-                   c.name as company_name
-            FROM reports r
-            LEFT JOIN sample_types st ON r.sample_type_id = st.id
-            LEFT JOIN companies c ON r.company_id = c.id
-            WHERE 1=1
-        '''
+        conditions = []
         params = []
 
+        status = request.args.get('status', '')
         if status:
-            sql += ' AND r.review_status = ?'
+            conditions.append('r.review_status = ?')
             params.append(status)
 
-        if sample_number:
-            sql += ' AND r.sample_number LIKE ?'
-            params.append(f'%{sample_number}%')
-
-        if company_id:
-            sql += ' AND r.company_id = ?'
-            params.append(company_id)
-
-        sql += ' ORDER BY r.created_at DESC'
-
-        reports = conn.execute(sql, params).fetchall()
-
-        return jsonify([dict(r) for r in reports])
+        return _report_list(conn, conditions, params)
 
 @report_workflow_bp.route('/api/reports/<int:id>/review-detail', methods=['GET'])
 @login_required
@@ -142,51 +117,18 @@ def api_report_review_detail(id):
     with get_db() as conn:
 
         # 获取报告基本信息
-        report = conn.execute('''
-            SELECT r.*,
-                   st.name as sample_type_name,
-                   c.name as company_name,
-                   t.name as template_name
-            FROM reports r
-            LEFT JOIN sample_types st ON r.sample_type_id = st.id
-            LEFT JOIN companies c ON r.company_id = c.id
-            LEFT JOIN excel_report_templates t ON r.template_id = t.id
-            WHERE r.id = ?
-        ''', (id,)).fetchone()
+        report = report_repository.get_report(conn, id)
 
         if not report:
             return jsonify({'error': '报告不存在'}), 404
 
         # 获取检测数据
-        detection_data = conn.execute('''
-            SELECT rd.*,
-                   i.name as indicator_name,
-                   i.unit,
-                   COALESCE(ti.limit_value, i.limit_value) as limit_value,
-                   i.detection_method,
-                   ig.name as group_name
-            FROM report_data rd
-            LEFT JOIN indicators i ON rd.indicator_id = i.id
-            LEFT JOIN indicator_groups ig ON i.group_id = ig.id
-            LEFT JOIN template_indicators ti
-                ON ti.indicator_id = rd.indicator_id AND ti.sample_type_id = ?
-            WHERE rd.report_id = ?
-            ORDER BY ti.sort_order, ig.sort_order, i.sort_order, i.name
-        ''', (report['sample_type_id'], id,)).fetchall()
+        detection_data = report_repository.get_detection_data(conn, id)
 
         # 获取模板字段值
         template_fields = []
         if report['template_id']:
-            template_fields = conn.execute('''
-                SELECT rfv.*,
-                       tfm.field_name,
-                       tfm.field_display_name,
-                       tfm.sheet_name,
-                       tfm.cell_address
-                FROM report_field_values rfv
-                LEFT JOIN template_field_mappings tfm ON rfv.field_mapping_id = tfm.id
-                WHERE rfv.report_id = ?
-            ''', (id,)).fetchall()
+            template_fields = report_repository.get_template_field_values(conn, id)
 
         # 获取审核历史记录
         review_history = conn.execute('''
@@ -213,46 +155,43 @@ def api_approve_report(id):
     data = request.json
     comment = data.get('comment', '')
 
-    with get_db() as conn:
-        cursor = conn.cursor()
-
-        try:
-            # 获取完整报告信息
-            report = conn.execute('''
-                SELECT r.*, st.name as sample_type_name
-                FROM reports r
-                LEFT JOIN sample_types st ON r.sample_type_id = st.id
-                WHERE r.id = ?
-            ''', (id,)).fetchone()
+    def approve(conn):
+        # 获取完整报告信息
+        report = report_repository.get_report(conn, id)
 
-            if not report:
-                return jsonify({'error': '报告不存在'}), 404
-
-            review_time = datetime.now()
-            username = session.get('username', 'unknown')
-
-            # 更新审核状态
-            cursor.execute('''
-                UPDATE reports
-                SET review_status = 'approved',
-                    review_person = ?,
-                    review_time = ?,
-                    review_comment = ?,
-                    reviewed_at = ?
-                WHERE id = ?
-            ''', (username, review_time, comment, review_time, id))
-
-            # 记录审核历史
-            cursor.execute('''
-                INSERT INTO review_history (report_id, reviewer_id, review_status, review_comment, reviewed_at)
-                VALUES (?, ?, 'approved', ?, ?)
-            ''', (id, session.get('user_id'), comment, review_time))
-
-            log_operation('审核报告', f'报告ID: {id}, 结果: 通过', conn=conn)
-
-            return jsonify({'message': '审核通过'})
-        except Exception as e:
-            return jsonify({'error': str(e)}), 500
+        if not report:
+            return {'error': '报告不存在'}, 404
+
+        review_time = datetime.now()
+        username = session.get('username', 'unknown')
+
+        # 更新审核状态
+        conn.execute('''
+            UPDATE reports
+            SET review_status = 'approved',
+                review_person = ?,
+                review_time = ?,
+                review_comment = ?,
+                reviewed_at = ?
+            WHERE id = ?
+        ''', (username, review_time, comment, review_time, id))
+
+        # 记录审核历史
+        conn.execute('''
+            INSERT INTO review_history (report_id, reviewer_id, review_status, review_comment, reviewed_at)
+            VALUES (?, ?, 'approved', ?, ?)
+        ''', (id, session.get('user_id'), comment, review_time))
+
+        log_operation('审核报告', f'报告ID: {id}, 结果: 通过', conn=conn)
+
+        return {'message': '审核通过'}, 200
+
+    try:
+        # 经写队列执行（见 write_queue），长时间导入期间也能及时完成
+        result, status = run_write(approve)
+        return jsonify(result), status
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
 @report_workflow_bp.route('/api/reports/<int:id>/reject', methods=['POST'])
 @login_required
@@ -264,120 +203,123 @@ def api_reject_report(id):
     if not comment:
         return jsonify({'error': '请填写拒绝原因'}), 400
 
-    with get_db() as conn:
-        cursor = conn.cursor()
-
-        try:
-            # 检查报告是否存在
-            report = conn.execute('SELECT id, review_status FROM reports WHERE id = ?', (id,)).fetchone()
-            if not report:
-                return jsonify({'error': '报告不存在'}), 404
-
-            review_time = datetime.now()
-            username = session.get('username', 'unknown')
-
-            # 更新审核状态
-            cursor.execute('''
-                UPDATE reports
-                SET review_status = 'rejected',
-                    review_person = ?,
-                    review_time = ?,
-                    review_comment = ?,
-                    reviewed_at = ?
-                WHERE id = ?
-            ''', (username, review_time, comment, review_time, id))
-
-            # 记录审核历史
-            cursor.execute('''
-                INSERT INTO review_history (report_id, reviewer_id, review_status, review_comment, reviewed_at)
-                VALUES (?, ?, 'rejected', ?, ?)
-            ''', (id, session.get('user_id'), comment, review_time))
-
-            log_operation('审核报告', f'报告ID: {id}, 结果: 拒绝', conn=conn)
-
-            return jsonify({'message': '已拒绝'})
-        except Exception as e:
-            return jsonify({'error': str(e)}), 500
+    def reject(conn):
+        # 检查报告是否存在
+        report = conn.execute('SELECT id, review_status FROM reports WHERE id = ?', (id,)).fetchone()
+        if not report:
+            return {'error': '报告不存在'}, 404
+
+        review_time = datetime.now()
+        username = session.get('username', 'unknown')
+
+        # 更新审核状态
+        conn.execute('''
+            UPDATE reports
+            SET review_status = 'rejected',
+                review_person = ?,
+                review_time = ?,
+                review_comment = ?,
+                reviewed_at = ?
+            WHERE id = ?
+        ''', (username, review_time, comment, review_time, id))
+
+        # 记录审核历史
+        conn.execute('''
+            INSERT INTO review_history (report_id, reviewer_id, review_status, review_comment, reviewed_at)
+            VALUES (?, ?, 'rejected', ?, ?)
+        ''', (id, session.get('user_id'), comment, review_time))
+
+        log_operation('审核报告', f'报告ID: {id}, 结果: 拒绝', conn=conn)
+
+        return {'message': '已拒绝'}, 200
+
+    try:
+        result, status = run_write(reject)
+        return jsonify(result), status
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
 @report_workflow_bp.route('/api/reports/<int:id>/submit', methods=['POST'])
 @login_required
 def api_submit_report(id):
     """提交报告到审核（将draft或rejected状态改为pending）"""
-    with get_db() as conn:
-        cursor = conn.cursor()
+    def submit(conn):
+        # 检查报告是否存在
+        report = conn.execute('SELECT id, review_status, created_by FROM reports WHERE id = ?', (id,)).fetchone()
+        if not report:
+            return {'error': '报告不存在'}, 404
 
-        try:
-            # 检查报告是否存在
-            report = conn.execute('SELECT id, review_status, created_by FROM reports WHERE id = ?', (id,)).fetchone()
-            if not report:
-                return jsonify({'error': '报告不存在'}), 404
+        # 检查权限（仅创建人或管理员可提交）
+        if session.get('role') not in ('admin', 'super_admin') and report['created_by'] != session['user_id']:
+            return {'error': '无权提交此报告'}, 403
 
-            # 检查权限（仅创建人或管理员可提交）
-            if session.get('role') not in ('admin', 'super_admin') and report['created_by'] != session['user_id']:
-                return jsonify({'error': '无权提交此报告'}), 403
+        # 检查当前状态是否允许提交
+        if report['review_status'] not in ['draft', 'rejected', None]:
+            return {'error': f'当前状态 ({report["review_status"]}) 不允许提交'}, 400
 
-            # 检查当前状态是否允许提交
-            if report['review_status'] not in ['draft', 'rejected', None]:
-                return jsonify({'error': f'当前状态 ({report["review_status"]}) 不允许提交'}), 400
+        # 更新状态为pending
+        conn.execute('''
+            UPDATE reports
+            SET review_status = 'pending'
+            WHERE id = ?
+        ''', (id,))
 
-            # 更新状态为pending
-            cursor.execute('''
-                UPDATE reports
-                SET review_status = 'pending'
-                WHERE id = ?
-            ''', (id,))
+        log_operation('提交报告', f'报告ID: {id}', conn=conn)
 
-            log_operation('提交报告', f'报告ID: {id}', conn=conn)
+        return {'message': '报告已提交审核'}, 200
 
-            return jsonify({'message': '报告已提交审核'})
-        except Exception as e:
-            return jsonify({'error': str(e)}), 500
+    try:
+        result, status = run_write(submit)
+        return jsonify(result), status
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
 @report_workflow_bp.route('/api/reports/<int:id>/return', methods=['POST'])
 @login_required
 def api_return_report(id):
     """退回报告到审核状态"""
-    with get_db() as conn:
-        cursor = conn.cursor()
+    # 获取退回原因
+    data = request.json or {}
+    return_reason = data.get('reason', '').strip()
 
-        try:
-            # 检查报告是否存在
-            report = conn.execute('SELECT id, review_status, created_by, review_person FROM reports WHERE id = ?', (id,)).fetchone()
-            if not report:
-                return jsonify({'error': '报告不存在'}), 404
+    def return_report(conn):
+        # 检查报告是否存在
+        report = conn.execute('SELECT id, review_status, created_by, review_person FROM reports WHERE id = ?', (id,)).fetchone()
+        if not report:
+            return {'error': '报告不存在'}, 404
 
-            # 检查权限（仅管理员或报告创建人可退回）
-            if session.get('role') not in ('admin', 'super_admin') and report['created_by'] != session['user_id']:
-                return jsonify({'error': '无权退回此报告'}), 403
+        # 检查权限（仅管理员或报告创建人可退回）
+        if session.get('role') not in ('admin', 'super_admin') and report['created_by'] != session['user_id']:
+            return {'error': '无权退回此报告'}, 403
 
-            # 检查当前状态是否为已审核
-            if report['review_status'] != 'approved':
-                return jsonify({'error': f'只有已审核通过的报告才能退回（当前状态: {report["review_status"]}）'}), 400
-
-            # 获取退回原因
-            data = request.json or {}
-            return_reason = data.get('reason', '').strip()
-
-            # 更新状态为pending，清除生成的报告路径
-            cursor.execute('''
-                UPDATE reports
-                SET review_status = 'pending',
-                    generated_report_path = NULL,
-                    review_comment = ?
-                WHERE id = ?
-            ''', (f'[已退回] {return_reason}' if return_reason else '[已退回] 需要重新审核', id))
-
-            # 记录退回历史
-            cursor.execute('''
-                INSERT INTO review_history (report_id, reviewer_id, review_status, review_comment, reviewed_at)
-                VALUES (?, ?, 'returned', ?, ?)
-            ''', (id, session.get('user_id'), return_reason or '退回重新审核', datetime.now()))
-
-            log_operation('退回报告', f'报告ID: {id}, 原因: {return_reason}', conn=conn)
-
-            return jsonify({'message': '报告已退回到审核状态'})
-        except Exception as e:
-            return jsonify({'error': str(e)}), 500
+        # 检查当前状态是否为已审核
+        if report['review_status'] != 'approved':
+            return {'error': f'只有已审核通过的报告才能退回（当前状态: {report["review_status"]}）'}, 400
+
+        # 更新状态为pending，清除生成的报告路径
+        conn.execute('''
+            UPDATE reports
+            SET review_status = 'pending',
+                generated_report_path = NULL,
+                review_comment = ?
+            WHERE id = ?
+        ''', (f'[已退回] {return_reason}' if return_reason else '[已退回] 需要重新审核', id))
+
+        # 记录退回历史
+        conn.execute('''
+            INSERT INTO review_history (report_id, reviewer_id, review_status, review_comment, reviewed_at)
+            VALUES (?, ?, 'returned', ?, ?)
+        ''', (id, session.get('user_id'), return_reason or '退回重新审核', datetime.now()))
+
+        log_operation('退回报告', f'报告ID: {id}, 原因: {return_reason}', conn=conn)
+
+        return {'message': '报告已退回到审核状态'}, 200
+
+    try:
+        result, status = run_write(return_report)
+        return jsonify(result), status
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
 @report_workflow_bp.route('/api/reports/<int:id>/generate', methods=['POST'])
 @login_required
@@ -408,17 +350,7 @@ def api_generate_report(id):
                 return jsonify({'error': '只有已审核通过的报告才能生成'}), 400
 
             # 获取报告数据
-            detection_items = conn.execute('''
-                SELECT rd.*, i.name, i.unit,
-                    COALESCE(ti.limit_value, i.limit_value) as limit_value,
-                    i.detection_method
-                FROM report_data rd
-                LEFT JOIN indicators i ON rd.indicator_id = i.id
-                LEFT JOIN reports r ON rd.report_id = r.id
-                LEFT JOIN template_indicators ti
-                    ON ti.indicator_id = rd.indicator_id AND ti.sample_type_id = r.sample_type_id
-                WHERE rd.report_id = ?
-            ''', (id,)).fetchall()
+            detection_items = report_repository.get_detection_data(conn, id)
 
             # 构建报告数据
             report_data = {
@@ -429,7 +361,7 @@ def api_generate_report(id):
                 'review_person': report['review_person'],
                 'detection_items': [
                     {
-                        'name': item['name'],
+                        'name': item['indicator_name'],
                         'unit': item['unit'],
                         'result': item['measured_value'],
                         'limit': item['limit_value'],
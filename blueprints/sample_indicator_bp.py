@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify, session
 from auth import login_required, admin_required, log_operation
 from models_v2 import get_db
+from pagination import PaginationError, cached_count, keyset_page, page_args
 
 sample_indicator_bp = Blueprint('sample_indicator_bp', __name__)
 
@@ -60,6 +61,25 @@ def api_sample_types():
         # GET请求 - 支持搜索
         search = request.args.get('search', '')
 
+        # 带 limit / cursor 参数时按 (created_at, id) 游标分页（见 pagination），只返回列表列
+        if 'limit' in request.args or 'cursor' in request.args:
+            conditions, params = [], []
+            if search:
+                conditions.append('(name LIKE ? OR remark LIKE ?)')
+                params.extend([f'%{search}%', f'%{search}%'])
+            try:
+                limit, cursor = page_args(request.args)
+            except PaginationError as e:
+                return jsonify({'error': str(e)}), 400
+            page = keyset_page(
+                conn,
+                'SELECT id, name, code, description, remark, version, created_at, updated_at FROM sample_types',
+                conditions, params, limit, cursor,
+            )
+            if request.args.get('count') == '1':
+                page['total'] = cached_count(conn, 'limits', 'FROM sample_types', conditions, params)
+            return jsonify(page)
+
         if search:
             sample_types = conn.execute(
                 'SELECT * FROM sample_types WHERE name LIKE ? OR remark LIKE ? ORDER BY created_at DESC',
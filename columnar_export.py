@@ -0,0 +1,134 @@
+"""
+原始数据与报告数据的列式导出（CSV / Parquet）
+
+面向 BI 取数，输出逐值一行的长表，免去 Excel 转置格式的二次解析：
+  - CSV：直接迭代数据库游标，按块编码后流式返回，内存占用与导出量无关
+  - Parquet：按批构建 pyarrow RecordBatch 写入文件，检测值拆为
+    数值（value_numeric）、是否检出限（below_limit）与原文（value_text）三列
+
+查询结果的列依次对应列定义，最后一列须为检测值原文；数值与检出限两列由原文派生。
+pyarrow 为可选依赖，未安装时只能导出 CSV。
+"""
+
+import csv
+import io
+from functools import lru_cache
+from itertools import islice
+
+from raw_data_validator import parse_numeric
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+EXPORT_FORMATS = ('csv', 'parquet')
+
+# CSV 每累积多少行编码输出一次
+CSV_CHUNK_ROWS = 2000
+
+# Parquet 每个 RecordBatch 的行数
+PARQUET_BATCH_ROWS = 65536
+
+# 列定义：(列名, 类型)，类型取 int / text / float / bool
+RAW_DATA_EXPORT_COLUMNS = (
+    ('record_id', 'int'),
+    ('sample_number', 'text'),
+    ('report_number', 'text'),
+    ('company_name', 'text'),
+    ('plant_name', 'text'),
+    ('sample_type', 'text'),
+    ('sampling_date', 'text'),
+    ('indicator', 'text'),
+    ('value_text', 'text'),
+)
+
+REPORT_EXPORT_COLUMNS = (
+    ('report_id', 'int'),
+    ('report_number', 'text'),
+    ('sample_number', 'text'),
+    ('company_name', 'text'),
+    ('sample_type', 'text'),
+    ('detection_date', 'text'),
+    ('review_status', 'text'),
+    ('indicator', 'text'),
+    ('unit', 'text'),
+    ('remark', 'text'),
+    ('value_text', 'text'),
+)
+
+# 由检测值原文派生的列
+DERIVED_COLUMNS = (
+    ('value_numeric', 'float'),
+    ('below_limit', 'bool'),
+)
+
+
+def parquet_available():
+    """是否可导出 Parquet（已安装 pyarrow）"""
+    return pq is not None
+
+
+@lru_cache(maxsize=65536)
+def split_value(text):
+    """检测值原文 → (数值, 是否检出限)；检出限取限值数值，无法解析时数值为 None"""
+    return parse_numeric(text)
+
+
+def typed_rows(rows):
+    """在每行末尾追加由检测值原文派生的数值与检出限标记"""
+    for row in rows:
+        row = tuple(row)
+        yield row + split_value(row[-1])
+
+
+def iter_csv(rows, columns):
+    """
+    将查询结果逐行写为 CSV，按块产出已编码的字节串。
+    首块带 UTF-8 BOM 以便 Excel 直接打开；空值写为空串，检出限标记写为 1/0。
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([name for name, _ in columns + DERIVED_COLUMNS])
+    yield ('\ufeff' + buffer.getvalue()).encode('utf-8')
+    buffer.seek(0)
+    buffer.truncate()
+
+    rows = typed_rows(rows)
+    while True:
+        writer.writerows(row[:-1] + (int(row[-1]),) for row in islice(rows, CSV_CHUNK_ROWS))
+        chunk = buffer.getvalue()
+        if not chunk:
+            break
+        yield chunk.encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def _arrow_schema(columns):
+    types = {'int': pa.int64(), 'text': pa.string(), 'float': pa.float64(), 'bool': pa.bool_()}
+    return pa.schema([(name, types[kind]) for name, kind in columns + DERIVED_COLUMNS])
+
+
+def write_parquet(path, rows, columns):
+    """将查询结果按批写为 Parquet 文件，返回写出的行数"""
+    if pq is None:
+        raise RuntimeError('未安装 pyarrow，无法导出 Parquet')
+    schema = _arrow_schema(columns)
+    width = len(schema)
+    total = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        batch = [[] for _ in range(width)]
+        for row in typed_rows(rows):
+            for values, value in zip(batch, row):
+                values.append(value)
+            if len(batch[0]) >= PARQUET_BATCH_ROWS:
+                writer.write_batch(pa.record_batch(batch, schema=schema))
+                total += len(batch[0])
+                batch = [[] for _ in range(width)]
+        if batch[0] or not total:
+            writer.write_batch(pa.record_batch(batch, schema=schema))
+            total += len(batch[0])
+    return total
@@ -0,0 +1,185 @@
+"""
+数据库后端：连接入口与 SQL 方言
+
+数据层通过 connect() 获取 DB-API 2.0 连接，不再在各模块中直接调用 sqlite3.connect；
+SQL 中与数据库相关的写法（占位符、upsert）由方言对象生成：
+  - 应用内的 SQL 统一使用 qmark 占位符（?）；connect() 返回的连接（DialectConnection）
+    在 execute / executemany（含其游标）执行前以方言的 format() 转换为驱动的占位符风格
+  - upsert() / insert_ignore() 生成 INSERT ... ON CONFLICT 语句（SQLite 3.24+ 与 PostgreSQL 写法相同），
+    替代 SQLite 专有的 INSERT OR REPLACE / INSERT OR IGNORE
+目前实现的后端（环境变量 DB_BACKEND）：
+  - sqlite（默认）：数据库文件
+  - sqlite-memory：每个数据库路径对应本进程内的一个内存库（memdb VFS，多个连接共享），
+    用于测试与 CI，不写磁盘；只在单进程内可见，进程退出即丢弃
+路径 ':memory:' 与 sqlite3 相同，每个连接各自一个私有内存库。
+服务器数据库（如 PostgreSQL）只需新增后端的 connect 实现，方言已提供对应的 SQL 生成。
+"""
+
+import os
+import re
+import sqlite3
+import threading
+
+DB_BACKEND = os.environ.get('DB_BACKEND', 'sqlite')
+_BACKENDS = ('sqlite', 'sqlite-memory')
+if DB_BACKEND not in _BACKENDS:
+    raise ValueError(f"未知的数据库后端 DB_BACKEND={DB_BACKEND}，可选: {', '.join(_BACKENDS)}")
+
+MEMORY_DATABASE = ':memory:'
+
+
+# ==================== SQL 方言 ====================
+
+# 字符串字面量、带引号的标识符与注释中的 ? 不是占位符
+_SQL_TOKEN_RE = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|--[^\n]*|/\*.*?\*/|\?|%", re.S)
+
+
+class Dialect:
+    """SQL 方言：占位符风格与 upsert 语法"""
+
+    name = None
+    paramstyle = 'qmark'
+    placeholder = '?'
+
+    def placeholders(self, count):
+        """count 个占位符，如 IN 列表 '?, ?, ?'"""
+        return ', '.join([self.placeholder] * count)
+
+    def format(self, sql):
+        """将 qmark 写法的 SQL 转换为本方言的占位符风格"""
+        return sql
+
+    def upsert(self, table, columns, key_columns, update_columns=None, values=None):
+        """
+        插入一行，key_columns 上的唯一约束冲突时更新 update_columns（默认为 columns 中的非键列）。
+        values 为各列的 SQL 表达式（如 CURRENT_TIMESTAMP），默认全部为占位符。
+        与 INSERT OR REPLACE 不同，冲突时原行保留（id 不变、不触发级联删除）。
+        """
+        if update_columns is None:
+            update_columns = [column for column in columns if column not in key_columns]
+        values = ', '.join(values) if values is not None else self.placeholders(len(columns))
+        sql = (f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({values}) "
+               f"ON CONFLICT ({', '.join(key_columns)}) ")
+        if not update_columns:
+            return sql + 'DO NOTHING'
+        return sql + 'DO UPDATE SET ' + ', '.join(f'{column} = excluded.{column}' for column in update_columns)
+
+    def insert_ignore(self, table, columns, key_columns):
+        """插入一行，key_columns 上的唯一约束冲突时忽略"""
+        return self.upsert(table, columns, key_columns, update_columns=[])
+
+
+class SQLiteDialect(Dialect):
+    name = 'sqlite'
+
+
+class PostgreSQLDialect(Dialect):
+    """PostgreSQL（psycopg 的 format 占位符 %s）"""
+
+    name = 'postgresql'
+    paramstyle = 'format'
+    placeholder = '%s'
+
+    def format(self, sql):
+        def replace(match):
+            token = match.group(0)
+            if token == '?':
+                return '%s'
+            if token == '%':
+                return '%%'
+            return token
+        return _SQL_TOKEN_RE.sub(replace, sql)
+
+
+DIALECTS = {
+    'sqlite': SQLiteDialect(),
+    'postgresql': PostgreSQLDialect(),
+}
+
+# 当前后端的方言
+dialect = DIALECTS['sqlite']
+
+
+# ==================== 连接 ====================
+
+class DialectCursor(sqlite3.Cursor):
+    """执行前按当前方言转换 SQL 的游标"""
+
+    def execute(self, sql, *args):
+        return super().execute(dialect.format(sql), *args)
+
+    def executemany(self, sql, *args):
+        return super().executemany(dialect.format(sql), *args)
+
+
+class DialectConnection(sqlite3.Connection):
+    """
+    connect() 返回的连接：游标默认为 DialectCursor；连接级 execute / executemany
+    转换 SQL 后直接交给 sqlite3 的 C 实现（不经 Python 游标，开销只有一次方言调用）
+    """
+
+    def cursor(self, factory=DialectCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, *args):
+        return super().execute(dialect.format(sql), *args)
+
+    def executemany(self, sql, *args):
+        return super().executemany(dialect.format(sql), *args)
+
+
+_memory_anchors = {}  # 内存库名 → 保持内存库存活的连接
+_memory_lock = threading.Lock()
+
+
+def is_memory(database):
+    """该数据库是否为进程内内存库"""
+    return database == MEMORY_DATABASE or DB_BACKEND == 'sqlite-memory'
+
+
+def _memory_name(database):
+    """数据库路径对应的共享内存库 URI（按绝对路径区分）"""
+    return f"file:/{os.path.abspath(database).lstrip('/')}?vfs=memdb"
+
+
+def _memory_uri(database):
+    uri = _memory_name(database)
+    # memdb 在最后一个连接关闭时释放，保留一个连接直到 drop_memory()
+    if uri not in _memory_anchors:
+        with _memory_lock:
+            if uri not in _memory_anchors:
+                _memory_anchors[uri] = sqlite3.connect(uri, uri=True, check_same_thread=False)
+    return uri
+
+
+def connect(database, **kwargs):
+    """
+    打开数据库连接（DB-API 2.0，参数同 sqlite3.connect，如 timeout、isolation_level、factory）。
+    factory 须为 DialectConnection 的子类。数据库文件所在目录由调用方保证存在。
+    """
+    factory = kwargs.setdefault('factory', DialectConnection)
+    if not issubclass(factory, DialectConnection):
+        raise TypeError(f'连接类 {factory.__name__} 须继承 DialectConnection')
+    if DB_BACKEND == 'sqlite-memory' and database != MEMORY_DATABASE:
+        return sqlite3.connect(_memory_uri(database), uri=True, **kwargs)
+    return sqlite3.connect(database, **kwargs)
+
+
+def exists(database):
+    """数据库是否已存在（共享内存库在首次连接后存在，':memory:' 视为不存在）"""
+    if database == MEMORY_DATABASE:
+        return False
+    if DB_BACKEND == 'sqlite-memory':
+        return _memory_name(database) in _memory_anchors
+    return os.path.exists(database)
+
+
+def drop_memory(database=None):
+    """释放内存库（database 为 None 时释放全部），之后再连接得到空库"""
+    with _memory_lock:
+        uris = list(_memory_anchors) if database is None else [_memory_name(database)]
+        for uri in uris:
+            anchor = _memory_anchors.pop(uri, None)
+            if anchor is not None:
+                anchor.close()
+
@@ -0,0 +1,262 @@
+"""
+数据库维护：WAL 检查点、PRAGMA optimize 与导入后的 ANALYZE
+
+数据库使用 WAL 模式，SQLite 的自动检查点不会收缩 WAL 文件：大批量导入后 WAL 保持在峰值大小，
+查询规划器也一直使用导入前的统计信息。维护调度器在每个 worker 中以后台线程运行
+（与 app_v2 的临时文件清理线程相同），每 MAINTENANCE_TICK 秒检查一次：
+  - ANALYZE：写入超过 ANALYZE_MIN_ROWS 行后由批量写入流程（原始数据导入、报告导入、客户导入、
+    由原始数据批量建稿）调用 request_analyze() 请求，下一次检查时执行
+    （analysis_limit 限制每个索引的采样行数，大表上也能快速完成）
+  - PRAGMA optimize：距上次执行超过 OPTIMIZE_INTERVAL 秒
+  - 只读快照（read_snapshot）：已有快照超过 DB_SNAPSHOT_MAX_AGE 秒时刷新，大查询使用时无需等待
+  - wal_checkpoint(TRUNCATE)：WAL 超过 CHECKPOINT_MIN_WAL_BYTES 且已空闲（WAL 文件
+    CHECKPOINT_IDLE_SECONDS 秒内无写入），把 WAL 写回主库并截断为 0
+多个 worker 之间以非阻塞文件锁（数据库旁的 .maintenance.lock）协调，同一时刻只有一个进程执行维护，
+其余进程跳过本次检查；上次执行时间与 ANALYZE 请求保存在数据库/文件中，各进程共享。
+
+每次执行记录在 maintenance_runs 表：任务、耗时、执行前后的 WAL 大小与执行结果，
+通过 GET /api/metrics 或 `python3 db_maintenance.py status` 查看；
+`python3 db_maintenance.py run` 立即执行全部任务（不检查空闲与间隔）。
+"""
+
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows 下无 fcntl，各进程各自执行
+    fcntl = None
+
+import db_backend
+import models_v2
+import read_snapshot
+from write_queue import run_write
+
+DB_MAINTENANCE = os.environ.get('DB_MAINTENANCE', '1') == '1'
+# 调度器检查间隔（秒）
+MAINTENANCE_TICK = int(os.environ.get('DB_MAINTENANCE_TICK', '60'))
+# WAL 文件超过此时间无写入视为空闲（秒）
+CHECKPOINT_IDLE_SECONDS = 30
+# WAL 小于此大小时不做截断检查点
+CHECKPOINT_MIN_WAL_BYTES = 1024 * 1024
+# PRAGMA optimize 执行间隔（秒）
+OPTIMIZE_INTERVAL = 3600
+# 单次导入达到该行数时请求 ANALYZE
+ANALYZE_MIN_ROWS = 1000
+# ANALYZE 每个索引采样的行数上限（0 为不限制）
+ANALYZE_LIMIT = 1000
+
+# SQLite 3.46+ 的 PRAGMA optimize 默认只分析本连接用过的表，0x10002 表示检查全部表
+_OPTIMIZE_PRAGMA = 'PRAGMA optimize = 0x10002' if sqlite3.sqlite_version_info >= (3, 46) else 'PRAGMA optimize'
+
+
+def wal_size(db_path):
+    try:
+        return os.path.getsize(f'{db_path}-wal')
+    except OSError:
+        return 0
+
+
+def _wal_idle_seconds(db_path):
+    try:
+        return time.time() - os.path.getmtime(f'{db_path}-wal')
+    except OSError:
+        return None
+
+
+def request_analyze(rows, db_path=None):
+    """导入完成后调用：写入行数达到 ANALYZE_MIN_ROWS 时标记需要 ANALYZE（由调度器执行）"""
+    db_path = db_path or models_v2.DATABASE_PATH
+    if rows < ANALYZE_MIN_ROWS or db_backend.is_memory(db_path):
+        return False
+    with open(f'{db_path}.analyze-pending', 'a') as f:
+        f.write(f'{int(time.time())} {rows}\n')
+    return True
+
+
+def _record(conn, task, started_at, duration_ms, wal_before, wal_after, detail):
+    conn.execute('''
+        INSERT INTO maintenance_runs (task, started_at, duration_ms, wal_bytes_before, wal_bytes_after, detail)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', (task, started_at, duration_ms, wal_before, wal_after, detail))
+
+
+def _last_run(conn, task):
+    row = conn.execute('SELECT MAX(started_at) FROM maintenance_runs WHERE task = ?', (task,)).fetchone()
+    return row[0]
+
+
+class _MaintenanceLock:
+    """非阻塞跨进程锁，acquired 为 False 时表示其他进程正在维护"""
+
+    def __init__(self, db_path):
+        self.path = f'{db_path}.maintenance.lock'
+        self._file = None
+        self.acquired = False
+
+    def __enter__(self):
+        self._file = open(self.path, 'a')
+        if fcntl is None:
+            self.acquired = True
+            return self
+        try:
+            fcntl.flock(self._file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            self.acquired = True
+        except BlockingIOError:
+            self.acquired = False
+        return self
+
+    def __exit__(self, *exc):
+        if self.acquired and fcntl is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+        self._file.close()
+        self._file = None
+
+
+def _run_task(conn, db_path, task, fn):
+    """执行单个维护任务并记录耗时与 WAL 大小，返回记录"""
+    started_at = time.strftime('%Y-%m-%d %H:%M:%S')
+    wal_before = wal_size(db_path)
+    started = time.perf_counter()
+    try:
+        detail = fn(conn)
+    except sqlite3.Error as e:
+        detail = f'失败: {e}'
+    duration_ms = int((time.perf_counter() - started) * 1000)
+    wal_after = wal_size(db_path)
+    run_write(_record, task, started_at, duration_ms, wal_before, wal_after, detail, db_path=db_path)
+    return {'task': task, 'started_at': started_at, 'duration_ms': duration_ms,
+            'wal_bytes_before': wal_before, 'wal_bytes_after': wal_after, 'detail': detail}
+
+
+def _analyze(conn):
+    conn.execute(f'PRAGMA analysis_limit = {ANALYZE_LIMIT}')
+    conn.execute('ANALYZE')
+    return 'ok'
+
+
+def _optimize(conn):
+    conn.execute(_OPTIMIZE_PRAGMA)
+    return 'ok'
+
+
+def _checkpoint(conn):
+    busy, log_frames, checkpointed = conn.execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchone()
+    # busy=1：仍有读事务使用旧快照，本次未能截断，下次空闲时重试
+    return f'busy={busy} log={log_frames} checkpointed={checkpointed}'
+
+
+def run_once(db_path=None, force=False):
+    """
+    执行一次到期的维护任务，返回本次执行的记录列表。
+    force=True 时不检查 ANALYZE 请求、optimize 间隔与空闲条件，全部执行。
+    其他进程正在维护时直接返回空列表。
+    """
+    db_path = db_path or models_v2.DATABASE_PATH
+    # 内存库没有 WAL 文件，无需维护
+    if db_backend.is_memory(db_path) or not os.path.exists(db_path):
+        return []
+    runs = []
+    with _MaintenanceLock(db_path) as lock:
+        if not lock.acquired:
+            return runs
+        conn = db_backend.connect(db_path, timeout=30.0, isolation_level=None)
+        conn.execute('PRAGMA busy_timeout = 30000')
+        try:
+            marker = f'{db_path}.analyze-pending'
+            try:
+                marker_mtime = os.path.getmtime(marker)
+            except OSError:
+                marker_mtime = None
+            if force or marker_mtime is not None:
+                runs.append(_run_task(conn, db_path, 'analyze', _analyze))
+                try:
+                    # 执行期间有新的导入请求时保留标记，下次再分析
+                    if marker_mtime is not None and os.path.getmtime(marker) == marker_mtime:
+                        os.remove(marker)
+                except OSError:
+                    pass
+
+            last_optimize = _last_run(conn, 'optimize')
+            due = last_optimize is None or time.time() - time.mktime(
+                time.strptime(last_optimize, '%Y-%m-%d %H:%M:%S')) >= OPTIMIZE_INTERVAL
+            if force or due:
+                runs.append(_run_task(conn, db_path, 'optimize', _optimize))
+
+            if read_snapshot.due(db_path):
+                runs.append(_run_task(conn, db_path, 'snapshot',
+                                      lambda _: read_snapshot.refresh_if_stale(db_path) or 'skipped'))
+
+            idle = _wal_idle_seconds(db_path)
+            if force or (wal_size(db_path) >= CHECKPOINT_MIN_WAL_BYTES
+                         and idle is not None and idle >= CHECKPOINT_IDLE_SECONDS):
+                runs.append(_run_task(conn, db_path, 'checkpoint', _checkpoint))
+        finally:
+            conn.close()
+    return runs
+
+
+def _scheduler_loop(db_path):
+    while True:
+        time.sleep(MAINTENANCE_TICK)
+        try:
+            run_once(db_path)
+        except Exception as e:
+            print(f"数据库维护失败: {e}", file=sys.stderr)
+
+
+_scheduler = None
+
+
+def start_scheduler(db_path=None):
+    """在本进程启动维护调度线程（DB_MAINTENANCE=0 时不启动），重复调用无效果"""
+    global _scheduler
+    if not DB_MAINTENANCE or _scheduler is not None:
+        return _scheduler
+    _scheduler = threading.Thread(target=_scheduler_loop, args=(db_path or models_v2.DATABASE_PATH,),
+                                  name='db-maintenance', daemon=True)
+    _scheduler.start()
+    return _scheduler
+
+
+def recent_runs(limit=20, db_path=None):
+    """最近的维护记录（按时间倒序）"""
+    db_path = db_path or models_v2.DATABASE_PATH
+    conn = db_backend.connect(db_path, timeout=30.0)
+    conn.row_factory = sqlite3.Row
+    try:
+        rows = conn.execute('SELECT * FROM maintenance_runs ORDER BY id DESC LIMIT ?', (limit,)).fetchall()
+        return [dict(row) for row in rows]
+    except sqlite3.OperationalError:
+        return []
+    finally:
+        conn.close()
+
+
+def stats(db_path=None):
+    db_path = db_path or models_v2.DATABASE_PATH
+    return {
+        'enabled': DB_MAINTENANCE,
+        'wal_bytes': wal_size(db_path),
+        'analyze_pending': os.path.exists(f'{db_path}.analyze-pending'),
+        'recent_runs': recent_runs(10, db_path),
+    }
+
+
+if __name__ == '__main__':
+    command = sys.argv[1] if len(sys.argv) > 1 else 'status'
+    if command == 'run':
+        for run in run_once(force=True):
+            print(f"  ✓ {run['task']}: {run['duration_ms']}ms  WAL {run['wal_bytes_before']} → "
+                  f"{run['wal_bytes_after']} 字节  {run['detail']}")
+    elif command == 'status':
+        print(f"WAL 大小: {wal_size(models_v2.DATABASE_PATH)} 字节")
+        for run in recent_runs():
+            print(f"  {run['started_at']}  {run['task']:<10} {run['duration_ms']:>6}ms  "
+                  f"WAL {run['wal_bytes_before']} → {run['wal_bytes_after']}  {run['detail']}")
+    else:
+        print("用法: python3 db_maintenance.py [run|status]")
+        sys.exit(1)
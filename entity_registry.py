@@ -0,0 +1,171 @@
+"""
+已知实体（被检单位、被检水厂）注册表
+
+汇总 raw_data_records、companies、customers、plants 中出现过的单位与水厂名称，
+在进程内缓存：
+  - 原始名称集合，供元信息校核做精确的集合查找
+  - 规范化名称（全半角统一、去空白、小写）到原始名称的映射
+  - 字符三元组倒排索引，用于"是否为 XX？"的模糊建议
+
+上述表有写入时由触发器递增 cache_versions 中的 'entities' 版本号，
+各 worker 进程比对版本号后按需重建。
+"""
+
+import re
+import sqlite3
+import threading
+import unicodedata
+
+import db_backend
+import models_v2
+from models_v2 import get_cache_version
+
+# 模糊建议的最低 Jaccard 相似度
+SUGGEST_MIN_SIMILARITY = 0.3
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+# 各类实体的名称来源查询；来源表不存在时跳过该来源
+ENTITY_SOURCES = {
+    'company': (
+        "SELECT DISTINCT company_name FROM raw_data_records "
+        "WHERE company_name IS NOT NULL AND company_name != ''",
+        "SELECT name FROM companies",
+        "SELECT DISTINCT inspected_unit FROM customers "
+        "WHERE inspected_unit IS NOT NULL AND inspected_unit != ''",
+    ),
+    'plant': (
+        "SELECT DISTINCT plant_name FROM raw_data_records "
+        "WHERE plant_name IS NOT NULL AND plant_name != ''",
+        "SELECT plant_name FROM plants",
+        "SELECT DISTINCT water_plant FROM customers "
+        "WHERE water_plant IS NOT NULL AND water_plant != ''",
+    ),
+}
+
+
+def normalize_name(name):
+    """名称规范化：NFKC（全角转半角）、去除所有空白、小写"""
+    if name is None:
+        return ''
+    return _WHITESPACE_RE.sub('', unicodedata.normalize('NFKC', str(name))).lower()
+
+
+def name_trigrams(normalized):
+    """带首尾标记的字符三元组，短名称也至少产生一个三元组"""
+    padded = f'^{normalized}$'
+    return {padded[i:i + 3] for i in range(max(1, len(padded) - 2))}
+
+
+class EntitySet:
+    """一类实体的名称集合及模糊匹配索引"""
+
+    def __init__(self, names=()):
+        self.names = set()
+        self.canonical = {}       # 规范化名称 → 首个原始名称
+        self.trigrams = {}        # 规范化名称 → 三元组集合
+        self.postings = {}        # 三元组 → 规范化名称集合
+        for name in names:
+            self.add(name)
+
+    def add(self, name):
+        if not name:
+            return
+        self.names.add(name)
+        norm = normalize_name(name)
+        if not norm or norm in self.canonical:
+            return
+        self.canonical[norm] = name
+        grams = name_trigrams(norm)
+        self.trigrams[norm] = grams
+        for gram in grams:
+            self.postings.setdefault(gram, set()).add(norm)
+
+    def __contains__(self, name):
+        return name in self.names
+
+    def __len__(self):
+        return len(self.names)
+
+    def __bool__(self):
+        return bool(self.names)
+
+    def suggest(self, name):
+        """
+        返回与 name 最接近的已知名称，无足够相似者返回 None。
+        规范化后相同者直接命中；否则按三元组 Jaccard 相似度取最高，同分取名称较小者。
+        """
+        norm = normalize_name(name)
+        if not norm:
+            return None
+        if norm in self.canonical:
+            return self.canonical[norm]
+
+        grams = name_trigrams(norm)
+        shared = {}
+        for gram in grams:
+            for candidate in self.postings.get(gram, ()):
+                shared[candidate] = shared.get(candidate, 0) + 1
+
+        best = None
+        best_score = SUGGEST_MIN_SIMILARITY
+        for candidate in sorted(shared):
+            common = shared[candidate]
+            score = common / (len(grams) + len(self.trigrams[candidate]) - common)
+            if score > best_score:
+                best, best_score = candidate, score
+        return self.canonical[best] if best is not None else None
+
+
+class EntityRegistry:
+    """被检单位与被检水厂注册表"""
+
+    def __init__(self, companies=(), plants=(), version=None):
+        self.companies = EntitySet(companies)
+        self.plants = EntitySet(plants)
+        self.version = version
+
+    @classmethod
+    def load(cls, conn, version=None):
+        """从数据库加载全部已知名称，各来源独立查询，缺表的来源跳过"""
+        names = {}
+        for kind, queries in ENTITY_SOURCES.items():
+            collected = []
+            for sql in queries:
+                try:
+                    collected.extend(row[0] for row in conn.execute(sql))
+                except sqlite3.OperationalError:
+                    continue
+            names[kind] = collected
+        return cls(names['company'], names['plant'], version)
+
+
+_registries = {}
+_registries_lock = threading.Lock()
+
+
+def get_entity_registry(db_path=None):
+    """
+    获取进程级实体注册表（按数据库路径缓存）。
+    每次调用只读取一次 'entities' 版本号，相关表有写入时重建。
+    """
+    db_path = db_path or models_v2.DATABASE_PATH
+    try:
+        conn = db_backend.connect(db_path)
+        try:
+            version = get_cache_version(conn, 'entities')
+            cached = _registries.get(db_path)
+            if cached is not None and version is not None and cached.version == version:
+                return cached
+            with _registries_lock:
+                cached = _registries.get(db_path)
+                if cached is not None and version is not None and cached.version == version:
+                    return cached
+                registry = EntityRegistry.load(conn, version)
+                if version is not None:
+                    _registries[db_path] = registry
+                return registry
+        finally:
+            conn.close()
+    except Exception:
+        return EntityRegistry()
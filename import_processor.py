@@ -3,7 +3,9 @@ Excel批量导入处理器
 解析导入的Excel文件并创建报告
 """
 import openpyxl
+from db_maintenance import request_analyze
 from models_v2 import get_db_connection
+from storage_profiles import bulk_import
 from datetime import datetime
 
 class ImportProcessor:
@@ -28,6 +30,7 @@ class ImportProcessor:
             'warnings': []
         }
 
+    @bulk_import()
     def process(self):
         """
         处理导入
@@ -49,6 +52,7 @@ class ImportProcessor:
             template_fields_dict = self._parse_template_fields()
 
             # 4. 创建报告
+            written_rows = 0
             for basic_info in basic_info_list:
                 sample_number = basic_info['sample_number']
 
@@ -61,6 +65,7 @@ class ImportProcessor:
 
                     # 创建报告
                     report_id = self._create_report(basic_info, detection_data, template_fields)
+                    written_rows += 1 + len(detection_data) + len(template_fields)
 
                     self.results['success'].append({
                         'sample_number': sample_number,
@@ -74,6 +79,8 @@ class ImportProcessor:
                         'message': f'创建报告失败: {str(e)}'
                     })
 
+            # 大批量导入后由维护线程更新查询规划器统计信息
+            request_analyze(written_rows)
             return self.results
 
         except Exception as e:
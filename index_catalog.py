@@ -0,0 +1,85 @@
+"""
+数据库索引目录
+
+全部二级索引在此集中声明，由 schema_migrations 在每次迁移后按目录对齐：
+  - 缺失的索引创建
+  - 同名但字段不一致的索引删除后按目录重建
+目录之外的索引（UNIQUE 约束自动生成的 sqlite_autoindex_*）不受影响。
+
+新增索引只需在 INDEX_CATALOG 中追加一项；热点查询的执行计划由
+tests/test_index_catalog.py 校验，新增查询条件时请一并补充。
+"""
+
+# (索引名, 表名, 字段元组)
+INDEX_CATALOG = (
+    # 报告：样品编号/报告编号查找、审核列表与我的报告列表按创建时间排序
+    ('idx_reports_sample_number', 'reports', ('sample_number',)),
+    ('idx_reports_report_number', 'reports', ('report_number',)),
+    ('idx_reports_created_at', 'reports', ('created_at',)),
+    ('idx_reports_review_status_created_at', 'reports', ('review_status', 'created_at')),
+    ('idx_reports_created_by_created_at', 'reports', ('created_by', 'created_at')),
+    ('idx_reports_sample_type_id', 'reports', ('sample_type_id',)),
+    ('idx_reports_template_id', 'reports', ('template_id',)),
+
+    # 报告数据与报告字段值：按报告读取详情、删除检测项目前的引用检查
+    ('idx_report_data_report_id', 'report_data', ('report_id',)),
+    ('idx_report_data_indicator_id', 'report_data', ('indicator_id',)),
+    ('idx_report_field_values_report_id', 'report_field_values', ('report_id',)),
+    ('idx_report_field_values_field_mapping_id', 'report_field_values', ('field_mapping_id',)),
+
+    # 审核历史
+    ('idx_review_history_report_id', 'review_history', ('report_id',)),
+    ('idx_review_history_reviewed_at', 'review_history', ('reviewed_at',)),
+
+    # 操作日志：按用户、操作类型筛选并按时间倒序
+    ('idx_operation_logs_created_at', 'operation_logs', ('created_at',)),
+    ('idx_operation_logs_user_operation', 'operation_logs', ('user_id', 'operation_type', 'created_at')),
+
+    # 检测项目
+    ('idx_indicators_group_id', 'indicators', ('group_id',)),
+
+    # 原始数据
+    ('idx_raw_data_records_sample_number', 'raw_data_records', ('sample_number',)),
+    ('idx_raw_data_records_sampling_date', 'raw_data_records', ('sampling_date',)),
+    ('idx_raw_data_records_company_name', 'raw_data_records', ('company_name',)),
+    ('idx_raw_data_records_plant_name', 'raw_data_records', ('plant_name',)),
+    ('idx_raw_data_records_sample_type', 'raw_data_records', ('sample_type',)),
+    ('idx_raw_data_values_record_id', 'raw_data_values', ('record_id',)),
+
+    # 模板
+    ('idx_export_template_columns_template_id', 'export_template_columns', ('template_id',)),
+    ('idx_template_field_mappings_template_id', 'template_field_mappings', ('template_id',)),
+    ('idx_template_sheet_configs_template_id', 'template_sheet_configs', ('template_id',)),
+
+    # 客户与样品类型列表按创建时间分页
+    ('idx_customers_created_at', 'customers', ('created_at',)),
+    ('idx_sample_types_created_at', 'sample_types', ('created_at',)),
+
+    # 数据库维护记录：按任务取上次执行时间
+    ('idx_maintenance_runs_task_started_at', 'maintenance_runs', ('task', 'started_at')),
+)
+
+
+def apply_index_catalog(cursor):
+    """
+    按目录创建或重建索引（由调用方提交），返回本次创建的索引名列表。
+    目录中的表不存在时跳过（如恢复的旧备份），待对应迁移建表后再次对齐。
+    """
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+    tables = {row[0] for row in cursor.fetchall()}
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index'")
+    existing = {row[0] for row in cursor.fetchall()}
+
+    created = []
+    for name, table, columns in INDEX_CATALOG:
+        if table not in tables:
+            continue
+        if name in existing:
+            cursor.execute(f"PRAGMA index_info('{name}')")
+            current = tuple(row[2] for row in sorted(cursor.fetchall()))
+            if current == columns:
+                continue
+            cursor.execute(f'DROP INDEX {name}')
+        cursor.execute(f'CREATE INDEX {name} ON {table}({", ".join(columns)})')
+        created.append(name)
+    return created
@@ -0,0 +1,409 @@
+"""
+原始数据列名 → 系统检测指标 解析器
+
+for-report 取数、筛选导出、校核限值匹配共用同一套名称规则：
+  - 规范化：NFKC（全角转半角、下标数字 ₃→3）、去空白、小写、常见笔误映射
+  - 逐层去除末尾括号：硝酸盐(以N计)(mg/L) → 硝酸盐(以N计) → 硝酸盐
+  - 别名映射：原始记录常见名称 → 系统指标名称
+
+NameIndex 将一组名称预编译为哈希索引，查找时只需对输入名称做一次规范化；
+IndicatorResolver 在其上叠加 indicators 与 raw_data_field_mapping，
+按进程缓存，indicators / raw_data_field_mapping 有写入时经 cache_versions 失效重建。
+
+新学到的字段映射先写入进程内解析器（立即生效），再经 MappingWriteBuffer 攒批
+写回 raw_data_field_mapping（INSERT OR IGNORE）。回写在独占事务中进行，
+期间版本号的变化全部来自本批写入，本进程据此推进缓存版本号而不必重建。
+"""
+
+import atexit
+import re
+import sqlite3
+import threading
+import unicodedata
+
+import db_backend
+import models_v2
+from models_v2 import get_cache_version
+
+# 新映射攒批回写：累积条数达到上限立即回写，否则自首条起延迟若干秒回写
+MAPPING_FLUSH_SIZE = 50
+MAPPING_FLUSH_DELAY = 5.0
+
+# 字段映射写入（raw_field_name 已存在时忽略）
+INSERT_MAPPING_SQL = db_backend.dialect.insert_ignore(
+    'raw_data_field_mapping', ('raw_field_name', 'indicator_id', 'indicator_name'), ('raw_field_name',))
+
+# 原始记录常见名称 → 系统指标名称
+INDICATOR_ALIASES = {
+    '六价铬': '铬(六价)',
+    '挥发酚': '挥发酚类(以苯酚计)',
+    '总α': '总α放射性',
+    '总β': '总β放射性',
+    '化学需氧量': '化学需氧量(COD)',
+    '五日生化需氧量': '五日生化需氧量(BOD5)',
+    '总硬度': '总硬度(以CaCO3计)',
+    '氨氮': '氨(以N计)',
+}
+
+# 系统指标名称 → 原始记录常见名称（按系统名反查原始列时使用）
+REVERSE_ALIASES = {v: k for k, v in INDICATOR_ALIASES.items()}
+
+# 常见笔误/异写（规范化后的键 → 规范化后的标准写法）
+TYPO_MAP = {
+    'ph值': 'ph',
+    '浊度': '浑浊度',
+}
+
+_WHITESPACE_RE = re.compile(r'\s+')
+_TRAILING_BRACKET_RE = re.compile(r'\([^)]*\)$')
+
+
+def normalize_indicator_name(name):
+    """名称规范化，用作索引键"""
+    if name is None:
+        return ''
+    key = _WHITESPACE_RE.sub('', unicodedata.normalize('NFKC', str(name))).lower()
+    return TYPO_MAP.get(key, key)
+
+
+def name_chain(name):
+    """规范化名称及逐层去除末尾括号后的各级名称，依次由具体到宽泛"""
+    key = normalize_indicator_name(name)
+    chain = [key] if key else []
+    while key:
+        stripped = _TRAILING_BRACKET_RE.sub('', key)
+        if stripped == key or not stripped:
+            break
+        key = TYPO_MAP.get(stripped, stripped)
+        chain.append(key)
+    return chain
+
+
+class NameIndex:
+    """
+    名称 → 值 的预编译索引。
+
+    每个名称登记其完整名（exact）与各级去括号名（base），同键多个值按登记顺序排列。
+    查找时对输入名称的每一级依次尝试 exact、base，再尝试别名映射，
+    最后回退为"输入名称包含别名"的子串匹配。
+
+    exact_only=True 时为单向匹配（限值匹配使用）：不登记 base，输入名称只去除一层
+    末尾单位括号，"铬(mg/L)" 不会匹配到 "铬(六价)"。
+    """
+
+    def __init__(self, items=(), aliases=None, exact_only=False):
+        self.exact = {}
+        self.base = {}
+        self.exact_only = exact_only
+        self.aliases = {
+            normalize_indicator_name(k): normalize_indicator_name(v)
+            for k, v in (INDICATOR_ALIASES if aliases is None else aliases).items()
+        }
+        for name, value in items:
+            self.add(name, value)
+
+    def add(self, name, value):
+        chain = name_chain(name)
+        if not chain:
+            return
+        self.exact.setdefault(chain[0], []).append(value)
+        if self.exact_only:
+            return
+        for key in chain[1:]:
+            self.base.setdefault(key, []).append(value)
+
+    @staticmethod
+    def _first(values, allowed):
+        for value in values:
+            if allowed is None or value in allowed:
+                return value
+        return None
+
+    def _find(self, key, allowed):
+        for table in (self.exact, self.base):
+            found = self._first(table.get(key, ()), allowed)
+            if found is not None:
+                return found
+        return None
+
+    def lookup(self, name, allowed=None):
+        """返回最佳匹配值；allowed 给定时只在其中选择。未命中返回 None"""
+        chain = name_chain(name)
+        if self.exact_only:
+            chain = chain[:2]
+        for key in chain:
+            found = self._find(key, allowed)
+            if found is not None:
+                return found
+
+        for key in chain:
+            canonical = self.aliases.get(key)
+            if canonical:
+                found = self._find(canonical, allowed)
+                if found is not None:
+                    return found
+
+        if chain:
+            for alias, canonical in self.aliases.items():
+                if alias in chain[0]:
+                    found = self._find(canonical, allowed)
+                    if found is not None:
+                        return found
+        return None
+
+
+class IndicatorResolver:
+    """
+    原始列名 → 检测指标 解析器。
+
+    indicators: {indicator_id: 指标信息}，按 id 顺序
+    mappings:   已固化的字段映射 {raw_field_name: indicator_id}
+    id_to_raws: 反向映射 {indicator_id: [raw_field_name, ...]}，按固化顺序
+    解析结果按 列名 → 候选范围 缓存在实例内。
+    """
+
+    def __init__(self, indicators=None, mappings=None, version=None):
+        self.indicators = indicators or {}
+        self.mappings = mappings or {}
+        self.version = version
+        self.index = NameIndex((info['indicator_name'], ind_id)
+                               for ind_id, info in self.indicators.items())
+        self.name_to_id = {}
+        for ind_id, info in self.indicators.items():
+            self.name_to_id.setdefault(info['indicator_name'], ind_id)
+        self.id_to_raws = {}
+        for raw_name, ind_id in self.mappings.items():
+            self.id_to_raws.setdefault(ind_id, []).append(raw_name)
+        # indicator_id → 首个已固化的 raw 列名
+        self.id_to_raw = {ind_id: names[0] for ind_id, names in self.id_to_raws.items()}
+        self._resolved = {}
+
+    @classmethod
+    def load(cls, conn, version=None):
+        indicators = {}
+        for ind_id, name, unit, limit_value, detection_method in conn.execute(
+            "SELECT id, name, unit, limit_value, detection_method FROM indicators ORDER BY id"
+        ):
+            indicators[ind_id] = {
+                'indicator_id': ind_id,
+                'indicator_name': name,
+                'unit': unit,
+                'limit_value': limit_value,
+                'detection_method': detection_method,
+            }
+        mappings = {}
+        try:
+            for raw_name, ind_id in conn.execute(
+                "SELECT raw_field_name, indicator_id FROM raw_data_field_mapping ORDER BY id"
+            ):
+                mappings.setdefault(raw_name, ind_id)
+        except sqlite3.OperationalError:
+            pass
+        return cls(indicators, mappings, version)
+
+    def resolve(self, raw_name, allowed=None):
+        """
+        返回原始列名对应的 indicator_id，未匹配返回 None。
+        allowed 为候选 indicator_id 集合（如某样品类型关联的指标），None 表示全部指标。
+        已固化映射优先，其次按名称规则匹配。
+        """
+        if allowed is not None and not isinstance(allowed, frozenset):
+            allowed = frozenset(allowed)
+        cached = self._resolved.setdefault(raw_name, {})
+        try:
+            return cached[allowed]
+        except KeyError:
+            pass
+        ind_id = self.mappings.get(raw_name)
+        if ind_id is None or ind_id not in self.indicators or (allowed is not None and ind_id not in allowed):
+            ind_id = self.index.lookup(raw_name, allowed)
+        cached[allowed] = ind_id
+        return ind_id
+
+    def learn(self, raw_name, ind_id):
+        """登记新映射（已有映射的列名不覆盖），返回是否新增"""
+        if raw_name in self.mappings:
+            return False
+        self.mappings[raw_name] = ind_id
+        self.id_to_raws.setdefault(ind_id, []).append(raw_name)
+        self.id_to_raw.setdefault(ind_id, raw_name)
+        self._resolved.pop(raw_name, None)
+        return True
+
+    def resolve_many(self, raw_names, allowed=None):
+        """批量解析：{raw_name: indicator_id 或 None}"""
+        if allowed is not None:
+            allowed = frozenset(allowed)
+        return {name: self.resolve(name, allowed) for name in raw_names}
+
+    def match_columns(self, indicator_names, raw_columns):
+        """
+        批量反查：为每个系统指标名在给定的原始列名中找到对应列。
+        依次尝试已固化映射、列名完全相同、名称规则与反向别名。
+
+        返回: {indicator_name: raw_column}，未匹配的指标不出现在结果中
+        """
+        raw_columns = list(raw_columns)
+        raw_set = set(raw_columns)
+        raw_index = NameIndex(((col, col) for col in raw_columns), aliases=REVERSE_ALIASES)
+        matched = {}
+        for indicator in indicator_names:
+            ind_id = self.name_to_id.get(indicator)
+            raw_col = self.id_to_raw.get(ind_id) if ind_id is not None else None
+            if raw_col is None and indicator in raw_set:
+                raw_col = indicator
+            if raw_col is None:
+                raw_col = raw_index.lookup(indicator)
+            if raw_col is not None:
+                matched[indicator] = raw_col
+        return matched
+
+
+_resolvers = {}
+_resolvers_lock = threading.Lock()
+
+
+def get_indicator_resolver(db_path=None):
+    """
+    获取进程级指标解析器（按数据库路径缓存）。
+    每次调用只读取一次 'indicators' 版本号，indicators / raw_data_field_mapping 有写入时重建。
+    """
+    db_path = db_path or models_v2.DATABASE_PATH
+    try:
+        conn = db_backend.connect(db_path)
+        try:
+            version = get_cache_version(conn, 'indicators')
+            cached = _resolvers.get(db_path)
+            if cached is not None and version is not None and cached.version == version:
+                return cached
+            with _resolvers_lock:
+                cached = _resolvers.get(db_path)
+                if cached is not None and version is not None and cached.version == version:
+                    return cached
+                resolver = IndicatorResolver.load(conn, version)
+                # 尚未回写的新映射在重建后的解析器中继续生效
+                buffer = _buffers.get(db_path)
+                if buffer is not None:
+                    for raw_name, (ind_id, _) in buffer.snapshot().items():
+                        resolver.learn(raw_name, ind_id)
+                if version is not None:
+                    _resolvers[db_path] = resolver
+                return resolver
+        finally:
+            conn.close()
+    except Exception:
+        return IndicatorResolver()
+
+
+class MappingWriteBuffer:
+    """新字段映射的攒批回写缓冲（每个数据库路径一个）"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.pending = {}  # raw_field_name → (indicator_id, indicator_name)
+        self.lock = threading.Lock()
+        self.timer = None
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.pending)
+
+    def add(self, raw_name, ind_id, ind_name):
+        """登记待回写的映射，达到批量上限时立即回写"""
+        with self.lock:
+            self.pending.setdefault(raw_name, (ind_id, ind_name))
+            full = len(self.pending) >= MAPPING_FLUSH_SIZE
+            if not full and self.timer is None:
+                self.timer = threading.Timer(MAPPING_FLUSH_DELAY, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+        if full:
+            self.flush()
+
+    def flush(self):
+        """回写全部待写映射，返回实际新增条数"""
+        with self.lock:
+            rows = [(raw_name, ind_id, ind_name) for raw_name, (ind_id, ind_name) in self.pending.items()]
+            self.pending = {}
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+        if not rows:
+            return 0
+
+        try:
+            conn = db_backend.connect(self.db_path, timeout=30.0, isolation_level=None)
+            try:
+                conn.execute('BEGIN IMMEDIATE')
+                try:
+                    before = get_cache_version(conn, 'indicators')
+                    inserted = conn.executemany(INSERT_MAPPING_SQL, rows).rowcount
+                    after = get_cache_version(conn, 'indicators')
+                    conn.execute('COMMIT')
+                except Exception:
+                    conn.execute('ROLLBACK')
+                    raise
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            # 回写失败（如长时间锁等待）时放回缓冲，留待下次回写
+            with self.lock:
+                for raw_name, ind_id, ind_name in rows:
+                    self.pending.setdefault(raw_name, (ind_id, ind_name))
+            raise
+
+        # 独占事务内版本号只因本批写入而变化；全部写入成功说明库中映射与内存一致，
+        # 推进缓存版本号。有被忽略的行（其他进程已写入不同映射）时交由下次调用重建
+        with _resolvers_lock:
+            cached = _resolvers.get(self.db_path)
+            if cached is not None and before is not None and cached.version == before:
+                if inserted == len(rows):
+                    cached.version = after
+                else:
+                    _resolvers.pop(self.db_path, None)
+        return inserted
+
+
+_buffers = {}
+
+
+def _mapping_buffer(db_path):
+    with _resolvers_lock:
+        buffer = _buffers.get(db_path)
+        if buffer is None:
+            buffer = _buffers[db_path] = MappingWriteBuffer(db_path)
+        return buffer
+
+
+def learn_mappings(mappings, db_path=None):
+    """
+    登记新学到的字段映射 [(raw_field_name, indicator_id, indicator_name), ...]：
+    立即写入进程内解析器，数据库回写攒批进行。返回新增条数
+    """
+    db_path = db_path or models_v2.DATABASE_PATH
+    resolver = _resolvers.get(db_path)
+    buffer = _mapping_buffer(db_path)
+    learned = 0
+    for raw_name, ind_id, ind_name in mappings:
+        if resolver is not None and not resolver.learn(raw_name, ind_id):
+            continue
+        buffer.add(raw_name, ind_id, ind_name)
+        learned += 1
+    return learned
+
+
+def flush_learned_mappings(db_path=None):
+    """立即回写待写映射（db_path 为 None 时回写全部数据库），返回新增条数"""
+    if db_path is not None:
+        buffer = _buffers.get(db_path)
+        return buffer.flush() if buffer is not None else 0
+    total = 0
+    for buffer in list(_buffers.values()):
+        try:
+            total += buffer.flush()
+        except sqlite3.Error:
+            pass
+    return total
+
+
+atexit.register(flush_learned_mappings)
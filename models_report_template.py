@@ -2,18 +2,30 @@
 报告模版数据模型扩展
 支持Excel报告模版的存储和管理
 """
-import sqlite3
 import os
+import db_backend
 from models_v2 import DATABASE_PATH, get_db_connection
 
 def create_report_template_tables():
     """创建报告模版相关的数据表"""
-    conn = sqlite3.connect(DATABASE_PATH)
+    conn = db_backend.connect(DATABASE_PATH)
     cursor = conn.cursor()
 
     # 启用外键约束
     cursor.execute('PRAGMA foreign_keys = ON')
 
+    create_report_template_schema(cursor)
+
+    conn.commit()
+    conn.close()
+
+    print("报告模版数据表创建成功！")
+
+    # 执行数据库迁移
+    migrate_template_tables()
+
+def create_report_template_schema(cursor):
+    """创建报告模版表及索引（CREATE ... IF NOT EXISTS，可重复执行，由调用方提交）"""
     # ==================== Excel报告模版表 ====================
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS excel_report_templates (
@@ -70,66 +82,36 @@ def create_report_template_tables():
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_template_field_mappings_template_id ON template_field_mappings(template_id)')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_template_sheet_configs_template_id ON template_sheet_configs(template_id)')
 
-    conn.commit()
-    conn.close()
-
-    print("报告模版数据表创建成功！")
-
-    # 执行数据库迁移
-    migrate_template_tables()
+# 模版字段映射表后续新增的字段：(字段名, 类型, 说明)
+TEMPLATE_FIELD_MAPPING_COLUMNS = [
+    ('field_display_name', 'TEXT', ''),
+    ('placeholder', 'TEXT', ''),
+    ('is_reference', 'BOOLEAN DEFAULT 0', ''),
+    ('column_mapping', 'TEXT', '用于存储检测数据列映射'),
+    ('original_cell_text', 'TEXT', '用于存储原始单元格完整文本'),
+    ('field_code', 'TEXT', '用于存储字段代号如 #report_no'),
+]
+
+def add_template_field_mapping_columns(cursor):
+    """为旧库的 template_field_mappings 表补齐新字段，返回新增的字段名列表（由调用方提交）"""
+    cursor.execute("PRAGMA table_info(template_field_mappings)")
+    columns = {row[1] for row in cursor.fetchall()}
+
+    added = []
+    for name, column_type, note in TEMPLATE_FIELD_MAPPING_COLUMNS:
+        if name not in columns:
+            cursor.execute(f'ALTER TABLE template_field_mappings ADD COLUMN {name} {column_type}')
+            print(f"  ✓ 添加字段 {name}" + (f" ({note})" if note else ""))
+            added.append(name)
+    return added
 
 def migrate_template_tables():
     """迁移模板表，添加新字段"""
-    conn = sqlite3.connect(DATABASE_PATH)
+    conn = db_backend.connect(DATABASE_PATH)
     cursor = conn.cursor()
 
     try:
-        # 检查 template_field_mappings 表是否需要添加新字段
-        cursor.execute("PRAGMA table_info(template_field_mappings)")
-        columns = [row[1] for row in cursor.fetchall()]
-
-        migrations_needed = []
-
-        if 'field_display_name' not in columns:
-            migrations_needed.append('field_display_name')
-        if 'placeholder' not in columns:
-            migrations_needed.append('placeholder')
-        if 'is_reference' not in columns:
-            migrations_needed.append('is_reference')
-        if 'column_mapping' not in columns:
-            migrations_needed.append('column_mapping')
-        if 'original_cell_text' not in columns:
-            migrations_needed.append('original_cell_text')
-        if 'field_code' not in columns:
-            migrations_needed.append('field_code')
-
-        if migrations_needed:
-            print(f"正在迁移 template_field_mappings 表，添加字段: {', '.join(migrations_needed)}")
-
-            if 'field_display_name' in migrations_needed:
-                cursor.execute('ALTER TABLE template_field_mappings ADD COLUMN field_display_name TEXT')
-                print("  ✓ 添加字段 field_display_name")
-
-            if 'placeholder' in migrations_needed:
-                cursor.execute('ALTER TABLE template_field_mappings ADD COLUMN placeholder TEXT')
-                print("  ✓ 添加字段 placeholder")
-
-            if 'is_reference' in migrations_needed:
-                cursor.execute('ALTER TABLE template_field_mappings ADD COLUMN is_reference BOOLEAN DEFAULT 0')
-                print("  ✓ 添加字段 is_reference")
-
-            if 'column_mapping' in migrations_needed:
-                cursor.execute('ALTER TABLE template_field_mappings ADD COLUMN column_mapping TEXT')
-                print("  ✓ 添加字段 column_mapping (用于存储检测数据列映射)")
-
-            if 'original_cell_text' in migrations_needed:
-                cursor.execute('ALTER TABLE template_field_mappings ADD COLUMN original_cell_text TEXT')
-                print("  ✓ 添加字段 original_cell_text (用于存储原始单元格完整文本)")
-
-            if 'field_code' in migrations_needed:
-                cursor.execute('ALTER TABLE template_field_mappings ADD COLUMN field_code TEXT')
-                print("  ✓ 添加字段 field_code (用于存储字段代号如 #report_no)")
-
+        if add_template_field_mapping_columns(cursor):
             conn.commit()
             print("模板表迁移完成！")
 
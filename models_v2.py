@@ -7,29 +7,217 @@ from datetime import datetime
 import sqlite3
 import os
 import re
+import secrets
+import threading
+import time
 from werkzeug.security import generate_password_hash
 
+import db_backend
+import sql_trace
+import storage_profiles
+
 DATABASE_PATH = 'database/water_quality_v2.db'
 
+# ==================== 连接池 ====================
+# 每个进程按 (数据库路径, 事务模式) 维护空闲连接栈：连接只在创建时设置一次 PRAGMA，
+# 存储配置（storage_profiles）与上次借出时不同时重新设置，
+# 借出时复位 row_factory，归还时回滚未提交事务。DB_POOL_SIZE=0 时不保留空闲连接，
+# 行为与每次新建连接相同。
+# 恢复备份等整体替换数据库内容的操作调用 reset_pools() 更新库旁的代次标记文件
+# （{库名}.generation），各进程借出与归还连接时发现代次变化即丢弃旧连接。
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '8'))
+# 空闲超过该秒数的连接在下次借出时丢弃
+DB_POOL_IDLE_TIMEOUT = 300
+# 每个连接缓存的预编译语句数（sqlite3 默认 128）
+DB_CACHED_STATEMENTS = 256
+
+
+class PooledConnection(db_backend.DialectConnection):
+    """连接池中的连接：close() 归还连接池而非真正关闭，重复 close() 无副作用"""
+
+    _pool = None
+    _checked_out = False
+    _storage_profile = None  # 已设置的存储配置名（见 storage_profiles）
+    _generation = None  # 创建时的连接池代次（见 pool_generation）
+
+    def close(self):
+        if self._checked_out:
+            self._checked_out = False
+            self._pool.release(self)
+        elif self._pool is None:
+            super().close()
+
+    def discard(self):
+        """真正关闭连接"""
+        self._checked_out = False
+        self._pool = None
+        super().close()
+
+
+class TracedPooledConnection(sql_trace.TracedConnectionMixin, PooledConnection):
+    """开启 SQL 追踪时连接池创建的连接（见 sql_trace）"""
+
+
+def _generation_file(path):
+    return f'{path}.generation'
+
+
+def pool_generation(path=None):
+    """数据库的连接池代次（跨进程），代次标记文件的 (修改时间, inode)；内存库或尚无标记时为 None"""
+    path = path or DATABASE_PATH
+    if db_backend.is_memory(path):
+        return None
+    try:
+        stat = os.stat(_generation_file(path))
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_ino
+
+
+def reset_pools(path=None):
+    """
+    通知所有进程丢弃该数据库的已有连接（恢复备份后调用）：原子替换代次标记文件，
+    各进程的连接池与写线程在下次借出/归还/写事务前发现代次变化后重新连接。本进程立即清空
+    """
+    path = path or DATABASE_PATH
+    if not db_backend.is_memory(path):
+        marker = _generation_file(path)
+        tmp_path = f'{marker}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(str(time.time_ns()))
+        os.replace(tmp_path, marker)
+    close_pool()
+
+
+class ConnectionPool:
+    """单个数据库路径、单种事务模式的连接池"""
+
+    def __init__(self, path, isolation_level):
+        self.path = path
+        self.isolation_level = isolation_level
+        self.idle = []  # [(连接, 归还时间)]，后进先出
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+        self.generation = pool_generation(path)
+        self.created = 0
+        self.reused = 0
+
+    def _connect(self):
+        traced = sql_trace.enabled()
+        conn = db_backend.connect(self.path, timeout=30.0, isolation_level=self.isolation_level,
+                                  check_same_thread=False,
+                                  factory=TracedPooledConnection if traced else PooledConnection,
+                                  cached_statements=DB_CACHED_STATEMENTS)
+        if traced:
+            sql_trace.install(conn)
+        conn._generation = self.generation
+        conn.execute('PRAGMA foreign_keys = ON')
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA busy_timeout = 30000')
+        self.created += 1
+        return conn
+
+    def acquire(self):
+        conn = None
+        expired = []
+        now = time.monotonic()
+        generation = pool_generation(self.path)
+        with self.lock:
+            if self.pid != os.getpid():
+                # fork 后的子进程不得使用父进程的连接，直接丢弃引用
+                self.idle = []
+                self.pid = os.getpid()
+            if generation != self.generation:
+                # 其他进程已替换数据库内容（reset_pools），丢弃全部空闲连接
+                expired = [candidate for candidate, _ in self.idle]
+                self.idle = []
+                self.generation = generation
+            while self.idle:
+                candidate, returned_at = self.idle.pop()
+                if now - returned_at <= DB_POOL_IDLE_TIMEOUT:
+                    conn = candidate
+                    self.reused += 1
+                    break
+                expired.append(candidate)
+        for candidate in expired:
+            candidate.discard()
+        if conn is None:
+            conn = self._connect()
+        profile = storage_profiles.active_profile()
+        if conn._storage_profile != profile:
+            conn._storage_profile = storage_profiles.apply_profile(conn, profile)
+        conn.row_factory = sqlite3.Row
+        conn._pool = self
+        conn._checked_out = True
+        return conn
+
+    def release(self, conn):
+        if conn._generation != pool_generation(self.path):
+            conn.discard()
+            return
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            conn.isolation_level = self.isolation_level
+        except sqlite3.Error:
+            conn.discard()
+            return
+        with self.lock:
+            if self.pid == os.getpid() and len(self.idle) < DB_POOL_SIZE:
+                self.idle.append((conn, time.monotonic()))
+                return
+        conn.discard()
+
+    def clear(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for conn, _ in idle:
+            conn.discard()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _get_pool(isolation_level):
+    key = (DATABASE_PATH, isolation_level)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.setdefault(key, ConnectionPool(DATABASE_PATH, isolation_level))
+    return pool
+
+
+def close_pool():
+    """关闭本进程连接池中的全部空闲连接（如恢复备份替换数据库文件前后）"""
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.clear()
+
+
+def pool_stats():
+    """各连接池的新建/复用次数与空闲连接数"""
+    with _pools_lock:
+        pools = list(_pools.items())
+    return [
+        {'path': path, 'autocommit': isolation_level is None, 'created': pool.created,
+         'reused': pool.reused, 'idle': len(pool.idle)}
+        for (path, isolation_level), pool in pools
+    ]
+
+
 def get_db_connection():
     """获取数据库连接（旧接口，保持向后兼容，需手动 close()）
-    注意：使用 autocommit 模式，rollback() 无效。新代码请使用 get_db()"""
-    conn = sqlite3.connect(DATABASE_PATH, timeout=30.0, isolation_level=None)
-    conn.row_factory = sqlite3.Row
-    conn.execute('PRAGMA foreign_keys = ON')
-    conn.execute('PRAGMA journal_mode = WAL')
-    conn.execute('PRAGMA busy_timeout = 30000')
-    return conn
+    注意：使用 autocommit 模式，rollback() 无效。新代码请使用 get_db()
+    连接取自连接池，close() 即归还"""
+    return _get_pool(None).acquire()
 
 @contextmanager
 def get_db():
-    """数据库连接上下文管理器（推荐），自动处理 commit/rollback/close
+    """数据库连接上下文管理器（推荐），自动处理 commit/rollback/归还连接池
     使用事务模式，支持正确的 rollback"""
-    conn = sqlite3.connect(DATABASE_PATH, timeout=30.0)
-    conn.row_factory = sqlite3.Row
-    conn.execute('PRAGMA foreign_keys = ON')
-    conn.execute('PRAGMA journal_mode = WAL')
-    conn.execute('PRAGMA busy_timeout = 30000')
+    conn = _get_pool('').acquire()
     try:
         yield conn
         conn.commit()
@@ -39,13 +227,18 @@ def get_db():
     finally:
         conn.close()
 
-def init_database():
-    """初始化数据库表结构"""
-    os.makedirs('database', exist_ok=True)
+def ensure_directories():
+    """创建数据库、导出与备份目录"""
+    os.makedirs(os.path.dirname(DATABASE_PATH) or '.', exist_ok=True)
     os.makedirs('exports', exist_ok=True)
     os.makedirs('backups', exist_ok=True)
 
-    conn = sqlite3.connect(DATABASE_PATH, timeout=30.0)
+def init_database():
+    """初始化数据库表结构
+    部署与升级请使用 schema_migrations.py（按版本执行全部迁移并记录 schema_version）"""
+    ensure_directories()
+
+    conn = db_backend.connect(DATABASE_PATH, timeout=30.0)
     cursor = conn.cursor()
 
     # 启用WAL模式以支持更好的并发
@@ -55,6 +248,19 @@ def init_database():
     # 设置繁忙超时
     cursor.execute('PRAGMA busy_timeout = 30000')
 
+    create_tables(cursor)
+    conn.commit()
+
+    # ==================== 初始化默认数据 ====================
+    init_default_data(cursor, conn)
+
+    conn.close()
+    print("数据库初始化成功！")
+
+def create_tables(cursor):
+    """创建全部基础表及缓存版本触发器（CREATE TABLE IF NOT EXISTS，可重复执行）"""
+    # 注意：迁移版本 1 使用 schema_migrations 中定稿的结构副本，已迁移的库不会再执行本函数；
+    # 新增表或字段必须在 schema_migrations.MIGRATIONS 末尾追加迁移步骤，只改这里不会生效
     # ==================== 用户表 ====================
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS users (
@@ -264,6 +470,38 @@ def init_database():
         )
     ''')
 
+    # ==================== 原始数据校核结果表 ====================
+    # 逐样品规则的校核结果，按记录内容哈希与规则集版本判断是否需要重新校核
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS raw_data_validation_results (
+            record_id INTEGER PRIMARY KEY,
+            content_hash TEXT NOT NULL,
+            ruleset_version TEXT NOT NULL,
+            results TEXT NOT NULL,
+            error_count INTEGER DEFAULT 0,
+            warning_count INTEGER DEFAULT 0,
+            notice_count INTEGER DEFAULT 0,
+            validated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (record_id) REFERENCES raw_data_records (id) ON DELETE CASCADE
+        )
+    ''')
+
+    # ==================== 原始数据历史统计表 ====================
+    # 按水厂、样品类型、指标列滚动维护的统计量（Welford 均值/方差与 P² 分位数），导入时增量更新
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS raw_data_indicator_stats (
+            plant_name TEXT NOT NULL,
+            sample_type TEXT NOT NULL DEFAULT '',
+            indicator TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            mean REAL NOT NULL DEFAULT 0,
+            m2 REAL NOT NULL DEFAULT 0,
+            sketch TEXT,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (plant_name, sample_type, indicator)
+        )
+    ''')
+
     # ==================== 原始数据字段映射表 ====================
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS raw_data_field_mapping (
@@ -314,13 +552,71 @@ def init_database():
         )
     ''')
 
-    conn.commit()
+    # ==================== 缓存版本表 ====================
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS cache_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    create_cache_version_triggers(cursor)
+
+# 进程内缓存依赖的数据表：表发生写入时由触发器递增对应缓存版本，
+# 各 worker 进程比对版本号即可判断缓存是否失效
+CACHE_VERSION_SOURCES = {
+    'limits': ('indicators', 'template_indicators', 'sample_types'),
+    'entities': ('raw_data_records', 'companies', 'customers', 'plants'),
+    'indicators': ('indicators', 'raw_data_field_mapping'),
+    'reports': ('reports',),
+}
+
+
+_INSERT_CACHE_VERSION_SQL = db_backend.dialect.insert_ignore('cache_versions', ('name', 'version'), ('name',))
+
+
+def create_cache_version_triggers(cursor):
+    """为 CACHE_VERSION_SOURCES 中的表创建版本递增触发器"""
+    existing_tables = {r[0] for r in cursor.execute(
+        "SELECT name FROM sqlite_master WHERE type='table'"
+    ).fetchall()}
+    for name, tables in CACHE_VERSION_SOURCES.items():
+        cursor.execute(_INSERT_CACHE_VERSION_SQL, (name, 0))
+        for table in tables:
+            if table not in existing_tables:
+                continue
+            for event in ('INSERT', 'UPDATE', 'DELETE'):
+                cursor.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS trg_cache_{name}_{table}_{event.lower()}
+                    AFTER {event} ON {table}
+                    BEGIN
+                        UPDATE cache_versions
+                        SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+                        WHERE name = '{name}';
+                    END
+                ''')
 
-    # ==================== 初始化默认数据 ====================
-    init_default_data(cursor, conn)
 
-    conn.close()
-    print("数据库初始化成功！")
+def get_cache_version(conn, name):
+    """读取缓存版本号，版本表不存在时返回 None（调用方应视为不可缓存）"""
+    try:
+        row = conn.execute('SELECT version FROM cache_versions WHERE name = ?', (name,)).fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return row[0] if row else None
+
+
+def bump_cache_versions(conn):
+    """整库替换（如恢复备份）后使全部进程内缓存失效。
+    恢复的版本号可能与旧缓存恰好相同，因此加随机偏移而非简单 +1"""
+    try:
+        conn.execute(
+            'UPDATE cache_versions SET version = version + ?, updated_at = CURRENT_TIMESTAMP',
+            (secrets.randbelow(2 ** 31) + 1,)
+        )
+    except sqlite3.OperationalError:
+        pass  # 旧备份尚无 cache_versions 表，进程读不到版本号时不会使用缓存
+
 
 def init_default_data(cursor, conn):
     """初始化默认数据"""
@@ -366,292 +662,284 @@ def init_default_data(cursor, conn):
 
 def run_migrations():
     """独立的数据库迁移函数，仅在需要时手动调用（python3 -c "from models_v2 import run_migrations; run_migrations()"）"""
-    conn = sqlite3.connect(DATABASE_PATH, timeout=30.0)
+    conn = db_backend.connect(DATABASE_PATH, timeout=30.0)
     cursor = conn.cursor()
     cursor.execute('PRAGMA journal_mode = WAL')
     cursor.execute('PRAGMA foreign_keys = ON')
     cursor.execute('PRAGMA busy_timeout = 30000')
 
-    migrated = False
-
     try:
-        # ==================== export_templates 添加 sample_type_id ====================
-        cursor.execute("PRAGMA table_info(export_templates)")
-        columns = [row[1] for row in cursor.fetchall()]
-        if 'sample_type_id' not in columns:
-            print("正在迁移export_templates表，添加sample_type_id列...")
-            cursor.execute('ALTER TABLE export_templates ADD COLUMN sample_type_id INTEGER')
-            migrated = True
-            print("export_templates表迁移完成！")
-
-        # ==================== reports 添加新列 ====================
-        cursor.execute("PRAGMA table_info(reports)")
-        report_columns = [row[1] for row in cursor.fetchall()]
-        if 'detection_items_description' not in report_columns:
-            print("正在迁移reports表，添加detection_items_description列...")
-            cursor.execute('ALTER TABLE reports ADD COLUMN detection_items_description TEXT')
-            migrated = True
-            print("reports表迁移完成（detection_items_description）！")
-        if 'attachment_info' not in report_columns:
-            print("正在迁移reports表，添加attachment_info列...")
-            cursor.execute('ALTER TABLE reports ADD COLUMN attachment_info TEXT')
-            migrated = True
-            print("reports表迁移完成（attachment_info）！")
-
-        # ==================== sample_types 去掉 UNIQUE(name) ====================
-        st_indexes = cursor.execute("PRAGMA index_list(sample_types)").fetchall()
-        for idx in st_indexes:
-            idx_cols = cursor.execute(f"PRAGMA index_info('{idx[1]}')").fetchall()
-            if idx[2] == 1 and len(idx_cols) == 1:
-                table_info = cursor.execute("PRAGMA table_info(sample_types)").fetchall()
-                col_map = {row[0]: row[1] for row in table_info}
-                if col_map.get(idx_cols[0][1]) == 'name':
-                    existing_tables = [r[0] for r in cursor.execute(
-                        "SELECT name FROM sqlite_master WHERE type='table' AND name IN ('sample_types_old')"
-                    ).fetchall()]
-                    if 'sample_types_old' in existing_tables:
-                        print("sample_types迁移：检测到sample_types_old已存在，跳过")
-                        break
-                    print("正在迁移sample_types表：去掉UNIQUE(name)约束...")
-                    cursor.execute('PRAGMA foreign_keys = OFF')
-                    cursor.execute('ALTER TABLE sample_types RENAME TO sample_types_old')
-                    cursor.execute('''
-                        CREATE TABLE sample_types (
-                            id INTEGER PRIMARY KEY AUTOINCREMENT,
-                            name TEXT NOT NULL,
-                            code TEXT NOT NULL UNIQUE,
-                            description TEXT,
-                            remark TEXT,
-                            version INTEGER DEFAULT 1,
-                            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                        )
-                    ''')
-                    old_cols = [r[1] for r in cursor.execute("PRAGMA table_info(sample_types_old)").fetchall()]
-                    new_cols = [r[1] for r in cursor.execute("PRAGMA table_info(sample_types)").fetchall()]
-                    common = [c for c in old_cols if c in new_cols]
-                    cols_str = ', '.join(common)
-                    cursor.execute(f'INSERT INTO sample_types ({cols_str}) SELECT {cols_str} FROM sample_types_old')
-                    cursor.execute('DROP TABLE sample_types_old')
-                    cursor.execute('PRAGMA foreign_keys = ON')
-                    migrated = True
-                    print("sample_types表迁移完成：允许同名样品类型！")
-                    break
+        migrated = apply_schema_fixes(cursor)
+        conn.commit()
+        if migrated:
+            print("数据库迁移完成！")
+        else:
+            print("数据库无需迁移。")
 
-        # ==================== template_indicators 添加 limit_value ====================
-        cursor.execute("PRAGMA table_info(template_indicators)")
-        ti_columns = [row[1] for row in cursor.fetchall()]
-        if 'limit_value' not in ti_columns:
-            print("正在迁移template_indicators表，添加limit_value列...")
-            cursor.execute('ALTER TABLE template_indicators ADD COLUMN limit_value TEXT')
-            cursor.execute('''
-                UPDATE template_indicators SET limit_value = (
-                    SELECT i.limit_value FROM indicators i
-                    WHERE i.id = template_indicators.indicator_id
-                )
-            ''')
-            migrated = True
-            print("template_indicators表迁移完成（limit_value）！")
+    except Exception as e:
+        conn.rollback()
+        print(f"数据库迁移失败，已回滚: {e}")
+        raise
+    finally:
+        conn.close()
 
-        # ==================== sample_types 添加新列 ====================
-        cursor.execute("PRAGMA table_info(sample_types)")
-        sample_type_columns = [row[1] for row in cursor.fetchall()]
-        if 'version' not in sample_type_columns:
-            cursor.execute('ALTER TABLE sample_types ADD COLUMN version INTEGER DEFAULT 1')
-            migrated = True
-        if 'updated_at' not in sample_type_columns:
-            cursor.execute('ALTER TABLE sample_types ADD COLUMN updated_at TIMESTAMP')
-            cursor.execute("UPDATE sample_types SET updated_at = CURRENT_TIMESTAMP WHERE updated_at IS NULL")
-            migrated = True
 
-        default_fields = [
-            ('default_sample_status', 'TEXT'),
-            ('default_sampling_basis', 'TEXT'),
-            ('default_product_standard', 'TEXT'),
-            ('default_detection_items', 'TEXT'),
-            ('default_test_conclusion', 'TEXT'),
-        ]
-        cursor.execute("PRAGMA table_info(sample_types)")
-        sample_type_columns = [row[1] for row in cursor.fetchall()]
-        for field_name, field_type in default_fields:
-            if field_name not in sample_type_columns:
-                cursor.execute(f'ALTER TABLE sample_types ADD COLUMN {field_name} {field_type}')
-                migrated = True
+def apply_schema_fixes(cursor):
+    """历史表结构修正（各项先检查再执行，可重复执行），返回是否有改动"""
+    migrated = False
 
-        # ==================== indicators 迁移 UNIQUE(name) → UNIQUE(name, group_id) ====================
-        old_indexes = cursor.execute("PRAGMA index_list(indicators)").fetchall()
-        has_old_unique = False
-        for idx in old_indexes:
-            idx_info = cursor.execute(f"PRAGMA index_info('{idx[1]}')").fetchall()
-            if idx[2] == 1 and len(idx_info) == 1:
-                col_name_in_idx = cursor.execute(f"PRAGMA index_info('{idx[1]}')").fetchone()
-                col_id = col_name_in_idx[1]
-                table_info = cursor.execute("PRAGMA table_info(indicators)").fetchall()
-                col_map = {row[0]: row[1] for row in table_info}
-                if col_map.get(col_id) == 'name':
-                    has_old_unique = True
+    # ==================== export_templates 添加 sample_type_id ====================
+    cursor.execute("PRAGMA table_info(export_templates)")
+    columns = [row[1] for row in cursor.fetchall()]
+    if 'sample_type_id' not in columns:
+        print("正在迁移export_templates表，添加sample_type_id列...")
+        cursor.execute('ALTER TABLE export_templates ADD COLUMN sample_type_id INTEGER')
+        migrated = True
+        print("export_templates表迁移完成！")
+
+    # ==================== reports 添加新列 ====================
+    cursor.execute("PRAGMA table_info(reports)")
+    report_columns = [row[1] for row in cursor.fetchall()]
+    if 'detection_items_description' not in report_columns:
+        print("正在迁移reports表，添加detection_items_description列...")
+        cursor.execute('ALTER TABLE reports ADD COLUMN detection_items_description TEXT')
+        migrated = True
+        print("reports表迁移完成（detection_items_description）！")
+    if 'attachment_info' not in report_columns:
+        print("正在迁移reports表，添加attachment_info列...")
+        cursor.execute('ALTER TABLE reports ADD COLUMN attachment_info TEXT')
+        migrated = True
+        print("reports表迁移完成（attachment_info）！")
+
+    # ==================== sample_types 去掉 UNIQUE(name) ====================
+    st_indexes = cursor.execute("PRAGMA index_list(sample_types)").fetchall()
+    for idx in st_indexes:
+        idx_cols = cursor.execute(f"PRAGMA index_info('{idx[1]}')").fetchall()
+        if idx[2] == 1 and len(idx_cols) == 1:
+            table_info = cursor.execute("PRAGMA table_info(sample_types)").fetchall()
+            col_map = {row[0]: row[1] for row in table_info}
+            if col_map.get(idx_cols[0][1]) == 'name':
+                existing_tables = [r[0] for r in cursor.execute(
+                    "SELECT name FROM sqlite_master WHERE type='table' AND name IN ('sample_types_old')"
+                ).fetchall()]
+                if 'sample_types_old' in existing_tables:
+                    print("sample_types迁移：检测到sample_types_old已存在，跳过")
                     break
-
-        if has_old_unique:
-            existing_tables = [r[0] for r in cursor.execute(
-                "SELECT name FROM sqlite_master WHERE type='table' AND name IN ('indicators_old')"
-            ).fetchall()]
-            if 'indicators_old' not in existing_tables:
-                print("正在迁移indicators表：UNIQUE(name) → UNIQUE(name, group_id)...")
+                print("正在迁移sample_types表：去掉UNIQUE(name)约束...")
                 cursor.execute('PRAGMA foreign_keys = OFF')
-                cursor.execute('ALTER TABLE indicators RENAME TO indicators_old')
+                cursor.execute('ALTER TABLE sample_types RENAME TO sample_types_old')
                 cursor.execute('''
-                    CREATE TABLE indicators (
+                    CREATE TABLE sample_types (
                         id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        group_id INTEGER,
                         name TEXT NOT NULL,
-                        unit TEXT,
-                        default_value TEXT,
-                        limit_value TEXT,
-                        detection_method TEXT,
+                        code TEXT NOT NULL UNIQUE,
                         description TEXT,
                         remark TEXT,
-                        sort_order INTEGER DEFAULT 0,
+                        version INTEGER DEFAULT 1,
                         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        FOREIGN KEY (group_id) REFERENCES indicator_groups (id) ON DELETE SET NULL,
-                        UNIQUE(name, group_id)
+                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                     )
                 ''')
-                cursor.execute('''
-                    INSERT INTO indicators (id, group_id, name, unit, default_value, limit_value,
-                        detection_method, description, remark, sort_order, created_at)
-                    SELECT id, group_id, name, unit, default_value, limit_value,
-                        detection_method, description, remark, sort_order, created_at
-                    FROM indicators_old
-                ''')
-                cursor.execute('DROP TABLE indicators_old')
+                old_cols = [r[1] for r in cursor.execute("PRAGMA table_info(sample_types_old)").fetchall()]
+                new_cols = [r[1] for r in cursor.execute("PRAGMA table_info(sample_types)").fetchall()]
+                common = [c for c in old_cols if c in new_cols]
+                cols_str = ', '.join(common)
+                cursor.execute(f'INSERT INTO sample_types ({cols_str}) SELECT {cols_str} FROM sample_types_old')
+                cursor.execute('DROP TABLE sample_types_old')
                 cursor.execute('PRAGMA foreign_keys = ON')
                 migrated = True
-                print("  约束已更新为 UNIQUE(name, group_id)")
-
-            # 拆分共享指标
-            shared = cursor.execute('''
-                SELECT ti.id, ti.sample_type_id, ti.indicator_id, ti.limit_value,
-                       i.name, i.unit, i.default_value, i.detection_method, i.description,
-                       i.remark, i.sort_order, i.group_id,
-                       st.name
-                FROM template_indicators ti
-                JOIN indicators i ON ti.indicator_id = i.id
-                JOIN sample_types st ON ti.sample_type_id = st.id
-                JOIN indicator_groups g ON g.name = st.name
-                WHERE i.group_id != g.id
-            ''').fetchall()
-
-            for row in shared:
-                ti_id, st_id, ind_id, ti_limit = row[0], row[1], row[2], row[3]
-                ind_name, ind_unit, ind_default = row[4], row[5], row[6]
-                ind_method, ind_desc, ind_remark, ind_sort = row[7], row[8], row[9], row[10]
-                st_name = row[12]
-
-                target_group = cursor.execute(
-                    'SELECT id FROM indicator_groups WHERE name = ?', (st_name,)
-                ).fetchone()
-                if not target_group:
-                    continue
-                target_group_id = target_group[0]
-
-                existing = cursor.execute(
-                    'SELECT id FROM indicators WHERE name = ? AND group_id = ?',
-                    (ind_name, target_group_id)
-                ).fetchone()
-
-                if existing:
-                    new_id = existing[0]
-                else:
-                    cursor.execute(
-                        'INSERT INTO indicators (group_id, name, unit, default_value, limit_value, '
-                        'detection_method, description, remark, sort_order) '
-                        'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
-                        (target_group_id, ind_name, ind_unit, ind_default,
-                         ti_limit or '', ind_method, ind_desc, ind_remark, ind_sort)
-                    )
-                    new_id = cursor.lastrowid
+                print("sample_types表迁移完成：允许同名样品类型！")
+                break
+
+    # ==================== template_indicators 添加 limit_value ====================
+    cursor.execute("PRAGMA table_info(template_indicators)")
+    ti_columns = [row[1] for row in cursor.fetchall()]
+    if 'limit_value' not in ti_columns:
+        print("正在迁移template_indicators表，添加limit_value列...")
+        cursor.execute('ALTER TABLE template_indicators ADD COLUMN limit_value TEXT')
+        cursor.execute('''
+            UPDATE template_indicators SET limit_value = (
+                SELECT i.limit_value FROM indicators i
+                WHERE i.id = template_indicators.indicator_id
+            )
+        ''')
+        migrated = True
+        print("template_indicators表迁移完成（limit_value）！")
+
+    # ==================== sample_types 添加新列 ====================
+    cursor.execute("PRAGMA table_info(sample_types)")
+    sample_type_columns = [row[1] for row in cursor.fetchall()]
+    if 'version' not in sample_type_columns:
+        cursor.execute('ALTER TABLE sample_types ADD COLUMN version INTEGER DEFAULT 1')
+        migrated = True
+    if 'updated_at' not in sample_type_columns:
+        cursor.execute('ALTER TABLE sample_types ADD COLUMN updated_at TIMESTAMP')
+        cursor.execute("UPDATE sample_types SET updated_at = CURRENT_TIMESTAMP WHERE updated_at IS NULL")
+        migrated = True
+
+    default_fields = [
+        ('default_sample_status', 'TEXT'),
+        ('default_sampling_basis', 'TEXT'),
+        ('default_product_standard', 'TEXT'),
+        ('default_detection_items', 'TEXT'),
+        ('default_test_conclusion', 'TEXT'),
+    ]
+    cursor.execute("PRAGMA table_info(sample_types)")
+    sample_type_columns = [row[1] for row in cursor.fetchall()]
+    for field_name, field_type in default_fields:
+        if field_name not in sample_type_columns:
+            cursor.execute(f'ALTER TABLE sample_types ADD COLUMN {field_name} {field_type}')
+            migrated = True
 
-                cursor.execute(
-                    'UPDATE template_indicators SET indicator_id = ? WHERE id = ?',
-                    (new_id, ti_id)
+    # ==================== indicators 迁移 UNIQUE(name) → UNIQUE(name, group_id) ====================
+    old_indexes = cursor.execute("PRAGMA index_list(indicators)").fetchall()
+    has_old_unique = False
+    for idx in old_indexes:
+        idx_info = cursor.execute(f"PRAGMA index_info('{idx[1]}')").fetchall()
+        if idx[2] == 1 and len(idx_info) == 1:
+            col_name_in_idx = cursor.execute(f"PRAGMA index_info('{idx[1]}')").fetchone()
+            col_id = col_name_in_idx[1]
+            table_info = cursor.execute("PRAGMA table_info(indicators)").fetchall()
+            col_map = {row[0]: row[1] for row in table_info}
+            if col_map.get(col_id) == 'name':
+                has_old_unique = True
+                break
+
+    if has_old_unique:
+        existing_tables = [r[0] for r in cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type='table' AND name IN ('indicators_old')"
+        ).fetchall()]
+        if 'indicators_old' not in existing_tables:
+            print("正在迁移indicators表：UNIQUE(name) → UNIQUE(name, group_id)...")
+            cursor.execute('PRAGMA foreign_keys = OFF')
+            cursor.execute('ALTER TABLE indicators RENAME TO indicators_old')
+            cursor.execute('''
+                CREATE TABLE indicators (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    group_id INTEGER,
+                    name TEXT NOT NULL,
+                    unit TEXT,
+                    default_value TEXT,
+                    limit_value TEXT,
+                    detection_method TEXT,
+                    description TEXT,
+                    remark TEXT,
+                    sort_order INTEGER DEFAULT 0,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (group_id) REFERENCES indicator_groups (id) ON DELETE SET NULL,
+                    UNIQUE(name, group_id)
                 )
-                cursor.execute('''
-                    UPDATE report_data SET indicator_id = ?
-                    WHERE indicator_id = ? AND report_id IN (
-                        SELECT id FROM reports WHERE sample_type_id = ?
-                    )
-                ''', (new_id, ind_id, st_id))
-                print(f"  拆分: {ind_name} -> 独立记录(group={st_name}, ID={new_id})")
-
-        # ==================== 修复外键引用 ====================
-        stale_fk_rows = cursor.execute(
-            "SELECT name, sql FROM sqlite_master WHERE type='table' "
-            "AND sql IS NOT NULL "
-            "AND (sql LIKE '%indicators_old%' OR sql LIKE '%sample_types_old%' "
-            "     OR sql LIKE '%_fixfk%')"
-        ).fetchall()
-
-        if stale_fk_rows:
-            stale_names = [r[0] for r in stale_fk_rows]
-            print(f"检测到外键引用旧表的表: {stale_names}，修复中...")
-            cursor.execute('PRAGMA writable_schema = ON')
-            for tbl_name, tbl_sql in stale_fk_rows:
-                fixed_sql = tbl_sql
-                fixed_sql = re.sub(r'"indicators_old[^"]*"', 'indicators', fixed_sql)
-                fixed_sql = re.sub(r'"sample_types_old[^"]*"', 'sample_types', fixed_sql)
-                fixed_sql = re.sub(r'"reports_fixfk[^"]*"', 'reports', fixed_sql)
-                fixed_sql = re.sub(r'"excel_report_templates_fixfk[^"]*"', 'excel_report_templates', fixed_sql)
-                fixed_sql = re.sub(r'"template_field_mappings_fixfk[^"]*"', 'template_field_mappings', fixed_sql)
-                if fixed_sql != tbl_sql:
-                    cursor.execute(
-                        "UPDATE sqlite_master SET sql = ? WHERE type = 'table' AND name = ?",
-                        (fixed_sql, tbl_name)
-                    )
-                    print(f"  已修复 {tbl_name} 的外键引用")
-            cursor.execute('PRAGMA writable_schema = OFF')
-            integrity = cursor.execute('PRAGMA integrity_check').fetchone()
-            if integrity and integrity[0] == 'ok':
-                print("外键引用修复完成，完整性检查通过！")
-            else:
-                print(f"警告：完整性检查结果: {integrity}")
+            ''')
+            cursor.execute('''
+                INSERT INTO indicators (id, group_id, name, unit, default_value, limit_value,
+                    detection_method, description, remark, sort_order, created_at)
+                SELECT id, group_id, name, unit, default_value, limit_value,
+                    detection_method, description, remark, sort_order, created_at
+                FROM indicators_old
+            ''')
+            cursor.execute('DROP TABLE indicators_old')
+            cursor.execute('PRAGMA foreign_keys = ON')
             migrated = True
+            print("  约束已更新为 UNIQUE(name, group_id)")
+
+        # 拆分共享指标
+        shared = cursor.execute('''
+            SELECT ti.id, ti.sample_type_id, ti.indicator_id, ti.limit_value,
+                   i.name, i.unit, i.default_value, i.detection_method, i.description,
+                   i.remark, i.sort_order, i.group_id,
+                   st.name
+            FROM template_indicators ti
+            JOIN indicators i ON ti.indicator_id = i.id
+            JOIN sample_types st ON ti.sample_type_id = st.id
+            JOIN indicator_groups g ON g.name = st.name
+            WHERE i.group_id != g.id
+        ''').fetchall()
+
+        for row in shared:
+            ti_id, st_id, ind_id, ti_limit = row[0], row[1], row[2], row[3]
+            ind_name, ind_unit, ind_default = row[4], row[5], row[6]
+            ind_method, ind_desc, ind_remark, ind_sort = row[7], row[8], row[9], row[10]
+            st_name = row[12]
+
+            target_group = cursor.execute(
+                'SELECT id FROM indicator_groups WHERE name = ?', (st_name,)
+            ).fetchone()
+            if not target_group:
+                continue
+            target_group_id = target_group[0]
+
+            existing = cursor.execute(
+                'SELECT id FROM indicators WHERE name = ? AND group_id = ?',
+                (ind_name, target_group_id)
+            ).fetchone()
+
+            if existing:
+                new_id = existing[0]
+            else:
+                cursor.execute(
+                    'INSERT INTO indicators (group_id, name, unit, default_value, limit_value, '
+                    'detection_method, description, remark, sort_order) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    (target_group_id, ind_name, ind_unit, ind_default,
+                     ti_limit or '', ind_method, ind_desc, ind_remark, ind_sort)
+                )
+                new_id = cursor.lastrowid
 
-        conn.commit()
-        if migrated:
-            print("数据库迁移完成！")
+            cursor.execute(
+                'UPDATE template_indicators SET indicator_id = ? WHERE id = ?',
+                (new_id, ti_id)
+            )
+            cursor.execute('''
+                UPDATE report_data SET indicator_id = ?
+                WHERE indicator_id = ? AND report_id IN (
+                    SELECT id FROM reports WHERE sample_type_id = ?
+                )
+            ''', (new_id, ind_id, st_id))
+            print(f"  拆分: {ind_name} -> 独立记录(group={st_name}, ID={new_id})")
+
+    # ==================== 修复外键引用 ====================
+    stale_fk_rows = cursor.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type='table' "
+        "AND sql IS NOT NULL "
+        "AND (sql LIKE '%indicators_old%' OR sql LIKE '%sample_types_old%' "
+        "     OR sql LIKE '%_fixfk%')"
+    ).fetchall()
+
+    if stale_fk_rows:
+        stale_names = [r[0] for r in stale_fk_rows]
+        print(f"检测到外键引用旧表的表: {stale_names}，修复中...")
+        cursor.execute('PRAGMA writable_schema = ON')
+        for tbl_name, tbl_sql in stale_fk_rows:
+            fixed_sql = tbl_sql
+            fixed_sql = re.sub(r'"indicators_old[^"]*"', 'indicators', fixed_sql)
+            fixed_sql = re.sub(r'"sample_types_old[^"]*"', 'sample_types', fixed_sql)
+            fixed_sql = re.sub(r'"reports_fixfk[^"]*"', 'reports', fixed_sql)
+            fixed_sql = re.sub(r'"excel_report_templates_fixfk[^"]*"', 'excel_report_templates', fixed_sql)
+            fixed_sql = re.sub(r'"template_field_mappings_fixfk[^"]*"', 'template_field_mappings', fixed_sql)
+            if fixed_sql != tbl_sql:
+                cursor.execute(
+                    "UPDATE sqlite_master SET sql = ? WHERE type = 'table' AND name = ?",
+                    (fixed_sql, tbl_name)
+                )
+                print(f"  已修复 {tbl_name} 的外键引用")
+        cursor.execute('PRAGMA writable_schema = OFF')
+        integrity = cursor.execute('PRAGMA integrity_check').fetchone()
+        if integrity and integrity[0] == 'ok':
+            print("外键引用修复完成，完整性检查通过！")
         else:
-            print("数据库无需迁移。")
+            print(f"警告：完整性检查结果: {integrity}")
+        migrated = True
 
-    except Exception as e:
-        conn.rollback()
-        print(f"数据库迁移失败，已回滚: {e}")
-        raise
-    finally:
-        conn.close()
+    return migrated
 
 
 def create_indexes():
-    """创建索引优化查询性能"""
+    """按索引目录（index_catalog.INDEX_CATALOG）创建索引，部署时由 schema_migrations 自动执行"""
+    from index_catalog import apply_index_catalog
+
     conn = get_db_connection()
     cursor = conn.cursor()
-
-    # 为常用查询字段创建索引
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_reports_sample_number ON reports(sample_number)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_reports_report_number ON reports(report_number)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_reports_created_at ON reports(created_at)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_operation_logs_created_at ON operation_logs(created_at)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_indicators_group_id ON indicators(group_id)')
-
-    # 原始数据相关索引
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_raw_data_records_sample_number ON raw_data_records(sample_number)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_raw_data_records_sampling_date ON raw_data_records(sampling_date)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_raw_data_records_company_name ON raw_data_records(company_name)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_raw_data_records_plant_name ON raw_data_records(plant_name)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_raw_data_records_sample_type ON raw_data_records(sample_type)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_raw_data_values_record_id ON raw_data_values(record_id)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_export_template_columns_template_id ON export_template_columns(template_id)')
-
+    apply_index_catalog(cursor)
     conn.commit()
     conn.close()
     print("数据库索引创建成功！")
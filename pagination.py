@@ -0,0 +1,114 @@
+"""
+列表接口的游标分页（keyset pagination）
+
+列表按 (created_at, id) 倒序返回，每页 limit 条（默认 DEFAULT_PAGE_SIZE，最多 MAX_PAGE_SIZE）：
+  - 响应为 {'items': [...], 'next_cursor': ..., 'limit': ...}，next_cursor 为 None 时已到末页；
+    下一页带上 cursor=<next_cursor> 请求，条件为 (created_at, id) < (游标值)，
+    与 OFFSET 不同，翻到多深都只读取一页的索引范围，翻页期间新增的记录也不会造成重复或遗漏
+  - count=1 时附带 total（满足筛选条件的总数）。计数按 (SQL, 参数) 缓存在进程内，
+    以 cache_versions 中对应的版本号判断失效，相关表无写入时翻页不再重复 COUNT
+  - 日期筛选使用 day_range() 转换为 created_at 的半开区间，可以使用 created_at 上的索引
+"""
+
+import base64
+import json
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+
+from models_v2 import get_cache_version
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# 计数缓存的条目数上限（按最近使用淘汰）
+COUNT_CACHE_SIZE = 256
+
+_counts = OrderedDict()  # (缓存名, SQL, 参数) → (版本号, 总数)
+_counts_lock = threading.Lock()
+
+
+class PaginationError(ValueError):
+    """分页参数无效（接口返回 400）"""
+
+
+def page_args(args):
+    """从查询参数读取 (limit, cursor)；cursor 解码为 (created_at, id) 或 None"""
+    try:
+        limit = int(args.get('limit') or DEFAULT_PAGE_SIZE)
+    except ValueError:
+        raise PaginationError('limit 必须为整数')
+    if limit < 1:
+        raise PaginationError('limit 必须大于 0')
+    return min(limit, MAX_PAGE_SIZE), decode_cursor(args.get('cursor'))
+
+
+def encode_cursor(created_at, row_id):
+    return base64.urlsafe_b64encode(json.dumps([created_at, row_id]).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        raise PaginationError('cursor 无效')
+    if not isinstance(row_id, int):
+        raise PaginationError('cursor 无效')
+    return created_at, row_id
+
+
+def day_range(day):
+    """'YYYY-MM-DD' → created_at 的半开区间 [当天, 次日)"""
+    try:
+        start = date.fromisoformat(day)
+    except ValueError:
+        raise PaginationError(f'日期格式应为 YYYY-MM-DD: {day}')
+    return start.isoformat(), (start + timedelta(days=1)).isoformat()
+
+
+def keyset_page(conn, select_sql, conditions, params, limit, cursor, sort=('created_at', 'id')):
+    """
+    执行分页查询。select_sql 为 SELECT ... FROM ... JOIN ...（不含 WHERE），
+    conditions 为 WHERE 条件列表，sort 为排序的 (时间列, ID列)，结果行须包含这两列。
+    """
+    created_at, row_id = sort
+    conditions = list(conditions)
+    params = list(params)
+    if cursor is not None:
+        conditions.append(f'({created_at}, {row_id}) < (?, ?)')
+        params.extend(cursor)
+    sql = (f"{select_sql} WHERE {' AND '.join(conditions) or '1=1'} "
+           f'ORDER BY {created_at} DESC, {row_id} DESC LIMIT ?')
+    rows = conn.execute(sql, params + [limit + 1]).fetchall()
+    items = [dict(row) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = encode_cursor(last[created_at.split('.')[-1]], last[row_id.split('.')[-1]])
+    return {'items': items, 'next_cursor': next_cursor, 'limit': limit}
+
+
+def cached_count(conn, cache_name, from_sql, conditions, params):
+    """
+    SELECT COUNT(*) {from_sql} WHERE {conditions} 的结果；
+    cache_name 为 cache_versions 中覆盖所涉及表的版本名，版本未变时返回缓存的总数
+    """
+    sql = f"SELECT COUNT(*) {from_sql} WHERE {' AND '.join(conditions) or '1=1'}"
+    key = (cache_name, sql, tuple(params))
+    version = get_cache_version(conn, cache_name)
+    if version is not None:
+        with _counts_lock:
+            cached = _counts.get(key)
+            if cached is not None and cached[0] == version:
+                _counts.move_to_end(key)
+                return cached[1]
+    total = conn.execute(sql, params).fetchone()[0]
+    if version is not None:
+        with _counts_lock:
+            _counts[key] = (version, total)
+            _counts.move_to_end(key)
+            while len(_counts) > COUNT_CACHE_SIZE:
+                _counts.popitem(last=False)
+    return total
@@ -0,0 +1,279 @@
+"""
+原始数据历史基线统计
+
+按 (被检水厂, 样品类型, 指标列) 维护历史检测值的滚动统计量，供校核引擎判断
+"在限值内但明显偏离本厂常态"的数值：
+  - count / mean / m2：Welford 在线算法，方差 = m2 / (count - 1)
+  - sketch：P² 流式分位数估计（5%、50%、95%），每个分位数仅保存 5 个标记点
+
+导入时逐值增量更新，校核时每个值 O(1) 查表，无需扫描历史数据。
+覆盖导入、修改或删除记录后，受影响的 (被检水厂, 样品类型) 由 rebuild_indicator_stats(groups=...)
+从该组已导入数据重建（P² 分位数估计无法撤销单个观测值）。
+检出限（如 "<0.010"）、非数值及空白样（样品编号以 K 开头）不计入统计。
+"""
+
+import json
+import math
+import sqlite3
+
+import db_backend
+import models_v2
+
+# IN (...) 查询每批参数个数
+SQL_BATCH_SIZE = 500
+
+# 维护的分位数
+SKETCH_QUANTILES = (0.05, 0.5, 0.95)
+
+# 历史样本数不足时不做判断
+BASELINE_MIN_COUNT = 20
+
+# |z| 达到该值判为偏离历史均值
+BASELINE_Z_THRESHOLD = 4.0
+
+# 超出 [P5 - k×(P95-P5), P95 + k×(P95-P5)] 判为偏离历史分布
+BASELINE_QUANTILE_FACTOR = 3.0
+
+
+class QuantileSketch:
+    """
+    P² 单分位数流式估计（Jain & Chlamtac, 1985）。
+
+    前 5 个观测值原样保存，之后仅维护 5 个标记点的高度与位置，
+    每次更新 O(1)，可序列化为 JSON 存入数据库。
+    """
+
+    def __init__(self, p, heights=None, positions=None, desired=None):
+        self.p = p
+        self.heights = list(heights or [])
+        self.positions = list(positions or [])
+        self.desired = list(desired or [])
+
+    @property
+    def increments(self):
+        p = self.p
+        return [0.0, p / 2, p, (1 + p) / 2, 1.0]
+
+    def add(self, x):
+        q = self.heights
+        if len(self.positions) < 5:
+            q.append(x)
+            q.sort()
+            if len(q) == 5:
+                p = self.p
+                self.positions = [1, 2, 3, 4, 5]
+                self.desired = [1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5]
+            return
+
+        pos = self.positions
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while k < 3 and x >= q[k + 1]:
+                k += 1
+        for i in range(k + 1, 5):
+            pos[i] += 1
+        for i, inc in enumerate(self.increments):
+            self.desired[i] += inc
+
+        for i in range(1, 4):
+            d = self.desired[i] - pos[i]
+            if (d >= 1 and pos[i + 1] - pos[i] > 1) or (d <= -1 and pos[i - 1] - pos[i] < -1):
+                d = 1 if d > 0 else -1
+                qp = q[i] + d / (pos[i + 1] - pos[i - 1]) * (
+                    (pos[i] - pos[i - 1] + d) * (q[i + 1] - q[i]) / (pos[i + 1] - pos[i])
+                    + (pos[i + 1] - pos[i] - d) * (q[i] - q[i - 1]) / (pos[i] - pos[i - 1])
+                )
+                if not q[i - 1] < qp < q[i + 1]:
+                    qp = q[i] + d * (q[i + d] - q[i]) / (pos[i + d] - pos[i])
+                q[i] = qp
+                pos[i] += d
+
+    def value(self):
+        """当前分位数估计，无观测值时返回 None"""
+        q = self.heights
+        if not q:
+            return None
+        if len(self.positions) < 5:
+            return q[min(len(q) - 1, int(round(self.p * (len(q) - 1))))]
+        return q[2]
+
+    def to_dict(self):
+        return {'h': self.heights, 'n': self.positions, 'd': self.desired}
+
+    @classmethod
+    def from_dict(cls, p, data):
+        return cls(p, data.get('h'), data.get('n'), data.get('d'))
+
+
+class IndicatorStats:
+    """单个 (水厂, 样品类型, 指标) 的滚动统计量"""
+
+    __slots__ = ('count', 'mean', 'm2', 'sketches')
+
+    def __init__(self, count=0, mean=0.0, m2=0.0, sketches=None):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+        self.sketches = sketches or {p: QuantileSketch(p) for p in SKETCH_QUANTILES}
+
+    def add(self, x):
+        """Welford 增量更新均值与二阶中心矩，并更新分位数估计"""
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+        for sketch in self.sketches.values():
+            sketch.add(x)
+
+    @property
+    def std(self):
+        if self.count < 2:
+            return 0.0
+        return math.sqrt(max(self.m2, 0.0) / (self.count - 1))
+
+    def without(self, x):
+        """
+        去掉一个已计入的观测值 x 后的统计量（留一法，用于校核已导入的数值）。
+        Welford 逆运算撤销 count / mean / m2；P² 分位数估计无法撤销，沿用原估计
+        """
+        if self.count < 2:
+            return IndicatorStats(0, 0.0, 0.0, self.sketches)
+        count = self.count - 1
+        mean = (self.count * self.mean - x) / count
+        m2 = self.m2 - (x - self.mean) * (x - mean)
+        return IndicatorStats(count, mean, m2, self.sketches)
+
+    def quantile(self, p):
+        sketch = self.sketches.get(p)
+        return sketch.value() if sketch else None
+
+    def sketch_json(self):
+        return json.dumps({str(p): s.to_dict() for p, s in self.sketches.items()})
+
+    @classmethod
+    def from_row(cls, count, mean, m2, sketch):
+        data = json.loads(sketch) if sketch else {}
+        sketches = {p: QuantileSketch.from_dict(p, data.get(str(p), {})) for p in SKETCH_QUANTILES}
+        return cls(count, mean, m2, sketches)
+
+
+def baseline_value(sample_number, value):
+    """可计入历史基线的数值：空白样、检出限与非数值返回 None"""
+    # 延迟导入，避免与 raw_data_validator 循环依赖
+    from raw_data_validator import parse_numeric
+
+    if value is None or str(sample_number or '').startswith('K'):
+        return None
+    num, is_limit = parse_numeric(str(value).strip())
+    if num is None or is_limit or not math.isfinite(num):
+        return None
+    return num
+
+
+def load_indicator_stats(conn, plants):
+    """
+    读取指定水厂的历史统计量。
+
+    返回: {(plant_name, sample_type, indicator): IndicatorStats}；旧库无统计表时返回空字典
+    """
+    stats = {}
+    plants = list(dict.fromkeys(p for p in plants if p))
+    try:
+        for i in range(0, len(plants), SQL_BATCH_SIZE):
+            chunk = plants[i:i + SQL_BATCH_SIZE]
+            placeholders = ','.join('?' * len(chunk))
+            for row in conn.execute(
+                "SELECT plant_name, sample_type, indicator, count, mean, m2, sketch "
+                f"FROM raw_data_indicator_stats WHERE plant_name IN ({placeholders})", chunk
+            ):
+                stats[(row[0], row[1], row[2])] = IndicatorStats.from_row(*row[3:])
+    except sqlite3.OperationalError:
+        return {}
+    return stats
+
+
+_UPSERT_STATS_SQL = db_backend.dialect.upsert(
+    'raw_data_indicator_stats',
+    ('plant_name', 'sample_type', 'indicator', 'count', 'mean', 'm2', 'sketch', 'updated_at'),
+    ('plant_name', 'sample_type', 'indicator'),
+    values=[db_backend.dialect.placeholder] * 7 + ['CURRENT_TIMESTAMP'],
+)
+
+
+def update_indicator_stats(conn, observations):
+    """
+    将新导入的检测值增量计入历史统计（与调用方同一事务，由调用方提交）。
+
+    参数:
+        observations: [(plant_name, sample_type, indicator, value)]，value 为数值
+    """
+    grouped = {}
+    for plant, stype, indicator, value in observations:
+        if plant:
+            grouped.setdefault((plant, stype or '', indicator), []).append(value)
+    if not grouped:
+        return 0
+
+    stats = load_indicator_stats(conn, [key[0] for key in grouped])
+    rows = []
+    for key, values in grouped.items():
+        entry = stats.get(key) or IndicatorStats()
+        for value in values:
+            entry.add(value)
+        rows.append(key + (entry.count, entry.mean, entry.m2, entry.sketch_json()))
+
+    conn.executemany(_UPSERT_STATS_SQL, rows)
+    return len(rows)
+
+
+def _group_observations(rows):
+    observations = []
+    for plant, stype, sample_number, indicator, value in rows:
+        num = baseline_value(sample_number, value)
+        if num is not None:
+            observations.append((plant, stype, indicator, num))
+    return observations
+
+
+def rebuild_indicator_stats(conn, groups=None):
+    """
+    按采样日期顺序从已导入数据重建历史统计（与调用方同一事务）。
+    groups 为 [(plant_name, sample_type)] 时只重建这些组（覆盖导入、修改或删除记录后），
+    None 时重建全部。返回写入的统计条数
+    """
+    query = ("SELECT r.plant_name, r.sample_type, r.sample_number, v.column_name, v.value "
+             "FROM raw_data_records r JOIN raw_data_values v ON v.record_id = r.id ")
+    order = "ORDER BY r.sampling_date, r.id, v.id"
+    if groups is None:
+        observations = _group_observations(conn.execute(query + order))
+        conn.execute("DELETE FROM raw_data_indicator_stats")
+        return update_indicator_stats(conn, observations)
+
+    written = 0
+    for plant, stype in dict.fromkeys((plant, stype or '') for plant, stype in groups if plant):
+        observations = _group_observations(conn.execute(
+            query + "WHERE r.plant_name = ? AND COALESCE(r.sample_type, '') = ? " + order, (plant, stype)))
+        conn.execute("DELETE FROM raw_data_indicator_stats WHERE plant_name = ? AND sample_type = ?",
+                     (plant, stype))
+        written += update_indicator_stats(conn, observations)
+    return written
+
+
+if __name__ == '__main__':
+    import sys
+
+    if len(sys.argv) < 2 or sys.argv[1] != 'rebuild':
+        print("用法: python raw_data_baseline.py rebuild")
+        sys.exit(1)
+
+    conn = db_backend.connect(models_v2.DATABASE_PATH)
+    with conn:
+        n = rebuild_indicator_stats(conn)
+    conn.close()
+    print(f"✓ 已重建 {n} 组历史统计")
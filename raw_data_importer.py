@@ -9,10 +9,74 @@
 """
 import pandas as pd
 import re
+import sqlite3
 from datetime import datetime
 from models_v2 import get_db_connection
+from raw_data_baseline import baseline_value, rebuild_indicator_stats, update_indicator_stats
+from db_maintenance import request_analyze
+import read_snapshot
+from storage_profiles import bulk_import
+from write_queue import enabled as write_queue_enabled, run_write
 import os
 
+# 开启写队列（DB_WRITE_QUEUE=1）时每个写事务包含的样品数：导入拆成多个短事务，
+# 期间其他写操作（如审核）可以穿插执行；此时导入中途意外出错会保留已提交的批次。
+# 未开启写队列时整个文件在一个写事务内写入，出错时全部回滚
+IMPORT_WRITE_CHUNK = 50
+
+
+def _write_samples(conn, samples):
+    """
+    在一个写事务内写入一批样品（经 run_write 调用）。
+    每个样品一个 SAVEPOINT，失败只回滚该样品；成功样品的数值增量计入历史基线统计，
+    有记录被覆盖的 (水厂, 样品类型) 改为从库中重建统计（撤销被覆盖记录的观测值）。
+    返回 (逐样品错误信息列表（成功为 None）, 基线统计错误信息)
+    """
+    errors = []
+    observations = []
+    replaced_groups = set()
+    for sample in samples:
+        conn.execute('SAVEPOINT import_sample')
+        try:
+            if sample['replace']:
+                # 删除旧记录（级联删除会自动删除关联的检测值）；
+                # 按样品编号在事务内查找，同一文件内先写入的同编号样品也被覆盖
+                old = conn.execute('SELECT id, plant_name, sample_type FROM raw_data_records WHERE sample_number = ?',
+                                   (sample['record'][0],)).fetchone()
+                if old is not None:
+                    conn.execute('DELETE FROM raw_data_records WHERE id = ?', (old[0],))
+                    replaced_groups.add((old[1], old[2] or ''))
+            cursor = conn.execute('''
+                INSERT INTO raw_data_records
+                (sample_number, report_number, company_name, plant_name, sample_type, sampling_date)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', sample['record'])
+            record_id = cursor.lastrowid
+            conn.executemany(
+                'INSERT INTO raw_data_values (record_id, column_name, value) VALUES (?, ?, ?)',
+                [(record_id, field_name, value) for field_name, value in sample['values']]
+            )
+            conn.execute('RELEASE import_sample')
+            errors.append(None)
+            observations.extend(sample['observations'])
+        except sqlite3.Error as e:
+            conn.execute('ROLLBACK TO import_sample')
+            conn.execute('RELEASE import_sample')
+            errors.append(str(e))
+
+    stats_error = None
+    conn.execute('SAVEPOINT import_stats')
+    try:
+        update_indicator_stats(conn, [obs for obs in observations if (obs[0], obs[1] or '') not in replaced_groups])
+        if replaced_groups:
+            rebuild_indicator_stats(conn, replaced_groups)
+        conn.execute('RELEASE import_stats')
+    except Exception as e:
+        conn.execute('ROLLBACK TO import_stats')
+        conn.execute('RELEASE import_stats')
+        stats_error = str(e)
+    return errors, stats_error
+
 
 class RawDataImporter:
     """原始数据导入器"""
@@ -136,6 +200,28 @@ class RawDataImporter:
             return True, result[0]
         return False, None
 
+    def _flush_samples(self, pending):
+        """写入缓冲的样品并统计结果"""
+        if not pending:
+            return
+        errors, stats_error = run_write(_write_samples, list(pending))
+        for sample, error in zip(pending, errors):
+            sample_number = sample['record'][0]
+            if error:
+                self.errors.append(f"样品'{sample_number}'处理失败: {error}")
+                self.skip_count += 1
+            else:
+                self.success_count += 1
+                if sample['replace']:
+                    self.warnings.append(f"样品'{sample_number}'已存在，已覆盖")
+        if stats_error:
+            self.warnings.append(f"历史基线统计更新失败: {stats_error}")
+        if not all(errors):
+            # 新导入的样品立即可供导出（导出读取的只读快照下次使用时重新生成）
+            read_snapshot.invalidate()
+        pending.clear()
+
+    @bulk_import()
     def import_excel(self, file_path, on_duplicate='skip', strict_columns=True, duplicate_decisions=None):
         """
         导入Excel文件（转置布局）
@@ -314,8 +400,33 @@ class RawDataImporter:
                     }
                 # 无重复，改为skip模式继续导入
                 on_duplicate = 'skip'
-                self.conn = sqlite3.connect(DATABASE_PATH, timeout=30.0)
-                self.conn.row_factory = sqlite3.Row
+                self.conn = get_db_connection()
+
+            # abort 模式：写入任何样品前预扫描重复，有重复时整个文件不导入
+            decisions = duplicate_decisions or {}
+            if on_duplicate == 'abort' or 'abort' in decisions.values():
+                seen_numbers = set()
+                for col_idx, sn in sample_columns:
+                    if not sn or not self.validate_date_format(get_cell_value('采样日期', col_idx))[0]:
+                        continue
+                    is_dup = sn in seen_numbers or self.check_duplicate_sample_number(sn)[0]
+                    seen_numbers.add(sn)
+                    if is_dup and decisions.get(sn, on_duplicate) == 'abort':
+                        self.conn.close()
+                        return {
+                            'success': False,
+                            'message': f'样品编号"{sn}"重复，已终止导入',
+                            'total_rows': total_samples,
+                            'success_count': 0,
+                            'skip_count': 0,
+                            'errors': self.errors,
+                            'warnings': self.warnings
+                        }
+
+            # 待写入的样品：开启写队列时每 IMPORT_WRITE_CHUNK 个样品一个写事务，否则最后一次写入
+            chunk_size = IMPORT_WRITE_CHUNK if write_queue_enabled() else None
+            pending = []
+            pending_numbers = set()
 
             # 逐列处理每个样品
             for col_idx, sample_number in sample_columns:
@@ -343,13 +454,18 @@ class RawDataImporter:
                         self.skip_count += 1
                         continue
 
-                    # 检查样品编号是否重复
-                    is_duplicate, existing_id = self.check_duplicate_sample_number(sample_number)
+                    # 检查样品编号是否重复（含同一文件内尚未写入的样品）
+                    is_duplicate = (sample_number in pending_numbers
+                                    or self.check_duplicate_sample_number(sample_number)[0])
+                    replace = False
 
                     if is_duplicate:
                         # 优先使用逐样品决策
-                        dup_action = (duplicate_decisions or {}).get(sample_number, on_duplicate)
+                        dup_action = decisions.get(sample_number, on_duplicate)
                         if dup_action == 'abort':
+                            # 预扫描后其他用户新导入的同编号样品：丢弃未写入的样品
+                            if self.success_count:
+                                self.warnings.append(f'终止前已写入{self.success_count}个样品')
                             self.conn.close()
                             return {
                                 'success': False,
@@ -365,40 +481,40 @@ class RawDataImporter:
                             self.skip_count += 1
                             continue
                         elif dup_action == 'overwrite':
-                            # 删除旧记录（级联删除会自动删除关联的检测值）
-                            cursor = self.conn.cursor()
-                            cursor.execute('DELETE FROM raw_data_records WHERE id = ?', (existing_id,))
-                            self.warnings.append(f"样品'{sample_number}'已存在，已覆盖")
-
-                    # 插入主记录
-                    cursor = self.conn.cursor()
-                    cursor.execute('''
-                        INSERT INTO raw_data_records
-                        (sample_number, report_number, company_name, plant_name, sample_type, sampling_date)
-                        VALUES (?, ?, ?, ?, ?, ?)
-                    ''', (sample_number, report_number, company_name, plant_name, sample_type, sampling_date))
-
-                    record_id = cursor.lastrowid
-
-                    # 插入检测指标数据
+                            replace = True
+
+                    # 检测指标数据
+                    values = []
+                    observations = []
                     for field_name in indicator_fields:
                         value = get_cell_value(field_name, col_idx)
                         value_str = value if value else None
-
-                        cursor.execute('''
-                            INSERT INTO raw_data_values (record_id, column_name, value)
-                            VALUES (?, ?, ?)
-                        ''', (record_id, field_name, value_str))
-
-                    self.success_count += 1
+                        values.append((field_name, value_str))
+
+                        num = baseline_value(sample_number, value_str)
+                        if num is not None:
+                            observations.append((plant_name, sample_type, field_name, num))
+
+                    pending.append({
+                        'record': (sample_number, report_number, company_name, plant_name, sample_type, sampling_date),
+                        'replace': replace,  # 覆盖模式下先删除旧记录
+                        'values': values,
+                        'observations': observations,
+                    })
+                    pending_numbers.add(sample_number)
+                    if chunk_size and len(pending) >= chunk_size:
+                        self._flush_samples(pending)
+                        pending_numbers.clear()
 
                 except Exception as e:
                     self.errors.append(f"样品'{sample_number}'处理失败: {str(e)}")
                     self.skip_count += 1
                     continue
 
-            self.conn.commit()
+            self._flush_samples(pending)
             self.conn.close()
+            # 大批量导入后由维护线程更新查询规划器统计信息
+            request_analyze(self.success_count * (len(indicator_fields) + 1))
 
             return {
                 'success': True,
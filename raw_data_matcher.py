@@ -0,0 +1,239 @@
+"""
+原始数据 → 报告 匹配
+
+将一条原始数据记录匹配为报告所需的客户、样品类型与检测项目：
+  - 客户：被检单位+水厂精确匹配 customers，回退按被检单位，再兼容旧 companies 表
+  - 样品类型：支持 "名称|代码" 与纯名称
+  - 检测项目：经进程级 IndicatorResolver 解析原始列名，限定在样品类型关联的指标内
+
+客户、样品类型在首次使用时整表载入，样品类型关联指标按类型缓存，
+同一请求内匹配多个样品时每张表只查询一次。
+for-report（单个样品）与 draft-from-raw（批量建稿）共用。
+"""
+
+from indicator_resolver import INSERT_MAPPING_SQL, get_indicator_resolver, learn_mappings
+
+SQL_BATCH_SIZE = 500
+
+
+class RawDataMatcher:
+    """单次请求内的原始数据匹配器（持有数据库游标与各表查找缓存）"""
+
+    def __init__(self, cursor, resolver=None, db_path=None):
+        self.cursor = cursor
+        self.db_path = db_path
+        self.resolver = resolver or get_indicator_resolver(db_path)
+        self._customers = None
+        self._customer_info = {}
+        self._sample_types = None
+        self._scoped = {}
+        self.new_mappings = {}  # raw_field_name → (indicator_id, indicator_name)
+
+    # ── 记录读取 ─────────────────────────────────────────────────────────
+
+    def load_records(self, sample_numbers):
+        """
+        批量读取原始数据记录及检测值。
+        返回 {sample_number: (记录元组, [(column_name, value), ...])}，检测值按导入顺序
+        """
+        sample_numbers = list(dict.fromkeys(sample_numbers))
+        records = {}
+        for i in range(0, len(sample_numbers), SQL_BATCH_SIZE):
+            chunk = sample_numbers[i:i + SQL_BATCH_SIZE]
+            self.cursor.execute(f'''
+                SELECT id, sample_number, company_name, plant_name, sample_type, sampling_date, report_number
+                FROM raw_data_records
+                WHERE sample_number IN ({','.join(['?'] * len(chunk))})
+            ''', chunk)
+            for row in self.cursor.fetchall():
+                records[row[1]] = (tuple(row), [])
+
+        by_id = {record[0]: values for record, values in records.values()}
+        record_ids = list(by_id)
+        for i in range(0, len(record_ids), SQL_BATCH_SIZE):
+            chunk = record_ids[i:i + SQL_BATCH_SIZE]
+            self.cursor.execute(f'''
+                SELECT record_id, column_name, value
+                FROM raw_data_values
+                WHERE record_id IN ({','.join(['?'] * len(chunk))})
+                ORDER BY id
+            ''', chunk)
+            for record_id, column_name, value in self.cursor.fetchall():
+                by_id[record_id].append((column_name, value))
+        return records
+
+    # ── 客户与样品类型 ───────────────────────────────────────────────────
+
+    def _load_customers(self):
+        by_unit_plant = {}
+        by_unit = {}
+        self._customer_info = {}
+        self.cursor.execute('''
+            SELECT id, inspected_unit, water_plant, unit_address, contact_person, contact_phone, email
+            FROM customers ORDER BY id
+        ''')
+        for cust_id, unit, plant, address, contact, phone, email in self.cursor.fetchall():
+            by_unit_plant.setdefault((unit, plant), cust_id)
+            by_unit.setdefault(unit, cust_id)
+            self._customer_info[cust_id] = {
+                'customer_unit': unit or '',
+                'customer_plant': plant or '',
+                'customer_address': address or '',
+                'customer_contact': contact or '',
+                'customer_phone': phone or '',
+                'customer_email': email or '',
+            }
+        companies = {}
+        self.cursor.execute('SELECT id, name FROM companies ORDER BY id')
+        for company_id, name in self.cursor.fetchall():
+            companies.setdefault(name, company_id)
+        self._customers = (by_unit_plant, by_unit, companies)
+
+    def match_customer(self, company_name, plant_name):
+        """返回 (customer_id, company_id)，customers 已匹配时不再查 companies"""
+        if self._customers is None:
+            self._load_customers()
+        by_unit_plant, by_unit, companies = self._customers
+        customer_id = None
+        if company_name and plant_name:
+            customer_id = by_unit_plant.get((company_name, plant_name))
+        if not customer_id and company_name:
+            customer_id = by_unit.get(company_name)
+        company_id = None
+        if not customer_id and company_name:
+            company_id = companies.get(company_name)
+        return customer_id, company_id
+
+    def customer_info(self, customer_id):
+        """客户信息（报告 remark 中的 customer_* 字段，与新建报告页"加载客户信息"一致），未匹配返回 None"""
+        if self._customers is None:
+            self._load_customers()
+        return self._customer_info.get(customer_id)
+
+    def match_sample_type(self, sample_type):
+        """返回 (sample_type_id, 样品类型名称)；"名称|代码" 格式按名称与代码匹配，名称只保留名称部分"""
+        if self._sample_types is None:
+            by_name_code = {}
+            by_name = {}
+            self.cursor.execute('SELECT id, name, code FROM sample_types ORDER BY id')
+            for type_id, name, code in self.cursor.fetchall():
+                by_name_code.setdefault((name, code), type_id)
+                by_name.setdefault(name, type_id)
+            self._sample_types = (by_name_code, by_name)
+        by_name_code, by_name = self._sample_types
+
+        if sample_type and '|' in sample_type:
+            st_name, st_code = sample_type.split('|', 1)
+            return by_name_code.get((st_name, st_code)), st_name
+        if sample_type:
+            return by_name.get(sample_type), sample_type
+        return None, sample_type
+
+    # ── 检测项目 ─────────────────────────────────────────────────────────
+
+    def template_indicators(self, sample_type_id):
+        """样品类型关联的指标 {indicator_id: 指标信息}，按模板顺序"""
+        scoped = self._scoped.get(sample_type_id)
+        if scoped is None:
+            scoped = {}
+            self.cursor.execute('''
+                SELECT i.id, i.name, i.unit,
+                    COALESCE(ti.limit_value, i.limit_value) as limit_value,
+                    i.detection_method, i.default_value
+                FROM template_indicators ti
+                JOIN indicators i ON ti.indicator_id = i.id
+                LEFT JOIN indicator_groups g ON i.group_id = g.id
+                WHERE ti.sample_type_id = ?
+                ORDER BY ti.sort_order, g.sort_order, i.sort_order
+            ''', (sample_type_id,))
+            for ind_row in self.cursor.fetchall():
+                scoped[ind_row[0]] = {
+                    'indicator_id': ind_row[0],
+                    'indicator_name': ind_row[1],
+                    'unit': ind_row[2],
+                    'limit_value': ind_row[3],
+                    'detection_method': ind_row[4],
+                    'default_value': ind_row[5],
+                }
+            self._scoped[sample_type_id] = scoped
+        return scoped
+
+    def match(self, record, raw_values):
+        """
+        将一条原始数据记录匹配为报告数据。
+        record 为 load_records 返回的记录元组；新发现的字段映射累积在 new_mappings 中。
+        """
+        _, sample_number, company_name, plant_name, sample_type, sampling_date = record[:6]
+        customer_id, company_id = self.match_customer(company_name, plant_name)
+        sample_type_id, sample_type = self.match_sample_type(sample_type)
+
+        # 优先使用该样品类型关联的指标（未匹配类型时取解析器缓存的全部指标）
+        resolver = self.resolver
+        scoped_by_id = self.template_indicators(sample_type_id) if sample_type_id else resolver.indicators
+        all_indicators = {info['indicator_name'] for info in scoped_by_id.values()}
+
+        # 批量解析原始字段名 -> 指标（已固化映射优先，其次名称规则）
+        resolved = resolver.resolve_many(
+            [rv[0] for rv in raw_values],
+            allowed=scoped_by_id.keys() if sample_type_id else None,
+        )
+
+        detection_items = []
+        unmatched_items = []
+        for col_name, value in raw_values:
+            ind_info = scoped_by_id.get(resolved[col_name])
+            # 模糊匹配成功且非精确匹配、尚未固化，保存映射
+            if ind_info and col_name not in all_indicators and col_name not in resolver.mappings:
+                self.new_mappings.setdefault(col_name, (ind_info['indicator_id'], ind_info['indicator_name']))
+
+            if ind_info:
+                detection_items.append({
+                    'indicator_name': ind_info['indicator_name'],
+                    'indicator_id': ind_info['indicator_id'],
+                    'measured_value': value or '',
+                    'unit': ind_info['unit'] or '',
+                    'limit_value': ind_info['limit_value'] or '',
+                    'detection_method': ind_info['detection_method'] or ''
+                })
+            else:
+                unmatched_items.append({
+                    'indicator_name': col_name,
+                    'indicator_id': None,
+                    'measured_value': value or '',
+                    'unit': '',
+                    'limit_value': '',
+                    'detection_method': ''
+                })
+
+        return {
+            'sample_number': sample_number,
+            'company_name': company_name,
+            'company_id': company_id,
+            'customer_id': customer_id,
+            'plant_name': plant_name,
+            'sample_type': sample_type,
+            'sample_type_id': sample_type_id,
+            'sampling_date': sampling_date,
+            'detection_items': detection_items,
+            'unmatched_items': unmatched_items
+        }
+
+    def queue_mappings(self):
+        """新发现的字段映射立即在进程内解析器生效，数据库回写攒批进行（见 indicator_resolver）"""
+        queued = learn_mappings(
+            [(raw_name, ind_id, ind_name) for raw_name, (ind_id, ind_name) in self.new_mappings.items()],
+            self.db_path,
+        )
+        self.new_mappings = {}
+        return queued
+
+    def save_mappings(self):
+        """在当前事务内持久化新发现的字段映射（已存在的忽略）"""
+        if self.new_mappings:
+            self.cursor.executemany(
+                INSERT_MAPPING_SQL,
+                [(raw_name, ind_id, ind_name) for raw_name, (ind_id, ind_name) in self.new_mappings.items()]
+            )
+        saved = len(self.new_mappings)
+        self.new_mappings = {}
+        return saved
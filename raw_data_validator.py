@@ -7,6 +7,7 @@
   3. 关联一致性 — 总硬度/钙镁、三卤甲烷等指标间交叉验证
   4. 元信息校核 — 被检单位/水厂/日期合理性
   5. 精度与格式 — 检出限格式、有效位数一致性
+  6. 历史基线 — 与本水厂同类样品的历史统计比对（z 分数、分位数）
 
 输入格式（与 raw_data_converter 输出兼容）:
   samples: [{'样品编号': ..., '被检单位': ..., '被检水厂': ..., '样品类型': ..., '采样日期': ...}, ...]
@@ -14,17 +15,65 @@
 
 输出格式:
   [{'level': 'error'|'warning'|'notice',
-    'category': '异常值'|'数值合理性'|'关联一致性'|'元信息'|'精度与格式',
+    'category': '异常值'|'数值合理性'|'关联一致性'|'元信息'|'精度与格式'|'历史基线',
     'sample': '样品编号',
     'indicator': '指标名（可选）',
     'message': '描述'}, ...]
 """
 
+import hashlib
+import json
+import math
+import multiprocessing
+import os
 import re
 import sqlite3
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime, date
+from functools import lru_cache
 
-DATABASE_PATH = 'database/water_quality_v2.db'
+import numpy as np
+import pandas as pd
+
+from entity_registry import get_entity_registry
+from indicator_resolver import NameIndex
+from models_v2 import get_cache_version
+from raw_data_baseline import (
+    BASELINE_MIN_COUNT, BASELINE_QUANTILE_FACTOR, BASELINE_Z_THRESHOLD, load_indicator_stats,
+)
+import db_backend
+import models_v2
+import sql_trace
+
+# IN (...) 查询每批参数个数，低于 SQLite 默认的 999 个绑定变量上限
+SQL_BATCH_SIZE = 500
+
+# 逐样品规则并行校核的默认进程数（1 为串行），可由环境变量 VALIDATION_WORKERS 配置
+VALIDATION_WORKERS = max(1, int(os.environ.get('VALIDATION_WORKERS') or 1))
+
+# 样品数低于该值时进程启动开销大于收益，始终串行
+PARALLEL_MIN_SAMPLES = 2000
+
+# 并行时每个任务的样品数
+PARALLEL_CHUNK_SIZE = 1000
+
+# 校核规则集版本：规则逻辑变更时递增，已保存的校核结果随之全部失效；
+# 限值变更由 cache_versions 中的 limits 版本号体现
+RULESET_VERSION = 1
+
+# 逐样品规则阶段：结果只取决于样品自身的检测值与样品类型，可按记录保存复用。
+# 历史基线随导入持续变化，水厂对比、元信息与检出限一致性涉及多个样品或当前日期，
+# 均在每次校核时实时计算
+RECORD_STAGES = ('anomalies', 'plausibility', 'consistency', 'precision')
+
+# 校核结果缓存写入（同一记录覆盖旧结果）
+_UPSERT_RESULTS_SQL = db_backend.dialect.upsert(
+    'raw_data_validation_results',
+    ('record_id', 'content_hash', 'ruleset_version', 'results', 'error_count', 'warning_count', 'notice_count'),
+    ('record_id',),
+)
 
 # ── 检出限与数值解析 ─────────────────────────────────────────────────────
 
@@ -113,91 +162,334 @@ def parse_limit_value(limit_str):
     return None
 
 
+class LimitResolver:
+    """
+    已编译的限值解析器。
+
+    global_limits: 指标库限值 {指标名: {'bounds', 'unit', 'raw'}}
+    type_limits:   样品类型限值 {样品类型名 或 "名称|代码": {指标名: ...}}，
+                   取 template_indicators.limit_value，为空时回退指标库限值
+    名称规范化与 indicator_resolver 共用，各限值表预编译为单向匹配的 NameIndex
+    （完整名 → 去除单位括号的列名 → 别名，不按指标名去括号后的基础名匹配）；
+    每个 (样品类型, raw列名) 只做一次匹配，结果缓存在实例内；
+    样品类型未配置该指标时回退到指标库限值。
+    """
+
+    def __init__(self, global_limits=None, type_limits=None, version=None):
+        self.global_limits = global_limits or {}
+        self.type_limits = type_limits or {}
+        self.version = version
+        self._global_index = NameIndex(self.global_limits.items(), exact_only=True)
+        self._type_indexes = {}
+        self._resolved = {}
+
+    def _type_index(self, sample_type):
+        index = self._type_indexes.get(sample_type)
+        if index is None:
+            index = NameIndex(self.type_limits.get(sample_type, {}).items(), exact_only=True)
+            self._type_indexes[sample_type] = index
+        return index
+
+    @classmethod
+    def load(cls, conn, version=None):
+        """从数据库加载全部限值"""
+        global_limits = {}
+        for name, unit, lv in conn.execute(
+            "SELECT name, unit, limit_value FROM indicators "
+            "WHERE limit_value IS NOT NULL AND limit_value != ''"
+        ):
+            parsed = parse_limit_value(lv)
+            if parsed is not None:
+                global_limits[name] = {'bounds': parsed, 'unit': unit, 'raw': lv}
+
+        # 同名样品类型以 id 最小者为准；带代码的 "名称|代码" 精确区分
+        type_limits = {}
+        try:
+            rows = conn.execute('''
+                SELECT st.name, st.code, i.name, i.unit,
+                       COALESCE(NULLIF(ti.limit_value, ''), i.limit_value)
+                FROM template_indicators ti
+                JOIN indicators i ON ti.indicator_id = i.id
+                JOIN sample_types st ON ti.sample_type_id = st.id
+                ORDER BY st.id, ti.sort_order, ti.id
+            ''').fetchall()
+        except sqlite3.OperationalError:
+            rows = []  # 旧库尚无样品类型限值
+        for st_name, st_code, name, unit, lv in rows:
+            parsed = parse_limit_value(lv)
+            if parsed is None:
+                continue
+            info = {'bounds': parsed, 'unit': unit, 'raw': lv}
+            for key in (st_name, f'{st_name}|{st_code}'):
+                type_limits.setdefault(key, {}).setdefault(name, info)
+
+        return cls(global_limits, type_limits, version)
+
+    def resolve(self, param_name, sample_type=''):
+        """返回 raw 列名在指定样品类型下的限值信息，无限值返回 None"""
+        key = (sample_type or '', param_name)
+        try:
+            return self._resolved[key]
+        except KeyError:
+            pass
+        info = None
+        if key[0] in self.type_limits:
+            info = self._type_index(key[0]).lookup(param_name)
+        if info is None:
+            info = self._global_index.lookup(param_name)
+        self._resolved[key] = info
+        return info
+
+
+_limit_resolvers = {}
+_limit_resolvers_lock = threading.Lock()
+
+
+def get_limit_resolver(db_path=None):
+    """
+    获取进程级限值解析器（按数据库路径缓存）。
+    每次调用只读取一次 cache_versions 中的 'limits' 版本号，
+    indicators / template_indicators / sample_types 有写入时版本递增，触发重建。
+    """
+    db_path = db_path or models_v2.DATABASE_PATH
+    try:
+        conn = sql_trace.connect(db_path)
+        try:
+            version = get_cache_version(conn, 'limits')
+            cached = _limit_resolvers.get(db_path)
+            if cached is not None and version is not None and cached.version == version:
+                return cached
+            with _limit_resolvers_lock:
+                cached = _limit_resolvers.get(db_path)
+                if cached is not None and version is not None and cached.version == version:
+                    return cached
+                resolver = LimitResolver.load(conn, version)
+                if version is not None:
+                    _limit_resolvers[db_path] = resolver
+                return resolver
+        finally:
+            conn.close()
+    except Exception:
+        return LimitResolver()
+
+
 # ── 已知 OCR 噪声模式 ────────────────────────────────────────────────────
 
 # 单个无意义汉字/符号（常见 OCR 残留）
 OCR_NOISE_RE = re.compile(r'^[去才大—△##＃※◇○●□■☆★\s]{1,3}$')
 
+# "<" 后带多余空格的检出限写法
+LOOSE_LIMIT_RE = re.compile(r'^<\s+\d')
+
+# 基本物理范围（指标名包含关键词即适用，按顺序取第一个命中项）
+PHYSICAL_RANGES = {
+    'pH': (1, 14),
+    '水温': (-5, 60),
+    '电导率': (0, 10000),
+}
+
+# 检出限格式问题代码
+FORMAT_OK = 0
+FORMAT_FULLWIDTH = 1
+FORMAT_LOOSE = 2
+
+
+# ── 关联一致性指标角色 ───────────────────────────────────────────────────
+
+# 三卤甲烷各组分及其限值 (mg/L)
+THM_COMPONENTS = {
+    '三氯甲烷': 0.06,
+    '四氯化碳': 0.002,
+    '二氯一溴甲烷': 0.06,
+    '一氯二溴甲烷': 0.1,
+    '三溴甲烷': 0.1,
+}
+
+# 出厂水与管网水需要对比的关键指标
+PLANT_COMPARE_PARAMS = ['pH', '浑浊度', '高锰酸盐指数', '电导率']
+
+# 关联一致性校核用到的全部指标角色关键词
+CONSISTENCY_KEYWORDS = frozenset(
+    ('总硬度', '钙', '镁', '三卤甲烷') + tuple(THM_COMPONENTS) + tuple(PLANT_COMPARE_PARAMS)
+)
+
+
+def find_param_column(columns, keyword):
+    """在列名序列中模糊查找指标列：精确 → 前缀 → 包含，均取第一个命中项"""
+    # 精确匹配
+    if keyword in columns:
+        return keyword
+    # 前缀匹配（如 "总硬度" 匹配 "总硬度(以CaCO3计)(mg/L)"）
+    for k in columns:
+        if k.startswith(keyword):
+            return k
+    # 包含匹配
+    for k in columns:
+        if keyword in k:
+            return k
+    return None
+
+
+@lru_cache(maxsize=256)
+def build_keyword_index(columns):
+    """
+    为一组列名（有序元组）构建 指标角色关键词 → 列名 索引，表头中没有的角色记为 None。
+    同一批样品的表头大多相同，按列名元组缓存，每种表头只扫描一次。
+    """
+    return {keyword: find_param_column(columns, keyword) for keyword in CONSISTENCY_KEYWORDS}
+
+
+def keyword_index_for(params):
+    """返回样品参数字典对应的关键词索引"""
+    return build_keyword_index(tuple(params))
+
+
+# ── 样品×指标矩阵 ───────────────────────────────────────────────────────
+
+def _parse_cell(val_str):
+    """
+    解析单个（已去空白的）检测值。
+    返回 (数值, 是否检出限, 检出限数值原文, 小数位数, 是否OCR噪声, 格式问题代码)
+    """
+    is_ocr = bool(OCR_NOISE_RE.match(val_str))
+    m = DETECTION_LIMIT_RE.match(val_str)
+    if m:
+        limit_text = m.group(1)
+        decimals = len(limit_text.split('.')[1]) if '.' in limit_text else -1
+        return float(limit_text), True, limit_text, decimals, is_ocr, FORMAT_OK
+    if NUMERIC_RE.match(val_str):
+        decimals = -1
+        if '.' in val_str:
+            trimmed = val_str.rstrip('0')
+            decimals = len(trimmed.split('.')[1]) if '.' in trimmed else 0
+        return float(val_str), False, None, decimals, is_ocr, FORMAT_OK
+    if val_str.startswith('＜'):
+        fmt = FORMAT_FULLWIDTH
+    elif LOOSE_LIMIT_RE.match(val_str):
+        fmt = FORMAT_LOOSE
+    else:
+        fmt = FORMAT_OK
+    return np.nan, False, None, -1, is_ocr, fmt
+
+
+class SampleMatrix:
+    """
+    样品 × 指标矩阵。
+
+    将 samples/data 展开为二维数组，每个不同的值字符串只解析一次：
+      text        去空白后的原值（缺失为 None）
+      num         解析出的数值（无法解析为 NaN）
+      is_limit    是否为检出限格式
+      limit_text  检出限数值部分原文
+      decimals    小数位数（无法确定为 -1）
+      is_ocr      是否疑似 OCR 噪声
+      fmt         检出限格式问题代码（FORMAT_*）
+      order       该值在样品参数字典中的位置（缺失为 -1），用于还原逐样品遍历顺序
+      checked     参与校核的单元格：非空且不属于文本型/噪声指标
+    行与 samples 一一对应（重复样品占多行），列为各样品参数名按首次出现顺序合并。
+    """
+
+    def __init__(self, samples, data):
+        self.sample_ids = [s['样品编号'] for s in samples]
+        self.sample_types = [s.get('样品类型') or '' for s in samples]
+        self.sample_types_arr = np.array(self.sample_types, dtype=object)
+        col_index = {}
+        rows, cols, order, values = [], [], [], []
+        for r, sid in enumerate(self.sample_ids):
+            for pos, (param, val) in enumerate(data.get(sid, {}).items()):
+                if val is None:
+                    continue
+                rows.append(r)
+                cols.append(col_index.setdefault(param, len(col_index)))
+                order.append(pos)
+                values.append(val)
+        self.columns = list(col_index)
+        self.col_index = col_index
+        shape = (len(self.sample_ids), len(self.columns))
+
+        # 与 loop 版相同按 str(val).strip() 取文本（float NaN 为 'nan'，不作为缺失值）
+        text = np.array([str(v).strip() for v in values], dtype=object)
+        codes, uniques = pd.factorize(text)
+        uniques = np.asarray(uniques, dtype=object)
+        parsed = [_parse_cell(u) for u in uniques]
+        u_num = np.array([p[0] for p in parsed], dtype=float)
+        u_is_limit = np.array([p[1] for p in parsed], dtype=bool)
+        u_limit_text = np.array([p[2] for p in parsed], dtype=object)
+        u_decimals = np.array([p[3] for p in parsed], dtype=np.int64)
+        u_is_ocr = np.array([p[4] for p in parsed], dtype=bool)
+        u_fmt = np.array([p[5] for p in parsed], dtype=np.int8)
+
+        r = np.asarray(rows, dtype=np.intp)
+        c = np.asarray(cols, dtype=np.intp)
+        self.text = np.full(shape, None, dtype=object)
+        self.num = np.full(shape, np.nan)
+        self.is_limit = np.zeros(shape, dtype=bool)
+        self.limit_text = np.full(shape, None, dtype=object)
+        self.decimals = np.full(shape, -1, dtype=np.int64)
+        self.is_ocr = np.zeros(shape, dtype=bool)
+        self.fmt = np.zeros(shape, dtype=np.int8)
+        self.order = np.full(shape, -1, dtype=np.intp)
+        present = np.zeros(shape, dtype=bool)
+        if len(codes):
+            self.text[r, c] = uniques[codes]
+            self.num[r, c] = u_num[codes]
+            self.is_limit[r, c] = u_is_limit[codes]
+            self.limit_text[r, c] = u_limit_text[codes]
+            self.decimals[r, c] = u_decimals[codes]
+            self.is_ocr[r, c] = u_is_ocr[codes]
+            self.fmt[r, c] = u_fmt[codes]
+            self.order[r, c] = order
+            present[r, c] = text != ''
+
+        skip_col = np.array(
+            [is_text_indicator(p) or is_noise_indicator(p) for p in self.columns],
+            dtype=bool,
+        )
+        self.checked = present & ~skip_col
+        self.is_blank = np.array([sid.startswith('K') for sid in self.sample_ids], dtype=bool)
+
+    def cells(self, mask):
+        """返回 mask 为真的单元格 (rows, cols)，按样品顺序、样品内参数顺序排列"""
+        r, c = np.nonzero(mask)
+        idx = np.lexsort((self.order[r, c], r))
+        return r[idx], c[idx]
+
 
 # ── 校核引擎 ─────────────────────────────────────────────────────────────
 
 class RawDataValidator:
-    """原始记录校核引擎"""
+    """
+    原始记录校核引擎
 
-    def __init__(self, db_path=None):
-        self.db_path = db_path or DATABASE_PATH
-        self._limit_cache = None
+    engine='matrix'（默认）在样品×指标矩阵上以数组运算执行逐值规则；
+    engine='loop' 为逐样品逐指标遍历的参考实现，结果与 matrix 完全一致，供测试比对。
 
-    def _get_limits(self):
-        """从数据库加载指标限值，缓存结果"""
-        if self._limit_cache is not None:
-            return self._limit_cache
+    workers>1 时 matrix 引擎将逐样品规则按样品分块交由进程池执行（进程级，首次使用时创建，
+    各请求共用），跨样品规则在主进程合并阶段执行，结果与串行完全一致。
+    """
 
-        limits = {}
-        try:
-            conn = sqlite3.connect(self.db_path)
-            rows = conn.execute(
-                "SELECT name, unit, limit_value FROM indicators "
-                "WHERE limit_value IS NOT NULL AND limit_value != ''"
-            ).fetchall()
-            conn.close()
-            for name, unit, lv in rows:
-                parsed = parse_limit_value(lv)
-                if parsed is not None:
-                    limits[name] = {'bounds': parsed, 'unit': unit, 'raw': lv}
-        except Exception:
-            pass
+    ENGINES = ('matrix', 'loop')
 
-        self._limit_cache = limits
-        return limits
+    def __init__(self, db_path=None, engine='matrix', workers=None):
+        if engine not in self.ENGINES:
+            raise ValueError(f'未知的校核引擎: {engine}')
+        self.db_path = db_path or models_v2.DATABASE_PATH
+        self.engine = engine
+        self.workers = workers or VALIDATION_WORKERS
+        # 最近一次 validate_from_db 复用/重新校核的记录数
+        self.last_run = None
 
-    def _get_known_companies(self):
-        """获取系统中已有的被检单位（从 raw_data_records 和 companies 表汇总）"""
-        names = set()
-        try:
-            conn = sqlite3.connect(self.db_path)
-            for row in conn.execute(
-                "SELECT DISTINCT company_name FROM raw_data_records "
-                "WHERE company_name IS NOT NULL AND company_name != ''"
-            ):
-                names.add(row[0])
-            for row in conn.execute("SELECT name FROM companies"):
-                names.add(row[0])
-            for row in conn.execute(
-                "SELECT DISTINCT inspected_unit FROM customers "
-                "WHERE inspected_unit IS NOT NULL AND inspected_unit != ''"
-            ):
-                names.add(row[0])
-            conn.close()
-        except Exception:
-            pass
-        return names
+    def _get_limit_resolver(self):
+        """获取进程级限值解析器"""
+        return get_limit_resolver(self.db_path)
 
-    def _get_known_plants(self):
-        """获取系统中已有的被检水厂"""
-        names = set()
-        try:
-            conn = sqlite3.connect(self.db_path)
-            for row in conn.execute(
-                "SELECT DISTINCT plant_name FROM raw_data_records "
-                "WHERE plant_name IS NOT NULL AND plant_name != ''"
-            ):
-                names.add(row[0])
-            for row in conn.execute("SELECT plant_name FROM plants"):
-                names.add(row[0])
-            for row in conn.execute(
-                "SELECT DISTINCT water_plant FROM customers "
-                "WHERE water_plant IS NOT NULL AND water_plant != ''"
-            ):
-                names.add(row[0])
-            conn.close()
-        except Exception:
-            pass
-        return names
+    def _get_entity_registry(self):
+        """获取进程级已知单位/水厂注册表"""
+        return get_entity_registry(self.db_path)
 
     # ── 主入口 ────────────────────────────────────────────────────────
 
-    def validate(self, samples, data, detection_date=None):
+    def validate(self, samples, data, detection_date=None, workers=None, stored=False):
         """
         对样品数据执行全量校核。
 
@@ -205,55 +497,240 @@ class RawDataValidator:
             samples: 样品元信息列表
             data: {sample_id: {param: value_str}}
             detection_date: 检测日期字符串(YYYY-MM-DD)，可选
+            workers: 逐样品规则的并行进程数，默认取构造参数或 VALIDATION_WORKERS
+            stored: 样品已导入（数值已计入历史基线），历史基线比对时先去掉样品自身的值
 
         返回: 校核结果列表
         """
-        results = []
-        results.extend(self._check_anomalies(samples, data))
-        results.extend(self._check_plausibility(samples, data))
-        results.extend(self._check_consistency(samples, data))
-        results.extend(self._check_metadata(samples, detection_date))
-        results.extend(self._check_precision(samples, data))
-        return results
+        if self.engine == 'loop':
+            results = []
+            results.extend(self._check_anomalies(samples, data))
+            results.extend(self._check_plausibility(samples, data))
+            results.extend(self._check_baseline(samples, data, stored))
+            results.extend(self._check_consistency(samples, data))
+            results.extend(self._check_metadata(samples, detection_date))
+            results.extend(self._check_precision(samples, data))
+            return results
+
+        per_sample = self.check_records(samples, data, workers)
+        return self._assemble(samples, data, per_sample, detection_date, stored)
 
     def validate_from_db(self, sample_numbers, detection_date=None):
         """
         从数据库加载数据并校核（供方案A的Tab使用）。
 
+        逐样品规则的结果保存在 raw_data_validation_results 中，
+        仅对内容哈希或规则集版本发生变化的记录重新校核。
+
         参数:
             sample_numbers: 样品编号列表
             detection_date: 检测日期字符串(YYYY-MM-DD)，可选
 
         返回: 校核结果列表
         """
+        samples, data, record_ids = self._load_samples(sample_numbers)
+        if self.engine == 'loop':
+            return self.validate(samples, data, detection_date, stored=True)
+        per_sample = self._load_record_results(samples, data, record_ids)
+        return self._assemble(samples, data, per_sample, detection_date, stored=True)
+
+    def check_records(self, samples, data, workers=None):
+        """
+        执行逐样品规则（矩阵版）。
+
+        各样品的逐样品规则相互独立，样品数足够多且 workers>1 时按块并行执行。
+
+        返回: {sample_id: {stage: [结果], 'precision_stats': {...}}}，同一编号只计算一次
+        """
+        unique = {}
+        for s in samples:
+            unique.setdefault(s['样品编号'], s)
+        per_sample = {sid: {stage: [] for stage in RECORD_STAGES} for sid in unique}
+        if not unique:
+            return per_sample
+
+        samples = list(unique.values())
+        workers = workers or self.workers
+        # 内存库只在本进程可见，子进程读不到，始终串行
+        if workers > 1 and len(samples) >= PARALLEL_MIN_SAMPLES and not db_backend.is_memory(self.db_path):
+            return self._check_records_parallel(samples, data, workers)
+
+        matrix = SampleMatrix(samples, data)
+        for stage, stage_results in (
+            ('anomalies', self._check_anomalies_matrix(matrix)),
+            ('plausibility', self._check_plausibility_matrix(matrix)),
+            ('consistency', self._check_sample_consistency(samples, data)),
+            ('precision', self._check_precision_format_matrix(matrix)),
+        ):
+            for r in stage_results:
+                per_sample[r['sample']][stage].append(r)
+        for sid, stats in self._precision_stats_matrix(matrix).items():
+            per_sample[sid]['precision_stats'] = stats
+        return per_sample
+
+    def _check_records_parallel(self, samples, data, workers):
+        """按 PARALLEL_CHUNK_SIZE 分块提交进程级进程池，按块顺序合并结果"""
+        chunks = [samples[i:i + PARALLEL_CHUNK_SIZE]
+                  for i in range(0, len(samples), PARALLEL_CHUNK_SIZE)]
+        pool = _get_pool(workers)
+        per_sample = {}
+        try:
+            futures = [
+                pool.submit(_check_records_chunk, self.db_path, chunk,
+                            {s['样品编号']: data.get(s['样品编号'], {}) for s in chunk})
+                for chunk in chunks
+            ]
+            for future in futures:
+                per_sample.update(future.result())
+        except BrokenProcessPool:
+            _discard_pool(pool)
+            raise
+        return per_sample
+
+    def _assemble(self, samples, data, per_sample, detection_date=None, stored=False):
+        """按规则阶段顺序合并逐样品结果与跨样品规则结果，顺序与 loop 版一致"""
+        def stage_results(stage):
+            out = []
+            for s in samples:
+                out.extend(per_sample[s['样品编号']][stage])
+            return out
+
+        results = []
+        results.extend(stage_results('anomalies'))
+        results.extend(stage_results('plausibility'))
+        results.extend(self._check_baseline(samples, data, stored))
+        results.extend(stage_results('consistency'))
+        results.extend(self._check_plant_consistency_frame(samples, data))
+        results.extend(self._check_metadata(samples, detection_date))
+        results.extend(stage_results('precision'))
+        results.extend(self._check_precision_limits(samples, per_sample))
+        return results
+
+    # ── 校核结果持久化 ────────────────────────────────────────────────
+
+    def _ruleset_version(self, conn):
+        """当前规则集版本（规则版本.限值版本），无法取得限值版本时返回 None"""
+        limits_version = get_cache_version(conn, 'limits')
+        if limits_version is None:
+            return None
+        return f'{RULESET_VERSION}.{limits_version}'
+
+    def _load_record_results(self, samples, data, record_ids):
+        """读取已保存的逐样品结果，内容或规则集变化的记录重新校核并写回"""
+        unique = {}
+        for s in samples:
+            unique.setdefault(s['样品编号'], s)
+        self.last_run = {'cached': 0, 'validated': len(unique)}
+        try:
+            conn = sql_trace.connect(self.db_path)
+        except sqlite3.Error:
+            return self.check_records(samples, data)
+
+        try:
+            ruleset = self._ruleset_version(conn)
+            if ruleset is None:
+                return self.check_records(samples, data)
+
+            hashes = {sid: record_content_hash(s, data.get(sid, {})) for sid, s in unique.items()}
+            ids = [record_ids[sid] for sid in unique]
+            stored = {}
+            for i in range(0, len(ids), SQL_BATCH_SIZE):
+                chunk = ids[i:i + SQL_BATCH_SIZE]
+                placeholders = ','.join('?' * len(chunk))
+                for record_id, content_hash, results in conn.execute(
+                    "SELECT record_id, content_hash, results FROM raw_data_validation_results "
+                    f"WHERE ruleset_version = ? AND record_id IN ({placeholders})",
+                    [ruleset] + chunk
+                ):
+                    stored[record_id] = (content_hash, results)
+
+            per_sample = {}
+            stale = []
+            for sid, s in unique.items():
+                row = stored.get(record_ids[sid])
+                if row and row[0] == hashes[sid]:
+                    per_sample[sid] = json.loads(row[1])
+                else:
+                    stale.append(s)
+
+            fresh = self.check_records(stale, data)
+            per_sample.update(fresh)
+            self.last_run = {'cached': len(unique) - len(stale), 'validated': len(stale)}
+
+            rows = []
+            for sid, checks in fresh.items():
+                counts = {'error': 0, 'warning': 0, 'notice': 0}
+                for stage in RECORD_STAGES:
+                    for r in checks[stage]:
+                        counts[r['level']] += 1
+                rows.append((record_ids[sid], hashes[sid], ruleset,
+                             json.dumps(checks, ensure_ascii=False),
+                             counts['error'], counts['warning'], counts['notice']))
+            if rows:
+                with conn:
+                    conn.executemany(_UPSERT_RESULTS_SQL, rows)
+            return per_sample
+        except sqlite3.OperationalError:
+            # 旧库尚无校核结果表，直接计算
+            return self.check_records(samples, data)
+        finally:
+            conn.close()
+
+    def _load_samples(self, sample_numbers):
+        """批量加载样品元信息与检测值：记录与检测值各一次集合查询（按批分块），
+        在内存中按样品分组。返回顺序与 sample_numbers 一致，不存在的编号跳过。
+
+        返回: (samples, data, {sample_id: record_id})"""
         samples = []
         data = {}
+        wanted = list(dict.fromkeys(sn for sn in sample_numbers if sn))
+        if not wanted:
+            return samples, data, {}
+
+        records = {}
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = sql_trace.connect(self.db_path)
             conn.row_factory = sqlite3.Row
-            for sn in sample_numbers:
-                rec = conn.execute(
-                    "SELECT * FROM raw_data_records WHERE sample_number = ?", (sn,)
-                ).fetchone()
-                if not rec:
-                    continue
-                samples.append({
-                    '样品编号': rec['sample_number'],
-                    '被检单位': rec['company_name'] or '',
-                    '被检水厂': rec['plant_name'] or '',
-                    '样品类型': rec['sample_type'] or '',
-                    '采样日期': rec['sampling_date'] or '',
-                })
-                vals = conn.execute(
-                    "SELECT column_name, value FROM raw_data_values WHERE record_id = ?",
-                    (rec['id'],)
-                ).fetchall()
-                data[sn] = {v['column_name']: v['value'] for v in vals}
-            conn.close()
+            try:
+                for i in range(0, len(wanted), SQL_BATCH_SIZE):
+                    chunk = wanted[i:i + SQL_BATCH_SIZE]
+                    placeholders = ','.join('?' * len(chunk))
+                    for rec in conn.execute(
+                        "SELECT id, sample_number, company_name, plant_name, "
+                        "sample_type, sampling_date FROM raw_data_records "
+                        f"WHERE sample_number IN ({placeholders})", chunk
+                    ):
+                        records[rec['sample_number']] = rec
+
+                id_to_sn = {rec['id']: sn for sn, rec in records.items()}
+                record_ids = list(id_to_sn)
+                for i in range(0, len(record_ids), SQL_BATCH_SIZE):
+                    chunk = record_ids[i:i + SQL_BATCH_SIZE]
+                    placeholders = ','.join('?' * len(chunk))
+                    for record_id, column_name, value in conn.execute(
+                        "SELECT record_id, column_name, value FROM raw_data_values "
+                        f"WHERE record_id IN ({placeholders}) ORDER BY record_id, id", chunk
+                    ):
+                        data.setdefault(id_to_sn[record_id], {})[column_name] = value
+            finally:
+                conn.close()
         except Exception:
             pass
 
-        return self.validate(samples, data, detection_date)
+        for sn in sample_numbers:
+            rec = records.get(sn)
+            if not rec:
+                continue
+            samples.append({
+                '样品编号': rec['sample_number'],
+                '被检单位': rec['company_name'] or '',
+                '被检水厂': rec['plant_name'] or '',
+                '样品类型': rec['sample_type'] or '',
+                '采样日期': rec['sampling_date'] or '',
+            })
+            data.setdefault(sn, {})
+        record_ids = {sn: rec['id'] for sn, rec in records.items()}
+        return samples, data, record_ids
 
     # ── 1. 异常值识别 ─────────────────────────────────────────────────
 
@@ -298,22 +775,40 @@ class RawDataValidator:
 
         return results
 
+    def _check_anomalies_matrix(self, matrix):
+        """异常值识别（矩阵版，结果与 _check_anomalies 一致）"""
+        results = []
+        ocr = matrix.checked & matrix.is_ocr
+        invalid = matrix.checked & ~matrix.is_ocr & np.isnan(matrix.num)
+        for r, c in zip(*matrix.cells(ocr | invalid)):
+            val_str = matrix.text[r, c]
+            if ocr[r, c]:
+                results.append({
+                    'level': 'error',
+                    'category': '异常值',
+                    'sample': matrix.sample_ids[r],
+                    'indicator': matrix.columns[c],
+                    'message': f'值 "{val_str}" 疑似OCR识别错误',
+                })
+            else:
+                results.append({
+                    'level': 'warning',
+                    'category': '异常值',
+                    'sample': matrix.sample_ids[r],
+                    'indicator': matrix.columns[c],
+                    'message': f'值 "{val_str}" 不是有效的数值或检出限格式',
+                })
+        return results
+
     # ── 2. 数值合理性 ─────────────────────────────────────────────────
 
     def _check_plausibility(self, samples, data):
         results = []
-        limits = self._get_limits()
-
-        # 基本物理范围
-        physical_ranges = {
-            'pH': (1, 14),
-            '水温': (-5, 60),
-            '电导率': (0, 10000),
-        }
+        resolver = self._get_limit_resolver()
 
         for s in samples:
             sid = s['样品编号']
-            sample_type = s.get('样品类型', '')
+            sample_type = s.get('样品类型') or ''
             is_blank = sid.startswith('K')
             params = data.get(sid, {})
 
@@ -330,7 +825,7 @@ class RawDataValidator:
                     continue  # 检出限值不做超标判断
 
                 # 物理范围检查
-                for key, (lo, hi) in physical_ranges.items():
+                for key, (lo, hi) in PHYSICAL_RANGES.items():
                     if key in param:
                         if num < lo or num > hi:
                             results.append({
@@ -342,8 +837,8 @@ class RawDataValidator:
                             })
                         break
 
-                # 标准限值比对（模糊匹配指标名）
-                limit_info = self._match_limit(param, limits)
+                # 标准限值比对（按样品类型模糊匹配指标名）
+                limit_info = resolver.resolve(param, sample_type)
                 if limit_info:
                     bounds = limit_info['bounds']
                     lo, hi = bounds
@@ -390,58 +885,179 @@ class RawDataValidator:
 
         return results
 
-    def _match_limit(self, param_name, limits):
-        """模糊匹配指标名到限值表"""
-        # 精确匹配
-        if param_name in limits:
-            return limits[param_name]
-
-        # 去掉单位括号后匹配: "氟化物(mg/L)" → "氟化物"
-        base = re.sub(r'\([^)]*\)$', '', param_name).strip()
-        if base in limits:
-            return limits[base]
-
-        # 已知别名映射
-        aliases = {
-            '六价铬': '铬(六价)',
-            '挥发酚': '挥发酚类(以苯酚计)',
-            '总α': '总α放射性',
-            '总β': '总β放射性',
-            '化学需氧量': '化学需氧量(COD)',
-            '五日生化需氧量': '五日生化需氧量(BOD5)',
-            '总硬度': '总硬度(以CaCO3计)',
-            '氨氮': '氨(以N计)',
-        }
-        # 从 param_name 中提取基础名用于别名查找
-        for alias, canonical in aliases.items():
-            if alias in param_name and canonical in limits:
-                return limits[canonical]
+    def _check_plausibility_matrix(self, matrix):
+        """数值合理性（矩阵版，结果与 _check_plausibility 一致）"""
+        resolver = self._get_limit_resolver()
+        n_cols = len(matrix.columns)
+
+        # 物理范围按列解析一次，展开为与矩阵列对齐的上下界数组
+        phys_ranges = [None] * n_cols
+        phys_lo = np.full(n_cols, np.nan)
+        phys_hi = np.full(n_cols, np.nan)
+        for j, param in enumerate(matrix.columns):
+            for key, rng in PHYSICAL_RANGES.items():
+                if key in param:
+                    phys_ranges[j] = rng
+                    phys_lo[j], phys_hi[j] = rng
+                    break
+
+        # 标准限值按 (样品类型, 列) 解析一次，同类型的行共享同一组上下界
+        lim_lo = np.full(matrix.num.shape, np.nan)
+        lim_hi = np.full(matrix.num.shape, np.nan)
+        limit_infos = {}
+        for stype in dict.fromkeys(matrix.sample_types):
+            infos = [resolver.resolve(param, stype) for param in matrix.columns]
+            limit_infos[stype] = infos
+            lo_vec = np.array([i['bounds'][0] if i and i['bounds'][0] is not None else np.nan
+                               for i in infos], dtype=float)
+            hi_vec = np.array([i['bounds'][1] if i and i['bounds'][1] is not None else np.nan
+                               for i in infos], dtype=float)
+            rows = matrix.sample_types_arr == stype
+            lim_lo[rows] = lo_vec
+            lim_hi[rows] = hi_vec
+
+        num = matrix.num
+        measured = matrix.checked & ~np.isnan(num) & ~matrix.is_limit
+        out_of_range = measured & ((num < phys_lo) | (num > phys_hi))
+        exceeded = measured & ((num < lim_lo) | (num > lim_hi))
+        blank = (measured & matrix.is_blank[:, None] & (num > 0)
+                 & (lim_hi > 0) & (num > lim_hi * 0.1))
+
+        # 同一单元格内按 物理范围 → 标准限值 → 空白样 的顺序输出
+        rows, cols, kinds = [], [], []
+        for kind, mask in enumerate((out_of_range, exceeded, blank)):
+            r, c = np.nonzero(mask)
+            rows.append(r)
+            cols.append(c)
+            kinds.append(np.full(len(r), kind))
+        r = np.concatenate(rows)
+        c = np.concatenate(cols)
+        k = np.concatenate(kinds)
+        idx = np.lexsort((k, matrix.order[r, c], r))
 
-        return None
+        results = []
+        for r, c, k in zip(r[idx], c[idx], k[idx]):
+            val_str = matrix.text[r, c]
+            if k == 0:
+                lo, hi = phys_ranges[c]
+                message = f'值 {val_str} 超出物理范围 {lo}~{hi}'
+            elif k == 1:
+                limit_info = limit_infos[matrix.sample_types[r]][c]
+                message = f'值 {val_str} 超过标准限值 ({limit_info["raw"]})'
+            else:
+                message = f'空白样检出值 {val_str}，超过限值10%'
+            results.append({
+                'level': 'error' if k == 0 else 'warning',
+                'category': '数值合理性',
+                'sample': matrix.sample_ids[r],
+                'indicator': matrix.columns[c],
+                'message': message,
+            })
+        return results
 
-    # ── 3. 关联一致性 ─────────────────────────────────────────────────
+    # ── 2b. 历史基线 ──────────────────────────────────────────────────
 
-    def _check_consistency(self, samples, data):
+    def _load_baseline(self, samples):
+        """读取本批样品所属水厂的历史统计量"""
+        try:
+            conn = sql_trace.connect(self.db_path)
+        except sqlite3.Error:
+            return {}
+        try:
+            return load_indicator_stats(conn, [s.get('被检水厂', '') for s in samples])
+        finally:
+            conn.close()
+
+    def _check_baseline(self, samples, data, stored=False):
+        """
+        数值与本水厂同类样品的历史统计比对：每个值一次查表，不扫描历史数据。
+        stored 为 True 时样品已导入、其数值已计入统计，按留一法去掉该值后再比对，
+        否则离群值会拉高自身所在组的均值与方差（历史样本少时几乎不会被标出）
+        """
         results = []
+        baseline = self._load_baseline(samples)
+        if not baseline:
+            return results
+
         for s in samples:
             sid = s['样品编号']
-            params = data.get(sid, {})
+            plant = s.get('被检水厂', '')
+            stype = s.get('样品类型', '') or ''
+            if not plant or sid.startswith('K'):
+                continue
+            for param, val in data.get(sid, {}).items():
+                stats = baseline.get((plant, stype, param))
+                if stats is None or stats.count < BASELINE_MIN_COUNT or val is None:
+                    continue
+                num, is_limit = parse_numeric(str(val).strip())
+                if num is None or is_limit or not math.isfinite(num):
+                    continue
+                if stored:
+                    stats = stats.without(num)
+                    if stats.count < BASELINE_MIN_COUNT:
+                        continue
+
+                std = stats.std
+                if std > 0:
+                    z = (num - stats.mean) / std
+                    if abs(z) >= BASELINE_Z_THRESHOLD:
+                        results.append({
+                            'level': 'warning',
+                            'category': '历史基线',
+                            'sample': sid,
+                            'indicator': param,
+                            'message': (f'值 {num} 偏离{plant}{stype}历史均值 {stats.mean:.4g} '
+                                        f'{z:+.1f} 个标准差（历史样本 {stats.count} 个）'),
+                        })
+                        continue
 
-            results.extend(self._check_hardness_consistency(sid, params))
-            results.extend(self._check_thm_consistency(sid, params))
+                low, high = stats.quantile(0.05), stats.quantile(0.95)
+                if low is None or high is None or high <= low:
+                    continue
+                spread = (high - low) * BASELINE_QUANTILE_FACTOR
+                if num > high + spread or num < low - spread:
+                    results.append({
+                        'level': 'notice',
+                        'category': '历史基线',
+                        'sample': sid,
+                        'indicator': param,
+                        'message': (f'值 {num} 超出{plant}{stype}历史常见范围 '
+                                    f'(P5={low:.4g}, P95={high:.4g})'),
+                    })
+
+        return results
+
+    # ── 3. 关联一致性 ─────────────────────────────────────────────────
+
+    def _check_consistency(self, samples, data):
+        results = self._check_sample_consistency(samples, data)
 
         # 同一水厂出厂水与管网水对比
         results.extend(self._check_plant_consistency(samples, data))
 
         return results
 
-    def _check_hardness_consistency(self, sid, params):
+    def _check_sample_consistency(self, samples, data):
+        """样品内指标间的关联一致性（总硬度、三卤甲烷）"""
+        results = []
+        for s in samples:
+            sid = s['样品编号']
+            params = data.get(sid, {})
+            index = keyword_index_for(params)
+
+            results.extend(self._check_hardness_consistency(sid, params, index))
+            results.extend(self._check_thm_consistency(sid, params, index))
+        return results
+
+    def _check_hardness_consistency(self, sid, params, index=None):
         """总硬度 ≈ Ca × 2.497 + Mg × 4.118"""
         results = []
+        if index is None:
+            index = keyword_index_for(params)
 
-        hardness_val = self._find_param_value(params, '总硬度')
-        ca_val = self._find_param_value(params, '钙')
-        mg_val = self._find_param_value(params, '镁')
+        hardness_val = self._find_param_value(params, '总硬度', index)
+        ca_val = self._find_param_value(params, '钙', index)
+        mg_val = self._find_param_value(params, '镁', index)
 
         if hardness_val is None or ca_val is None or mg_val is None:
             return results
@@ -480,11 +1096,13 @@ class RawDataValidator:
 
         return results
 
-    def _check_thm_consistency(self, sid, params):
+    def _check_thm_consistency(self, sid, params, index=None):
         """三卤甲烷(总量) = 各组分实测值/各自限值 之和"""
         results = []
+        if index is None:
+            index = keyword_index_for(params)
 
-        thm_total_val = self._find_param_value(params, '三卤甲烷')
+        thm_total_val = self._find_param_value(params, '三卤甲烷', index)
         if thm_total_val is None:
             return results
 
@@ -492,19 +1110,10 @@ class RawDataValidator:
         if thm_num is None or thm_lim:
             return results
 
-        # 各组分及其限值 (mg/L)
-        components = {
-            '三氯甲烷': 0.06,
-            '四氯化碳': 0.002,
-            '二氯一溴甲烷': 0.06,
-            '一氯二溴甲烷': 0.1,
-            '三溴甲烷': 0.1,
-        }
-
         calc_sum = 0
         found_any = False
-        for comp_name, comp_limit in components.items():
-            comp_val = self._find_param_value(params, comp_name)
+        for comp_name, comp_limit in THM_COMPONENTS.items():
+            comp_val = self._find_param_value(params, comp_name, index)
             if comp_val is None:
                 continue
             comp_num, comp_is_lim = parse_numeric(str(comp_val))
@@ -542,9 +1151,6 @@ class RawDataValidator:
             if plant and stype in ('出厂水', '管网水'):
                 plant_groups.setdefault(plant, []).append(s)
 
-        # 需要对比的关键指标
-        compare_params = ['pH', '浑浊度', '高锰酸盐指数', '电导率']
-
         for plant, group in plant_groups.items():
             if len(group) < 2:
                 continue
@@ -553,9 +1159,12 @@ class RawDataValidator:
             if not factory_samples or not network_samples:
                 continue
 
-            for param_key in compare_params:
+            indexes = {s['样品编号']: keyword_index_for(data.get(s['样品编号'], {})) for s in group}
+
+            for param_key in PLANT_COMPARE_PARAMS:
                 for fs in factory_samples:
-                    fv_raw = self._find_param_value(data.get(fs['样品编号'], {}), param_key)
+                    fv_raw = self._find_param_value(data.get(fs['样品编号'], {}), param_key,
+                                                    indexes[fs['样品编号']])
                     if fv_raw is None:
                         continue
                     fv, fl = parse_numeric(str(fv_raw))
@@ -563,7 +1172,8 @@ class RawDataValidator:
                         continue
 
                     for ns in network_samples:
-                        nv_raw = self._find_param_value(data.get(ns['样品编号'], {}), param_key)
+                        nv_raw = self._find_param_value(data.get(ns['样品编号'], {}), param_key,
+                                                        indexes[ns['样品编号']])
                         if nv_raw is None:
                             continue
                         nv, nl = parse_numeric(str(nv_raw))
@@ -586,27 +1196,90 @@ class RawDataValidator:
 
         return results
 
-    def _find_param_value(self, params, keyword):
-        """在参数字典中模糊查找指标值"""
-        # 精确匹配
-        if keyword in params:
-            return params[keyword]
-        # 前缀匹配（如 "总硬度" 匹配 "总硬度(以CaCO3计)(mg/L)"）
-        for k, v in params.items():
-            if k.startswith(keyword):
-                return v
-        # 包含匹配
-        for k, v in params.items():
-            if keyword in k:
-                return v
-        return None
+    def _check_plant_consistency_frame(self, samples, data):
+        """
+        同一水厂出厂水与管网水对比（分组向量化版，结果与 _check_plant_consistency 一致）。
+
+        每个样品每个对比指标只解析一次，按 (水厂, 指标) 将出厂水值广播到管网水样品上
+        计算偏差；结果按 水厂首次出现 → 指标 → 出厂水样品 → 管网水样品 的顺序输出。
+        """
+        rows = []
+        plant_order = {}
+        for pos, s in enumerate(samples):
+            plant = s.get('被检水厂', '')
+            stype = s.get('样品类型', '')
+            if not plant or stype not in ('出厂水', '管网水'):
+                continue
+            plant_order.setdefault(plant, len(plant_order))
+            sid = s['样品编号']
+            params = data.get(sid, {})
+            index = keyword_index_for(params)
+            for param_idx, param_key in enumerate(PLANT_COMPARE_PARAMS):
+                raw = self._find_param_value(params, param_key, index)
+                if raw is None:
+                    continue
+                num, is_limit = parse_numeric(str(raw))
+                if num is None or is_limit:
+                    continue
+                rows.append((plant, pos, sid, stype == '出厂水', param_idx, num))
+        if not rows:
+            return []
+
+        df = pd.DataFrame(rows, columns=['plant', 'pos', 'sid', 'factory', 'param', 'value'])
+        df['plant_order'] = df['plant'].map(plant_order)
+        keys = ['plant_order', 'param']
+        factory = df[df['factory'] & (df['value'] > 0)]
+        network = df[~df['factory']]
+        pairs = factory.merge(network, on=keys, suffixes=('_f', '_n'))
+        if pairs.empty:
+            return []
+
+        fv = pairs['value_f'].to_numpy()
+        nv = pairs['value_n'].to_numpy()
+        diff_pct = np.abs(nv - fv) / fv * 100
+        hit = np.flatnonzero(diff_pct > 50)
+        hit = hit[np.lexsort((pairs['pos_n'].to_numpy()[hit], pairs['pos_f'].to_numpy()[hit],
+                              pairs['param'].to_numpy()[hit], pairs['plant_order'].to_numpy()[hit]))]
+
+        plants = pairs['plant_f'].to_numpy()[hit].tolist()
+        param_idx = pairs['param'].to_numpy()[hit].tolist()
+        f_sids = pairs['sid_f'].to_numpy()[hit].tolist()
+        n_sids = pairs['sid_n'].to_numpy()[hit].tolist()
+        results = []
+        for plant, p, f_sid, n_sid, pct, f_val, n_val in zip(
+                plants, param_idx, f_sids, n_sids,
+                diff_pct[hit].tolist(), fv[hit].tolist(), nv[hit].tolist()):
+            param_key = PLANT_COMPARE_PARAMS[p]
+            results.append({
+                'level': 'warning',
+                'category': '关联一致性',
+                'sample': n_sid,
+                'indicator': param_key,
+                'message': (f'{plant}管网水({n_sid}) '
+                            f'与出厂水({f_sid}) 的 {param_key} '
+                            f'偏差 {pct:.0f}% '
+                            f'(出厂={f_val}, 管网={n_val})'),
+            })
+        return results
+
+    def _find_param_value(self, params, keyword, index=None):
+        """在参数字典中模糊查找指标值（经关键词索引 O(1) 定位列名）"""
+        if index is None:
+            index = keyword_index_for(params)
+        if keyword in CONSISTENCY_KEYWORDS:
+            col = index[keyword]
+        else:
+            # 非预置角色关键词，直接扫描
+            col = find_param_column(params, keyword)
+        return params[col] if col is not None else None
 
     # ── 4. 元信息校核 ─────────────────────────────────────────────────
 
     def _check_metadata(self, samples, detection_date=None):
         results = []
-        known_companies = self._get_known_companies()
-        known_plants = self._get_known_plants()
+        registry = self._get_entity_registry()
+        known_companies = registry.companies
+        known_plants = registry.plants
 
         for s in samples:
             sid = s['样品编号']
@@ -614,23 +1287,31 @@ class RawDataValidator:
             # 被检单位校验
             company = s.get('被检单位', '').strip()
             if company and known_companies and company not in known_companies:
+                message = f'被检单位 "{company}" 不在系统已有单位中，请确认'
+                suggestion = known_companies.suggest(company)
+                if suggestion:
+                    message += f'（是否为 "{suggestion}"？）'
                 results.append({
                     'level': 'notice',
                     'category': '元信息',
                     'sample': sid,
                     'indicator': '',
-                    'message': f'被检单位 "{company}" 不在系统已有单位中，请确认',
+                    'message': message,
                 })
 
             # 被检水厂校验
             plant = s.get('被检水厂', '').strip()
             if plant and known_plants and plant not in known_plants:
+                message = f'被检水厂 "{plant}" 不在系统已有水厂中，请确认'
+                suggestion = known_plants.suggest(plant)
+                if suggestion:
+                    message += f'（是否为 "{suggestion}"？）'
                 results.append({
                     'level': 'notice',
                     'category': '元信息',
                     'sample': sid,
                     'indicator': '',
-                    'message': f'被检水厂 "{plant}" 不在系统已有水厂中，请确认',
+                    'message': message,
                 })
 
             # 采样日期校验
@@ -768,18 +1449,159 @@ class RawDataValidator:
 
         return results
 
+    def _check_precision_format_matrix(self, matrix):
+        """检出限格式不规范（矩阵版，仅针对既非数值也非合法检出限的值）"""
+        results = []
+        fmt = np.where(matrix.checked, matrix.fmt, FORMAT_OK)
+        for r, c in zip(*matrix.cells(fmt != FORMAT_OK)):
+            if fmt[r, c] == FORMAT_FULLWIDTH:
+                message = f'检出限使用了全角符号 "＜"，建议统一为半角 "<"'
+            else:
+                message = f'检出限 "{matrix.text[r, c]}" 中 "<" 后有多余空格'
+            results.append({
+                'level': 'notice',
+                'category': '精度与格式',
+                'sample': matrix.sample_ids[r],
+                'indicator': matrix.columns[c],
+                'message': message,
+            })
+        return results
+
+    def _precision_stats_matrix(self, matrix):
+        """
+        逐样品汇总检出限一致性所需的统计量，供跨样品比对。
+
+        返回: {sample_id: {'columns': [参与校核的列], 'limits': [[列, 检出限], ...]}}，
+        均按样品内列顺序排列
+        """
+        stats = {}
+        rows, cols = matrix.cells(matrix.checked)
+        bounds = np.searchsorted(rows, np.arange(1, len(matrix.sample_ids)))
+        for r, row_cols in enumerate(np.split(cols, bounds)):
+            limit_cols = row_cols[matrix.is_limit[r, row_cols]]
+            stats[matrix.sample_ids[r]] = {
+                'columns': [matrix.columns[c] for c in row_cols],
+                'limits': [[matrix.columns[c], matrix.limit_text[r, c]] for c in limit_cols],
+            }
+        return stats
+
+    def _check_precision_limits(self, samples, per_sample):
+        """同一指标不同样品的检出限一致性，指标按首次出现顺序输出，检出限按首次出现顺序计数"""
+        results = []
+        columns = {}
+        limits = {}
+        for s in samples:
+            stats = per_sample[s['样品编号']].get('precision_stats')
+            if not stats:
+                continue
+            for col in stats['columns']:
+                columns.setdefault(col, None)
+            for col, limit_val in stats['limits']:
+                col_limits = limits.setdefault(col, {})
+                col_limits[limit_val] = col_limits.get(limit_val, 0) + 1
+
+        for col in columns:
+            col_limits = limits.get(col, {})
+            if len(col_limits) > 1:
+                limit_detail = ', '.join(
+                    f'<{lv}({cnt}个样品)' for lv, cnt in col_limits.items()
+                )
+                results.append({
+                    'level': 'warning',
+                    'category': '精度与格式',
+                    'sample': '全部样品',
+                    'indicator': col,
+                    'message': f'同一指标存在不同检出限: {limit_detail}',
+                })
+
+        return results
+
+
+def _check_records_chunk(db_path, samples, data):
+    """进程池任务：对一块样品串行执行逐样品规则"""
+    return RawDataValidator(db_path, workers=1).check_records(samples, data)
+
+
+_pool = None  # (进程数, ProcessPoolExecutor)
+_pool_lock = threading.Lock()
+
+
+def _init_pool_worker():
+    """子进程初始化：启动时导入校核模块（pandas / numpy），之后的任务不再付导入开销"""
+    import raw_data_validator  # noqa: F401
+
+
+def _get_pool(workers):
+    """进程级校核进程池：首次并行校核时创建，之后各请求共用；进程数变化时重建"""
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool[0] != workers:
+            if _pool is not None:
+                _pool[1].shutdown(wait=False)
+            # spawn 方式启动子进程，避免在含后台线程的 Web 进程中 fork
+            _pool = (workers, ProcessPoolExecutor(max_workers=workers,
+                                                  mp_context=multiprocessing.get_context('spawn'),
+                                                  initializer=_init_pool_worker))
+        return _pool[1]
+
+
+def _discard_pool(pool):
+    """子进程异常退出后丢弃进程池，下次并行校核时重建"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool[1] is pool:
+            _pool = None
+    pool.shutdown(wait=False)
+
+
+def record_content_hash(sample, params):
+    """记录内容哈希：样品编号、样品类型及按顺序排列的检测值"""
+    payload = json.dumps(
+        [sample.get('样品编号'), sample.get('样品类型') or '',
+         [[col, val] for col, val in params.items()]],
+        ensure_ascii=False, default=str,
+    )
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def count_stored_levels(conn, where='1=1', params=()):
+    """
+    预聚合查询：按 raw_data_records 筛选条件汇总已保存的逐样品校核结果。
+
+    仅统计当前规则集版本下的结果；历史基线与跨样品规则（水厂对比、元信息、
+    检出限一致性）随导入数据或所选样品集合变化，不计入。
+
+    返回: {'counts': {level: n}, 'validated': 已有结果的记录数, 'total': 记录总数}
+    """
+    limits_version = get_cache_version(conn, 'limits')
+    ruleset = f'{RULESET_VERSION}.{limits_version}' if limits_version is not None else None
+    row = conn.execute(
+        "SELECT COUNT(*), COUNT(v.record_id), COALESCE(SUM(v.error_count), 0), "
+        "COALESCE(SUM(v.warning_count), 0), COALESCE(SUM(v.notice_count), 0) "
+        "FROM raw_data_records r "
+        "LEFT JOIN raw_data_validation_results v "
+        "ON v.record_id = r.id AND v.ruleset_version = ? "
+        f"WHERE {where}",
+        [ruleset] + list(params)
+    ).fetchone()
+    return {
+        'counts': {'error': row[2], 'warning': row[3], 'notice': row[4]},
+        'validated': row[1],
+        'total': row[0],
+    }
+
 
 # ── 便捷函数 ─────────────────────────────────────────────────────────────
 
-def validate_samples(samples, data, detection_date=None, db_path=None):
+def validate_samples(samples, data, detection_date=None, db_path=None, workers=None):
     """便捷函数：对样品数据执行校核"""
-    validator = RawDataValidator(db_path)
+    validator = RawDataValidator(db_path, workers=workers)
     return validator.validate(samples, data, detection_date)
 
 
-def validate_from_database(sample_numbers, detection_date=None, db_path=None):
+def validate_from_database(sample_numbers, detection_date=None, db_path=None, workers=None):
     """便捷函数：从数据库加载数据并校核"""
-    validator = RawDataValidator(db_path)
+    validator = RawDataValidator(db_path, workers=workers)
     return validator.validate_from_db(sample_numbers, detection_date)
 
 
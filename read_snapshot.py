@@ -0,0 +1,194 @@
+"""
+只读快照：大批量读取查询使用的数据库副本
+
+导出等大查询在主库上长时间持有读事务，期间 WAL 检查点无法截断，WAL 持续增长。
+这些查询改为读取主库的只读快照：
+  - 快照用 sqlite3 在线备份 API 复制到主库旁的独立文件（{库名}.snapshot.db），
+    先写临时文件再原子替换，正在读取旧快照的连接不受影响
+  - 快照超过 DB_SNAPSHOT_MAX_AGE 秒时，下一次使用前刷新；其他进程正在刷新时直接使用现有快照。
+    维护调度器（db_maintenance）也会定期刷新已存在的快照，请求通常无需等待
+  - 原始数据导入、修改、删除后调用 invalidate()，之后的导出不会漏掉刚导入的样品；
+    按条件选样后立即处理的查询（如按筛选条件校核）直接读取主库
+  - 快照以 immutable 方式只读打开，读取不加锁，也不影响主库的检查点
+  - 响应中报告数据的快照时间与快照年龄（JSON 的 snapshot 字段或 X-Snapshot-* 响应头）
+DB_SNAPSHOT_MAX_AGE=0 或内存库（db_backend 的 sqlite-memory）时不使用快照，直接读取主库。
+"""
+
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows 下无 fcntl，不做跨进程互斥
+    fcntl = None
+
+import db_backend
+import models_v2
+import sql_trace
+
+# 快照最长使用时间（秒），0 表示不使用快照
+DB_SNAPSHOT_MAX_AGE = int(os.environ.get('DB_SNAPSHOT_MAX_AGE', '300'))
+
+
+def enabled(db_path=None):
+    db_path = db_path or models_v2.DATABASE_PATH
+    return DB_SNAPSHOT_MAX_AGE > 0 and not db_backend.is_memory(db_path)
+
+
+def snapshot_path(db_path=None):
+    db_path = db_path or models_v2.DATABASE_PATH
+    return f'{os.path.splitext(db_path)[0]}.snapshot.db'
+
+
+def snapshot_time(db_path=None):
+    """快照对应的主库时间点（时间戳），尚无快照时为 None"""
+    try:
+        return os.path.getmtime(snapshot_path(db_path))
+    except OSError:
+        return None
+
+
+def due(db_path=None):
+    """已有快照且超过最长使用时间（供维护调度器定期刷新）"""
+    taken_at = snapshot_time(db_path)
+    return enabled(db_path) and taken_at is not None and time.time() - taken_at >= DB_SNAPSHOT_MAX_AGE
+
+
+class _RefreshLock:
+    """跨进程刷新锁；blocking=False 时 acquired 为 False 表示其他进程正在刷新"""
+
+    def __init__(self, path, blocking):
+        self.path = f'{path}.lock'
+        self.blocking = blocking
+        self._file = None
+        self.acquired = False
+
+    def __enter__(self):
+        self._file = open(self.path, 'a')
+        if fcntl is None:
+            self.acquired = True
+            return self
+        try:
+            fcntl.flock(self._file, fcntl.LOCK_EX if self.blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            self.acquired = True
+        except BlockingIOError:
+            self.acquired = False
+        return self
+
+    def __exit__(self, *exc):
+        if self.acquired and fcntl is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+        self._file.close()
+        self._file = None
+
+
+def refresh(db_path=None):
+    """用在线备份 API 重新生成快照，返回耗时说明（也作为维护记录的 detail）"""
+    db_path = db_path or models_v2.DATABASE_PATH
+    path = snapshot_path(db_path)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    started_at = time.time()
+    started = time.perf_counter()
+    source = db_backend.connect(db_path, timeout=30.0)
+    try:
+        target = sqlite3.connect(tmp_path)
+        try:
+            # 一次复制全部页面：在单个读事务内完成，得到一致的时间点；
+            # 分步复制在主库有写入时会从头重来
+            source.backup(target)
+            # 快照只读使用，改为回滚日志模式，打开时不需要 -wal / -shm 文件
+            target.execute('PRAGMA journal_mode = DELETE')
+        finally:
+            target.close()
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    finally:
+        source.close()
+    # 以备份开始时间作为快照时间点
+    os.utime(tmp_path, (started_at, started_at))
+    os.replace(tmp_path, path)
+    return f'{os.path.getsize(path)} bytes in {int((time.perf_counter() - started) * 1000)}ms'
+
+
+def refresh_if_stale(db_path=None, wait=False):
+    """
+    快照不存在或已过期时刷新，返回 refresh() 的说明；无需刷新时返回 None。
+    wait=False 时其他进程正在刷新则直接返回 None。
+    """
+    db_path = db_path or models_v2.DATABASE_PATH
+    with _RefreshLock(snapshot_path(db_path), blocking=wait) as lock:
+        if not lock.acquired:
+            return None
+        # 拿到锁后重新检查：其他进程可能刚刷新完成
+        taken_at = snapshot_time(db_path)
+        if taken_at is None or time.time() - taken_at >= DB_SNAPSHOT_MAX_AGE:
+            return refresh(db_path)
+    return None
+
+
+def connect(db_path=None):
+    """
+    打开大查询使用的连接，返回 (连接, 快照信息)。
+    快照信息为 {'source': 'snapshot', 'taken_at': ..., 'age_seconds': ...}，
+    不使用快照时为 {'source': 'live'}，连接为连接池的自动提交连接。调用方负责 close()。
+    """
+    db_path = db_path or models_v2.DATABASE_PATH
+    if not enabled(db_path):
+        return models_v2.get_db_connection(), {'source': 'live'}
+    taken_at = snapshot_time(db_path)
+    if taken_at is None or time.time() - taken_at >= DB_SNAPSHOT_MAX_AGE:
+        # 尚无快照时等待其他进程刷新完成；已有快照时不等待，继续使用现有快照
+        refresh_if_stale(db_path, wait=taken_at is None)
+    path = snapshot_path(db_path)
+    taken_at = snapshot_time(db_path)
+    conn = sql_trace.connect(f'file:{os.path.abspath(path)}?mode=ro&immutable=1', uri=True,
+                             check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    return conn, {
+        'source': 'snapshot',
+        'taken_at': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(taken_at)),
+        'age_seconds': int(time.time() - taken_at),
+    }
+
+
+@contextmanager
+def snapshot_db(db_path=None):
+    """`with snapshot_db() as (conn, snapshot):` 在快照上执行只读查询"""
+    conn, snapshot = connect(db_path)
+    try:
+        yield conn, snapshot
+    finally:
+        conn.close()
+
+
+def headers(snapshot):
+    """文件下载等非 JSON 响应报告快照信息的响应头"""
+    if snapshot['source'] != 'snapshot':
+        return {'X-Snapshot-Source': 'live'}
+    return {
+        'X-Snapshot-Source': 'snapshot',
+        'X-Snapshot-Taken-At': snapshot['taken_at'],
+        'X-Snapshot-Age': str(snapshot['age_seconds']),
+    }
+
+
+def stats(db_path=None):
+    taken_at = snapshot_time(db_path)
+    return {
+        'enabled': enabled(db_path),
+        'max_age_seconds': DB_SNAPSHOT_MAX_AGE,
+        'age_seconds': int(time.time() - taken_at) if taken_at is not None else None,
+        'bytes': os.path.getsize(snapshot_path(db_path)) if taken_at is not None else 0,
+    }
+
+
+def invalidate(db_path=None):
+    """删除快照（如恢复备份或导入原始数据后），下次使用时重新生成"""
+    try:
+        os.remove(snapshot_path(db_path))
+    except OSError:
+        pass
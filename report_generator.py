@@ -7,6 +7,7 @@ import openpyxl
 from openpyxl.styles import Font, Alignment
 from datetime import datetime
 from models_v2 import get_db_connection
+import report_repository
 import shutil
 
 class ReportGenerator:
@@ -103,14 +104,7 @@ class ReportGenerator:
         conn = get_db_connection()
 
         # 1. 加载报告基本信息
-        report = conn.execute('''
-            SELECT r.*, st.name as sample_type_name, st.code as sample_type_code,
-                   c.name as company_name
-            FROM reports r
-            LEFT JOIN sample_types st ON r.sample_type_id = st.id
-            LEFT JOIN companies c ON r.company_id = c.id
-            WHERE r.id = ?
-        ''', (self.report_id,)).fetchone()
+        report = report_repository.get_report(conn, self.report_id)
 
         if report:
             # 合并所有基本信息到report_data
@@ -160,14 +154,11 @@ class ReportGenerator:
             print(f"报告数据键: {list(self.report_data.keys())}")
 
         # 2. 加载模板字段值（关键！之前缺失的部分）
-        field_values = conn.execute('''
-            SELECT rfv.field_value, tfm.field_name, tfm.field_display_name
-            FROM report_field_values rfv
-            JOIN template_field_mappings tfm ON rfv.field_mapping_id = tfm.id
-            WHERE rfv.report_id = ?
-        ''', (self.report_id,)).fetchall()
+        field_values = report_repository.get_template_field_values(conn, self.report_id)
 
         for fv in field_values:
+            if fv['field_name'] is None:  # 字段映射已删除
+                continue
             # 使用field_name作为键
             field_key = fv['field_name']
             self.report_data[field_key] = fv['field_value']
@@ -177,29 +168,18 @@ class ReportGenerator:
 
         # 3. 加载检测数据
         if 'detection_items' not in self.report_data or not self.report_data['detection_items']:
-            detection_items = conn.execute('''
-                SELECT rd.measured_value, i.name, i.unit,
-                    COALESCE(ti.limit_value, i.limit_value) as limit_value,
-                    i.detection_method
-                FROM report_data rd
-                JOIN indicators i ON rd.indicator_id = i.id
-                LEFT JOIN indicator_groups g ON i.group_id = g.id
-                JOIN reports r ON rd.report_id = r.id
-                LEFT JOIN template_indicators ti
-                    ON ti.indicator_id = rd.indicator_id AND ti.sample_type_id = r.sample_type_id
-                WHERE rd.report_id = ?
-                ORDER BY ti.sort_order, g.sort_order, i.sort_order, i.name
-            ''', (self.report_id,)).fetchall()
+            detection_items = report_repository.get_detection_data(conn, self.report_id)
 
             self.report_data['detection_items'] = [
                 {
-                    'name': item['name'],
+                    'name': item['indicator_name'],
                     'unit': item['unit'] or '',
                     'result': item['measured_value'] or '',
                     'limit': item['limit_value'] or '',
                     'method': item['detection_method'] or ''
                 }
                 for item in detection_items
+                if item['indicator_name'] is not None
             ]
 
         conn.close()
@@ -1105,32 +1085,15 @@ def generate_simple_report(report_id):
     conn = get_db_connection()
 
     # 获取报告基本信息
-    report = conn.execute(
-        'SELECT r.*, st.name as sample_type_name, c.name as company_name '
-        'FROM reports r '
-        'LEFT JOIN sample_types st ON r.sample_type_id = st.id '
-        'LEFT JOIN companies c ON r.company_id = c.id '
-        'WHERE r.id = ?',
-        (report_id,)
-    ).fetchone()
+    report = report_repository.get_report(conn, report_id)
 
     if not report:
         conn.close()
         raise ValueError(f"报告不存在: ID={report_id}")
 
     # 获取检测数据
-    data_items = conn.execute(
-        'SELECT rd.*, i.name as indicator_name, i.unit, '
-        'COALESCE(ti.limit_value, i.limit_value) as limit_value, i.detection_method '
-        'FROM report_data rd '
-        'JOIN indicators i ON rd.indicator_id = i.id '
-        'JOIN reports r ON rd.report_id = r.id '
-        'LEFT JOIN template_indicators ti '
-        '    ON ti.indicator_id = rd.indicator_id AND ti.sample_type_id = r.sample_type_id '
-        'WHERE rd.report_id = ? '
-        'ORDER BY ti.sort_order, i.sort_order, i.name',
-        (report_id,)
-    ).fetchall()
+    data_items = [item for item in report_repository.get_detection_data(conn, report_id)
+                  if item['indicator_name'] is not None]
 
     conn.close()
 
@@ -0,0 +1,124 @@
+"""
+报告热点查询
+
+报告头（reports 关联样品类型、委托单位、模板与创建人）、检测数据（关联检测项目、分组与
+template_indicators 的排序和限值）、模板字段值三类查询此前在 report_bp、report_workflow_bp、
+ReportGenerator._load_complete_data 与 generate_simple_report 中各写一份，SQL 文本各不相同，
+连接的预编译语句缓存（models_v2.DB_CACHED_STATEMENTS）无法在各接口间复用。
+这里每个查询只有一份固定文本，在连接池连接上执行时命中同一条缓存语句：
+  - 检测数据通过 reports 关联样品类型取 template_indicators，单张与批量查询共用同一写法，
+    统一按模板排序、分组排序、项目排序、项目名称排序
+  - 批量版本一次查询多张报告；IN 列表长度按 2 的幂补齐（重复最后一个 id），
+    任意数量的调用只对应少数几条语句文本，同样命中缓存
+"""
+
+from functools import lru_cache
+
+# 单条批量语句的 id 数上限（2 的幂，低于 SQLite 旧版本 999 个参数的限制）
+REPORT_BATCH_SIZE = 512
+
+_REPORT_HEADER = '''
+    SELECT r.*,
+           st.name as sample_type_name,
+           st.code as sample_type_code,
+           c.name as company_name,
+           t.name as template_name,
+           u.username as creator_name
+    FROM reports r
+    LEFT JOIN sample_types st ON r.sample_type_id = st.id
+    LEFT JOIN companies c ON r.company_id = c.id
+    LEFT JOIN excel_report_templates t ON r.template_id = t.id
+    LEFT JOIN users u ON r.created_by = u.id
+'''
+
+_DETECTION_DATA = '''
+    SELECT rd.*,
+           i.name as indicator_name,
+           i.unit,
+           COALESCE(ti.limit_value, i.limit_value) as limit_value,
+           i.detection_method,
+           i.group_id,
+           g.name as group_name
+    FROM report_data rd
+    JOIN reports r ON rd.report_id = r.id
+    LEFT JOIN indicators i ON rd.indicator_id = i.id
+    LEFT JOIN indicator_groups g ON i.group_id = g.id
+    LEFT JOIN template_indicators ti
+        ON ti.indicator_id = rd.indicator_id AND ti.sample_type_id = r.sample_type_id
+'''
+
+_DETECTION_DATA_ORDER = 'ti.sort_order, g.sort_order, i.sort_order, i.name'
+
+REPORT_HEADER_SQL = _REPORT_HEADER + 'WHERE r.id = ?'
+
+DETECTION_DATA_SQL = _DETECTION_DATA + f'WHERE rd.report_id = ?\nORDER BY {_DETECTION_DATA_ORDER}'
+
+TEMPLATE_FIELD_VALUES_SQL = '''
+    SELECT rfv.*,
+           tfm.field_name,
+           tfm.field_display_name,
+           tfm.sheet_name,
+           tfm.cell_address
+    FROM report_field_values rfv
+    LEFT JOIN template_field_mappings tfm ON rfv.field_mapping_id = tfm.id
+    WHERE rfv.report_id = ?
+'''
+
+
+@lru_cache(maxsize=None)
+def _report_headers_sql(size):
+    return _REPORT_HEADER + f"WHERE r.id IN ({', '.join('?' * size)})"
+
+
+@lru_cache(maxsize=None)
+def _detection_data_batch_sql(size):
+    return (_DETECTION_DATA + f"WHERE rd.report_id IN ({', '.join('?' * size)})\n"
+            f'ORDER BY rd.report_id, {_DETECTION_DATA_ORDER}')
+
+
+def _chunks(report_ids):
+    """去重后按 REPORT_BATCH_SIZE 分块，每块补齐到 2 的幂长度"""
+    ids = list(dict.fromkeys(report_ids))
+    for start in range(0, len(ids), REPORT_BATCH_SIZE):
+        chunk = ids[start:start + REPORT_BATCH_SIZE]
+        size = 1
+        while size < len(chunk):
+            size *= 2
+        yield chunk + [chunk[-1]] * (size - len(chunk))
+
+
+# ==================== 单张报告 ====================
+
+def get_report(conn, report_id):
+    """报告头（含 sample_type_name / sample_type_code / company_name / template_name / creator_name），不存在时为 None"""
+    return conn.execute(REPORT_HEADER_SQL, (report_id,)).fetchone()
+
+
+def get_detection_data(conn, report_id):
+    """报告的检测数据（含 indicator_name / unit / limit_value / detection_method / group_id / group_name）"""
+    return conn.execute(DETECTION_DATA_SQL, (report_id,)).fetchall()
+
+
+def get_template_field_values(conn, report_id):
+    """报告的模板字段值（含 field_name / field_display_name / sheet_name / cell_address）"""
+    return conn.execute(TEMPLATE_FIELD_VALUES_SQL, (report_id,)).fetchall()
+
+
+# ==================== 批量 ====================
+
+def get_reports(conn, report_ids):
+    """多张报告的报告头，返回 {报告ID: 行}，不存在的 ID 不在结果中"""
+    reports = {}
+    for chunk in _chunks(report_ids):
+        for row in conn.execute(_report_headers_sql(len(chunk)), chunk):
+            reports[row['id']] = row
+    return reports
+
+
+def get_detection_data_batch(conn, report_ids):
+    """多张报告的检测数据，返回 {报告ID: [行]}（每个请求的 ID 都有一项，无数据时为空列表）"""
+    data = {report_id: [] for report_id in report_ids}
+    for chunk in _chunks(report_ids):
+        for row in conn.execute(_detection_data_batch_sql(len(chunk)), chunk):
+            data[row['report_id']].append(row)
+    return data
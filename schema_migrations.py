@@ -0,0 +1,647 @@
+"""
+数据库结构版本迁移
+
+数据库结构按版本号顺序演进，已执行的版本记录在 schema_version 表中：
+  - 部署或升级时先执行 `python3 schema_migrations.py`（或 migrate 子命令）将数据库迁移到最新版本，
+    再启动 worker；多个进程同时执行时由迁移锁文件串行化，拿到锁后重新读取版本
+  - worker 启动时只调用 ensure_schema()：一条 SELECT MAX(version) 查询，耗时与表数量、迁移数量无关；
+    版本落后时抛出 SchemaVersionError，要求先执行迁移命令（start.sh 在启动 gunicorn 前执行）；
+    本地开发可设置 SCHEMA_AUTO_MIGRATE=1 让 worker 在迁移锁内就地迁移
+  - `python3 schema_migrations.py status` 查看已执行的版本
+  - 索引在 index_catalog.INDEX_CATALOG 中声明，每次迁移结束时与目录对齐
+
+每个迁移步骤都可重复执行（CREATE ... IF NOT EXISTS、缺列才 ALTER），
+步骤与其版本记录在同一事务内提交；中途失败时回滚，下次从该版本重新执行。
+新增结构变更只需在 MIGRATIONS 末尾追加一项，不要修改已发布的步骤。
+"""
+
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows 下无 fcntl，依赖 SQLite 自身的写锁
+    fcntl = None
+
+import db_backend
+import models_v2
+from index_catalog import apply_index_catalog
+from models_v2 import (apply_schema_fixes, create_cache_version_triggers, ensure_directories,
+                       init_default_data)
+from models_report_template import add_template_field_mapping_columns, create_report_template_schema
+
+
+class SchemaVersionError(RuntimeError):
+    """数据库结构版本落后且未开启自动迁移（SCHEMA_AUTO_MIGRATE=1）"""
+
+
+def _ensure_columns(cursor, table, columns):
+    """为表补齐缺失的字段，columns 为 [(字段名, 类型)]，返回新增的字段名列表"""
+    cursor.execute(f"PRAGMA table_info({table})")
+    existing = {row[1] for row in cursor.fetchall()}
+    added = []
+    for name, column_type in columns:
+        if name not in existing:
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN {name} {column_type}')
+            added.append(name)
+    return added
+
+
+# ==================== 迁移步骤 ====================
+
+def _create_base_tables(cursor):
+    """版本 1 的基础表结构（定稿于此，不随 models_v2.create_tables 变化；后续结构变更追加新的迁移步骤）"""
+    # ==================== 用户表 ====================
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT NOT NULL UNIQUE,
+            password_hash TEXT NOT NULL,
+            role TEXT NOT NULL CHECK(role IN ('super_admin', 'admin', 'reviewer', 'reporter')),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # 迁移：修复旧的角色 CHECK 约束（仅允许 admin/reporter -> 支持全部角色）
+    user_sql = cursor.execute(
+        "SELECT sql FROM sqlite_master WHERE type='table' AND name='users'"
+    ).fetchone()
+    if user_sql and "'admin', 'reporter')" in user_sql[0] and "'super_admin'" not in user_sql[0]:
+        print("正在修复users表角色约束...")
+        cursor.execute('PRAGMA writable_schema = ON')
+        fixed_sql = user_sql[0].replace(
+            "role IN ('admin', 'reporter')",
+            "role IN ('super_admin', 'admin', 'reviewer', 'reporter')"
+        )
+        cursor.execute(
+            "UPDATE sqlite_master SET sql = ? WHERE type = 'table' AND name = 'users'",
+            (fixed_sql,)
+        )
+        cursor.execute('PRAGMA writable_schema = OFF')
+        print("users表角色约束已更新，支持 super_admin/admin/reviewer/reporter")
+
+    # ==================== 公司表 ====================
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS companies (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # ==================== 客户管理表 ====================
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS customers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            inspected_unit TEXT NOT NULL,
+            water_plant TEXT,
+            unit_address TEXT,
+            contact_person TEXT,
+            contact_phone TEXT,
+            email TEXT,
+            remark TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # ==================== 样品类型表 ====================
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sample_types (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            code TEXT NOT NULL UNIQUE,
+            description TEXT,
+            remark TEXT,
+            version INTEGER DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # ==================== 检测项目分组表 ====================
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS indicator_groups (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            sort_order INTEGER DEFAULT 0,
+            is_system BOOLEAN DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # ==================== 检测指标表 ====================
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS indicators (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            group_id INTEGER,
+            name TEXT NOT NULL,
+            unit TEXT,
+            default_value TEXT,
+            limit_value TEXT,
+            detection_method TEXT,
+            description TEXT,
+            remark TEXT,
+            sort_order INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (group_id) REFERENCES indicator_groups (id) ON DELETE SET NULL,
+            UNIQUE(name, group_id)
+        )
+    ''')
+
+    # ==================== 模板-检测项目关联表 ====================
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS template_indicators (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            sample_type_id INTEGER NOT NULL,
+            indicator_id INTEGER NOT NULL,
+            is_required BOOLEAN DEFAULT 0,
+            sort_order INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (sample_type_id) REFERENCES sample_types (id) ON DELETE CASCADE,
+            FOREIGN KEY (indicator_id) REFERENCES indicators (id) ON DELETE CASCADE,
+            UNIQUE(sample_type_id, indicator_id)
+        )
+    ''')
+
+    # ==================== 报告模板配置表 ====================
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS report_templates (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            company_name TEXT DEFAULT '水质检测中心',
+            report_title TEXT DEFAULT '水质检测报告',
+            footer_text TEXT DEFAULT '',
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # ==================== 报告表 ====================
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS reports (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            report_number TEXT NOT NULL UNIQUE,
+            sample_number TEXT NOT NULL,
+            company_id INTEGER,
+            sample_type_id INTEGER NOT NULL,
+            detection_person TEXT,
+            review_person TEXT,
+            detection_date DATE,
+            remark TEXT,
+            created_by INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (company_id) REFERENCES companies (id) ON DELETE SET NULL,
+            FOREIGN KEY (sample_type_id) REFERENCES sample_types (id),
+            FOREIGN KEY (created_by) REFERENCES users (id)
+        )
+    ''')
+
+    # ==================== 报告数据表 ====================
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS report_data (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            report_id INTEGER NOT NULL,
+            indicator_id INTEGER NOT NULL,
+            measured_value TEXT,
+            remark TEXT,
+            FOREIGN KEY (report_id) REFERENCES reports (id) ON DELETE CASCADE,
+            FOREIGN KEY (indicator_id) REFERENCES indicators (id)
+        )
+    ''')
+
+    # ==================== 操作日志表 ====================
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS operation_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            operation_type TEXT NOT NULL,
+            operation_detail TEXT,
+            ip_address TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+
+    # ==================== 原始数据列名配置表 ====================
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS raw_data_column_schema (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            column_name TEXT NOT NULL UNIQUE,
+            column_order INTEGER NOT NULL,
+            data_type TEXT NOT NULL CHECK(data_type IN ('text', 'numeric', 'date')),
+            is_base_field BOOLEAN DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # ==================== 原始数据记录表 ====================
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS raw_data_records (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            sample_number TEXT NOT NULL UNIQUE,
+            report_number TEXT,
+            company_name TEXT,
+            plant_name TEXT,
+            sample_type TEXT,
+            sampling_date DATE NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # ==================== 原始数据检测值表 ====================
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS raw_data_values (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            record_id INTEGER NOT NULL,
+            column_name TEXT NOT NULL,
+            value TEXT,
+            FOREIGN KEY (record_id) REFERENCES raw_data_records (id) ON DELETE CASCADE,
+            UNIQUE(record_id, column_name)
+        )
+    ''')
+
+    # ==================== 原始数据校核结果表 ====================
+    # 逐样品规则的校核结果，按记录内容哈希与规则集版本判断是否需要重新校核
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS raw_data_validation_results (
+            record_id INTEGER PRIMARY KEY,
+            content_hash TEXT NOT NULL,
+            ruleset_version TEXT NOT NULL,
+            results TEXT NOT NULL,
+            error_count INTEGER DEFAULT 0,
+            warning_count INTEGER DEFAULT 0,
+            notice_count INTEGER DEFAULT 0,
+            validated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (record_id) REFERENCES raw_data_records (id) ON DELETE CASCADE
+        )
+    ''')
+
+    # ==================== 原始数据历史统计表 ====================
+    # 按水厂、样品类型、指标列滚动维护的统计量（Welford 均值/方差与 P² 分位数），导入时增量更新
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS raw_data_indicator_stats (
+            plant_name TEXT NOT NULL,
+            sample_type TEXT NOT NULL DEFAULT '',
+            indicator TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            mean REAL NOT NULL DEFAULT 0,
+            m2 REAL NOT NULL DEFAULT 0,
+            sketch TEXT,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (plant_name, sample_type, indicator)
+        )
+    ''')
+
+    # ==================== 原始数据字段映射表 ====================
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS raw_data_field_mapping (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            raw_field_name TEXT NOT NULL UNIQUE,
+            indicator_id INTEGER NOT NULL,
+            indicator_name TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (indicator_id) REFERENCES indicators (id) ON DELETE CASCADE
+        )
+    ''')
+
+    # ==================== 导出模板分类表 ====================
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS export_template_categories (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            sort_order INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # ==================== 导出模板表 ====================
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS export_templates (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            category_id INTEGER,
+            sample_type_id INTEGER,
+            name TEXT NOT NULL,
+            description TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (category_id) REFERENCES export_template_categories (id) ON DELETE SET NULL,
+            FOREIGN KEY (sample_type_id) REFERENCES sample_types (id) ON DELETE SET NULL,
+            UNIQUE(category_id, name)
+        )
+    ''')
+
+    # ==================== 导出模板-列关联表 ====================
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS export_template_columns (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            template_id INTEGER NOT NULL,
+            column_name TEXT NOT NULL,
+            column_order INTEGER DEFAULT 0,
+            FOREIGN KEY (template_id) REFERENCES export_templates (id) ON DELETE CASCADE,
+            UNIQUE(template_id, column_name)
+        )
+    ''')
+
+    # ==================== 缓存版本表 ====================
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS cache_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def _base_schema(conn, cursor):
+    """基础表、缓存版本触发器与默认数据"""
+    _create_base_tables(cursor)
+    create_cache_version_triggers(cursor)
+    init_default_data(cursor, conn)
+
+
+def _report_templates(conn, cursor):
+    """Excel 报告模版表及其后续新增字段（原 models_report_template.create_report_template_tables）"""
+    create_report_template_schema(cursor)
+    add_template_field_mapping_columns(cursor)
+    _ensure_columns(cursor, 'template_field_mappings', [
+        ('is_required', 'BOOLEAN DEFAULT 0'),
+        ('default_value', 'TEXT'),
+    ])
+
+
+def _legacy_fixes(conn, cursor):
+    """旧库结构修复（原 models_v2.run_migrations）"""
+    apply_schema_fixes(cursor)
+
+
+def _report_workflow(conn, cursor):
+    """报告审核与报告字段（原 scripts/migrations 下 migrate_database_v3、add_report_fields、add_reviewed_at_field）"""
+    added = _ensure_columns(cursor, 'reports', [
+        ('template_id', 'INTEGER'),
+        ('review_status', "TEXT DEFAULT 'draft'"),
+        ('review_person', 'TEXT'),
+        ('review_time', 'TIMESTAMP'),
+        ('review_comment', 'TEXT'),
+        ('generated_report_path', 'TEXT'),
+        ('report_date', 'DATE'),
+        ('sample_source', 'TEXT'),
+        ('sampler', 'TEXT'),
+        ('sampling_date', 'DATE'),
+        ('sampling_basis', 'TEXT'),
+        ('sample_received_date', 'DATE'),
+        ('sampling_location', 'TEXT'),
+        ('sample_status', 'TEXT'),
+        ('product_standard', 'TEXT'),
+        ('test_conclusion', 'TEXT'),
+        ('additional_info', 'TEXT'),
+        ('reviewed_at', 'TIMESTAMP'),
+    ])
+    if 'review_status' in added:
+        # 审核功能上线前的报告视为待审核
+        cursor.execute("UPDATE reports SET review_status = 'pending' WHERE review_status IS NULL")
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_reports_template_id ON reports(template_id)')
+
+    # 报告字段值表（存储报告的实际填写值）
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS report_field_values (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            report_id INTEGER NOT NULL,
+            field_mapping_id INTEGER NOT NULL,
+            field_value TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (report_id) REFERENCES reports (id) ON DELETE CASCADE,
+            FOREIGN KEY (field_mapping_id) REFERENCES template_field_mappings (id) ON DELETE CASCADE
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_report_field_values_report_id ON report_field_values(report_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_report_field_values_field_mapping_id ON report_field_values(field_mapping_id)')
+
+
+def _review_history(conn, cursor):
+    """审核历史表（原 scripts/migrations/add_review_history）"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS review_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            report_id INTEGER NOT NULL,
+            reviewer_id INTEGER NOT NULL,
+            review_status TEXT NOT NULL,
+            review_comment TEXT,
+            reviewed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (report_id) REFERENCES reports(id) ON DELETE CASCADE,
+            FOREIGN KEY (reviewer_id) REFERENCES users(id)
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_review_history_report_id ON review_history(report_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_review_history_reviewed_at ON review_history(reviewed_at)')
+
+
+def _index_catalog(conn, cursor):
+    """按索引目录创建索引（此前 create_indexes 只在直接运行 models_v2.py 时执行）"""
+    apply_index_catalog(cursor)
+
+
+def _maintenance_runs(conn, cursor):
+    """数据库维护记录表（db_maintenance）"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS maintenance_runs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            task TEXT NOT NULL,
+            started_at TIMESTAMP NOT NULL,
+            duration_ms INTEGER,
+            wal_bytes_before INTEGER,
+            wal_bytes_after INTEGER,
+            detail TEXT
+        )
+    ''')
+
+
+def _list_count_versions(conn, cursor):
+    """reports 表的缓存版本触发器（列表分页总数缓存，见 pagination）"""
+    create_cache_version_triggers(cursor)
+
+
+# (版本号, 说明, 迁移函数)，版本号严格递增，只在末尾追加
+MIGRATIONS = [
+    (1, '基础表结构与默认数据', _base_schema),
+    (2, 'Excel报告模版表', _report_templates),
+    (3, '旧库结构修复', _legacy_fixes),
+    (4, '报告审核与报告字段', _report_workflow),
+    (5, '审核历史表', _review_history),
+    (6, '索引目录', _index_catalog),
+    (7, '数据库维护记录表', _maintenance_runs),
+    (8, '报告列表计数缓存版本', _list_count_versions),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+# ==================== 版本记录 ====================
+
+def _create_version_table(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            duration_ms INTEGER
+        )
+    ''')
+
+
+def current_version(conn):
+    """数据库当前结构版本；尚无 schema_version 表（新库或旧库）时为 0"""
+    try:
+        row = conn.execute('SELECT MAX(version) FROM schema_version').fetchone()
+    except sqlite3.OperationalError:
+        return 0
+    return row[0] or 0
+
+
+def _connect(db_path):
+    conn = db_backend.connect(db_path, timeout=30.0)
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA foreign_keys = ON')
+    conn.execute('PRAGMA busy_timeout = 30000')
+    return conn
+
+
+_memory_migration_lock = threading.Lock()
+
+
+class _MigrationLock:
+    """跨进程迁移锁（数据库旁的 .migrate.lock 文件）；内存库只在本进程可见，使用进程内锁"""
+
+    def __init__(self, db_path):
+        self.path = f'{db_path}.migrate.lock'
+        self.memory = db_backend.is_memory(db_path)
+        self._file = None
+
+    def __enter__(self):
+        if self.memory:
+            _memory_migration_lock.acquire()
+            return self
+        self._file = open(self.path, 'a')
+        if fcntl is not None:
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self.memory:
+            _memory_migration_lock.release()
+            return
+        if fcntl is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+        self._file.close()
+        self._file = None
+
+
+def migrate(db_path=None, verbose=True):
+    """将数据库迁移到最新版本，返回本次执行的版本号列表"""
+    db_path = db_path or models_v2.DATABASE_PATH
+    if not db_backend.is_memory(db_path):
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+
+    applied = []
+    with _MigrationLock(db_path):
+        conn = _connect(db_path)
+        try:
+            cursor = conn.cursor()
+            _create_version_table(cursor)
+            conn.commit()
+            # 拿到锁后重新读取：其他进程可能刚完成迁移
+            version = current_version(conn)
+            for number, description, step in MIGRATIONS:
+                if number <= version:
+                    continue
+                started = time.perf_counter()
+                try:
+                    step(conn, cursor)
+                    cursor.execute(
+                        'INSERT INTO schema_version (version, description, duration_ms) VALUES (?, ?, ?)',
+                        (number, description, int((time.perf_counter() - started) * 1000))
+                    )
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    print(f"数据库迁移失败（版本 {number}：{description}），已回滚")
+                    raise
+                applied.append(number)
+                if verbose:
+                    print(f"  ✓ 版本 {number}：{description}")
+
+            # 索引目录随代码演进，每次迁移都与目录对齐（已对齐时只读取 sqlite_master）
+            created = apply_index_catalog(cursor)
+            conn.commit()
+            if verbose and created:
+                print(f"  ✓ 创建索引: {', '.join(created)}")
+        finally:
+            conn.close()
+
+    if verbose:
+        if applied:
+            print(f"数据库已迁移到版本 {LATEST_VERSION}")
+        else:
+            print(f"数据库已是最新版本 {LATEST_VERSION}，无需迁移")
+    return applied
+
+
+def ensure_schema(db_path=None):
+    """
+    worker 启动时的结构版本检查，只读取一次 schema_version。
+    版本落后时抛出 SchemaVersionError；SCHEMA_AUTO_MIGRATE=1 时改为在迁移锁内就地迁移。
+    """
+    ensure_directories()
+    db_path = db_path or models_v2.DATABASE_PATH
+    version = 0
+    if db_backend.exists(db_path):
+        conn = db_backend.connect(db_path, timeout=30.0)
+        try:
+            version = current_version(conn)
+        finally:
+            conn.close()
+    if version >= LATEST_VERSION:
+        return version
+
+    if os.environ.get('SCHEMA_AUTO_MIGRATE', '0') != '1':
+        raise SchemaVersionError(
+            f'数据库结构版本 {version} 落后于 {LATEST_VERSION}，请先执行 python3 schema_migrations.py'
+        )
+    migrate(db_path)
+    return LATEST_VERSION
+
+
+def print_status(db_path=None):
+    db_path = db_path or models_v2.DATABASE_PATH
+    if not db_backend.exists(db_path):
+        print(f"数据库不存在: {db_path}")
+        return
+    conn = db_backend.connect(db_path, timeout=30.0)
+    try:
+        version = current_version(conn)
+        print(f"数据库: {db_path}")
+        print(f"当前版本: {version}，最新版本: {LATEST_VERSION}")
+        if version:
+            for row in conn.execute(
+                    'SELECT version, description, applied_at, duration_ms FROM schema_version ORDER BY version'):
+                print(f"  {row[0]:>3}  {row[1]}  {row[2]}  {row[3]}ms")
+        for number, description, _ in MIGRATIONS:
+            if number > version:
+                print(f"  {number:>3}  {description}  (待执行)")
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    command = sys.argv[1] if len(sys.argv) > 1 else 'migrate'
+    if command == 'migrate':
+        ensure_directories()
+        migrate()
+    elif command == 'status':
+        print_status()
+    else:
+        print("用法: python3 schema_migrations.py [migrate|status]")
+        sys.exit(1)
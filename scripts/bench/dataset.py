@@ -0,0 +1,51 @@
+"""
+性能测试用的合成数据集
+
+在临时数据库上执行全部迁移后写入：
+  - reports 张待审核报告（样品类型“出厂水”）
+  - samples 个原始数据样品，每个样品 values_per_sample 项检测值（经导入同一写入函数 _write_samples）
+"""
+import contextlib
+import io
+import os
+import random
+import sqlite3
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+VALUES_PER_SAMPLE = 60
+PLANTS = ['一水厂', '二水厂', '三水厂', '四水厂']
+
+
+def make_samples(prefix, count, values_per_sample=VALUES_PER_SAMPLE):
+    """生成导入缓冲格式的样品（与 RawDataImporter 传给 _write_samples 的结构相同）"""
+    return [{
+        'record': (f'{prefix}-{i}', f'R{prefix}-{i}', '供水公司', random.choice(PLANTS), '出厂水',
+                   f'2026-{random.randint(1, 12):02d}-{random.randint(1, 28):02d}'),
+        'replace': False,
+        'values': [(f'指标{j}', f'{random.random() * 10:.3f}') for j in range(values_per_sample)],
+        'observations': [],
+    } for i in range(count)]
+
+
+def create_dataset(db_path, reports=2000, samples=0, values_per_sample=VALUES_PER_SAMPLE):
+    from raw_data_importer import IMPORT_WRITE_CHUNK, _write_samples
+    from schema_migrations import migrate
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        migrate(db_path, verbose=False)
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    conn.execute('BEGIN')
+    conn.execute("INSERT INTO sample_types (name, code) VALUES ('出厂水', 'CCS')")
+    conn.executemany(
+        "INSERT INTO reports (report_number, sample_number, sample_type_id, created_by, review_status) "
+        "VALUES (?, ?, 1, 1, 'pending')",
+        [(f'R{i}', f'S{i}') for i in range(reports)]
+    )
+    conn.execute('COMMIT')
+    for start in range(0, samples, IMPORT_WRITE_CHUNK):
+        conn.execute('BEGIN')
+        _write_samples(conn, make_samples(f'D{start}', min(IMPORT_WRITE_CHUNK, samples - start), values_per_sample))
+        conn.execute('COMMIT')
+    conn.close()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+存储配置对比测试（storage_profiles）
+
+对每个存储配置在同一份合成数据集（dataset.create_dataset）的副本上测量：
+  - 导入：按 IMPORT_WRITE_CHUNK 分块事务写入样品的吞吐（样品/秒）
+  - 小事务写入：逐条提交的审核事务耗时（平均与 p99）
+  - 读取：审核列表、按样品编号查找与原始数据 IN 查询的混合吞吐（次/秒）
+各配置按轮次交替执行 --rounds 轮，输出各项的中位数。
+数据库放在 --dir 指定的目录（默认系统临时目录），应与生产数据库位于同类磁盘，
+否则 synchronous 的差异无法体现。
+
+用法:
+  python3 scripts/bench/storage_profiles.py [--samples 10000] [--dir database]
+"""
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from dataset import create_dataset, make_samples
+from raw_data_importer import IMPORT_WRITE_CHUNK, _write_samples
+from storage_profiles import STORAGE_PROFILES, apply_profile
+
+REPORTS = 2000
+
+
+def _connect(db_path, profile):
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA foreign_keys = ON')
+    apply_profile(conn, profile)
+    return conn
+
+
+def bench_import(db_path, profile, samples):
+    conn = _connect(db_path, profile)
+    data = make_samples(f'I{profile}', samples)
+    started = time.perf_counter()
+    for start in range(0, samples, IMPORT_WRITE_CHUNK):
+        conn.execute('BEGIN IMMEDIATE')
+        _write_samples(conn, data[start:start + IMPORT_WRITE_CHUNK])
+        conn.execute('COMMIT')
+    elapsed = time.perf_counter() - started
+    conn.close()
+    return samples / elapsed
+
+
+def bench_small_writes(db_path, profile, count):
+    conn = _connect(db_path, profile)
+    latencies = []
+    for _ in range(count):
+        report_id = random.randint(1, REPORTS)
+        review_time = time.strftime('%Y-%m-%d %H:%M:%S')
+        started = time.perf_counter()
+        conn.execute('BEGIN IMMEDIATE')
+        conn.execute("UPDATE reports SET review_status = 'approved', reviewed_at = ? WHERE id = ?",
+                     (review_time, report_id))
+        conn.execute("INSERT INTO review_history (report_id, reviewer_id, review_status, reviewed_at) "
+                     "VALUES (?, 1, 'approved', ?)", (report_id, review_time))
+        conn.execute('COMMIT')
+        latencies.append((time.perf_counter() - started) * 1000)
+    conn.close()
+    latencies.sort()
+    return sum(latencies) / len(latencies), latencies[int(len(latencies) * 0.99)]
+
+
+def bench_reads(db_path, profile, seconds):
+    conn = _connect(db_path, profile)
+    max_record = conn.execute('SELECT MAX(id) FROM raw_data_records').fetchone()[0]
+    queries = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        conn.execute("SELECT r.*, st.name FROM reports r LEFT JOIN sample_types st ON r.sample_type_id = st.id "
+                     "WHERE r.review_status = ? ORDER BY r.created_at DESC LIMIT 50", ('pending',)).fetchall()
+        conn.execute('SELECT id FROM raw_data_records WHERE sample_number = ?',
+                     (f'D0-{random.randint(0, 49)}',)).fetchall()
+        ids = [random.randint(1, max_record) for _ in range(20)]
+        conn.execute(f"SELECT record_id, column_name, value FROM raw_data_values "
+                     f"WHERE record_id IN ({', '.join('?' * len(ids))}) ORDER BY id", ids).fetchall()
+        queries += 3
+    conn.close()
+    return queries / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description='存储配置对比测试')
+    parser.add_argument('--samples', type=int, default=10000, help='数据集中的原始数据样品数')
+    parser.add_argument('--import-samples', type=int, default=2000, help='导入测试写入的样品数')
+    parser.add_argument('--writes', type=int, default=300, help='小事务写入次数')
+    parser.add_argument('--read-seconds', type=float, default=5.0)
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--dir', default=None, help='测试数据库所在目录')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        base = os.path.join(tmp, 'base.db')
+        print(f"生成数据集: {REPORTS} 张报告，{args.samples} 个原始数据样品 ...")
+        create_dataset(base, reports=REPORTS, samples=args.samples)
+        print(f"数据库大小: {os.path.getsize(base) / 1024 / 1024:.1f} MB")
+        print()
+        results = {profile: [] for profile in STORAGE_PROFILES}
+        for _ in range(args.rounds):
+            for profile in STORAGE_PROFILES:
+                db_path = os.path.join(tmp, f'{profile}.db')
+                shutil.copyfile(base, db_path)
+                rate = bench_import(db_path, profile, args.import_samples)
+                mean, p99 = bench_small_writes(db_path, profile, args.writes)
+                reads = bench_reads(db_path, profile, args.read_seconds)
+                results[profile].append((rate, mean, p99, reads))
+                for suffix in ('', '-wal', '-shm'):
+                    if os.path.exists(db_path + suffix):
+                        os.remove(db_path + suffix)
+
+        print(f"{'配置':<12} {'导入(样品/s)':>12} {'写事务均值(ms)':>14} {'写事务p99(ms)':>14} {'读取(次/s)':>10}"
+              f"  （{args.rounds} 轮中位数）")
+        for profile, rounds in results.items():
+            rate, mean, p99, reads = (statistics.median(column) for column in zip(*rounds))
+            print(f"{profile:<12} {rate:>12.0f} {mean:>14.2f} {p99:>14.2f} {reads:>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
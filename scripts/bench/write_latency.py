@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+混合负载写入延迟测试（导入 + 审核 + 查询）
+
+在临时数据库上模拟多个 worker 进程并发：
+  - 1 个导入进程：连续导入原始数据
+  - APPROVERS 个审核进程（每个多线程）：反复执行审核事务（更新报告、写审核历史与操作日志），记录每次耗时
+  - 1 个查询进程：反复执行审核列表查询
+输出审核写入耗时的 p50 / p95 / p99 / 最大值，以及导入与查询吞吐。
+
+用法:
+  python3 scripts/bench/write_latency.py --mode before   # 导入一个大事务，写操作直接竞争 SQLite 写锁
+  python3 scripts/bench/write_latency.py --mode after    # DB_WRITE_QUEUE=1，导入分块，写操作经写队列
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from dataset import VALUES_PER_SAMPLE, create_dataset, make_samples
+
+REPORTS = 2000
+
+
+def _configure(db_path, mode):
+    import models_v2
+    import write_queue
+    models_v2.DATABASE_PATH = db_path
+    write_queue.DB_WRITE_QUEUE = mode == 'after'
+
+
+def _approve(conn, report_id):
+    review_time = time.strftime('%Y-%m-%d %H:%M:%S')
+    conn.execute('SELECT id, review_status FROM reports WHERE id = ?', (report_id,)).fetchone()
+    conn.execute(
+        "UPDATE reports SET review_status = 'approved', review_person = ?, review_time = ?, reviewed_at = ? "
+        "WHERE id = ?", ('bench', review_time, review_time, report_id))
+    conn.execute(
+        "INSERT INTO review_history (report_id, reviewer_id, review_status, review_comment, reviewed_at) "
+        "VALUES (?, 1, 'approved', '', ?)", (report_id, review_time))
+    conn.execute(
+        "INSERT INTO operation_logs (user_id, operation_type, operation_detail, created_at) VALUES (1, ?, ?, ?)",
+        ('审核报告', f'报告ID: {report_id}', review_time))
+
+
+def approver(db_path, mode, duration, threads, out):
+    _configure(db_path, mode)
+    from write_queue import run_write
+    latencies = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def loop():
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            run_write(_approve, random.randint(1, REPORTS))
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                latencies.append(elapsed)
+            time.sleep(0.01)
+
+    workers = [threading.Thread(target=loop) for _ in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    out.put(('approve', latencies))
+
+
+def importer(db_path, mode, duration, samples_per_file, out):
+    _configure(db_path, mode)
+    from raw_data_importer import IMPORT_WRITE_CHUNK, _write_samples
+    from write_queue import run_write
+    imported = 0
+    deadline = time.monotonic() + duration
+    batch = 0
+    while time.monotonic() < deadline:
+        batch += 1
+        samples = make_samples(f'P{os.getpid()}-{batch}', samples_per_file)
+        if mode == 'before':
+            # 旧行为：整个文件一个事务
+            conn = sqlite3.connect(db_path, timeout=30.0)
+            conn.execute('PRAGMA busy_timeout = 30000')
+            with conn:
+                _write_samples(conn, samples)
+            conn.close()
+        else:
+            for i in range(0, len(samples), IMPORT_WRITE_CHUNK):
+                run_write(_write_samples, samples[i:i + IMPORT_WRITE_CHUNK])
+        imported += len(samples)
+    out.put(('import', imported))
+
+
+def searcher(db_path, mode, duration, out):
+    _configure(db_path, mode)
+    from models_v2 import get_db
+    queries = 0
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        with get_db() as conn:
+            conn.execute(
+                "SELECT r.*, st.name FROM reports r LEFT JOIN sample_types st ON r.sample_type_id = st.id "
+                "WHERE r.review_status = ? ORDER BY r.created_at DESC LIMIT 50", ('pending',)).fetchall()
+        queries += 1
+    out.put(('search', queries))
+
+
+def _pct(samples, pct):
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))] if samples else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='混合负载写入延迟测试')
+    parser.add_argument('--mode', choices=['before', 'after'], required=True)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--approvers', type=int, default=2, help='审核进程数')
+    parser.add_argument('--threads', type=int, default=4, help='每个审核进程的线程数')
+    parser.add_argument('--samples-per-file', type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        create_dataset(db_path, reports=REPORTS)
+        ctx = multiprocessing.get_context('fork')
+        out = ctx.Queue()
+        procs = [ctx.Process(target=importer, args=(db_path, args.mode, args.duration, args.samples_per_file, out)),
+                 ctx.Process(target=searcher, args=(db_path, args.mode, args.duration, out))]
+        procs += [ctx.Process(target=approver, args=(db_path, args.mode, args.duration, args.threads, out))
+                  for _ in range(args.approvers)]
+        for p in procs:
+            p.start()
+        latencies, imported, searches = [], 0, 0
+        for _ in procs:
+            kind, value = out.get()
+            if kind == 'approve':
+                latencies.extend(value)
+            elif kind == 'import':
+                imported = value
+            else:
+                searches = value
+        for p in procs:
+            p.join()
+
+    latencies.sort()
+    print(f"模式: {args.mode}  时长: {args.duration:.0f}s")
+    print(f"审核写入 {len(latencies)} 次  p50 {_pct(latencies, 50):.1f}ms  p95 {_pct(latencies, 95):.1f}ms  "
+          f"p99 {_pct(latencies, 99):.1f}ms  最大 {latencies[-1] if latencies else 0:.1f}ms")
+    print(f"导入样品 {imported} 个（每样品 {VALUES_PER_SAMPLE} 项）  查询 {searches} 次")
+
+
+if __name__ == '__main__':
+    main()
@@ -2,7 +2,7 @@
 """
 添加报告表的新字段
 """
-import sqlite3
+import db_backend
 from models_v2 import DATABASE_PATH
 
 def add_report_fields():
@@ -11,7 +11,7 @@ def add_report_fields():
     print("添加报告表新字段")
     print("=" * 60)
 
-    conn = sqlite3.connect(DATABASE_PATH, timeout=30.0)
+    conn = db_backend.connect(DATABASE_PATH, timeout=30.0)
     cursor = conn.cursor()
 
     # 要添加的字段列表
@@ -2,7 +2,7 @@
 """
 添加审核历史表
 """
-import sqlite3
+import db_backend
 from models_v2 import DATABASE_PATH
 
 def create_review_history_table():
@@ -11,7 +11,7 @@ def create_review_history_table():
     print("创建审核历史表")
     print("=" * 60)
 
-    conn = sqlite3.connect(DATABASE_PATH, timeout=30.0)
+    conn = db_backend.connect(DATABASE_PATH, timeout=30.0)
     cursor = conn.cursor()
 
     # 创建审核历史表
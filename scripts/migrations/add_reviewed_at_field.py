@@ -2,7 +2,7 @@
 """
 添加reviewed_at字段到reports表
 """
-import sqlite3
+import db_backend
 from models_v2 import DATABASE_PATH
 
 def add_reviewed_at_field():
@@ -11,7 +11,7 @@ def add_reviewed_at_field():
     print("添加reviewed_at字段到reports表")
     print("=" * 60)
 
-    conn = sqlite3.connect(DATABASE_PATH, timeout=30.0)
+    conn = db_backend.connect(DATABASE_PATH, timeout=30.0)
     cursor = conn.cursor()
 
     try:
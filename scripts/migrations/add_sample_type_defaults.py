@@ -3,11 +3,11 @@
 添加样品类型默认字段
 为sample_types表添加默认样品状态、采样依据、产品标准、检测项目、检测结论字段
 """
-import sqlite3
 import sys
 import os
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../..'))
+import db_backend
 from models_v2 import DATABASE_PATH
 
 
@@ -17,7 +17,7 @@ def add_sample_type_defaults():
     print("添加样品类型默认字段")
     print("=" * 60)
 
-    conn = sqlite3.connect(DATABASE_PATH, timeout=30.0)
+    conn = db_backend.connect(DATABASE_PATH, timeout=30.0)
     cursor = conn.cursor()
 
     new_fields = [
@@ -0,0 +1,17 @@
+#!/bin/bash
+# 分别在两种数据库后端上运行测试（见 db_backend.py）：
+#   sqlite         数据库文件
+#   sqlite-memory  进程内共享内存库，不写磁盘
+# 对运行中服务发请求的联调脚本不在收集范围内（见 tests/conftest.py）
+# 用法: bash scripts/run_tests.sh [pytest 参数]
+
+cd "$(dirname "$0")/.." || exit 1
+
+status=0
+for backend in sqlite sqlite-memory; do
+    echo "================================================"
+    echo "   数据库后端: $backend"
+    echo "================================================"
+    DB_BACKEND=$backend python3 -m pytest -q tests "$@" || status=1
+done
+exit $status
@@ -0,0 +1,319 @@
+"""
+SQL 执行追踪：每请求查询数、数据库耗时、慢查询与 N+1 检测
+
+开启方式：环境变量 SQL_TRACE=1，或 `python3 app_v2.py --debug`。未开启时连接池照常
+创建普通连接，不产生任何额外开销。开启后：
+  - 连接池创建 TracedConnection：set_trace_callback 统计 SQLite 实际执行的每条语句
+    （executemany 整批计一次，BEGIN/COMMIT 等事务控制语句不计），
+    execute / executemany / executescript 外包计时，记录最慢的语句
+  - 单条语句耗时超过 SQL_SLOW_MS 毫秒记入慢查询日志
+  - 同一请求内同一条归一化语句（字面量替换为 ?）执行超过 SQL_N_PLUS_ONE_THRESHOLD 次时告警
+  - 调试模式或 SQL_TRACE_HEADERS=1 时在响应头返回本请求的统计（X-DB-*）
+  - 进程级汇总通过 GET /api/metrics 查看（每个 worker 进程各自统计）
+
+计时只覆盖 execute 调用本身（SELECT 的首行）；之后 fetch 剩余行的时间不计入。
+流式响应在 after_request 之后才执行的查询不计入该请求。
+"""
+
+import heapq
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+
+import db_backend
+
+SQL_SLOW_MS = float(os.environ.get('SQL_SLOW_MS', '100'))
+SQL_N_PLUS_ONE_THRESHOLD = int(os.environ.get('SQL_N_PLUS_ONE_THRESHOLD', '20'))
+# 每请求保留的最慢语句数、进程级保留的最近慢查询与 N+1 告警数
+SQL_TRACE_TOP = 5
+SQL_TRACE_RECENT = 50
+
+_enabled = os.environ.get('SQL_TRACE', '0') == '1'
+_local = threading.local()
+
+_TRANSACTION_CONTROL = ('BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE', 'END')
+
+
+def enabled():
+    return _enabled
+
+
+def enable(flag=True):
+    """开启/关闭追踪；只影响之后新建的连接（开启前已在连接池中的连接不追踪）"""
+    global _enabled
+    _enabled = flag
+
+
+# ==================== 语句归一化 ====================
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'(?<![\w.])-?\d+(?:\.\d+)?\b')
+_IN_LIST_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_SPACE_RE = re.compile(r'\s+')
+
+
+@lru_cache(maxsize=4096)
+def normalize_sql(sql):
+    """去掉字面量与多余空白，IN (?, ?, ...) 折叠为 IN (...)，用于同类语句计数"""
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = _SPACE_RE.sub(' ', sql).strip()
+    return _IN_LIST_RE.sub('(...)', sql)
+
+
+# ==================== 单次请求统计 ====================
+
+class QueryTrace:
+    """一次请求（或一段代码）内的查询统计"""
+
+    def __init__(self, label=''):
+        self.label = label
+        self.queries = 0
+        self.db_ms = 0.0
+        self.statements = {}  # 归一化语句 → 执行次数
+        self.slowest = []  # 小根堆 [(耗时ms, 序号, 语句)]
+        self.slow = []  # 超过阈值的 [(耗时ms, 语句)]
+        self._seq = 0
+        self._batch = 0  # executemany 嵌套深度，批内逐行回调不计数
+
+    def on_statement(self, sql):
+        if self._batch or sql.startswith('--') or sql.lstrip().upper().startswith(_TRANSACTION_CONTROL):
+            return
+        self.queries += 1
+        key = normalize_sql(sql)
+        self.statements[key] = self.statements.get(key, 0) + 1
+
+    def on_timed(self, sql, elapsed_ms, batch=False):
+        self.db_ms += elapsed_ms
+        if batch:
+            self.queries += 1
+            key = normalize_sql(sql)
+            self.statements[key] = self.statements.get(key, 0) + 1
+        self._seq += 1
+        entry = (elapsed_ms, self._seq, sql)
+        if len(self.slowest) < SQL_TRACE_TOP:
+            heapq.heappush(self.slowest, entry)
+        elif elapsed_ms > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, entry)
+        if elapsed_ms >= SQL_SLOW_MS:
+            self.slow.append((elapsed_ms, sql))
+
+    def repeated(self):
+        """执行次数超过 N+1 阈值的语句 [(次数, 语句)]，按次数降序"""
+        return sorted(
+            ((count, sql) for sql, count in self.statements.items() if count > SQL_N_PLUS_ONE_THRESHOLD),
+            reverse=True,
+        )
+
+    def top(self):
+        """最慢的语句 [(耗时ms, 归一化语句)]，按耗时降序"""
+        return [(round(ms, 2), normalize_sql(sql)) for ms, _, sql in sorted(self.slowest, reverse=True)]
+
+
+def current_trace():
+    return getattr(_local, 'trace', None)
+
+
+def start_trace(label=''):
+    _local.trace = QueryTrace(label)
+    return _local.trace
+
+
+def finish_trace():
+    """结束当前线程的统计：写慢查询与 N+1 日志并计入进程汇总，返回 QueryTrace"""
+    trace = getattr(_local, 'trace', None)
+    _local.trace = None
+    if trace is not None:
+        _record(trace)
+    return trace
+
+
+class trace_queries:
+    """在请求之外统计一段代码的查询（脚本、后台任务、测试）"""
+
+    def __init__(self, label=''):
+        self.label = label
+        self.trace = None
+
+    def __enter__(self):
+        self._outer = current_trace()
+        self.trace = start_trace(self.label)
+        return self.trace
+
+    def __exit__(self, *exc):
+        finish_trace()
+        _local.trace = self._outer
+
+
+# ==================== 带追踪的连接 ====================
+
+def _on_statement(sql):
+    trace = getattr(_local, 'trace', None)
+    if trace is not None:
+        trace.on_statement(sql)
+
+
+def _timed(method, sql, args, batch=False):
+    trace = getattr(_local, 'trace', None)
+    if trace is None:
+        return method(sql, *args)
+    if batch:
+        trace._batch += 1
+    started = time.perf_counter()
+    try:
+        return method(sql, *args)
+    finally:
+        if batch:
+            trace._batch -= 1
+        trace.on_timed(sql, (time.perf_counter() - started) * 1000, batch)
+
+
+class TracedCursor(db_backend.DialectCursor):
+    def execute(self, sql, *args):
+        return _timed(super().execute, sql, args)
+
+    def executemany(self, sql, *args):
+        return _timed(super().executemany, sql, args, batch=True)
+
+    def executescript(self, sql, *args):
+        return _timed(super().executescript, sql, args)
+
+
+class TracedConnectionMixin:
+    """为 DialectConnection 子类加上追踪：游标默认为 TracedCursor，连接级 execute 也经其计时"""
+
+    def cursor(self, factory=TracedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, *args):
+        return self.cursor().execute(sql, *args)
+
+    def executemany(self, sql, *args):
+        return self.cursor().executemany(sql, *args)
+
+    def executescript(self, sql, *args):
+        return self.cursor().executescript(sql, *args)
+
+
+class TracedConnection(TracedConnectionMixin, db_backend.DialectConnection):
+    pass
+
+
+def install(conn):
+    """在新建的连接上注册语句回调"""
+    conn.set_trace_callback(_on_statement)
+    return conn
+
+
+def connect(path, **kwargs):
+    """db_backend.connect 的替代：开启追踪时返回 TracedConnection，否则与 db_backend.connect 相同"""
+    if not _enabled:
+        return db_backend.connect(path, **kwargs)
+    return install(db_backend.connect(path, factory=TracedConnection, **kwargs))
+
+
+# ==================== 进程汇总 ====================
+
+_stats_lock = threading.Lock()
+_endpoints = {}  # 标签 → {requests, queries, db_ms, max_queries}
+_recent_slow = deque(maxlen=SQL_TRACE_RECENT)
+_recent_repeated = deque(maxlen=SQL_TRACE_RECENT)
+
+
+def _log(message):
+    print(message, file=sys.stderr, flush=True)
+
+
+def _record(trace):
+    repeated = trace.repeated()
+    for elapsed_ms, sql in trace.slow:
+        _log(f"[慢查询] {trace.label} {elapsed_ms:.1f}ms: {normalize_sql(sql)}")
+    for count, sql in repeated:
+        _log(f"[N+1] {trace.label} 同一语句执行 {count} 次: {sql}")
+
+    with _stats_lock:
+        stats = _endpoints.setdefault(trace.label, {'requests': 0, 'queries': 0, 'db_ms': 0.0, 'max_queries': 0})
+        stats['requests'] += 1
+        stats['queries'] += trace.queries
+        stats['db_ms'] += trace.db_ms
+        stats['max_queries'] = max(stats['max_queries'], trace.queries)
+        now = time.strftime('%Y-%m-%d %H:%M:%S')
+        for elapsed_ms, sql in trace.slow:
+            _recent_slow.append({'time': now, 'label': trace.label, 'ms': round(elapsed_ms, 2),
+                                 'sql': normalize_sql(sql)})
+        for count, sql in repeated:
+            _recent_repeated.append({'time': now, 'label': trace.label, 'count': count, 'sql': sql})
+
+
+def metrics():
+    """本进程的追踪汇总"""
+    with _stats_lock:
+        endpoints = {
+            label: {
+                'requests': s['requests'],
+                'queries': s['queries'],
+                'avg_queries': round(s['queries'] / s['requests'], 2),
+                'max_queries': s['max_queries'],
+                'db_ms': round(s['db_ms'], 2),
+                'avg_db_ms': round(s['db_ms'] / s['requests'], 2),
+            }
+            for label, s in _endpoints.items()
+        }
+        return {
+            'enabled': _enabled,
+            'slow_ms': SQL_SLOW_MS,
+            'n_plus_one_threshold': SQL_N_PLUS_ONE_THRESHOLD,
+            'endpoints': endpoints,
+            'recent_slow': list(_recent_slow),
+            'recent_repeated': list(_recent_repeated),
+        }
+
+
+def reset_metrics():
+    with _stats_lock:
+        _endpoints.clear()
+        _recent_slow.clear()
+        _recent_repeated.clear()
+
+
+# ==================== Flask 集成 ====================
+
+def _header_value(text):
+    return text[:200].encode('ascii', 'backslashreplace').decode('ascii')
+
+
+def init_app(app):
+    """注册请求钩子；调试模式（app.debug）或 SQL_TRACE_HEADERS=1 时返回 X-DB-* 响应头"""
+    from flask import request
+
+    headers = os.environ.get('SQL_TRACE_HEADERS', '0') == '1'
+
+    @app.before_request
+    def _start_sql_trace():
+        if _enabled:
+            start_trace(f'{request.method} {request.url_rule.rule if request.url_rule else request.path}')
+
+    @app.after_request
+    def _finish_sql_trace(response):
+        trace = finish_trace()
+        if trace is not None and (headers or app.debug):
+            response.headers['X-DB-Query-Count'] = str(trace.queries)
+            response.headers['X-DB-Time-Ms'] = f'{trace.db_ms:.2f}'
+            top = trace.top()
+            if top:
+                ms, sql = top[0]
+                response.headers['X-DB-Slowest'] = _header_value(f'{ms}ms {sql}')
+            repeated = trace.repeated()
+            if repeated:
+                response.headers['X-DB-Repeated'] = _header_value(f'{repeated[0][0]}x {repeated[0][1]}')
+        return response
+
+    @app.teardown_request
+    def _drop_sql_trace(exc):
+        # 未走到 after_request（如未捕获异常）时丢弃统计，避免串到同线程的下一个请求
+        _local.trace = None
@@ -9,14 +9,12 @@ echo ""
 python_version=$(python3 --version 2>&1 | awk '{print $2}')
 echo "✓ Python版本: $python_version"
 
-# 检查数据库
+# 初始化或迁移数据库（在启动 worker 之前完成，worker 只检查版本号）
 if [ ! -f "database/water_quality_v2.db" ]; then
     echo "⚠ 未找到数据库，正在初始化..."
-    python3 models_v2.py
-    echo "✓ 数据库初始化完成"
-else
-    echo "✓ 数据库已存在"
 fi
+python3 schema_migrations.py || exit 1
+echo "✓ 数据库结构已是最新版本"
 
 echo ""
 echo "正在启动系统..."
@@ -2911,6 +2911,36 @@ async function resetUserPassword(userId) {
     } catch (e) { console.error(e); }
 }
 
+// ==================== 游标分页列表 ====================
+
+// 列表接口按页返回 {items, next_cursor}：首次加载替换表格内容，
+// 还有下一页时在表格末尾显示“加载更多”，点击后追加下一页；空行与“加载更多”行都横跨 colspan 列
+async function loadPagedRows(tbody, url, emptyText, colspan, renderRow, cursor = null) {
+    const page = await apiRequest(cursor ? `${url}cursor=${encodeURIComponent(cursor)}&` : url);
+
+    tbody.querySelector('tr.load-more-row')?.remove();
+    if (!cursor) {
+        if (page.items.length === 0) {
+            tbody.innerHTML = `<tr><td colspan="${colspan}" class="text-center text-muted">${emptyText}</td></tr>`;
+            return;
+        }
+        tbody.innerHTML = '';
+    }
+    tbody.insertAdjacentHTML('beforeend', page.items.map(renderRow).join(''));
+
+    if (page.next_cursor) {
+        const row = document.createElement('tr');
+        row.className = 'load-more-row';
+        row.innerHTML = `<td colspan="${colspan}" class="text-center">
+            <button class="btn btn-sm btn-outline-secondary">加载更多</button>
+        </td>`;
+        row.querySelector('button').onclick = () =>
+            loadPagedRows(tbody, url, emptyText, colspan, renderRow, page.next_cursor)
+                .catch(error => console.error('加载更多失败:', error));
+        tbody.appendChild(row);
+    }
+}
+
 // ==================== 待提交报告 ====================
 
 async function loadPendingReports() {
@@ -2922,16 +2952,8 @@ async function loadPendingReports() {
         if (sampleNumber) url += `sample_number=${sampleNumber}&`;
         if (companyId) url += `company_id=${companyId}&`;
 
-        const reports = await apiRequest(url);
-
         const tbody = document.getElementById('pendingReportsTableBody');
-
-        if (reports.length === 0) {
-            tbody.innerHTML = '<tr><td colspan="9" class="text-center text-muted">暂无待提交报告</td></tr>';
-            return;
-        }
-
-        tbody.innerHTML = reports.map(report => {
+        await loadPagedRows(tbody, url, '暂无待提交报告', 10, report => {
             const statusBadge = report.review_status === 'draft'
                 ? '<span class="badge bg-secondary">草稿</span>'
                 : '<span class="badge bg-danger">已拒绝</span>';
@@ -2940,18 +2962,9 @@ async function loadPendingReports() {
                 ? report.review_comment
                 : '-';
 
-            // 解析客户信息
-            let customerUnit = '-';
-            let customerPlant = '-';
-            try {
-                if (report.remark) {
-                    const customerInfo = JSON.parse(report.remark);
-                    customerUnit = customerInfo.customer_unit || '-';
-                    customerPlant = customerInfo.customer_plant || '-';
-                }
-            } catch (e) {
-                // 如果remark不是JSON格式，保持默认值
-            }
+            // 客户信息（由后端从 remark 中提取）
+            const customerUnit = report.customer_unit || '-';
+            const customerPlant = report.customer_plant || '-';
 
             // 检测项目数
             const indicatorCount = report.data ? report.data.length : 0;
@@ -2983,7 +2996,7 @@ async function loadPendingReports() {
                     </td>
                 </tr>
             `;
-        }).join('');
+        });
     } catch (error) {
         console.error('加载待提交报告失败:', error);
         showToast('加载待提交报告失败', 'error');
@@ -3304,16 +3317,8 @@ async function loadSubmittedReports() {
         if (companyId) url += `company_id=${companyId}&`;
         if (date) url += `date=${date}&`;
 
-        const reports = await apiRequest(url);
-
         const tbody = document.getElementById('submittedReportsTableBody');
-
-        if (reports.length === 0) {
-            tbody.innerHTML = '<tr><td colspan="9" class="text-center text-muted">暂无已提交报告</td></tr>';
-            return;
-        }
-
-        tbody.innerHTML = reports.map(report => {
+        await loadPagedRows(tbody, url, '暂无已提交报告', 9, report => {
             // 审核状态
             let reviewStatusBadge = '';
             switch (report.review_status) {
@@ -3357,7 +3362,7 @@ async function loadSubmittedReports() {
                     </td>
                 </tr>
             `;
-        }).join('');
+        });
     } catch (error) {
         console.error('加载已提交报告失败:', error);
         showToast('加载已提交报告失败', 'error');
@@ -3377,16 +3382,8 @@ async function loadReviewReports() {
         if (status) url += `status=${status}&`;
         if (companyId) url += `company_id=${companyId}&`;
 
-        const reports = await apiRequest(url);
-
         const tbody = document.getElementById('reviewReportsList');
-
-        if (reports.length === 0) {
-            tbody.innerHTML = '<tr><td colspan="8" class="text-center text-muted">暂无报告</td></tr>';
-            return;
-        }
-
-        tbody.innerHTML = reports.map(report => {
+        await loadPagedRows(tbody, url, '暂无报告', 8, report => {
             let statusBadge = '';
             let actionButtons = '';
 
@@ -3442,7 +3439,7 @@ async function loadReviewReports() {
                     </td>
                 </tr>
             `;
-        }).join('');
+        });
     } catch (error) {
         console.error('加载报告审核列表失败:', error);
         showToast('加载报告审核列表失败', 'error');
@@ -3725,16 +3722,8 @@ async function loadGenReports() {
         if (sampleNumber) url += `sample_number=${sampleNumber}&`;
         if (companyId) url += `company_id=${companyId}&`;
 
-        const reports = await apiRequest(url);
-
         const tbody = document.getElementById('genReportsList');
-
-        if (reports.length === 0) {
-            tbody.innerHTML = '<tr><td colspan="8" class="text-center text-muted">暂无已审核通过的报告</td></tr>';
-            return;
-        }
-
-        tbody.innerHTML = reports.map(report => {
+        await loadPagedRows(tbody, url, '暂无已审核通过的报告', 8, report => {
             const generateStatusBadge = report.generated_report_path
                 ? '<span class="badge bg-success">已生成</span>'
                 : '<span class="badge bg-secondary">未生成</span>';
@@ -3771,7 +3760,7 @@ async function loadGenReports() {
                     <td>${actionButtons}</td>
                 </tr>
             `;
-        }).join('');
+        });
     } catch (error) {
         console.error('加载报告生成列表失败:', error);
         showToast('加载报告生成列表失败', 'error');
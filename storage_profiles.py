@@ -0,0 +1,83 @@
+"""
+SQLite 存储配置（storage profile）
+
+连接除 foreign_keys / journal_mode / busy_timeout 外的性能相关 PRAGMA 按命名配置统一设置：
+  - durable：每次提交都同步到磁盘，断电不丢失已提交的事务；缓存等保持 SQLite 默认
+  - balanced：WAL 下 synchronous=NORMAL 只在检查点时同步，断电可能丢失最近提交的事务但数据库不会损坏；
+    较大的页缓存、内存映射读取、临时表放内存
+  - bulk-import：导入期间使用，更大的页缓存，推迟自动检查点（导入结束后由 db_maintenance 截断 WAL）
+默认配置由环境变量 DB_STORAGE_PROFILE 指定（默认 balanced，依据 scripts/bench/storage_profiles.py 的测试结果）。
+
+连接池借出连接时按当前线程的配置设置（与上次不同时才执行 PRAGMA）；
+`with bulk_import():` 块内本线程借出的连接、经 run_write 提交的写操作使用 bulk-import 配置，
+RawDataImporter、ImportProcessor 与客户导入已自动使用。
+PRAGMA synchronous 不能在事务中修改，apply_profile 须在事务外调用。
+"""
+
+import os
+import threading
+from contextlib import contextmanager
+
+# 各配置的连接级 PRAGMA（cache_size 为负数时单位为 KiB，mmap_size 单位为字节）
+STORAGE_PROFILES = {
+    'durable': {
+        'synchronous': 'FULL',
+        'cache_size': -2000,
+        'mmap_size': 0,
+        'temp_store': 'DEFAULT',
+        'wal_autocheckpoint': 1000,
+    },
+    'balanced': {
+        'synchronous': 'NORMAL',
+        'cache_size': -16000,
+        'mmap_size': 128 * 1024 * 1024,
+        'temp_store': 'MEMORY',
+        'wal_autocheckpoint': 1000,
+    },
+    'bulk-import': {
+        'synchronous': 'NORMAL',
+        'cache_size': -64000,
+        'mmap_size': 256 * 1024 * 1024,
+        'temp_store': 'MEMORY',
+        'wal_autocheckpoint': 10000,
+    },
+}
+
+BULK_IMPORT_PROFILE = 'bulk-import'
+
+DB_STORAGE_PROFILE = os.environ.get('DB_STORAGE_PROFILE', 'balanced')
+if DB_STORAGE_PROFILE not in STORAGE_PROFILES:
+    raise ValueError(f"未知的存储配置 DB_STORAGE_PROFILE={DB_STORAGE_PROFILE}，"
+                     f"可选: {', '.join(STORAGE_PROFILES)}")
+
+_local = threading.local()
+
+
+def active_profile():
+    """当前线程使用的存储配置名"""
+    return getattr(_local, 'profile', None) or DB_STORAGE_PROFILE
+
+
+def apply_profile(conn, name):
+    """在连接上设置指定配置的 PRAGMA（须在事务外），返回配置名"""
+    for pragma, value in STORAGE_PROFILES[name].items():
+        conn.execute(f'PRAGMA {pragma} = {value}')
+    return name
+
+
+@contextmanager
+def use_profile(name):
+    """块内本线程借出的连接与提交的写操作使用指定配置"""
+    if name not in STORAGE_PROFILES:
+        raise ValueError(f'未知的存储配置: {name}')
+    previous = getattr(_local, 'profile', None)
+    _local.profile = name
+    try:
+        yield
+    finally:
+        _local.profile = previous
+
+
+def bulk_import():
+    """导入期间使用 bulk-import 配置"""
+    return use_profile(BULK_IMPORT_PROFILE)
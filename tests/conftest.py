@@ -0,0 +1,19 @@
+"""
+pytest 配置
+
+以下脚本不是单元测试，pytest 收集时跳过，需要时直接运行：
+  - 对运行中的服务（http://localhost:5000）发请求的接口联调脚本
+  - test_parser.py：模块级解析 templates/excel_reports 下的指定报告模板
+"""
+
+collect_ignore = [
+    'test_api.py',
+    'test_customer_integration.py',
+    'test_edit_report.py',
+    'test_fixes.py',
+    'test_new_fields.py',
+    'test_parser.py',
+    'test_sample_type_indicators.py',
+    'test_searchable_unit.py',
+    'test_version_control_and_sorting.py',
+]
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+列式导出测试
+验证 CSV 分块流式输出与检测值派生列，以及安装 pyarrow 时 Parquet 的列类型
+"""
+import csv
+import io
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import columnar_export
+from columnar_export import RAW_DATA_EXPORT_COLUMNS, iter_csv, parquet_available, write_parquet
+
+ROWS = [
+    (1, 'S1', None, '城东供水', '城东水厂', '出厂水', '2026-01-05', '浑浊度(NTU)', '0.3'),
+    (1, 'S1', None, '城东供水', '城东水厂', '出厂水', '2026-01-05', '六价铬(mg/L)', '＜0.004'),
+    (1, 'S1', None, '城东供水', '城东水厂', '出厂水', '2026-01-05', '臭和味', '无'),
+    (2, 'S2', 'R2', '城东供水', '城东水厂', '出厂水', '2026-01-06', '浑浊度(NTU)', None),
+]
+
+
+def test_csv_stream():
+    """分块输出拼接后与逐行结果一致；检出限拆为数值与标记，无法解析的值数值为空"""
+    original = columnar_export.CSV_CHUNK_ROWS
+    columnar_export.CSV_CHUNK_ROWS = 3
+    try:
+        chunks = list(iter_csv(iter(ROWS), RAW_DATA_EXPORT_COLUMNS))
+    finally:
+        columnar_export.CSV_CHUNK_ROWS = original
+    assert len(chunks) == 3  # 表头 + 两个数据块
+    text = b''.join(chunks).decode('utf-8')
+    assert text.startswith('\ufeff')
+    table = list(csv.reader(io.StringIO(text[1:])))
+    assert table[0][-3:] == ['value_text', 'value_numeric', 'below_limit']
+    assert [row[-3:] for row in table[1:]] == [
+        ['0.3', '0.3', '0'],
+        ['＜0.004', '0.004', '1'],
+        ['无', '', '0'],
+        ['', '', '0'],
+    ]
+
+
+def test_parquet_types():
+    """Parquet 列类型：数值列为 double，检出限标记为 bool（未安装 pyarrow 时跳过）"""
+    if not parquet_available():
+        pytest.skip('未安装 pyarrow')
+    import pyarrow.parquet as pq
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'raw.parquet')
+        assert write_parquet(path, iter(ROWS), RAW_DATA_EXPORT_COLUMNS) == len(ROWS)
+        table = pq.read_table(path)
+        assert str(table.schema.field('value_numeric').type) == 'double'
+        assert str(table.schema.field('below_limit').type) == 'bool'
+        assert table.column('value_numeric').to_pylist() == [0.3, 0.004, None, None]
+        assert table.column('below_limit').to_pylist() == [False, True, False, False]
+
+
+if __name__ == '__main__':
+    test_csv_stream()
+    test_parquet_types()
+    print('✓ 列式导出测试通过')
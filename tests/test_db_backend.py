@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+数据库后端测试
+验证方言生成的占位符与 upsert 语句、upsert 在文件库与内存库上的行为，
+连接（含连接池与追踪连接）执行前经方言转换 SQL，以及 sqlite-memory 后端下连接池各连接共享同一个内存库
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_backend
+import models_v2
+import sql_trace
+from db_backend import DIALECTS, SQLiteDialect
+from schema_migrations import LATEST_VERSION, current_version, migrate
+
+
+def test_dialect_sql():
+    sqlite, postgresql = DIALECTS['sqlite'], DIALECTS['postgresql']
+    assert sqlite.placeholders(3) == '?, ?, ?' and postgresql.placeholders(2) == '%s, %s'
+    assert sqlite.upsert('t', ('k', 'a', 'b'), ('k',)) == \
+        'INSERT INTO t (k, a, b) VALUES (?, ?, ?) ON CONFLICT (k) DO UPDATE SET a = excluded.a, b = excluded.b'
+    assert postgresql.insert_ignore('t', ('k', 'a'), ('k',)) == \
+        'INSERT INTO t (k, a) VALUES (%s, %s) ON CONFLICT (k) DO NOTHING'
+    # 字面量、标识符与注释中的 ? 不转换，% 转义
+    assert postgresql.format("SELECT '?', \"a?\" FROM t WHERE x = ? AND y LIKE 'a%' -- ?\n AND z = ?") == \
+        "SELECT '?', \"a?\" FROM t WHERE x = %s AND y LIKE 'a%' -- ?\n AND z = %s"
+    assert postgresql.format('SELECT 5 % 2 WHERE x = ?') == 'SELECT 5 %% 2 WHERE x = %s'
+
+
+def _check_upsert(conn):
+    conn.execute('CREATE TABLE t (id INTEGER PRIMARY KEY, k TEXT UNIQUE, a INTEGER, b INTEGER)')
+    upsert = db_backend.dialect.upsert('t', ('k', 'a', 'b'), ('k',), update_columns=['a'])
+    ignore = db_backend.dialect.insert_ignore('t', ('k', 'a', 'b'), ('k',))
+    conn.execute(upsert, ('x', 1, 1))
+    conn.execute(upsert, ('x', 2, 2))
+    assert conn.execute(ignore, ('x', 3, 3)).rowcount == 0
+    conn.execute(ignore, ('y', 4, 4))
+    # 冲突时原行保留：id 不变，只更新指定列
+    assert conn.execute('SELECT id, k, a, b FROM t ORDER BY id').fetchall() == [(1, 'x', 2, 1), (2, 'y', 4, 4)]
+
+
+def test_upsert_file_and_memory():
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = db_backend.connect(os.path.join(tmp, 'upsert.db'))
+        try:
+            _check_upsert(conn)
+        finally:
+            conn.close()
+    conn = db_backend.connect(':memory:')
+    try:
+        _check_upsert(conn)
+    finally:
+        conn.close()
+
+
+class _RecordingDialect(SQLiteDialect):
+    def __init__(self):
+        self.statements = []
+
+    def format(self, sql):
+        self.statements.append(sql)
+        return sql
+
+
+def test_connections_apply_dialect():
+    original = (db_backend.dialect, models_v2.DATABASE_PATH, sql_trace.enabled())
+    recording = db_backend.dialect = _RecordingDialect()
+    with tempfile.TemporaryDirectory() as tmp:
+        models_v2.DATABASE_PATH = os.path.join(tmp, 'dialect.db')
+        try:
+            conn = db_backend.connect(models_v2.DATABASE_PATH)
+            conn.execute('CREATE TABLE t (v INTEGER)')
+            conn.executemany('INSERT INTO t (v) VALUES (?)', [(1,), (2,)])
+            conn.cursor().execute('SELECT v FROM t WHERE v = ?', (1,))
+            conn.close()
+            with models_v2.get_db() as pooled:
+                pooled.execute('SELECT COUNT(*) FROM t')
+            sql_trace.enable()
+            traced = sql_trace.connect(models_v2.DATABASE_PATH)
+            traced.execute('SELECT MAX(v) FROM t')
+            traced.close()
+            for sql in ('CREATE TABLE t (v INTEGER)', 'INSERT INTO t (v) VALUES (?)', 'SELECT v FROM t WHERE v = ?',
+                        'SELECT COUNT(*) FROM t', 'SELECT MAX(v) FROM t'):
+                assert sql in recording.statements, sql
+        finally:
+            models_v2.close_pool()
+            db_backend.dialect, models_v2.DATABASE_PATH, traced_flag = original
+            sql_trace.enable(traced_flag)
+
+
+def test_memory_backend_shares_database():
+    original = (db_backend.DB_BACKEND, models_v2.DATABASE_PATH)
+    db_backend.DB_BACKEND = 'sqlite-memory'
+    models_v2.DATABASE_PATH = os.path.join(tempfile.gettempdir(), 'db-backend-test', 'memory.db')
+    try:
+        migrate(verbose=False)
+        assert db_backend.exists(models_v2.DATABASE_PATH)
+        assert not os.path.exists(os.path.dirname(models_v2.DATABASE_PATH))  # 不写磁盘
+        with models_v2.get_db() as conn:
+            conn.execute("INSERT INTO sample_types (name, code) VALUES ('出厂水', 'CCS')")
+        # 连接池的另一个连接与直接连接看到同一个库
+        conn = models_v2.get_db_connection()
+        try:
+            assert conn.execute("SELECT code FROM sample_types WHERE name = '出厂水'").fetchone()[0] == 'CCS'
+        finally:
+            conn.close()
+        direct = db_backend.connect(models_v2.DATABASE_PATH)
+        try:
+            assert current_version(direct) == LATEST_VERSION
+        finally:
+            direct.close()
+
+        models_v2.close_pool()
+        db_backend.drop_memory(models_v2.DATABASE_PATH)
+        assert not db_backend.exists(models_v2.DATABASE_PATH)
+        empty = db_backend.connect(models_v2.DATABASE_PATH)
+        try:
+            assert current_version(empty) == 0
+        finally:
+            empty.close()
+    finally:
+        models_v2.close_pool()
+        db_backend.drop_memory(models_v2.DATABASE_PATH)
+        db_backend.DB_BACKEND, models_v2.DATABASE_PATH = original
+
+
+if __name__ == '__main__':
+    test_dialect_sql()
+    test_upsert_file_and_memory()
+    test_connections_apply_dialect()
+    test_memory_backend_shares_database()
+    print('✓ 数据库后端测试通过')
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+数据库维护测试
+验证导入请求的 ANALYZE、按间隔执行的 optimize、空闲时截断 WAL 的检查点、
+执行记录（耗时与前后 WAL 大小）以及多进程维护锁
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_backend
+import db_maintenance
+from db_maintenance import _MaintenanceLock, request_analyze, run_once, wal_size
+from schema_migrations import migrate
+
+
+def test_maintenance_runs():
+    if db_backend.DB_BACKEND == 'sqlite-memory':
+        return  # 内存库没有 WAL 与标记文件，维护任务不执行
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'maintenance.db')
+        migrate(db_path, verbose=False)
+        # 保持一个连接打开，否则最后一个连接关闭时 SQLite 自动检查点并删除 WAL
+        conn = db_backend.connect(db_path)
+        try:
+            conn.execute('PRAGMA wal_autocheckpoint = 0')
+            conn.executemany('INSERT INTO raw_data_records (sample_number, sampling_date) VALUES (?, ?)',
+                             [(f'S{i}' * 20, '2026-01-01') for i in range(20000)])
+            conn.commit()
+            assert wal_size(db_path) >= db_maintenance.CHECKPOINT_MIN_WAL_BYTES
+
+            assert not request_analyze(10, db_path)
+            assert request_analyze(20000, db_path)
+
+            # 导入刚结束：执行 ANALYZE 与首次 optimize，WAL 仍在写入期内不做检查点
+            runs = run_once(db_path)
+            assert [run['task'] for run in runs] == ['analyze', 'optimize']
+            assert not os.path.exists(f'{db_path}.analyze-pending')
+            assert conn.execute("SELECT COUNT(*) FROM sqlite_stat1 WHERE tbl = 'raw_data_records'").fetchone()[0]
+
+            # 其他进程持有维护锁时跳过
+            with _MaintenanceLock(db_path):
+                assert run_once(db_path) == []
+
+            # WAL 空闲后截断；optimize 未到间隔不重复执行
+            idle = time.time() - db_maintenance.CHECKPOINT_IDLE_SECONDS - 1
+            os.utime(f'{db_path}-wal', (idle, idle))
+            runs = run_once(db_path)
+            assert [run['task'] for run in runs] == ['checkpoint']
+            assert runs[0]['wal_bytes_before'] >= db_maintenance.CHECKPOINT_MIN_WAL_BYTES
+            assert runs[0]['detail'].startswith('busy=0')
+
+            recorded = db_maintenance.recent_runs(db_path=db_path)
+            assert [run['task'] for run in recorded] == ['checkpoint', 'optimize', 'analyze']
+            assert all(run['duration_ms'] is not None for run in recorded)
+            assert run_once(db_path) == []
+        finally:
+            conn.close()
+
+
+if __name__ == '__main__':
+    test_maintenance_runs()
+    print('✓ 数据库维护测试通过')
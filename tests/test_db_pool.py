@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+数据库连接池测试
+验证连接复用、归还时回滚未提交事务、重复 close() 无副作用及 get_db() 的提交/回滚约定，
+以及恢复备份经在线备份 API 写入、其他进程调用 reset_pools() 后本进程丢弃旧连接
+"""
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_backend
+import models_v2
+from blueprints import backup_bp
+
+
+def test_pool_reuse_and_reset():
+    original = models_v2.DATABASE_PATH
+    with tempfile.TemporaryDirectory() as tmp:
+        models_v2.DATABASE_PATH = os.path.join(tmp, 'pool.db')
+        try:
+            with models_v2.get_db() as conn:
+                conn.execute('CREATE TABLE t (a INTEGER)')
+                first = conn
+
+            # get_db() 异常时回滚，连接仍归还复用
+            try:
+                with models_v2.get_db() as conn:
+                    assert conn is first
+                    conn.execute('INSERT INTO t VALUES (1)')
+                    raise ValueError
+            except ValueError:
+                pass
+
+            # 借出者留下未提交事务：归还时回滚
+            conn = models_v2.get_db_connection()
+            conn.execute('BEGIN')
+            conn.execute('INSERT INTO t VALUES (2)')
+            conn.row_factory = None
+            conn.close()
+            conn.close()
+
+            again = models_v2.get_db_connection()
+            assert again is conn
+            assert again.execute('SELECT COUNT(*) AS n FROM t').fetchone()['n'] == 0
+            assert again.execute('PRAGMA foreign_keys').fetchone()[0] == 1
+            again.close()
+
+            stats = {s['autocommit']: s for s in models_v2.pool_stats() if s['path'] == models_v2.DATABASE_PATH}
+            assert stats[False]['created'] == 1 and stats[True]['created'] == 1
+        finally:
+            models_v2.close_pool()
+            models_v2.DATABASE_PATH = original
+
+
+def test_restore_resets_pools():
+    if db_backend.DB_BACKEND == 'sqlite-memory':
+        return  # 内存库只在本进程可见
+    original = (models_v2.DATABASE_PATH, backup_bp.DATABASE_PATH)
+    with tempfile.TemporaryDirectory() as tmp:
+        models_v2.DATABASE_PATH = backup_bp.DATABASE_PATH = os.path.join(tmp, 'pool.db')
+        try:
+            with models_v2.get_db() as conn:
+                conn.execute('CREATE TABLE t (a INTEGER)')
+                conn.execute('INSERT INTO t VALUES (1)')
+            backup_file = os.path.join(tmp, 'backup.db')
+            backup_bp._save_database_copy(backup_file)
+            with models_v2.get_db() as conn:
+                conn.execute('INSERT INTO t VALUES (2)')
+                pooled = conn
+
+            # 其他进程恢复备份：内容经在线备份 API 写入，WAL 截断
+            checked_out = models_v2.get_db_connection()
+            subprocess.run([sys.executable, '-c', (
+                'import sys; sys.path.insert(0, sys.argv[1]); import models_v2; '
+                'from blueprints import backup_bp; '
+                'models_v2.DATABASE_PATH = backup_bp.DATABASE_PATH = sys.argv[2]; '
+                'backup_bp._load_database_copy(sys.argv[3]); models_v2.reset_pools()'
+            ), os.path.dirname(os.path.dirname(os.path.abspath(__file__))), models_v2.DATABASE_PATH, backup_file],
+                check=True, capture_output=True)
+            assert os.path.getsize(f'{models_v2.DATABASE_PATH}-wal') == 0
+
+            # 本进程的空闲连接与恢复前借出的连接均不再复用
+            with models_v2.get_db() as conn:
+                assert conn is not pooled
+                assert [row['a'] for row in conn.execute('SELECT a FROM t')] == [1]
+            checked_out.close()
+            again = models_v2.get_db_connection()
+            assert again is not checked_out
+            again.close()
+            try:
+                checked_out.execute('SELECT 1')
+                assert False, '恢复前借出的连接应已关闭'
+            except sqlite3.ProgrammingError:
+                pass
+        finally:
+            models_v2.close_pool()
+            models_v2.DATABASE_PATH, backup_bp.DATABASE_PATH = original
+
+
+if __name__ == '__main__':
+    test_pool_reuse_and_reset()
+    test_restore_resets_pools()
+    print('✓ 连接池测试通过')
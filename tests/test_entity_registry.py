@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+已知实体注册表测试
+验证名称规范化、三元组模糊建议、缺表来源不影响其他来源，以及写入后缓存失效
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_backend
+from entity_registry import EntitySet, get_entity_registry
+from models_v2 import create_cache_version_triggers
+from raw_data_validator import RawDataValidator
+
+
+def _make_db(path):
+    # 不建 plants 表：旧库常见情形
+    conn = db_backend.connect(path)
+    conn.executescript('''
+        CREATE TABLE cache_versions (name TEXT PRIMARY KEY, version INTEGER NOT NULL DEFAULT 0,
+                                     updated_at TIMESTAMP);
+        CREATE TABLE companies (id INTEGER PRIMARY KEY, name TEXT);
+        CREATE TABLE customers (id INTEGER PRIMARY KEY, inspected_unit TEXT, water_plant TEXT);
+        CREATE TABLE raw_data_records (id INTEGER PRIMARY KEY, sample_number TEXT,
+                                       company_name TEXT, plant_name TEXT);
+        INSERT INTO companies (name) VALUES ('城东供水有限公司');
+        INSERT INTO customers (inspected_unit, water_plant) VALUES ('城西水务集团', '城西第二水厂');
+        INSERT INTO raw_data_records (sample_number, company_name, plant_name)
+            VALUES ('S1', '城东供水有限公司', '城东水厂');
+    ''')
+    create_cache_version_triggers(conn.cursor())
+    conn.commit()
+    conn.close()
+
+
+def test_suggest():
+    """规范化后相同直接命中，相近名称给出建议，差异过大不建议"""
+    names = EntitySet(['城东水厂', '城西第二水厂', 'ＡＢＣ水厂（北区）'])
+    assert names.suggest('城东 水厂') == '城东水厂'
+    assert names.suggest('abc水厂(北区)') == 'ＡＢＣ水厂（北区）'
+    assert names.suggest('城西第二水场') == '城西第二水厂'
+    assert names.suggest('南郊净水站') is None
+    assert '城东 水厂' not in names
+
+
+def test_registry_sources_and_invalidation():
+    """plants 表缺失时其余来源照常加载；写入后重建，元信息校核给出建议"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'entities.db')
+        _make_db(db_path)
+        registry = get_entity_registry(db_path)
+        assert registry.plants.names == {'城东水厂', '城西第二水厂'}
+        assert registry.companies.names == {'城东供水有限公司', '城西水务集团'}
+        assert get_entity_registry(db_path) is registry
+
+        conn = db_backend.connect(db_path)
+        conn.execute("INSERT INTO customers (inspected_unit, water_plant) VALUES ('南郊水务', '南郊水厂')")
+        conn.commit()
+        conn.close()
+        registry = get_entity_registry(db_path)
+        assert '南郊水厂' in registry.plants
+
+        samples = [{'样品编号': 'S2', '被检单位': '城东供水有限公司', '被检水厂': '城西第二水场',
+                    '样品类型': '出厂水', '采样日期': '2026-01-05'}]
+        results = RawDataValidator(db_path).validate(samples, {})
+        messages = [r['message'] for r in results if r['category'] == '元信息']
+        assert messages == ['被检水厂 "城西第二水场" 不在系统已有水厂中，请确认（是否为 "城西第二水厂"？）']
+
+
+if __name__ == '__main__':
+    test_suggest()
+    test_registry_sources_and_invalidation()
+    print('✓ 实体注册表测试通过')
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+索引目录测试
+验证迁移后目录中的索引齐全、字段变化时按目录重建，
+以及热点接口查询的执行计划全部为索引查找（不出现 SCAN，包括按索引顺序的整表扫描）
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_backend
+import report_repository
+from blueprints.customer_bp import CUSTOMER_LIST_SELECT
+from blueprints.report_workflow_bp import REPORT_LIST_SELECT
+from index_catalog import INDEX_CATALOG, apply_index_catalog
+from schema_migrations import migrate
+
+# (接口, SQL, 参数)：与各接口中的查询条件保持一致
+HOT_QUERIES = [
+    ('GET /api/reports/pending-submit', REPORT_LIST_SELECT + '''
+        WHERE r.created_by = ? AND (r.review_status = 'draft' OR r.review_status = 'rejected' OR r.review_status IS NULL)
+          AND (r.created_at, r.id) < (?, ?)
+        ORDER BY r.created_at DESC, r.id DESC LIMIT ?
+    ''', (1, '2026-01-01 00:00:00', 100, 51)),
+    ('GET /api/reports/submitted?date=', REPORT_LIST_SELECT + '''
+        WHERE r.created_by = ? AND r.review_status IN ('pending', 'approved', 'rejected')
+          AND r.created_at >= ? AND r.created_at < ?
+        ORDER BY r.created_at DESC, r.id DESC LIMIT ?
+    ''', (1, '2026-01-01', '2026-01-02', 51)),
+    ('GET /api/reports/review?status=', REPORT_LIST_SELECT + '''
+        WHERE r.review_status = ? AND (r.created_at, r.id) < (?, ?)
+        ORDER BY r.created_at DESC, r.id DESC LIMIT ?
+    ''', ('pending', '2026-01-01 00:00:00', 100, 51)),
+    ('GET /api/customers?limit=', CUSTOMER_LIST_SELECT + '''
+        WHERE (created_at, id) < (?, ?) ORDER BY created_at DESC, id DESC LIMIT ?
+    ''', ('2026-01-01 00:00:00', 100, 51)),
+    ('GET /api/sample-types?limit=', '''
+        SELECT id, name, code FROM sample_types
+        WHERE (created_at, id) < (?, ?) ORDER BY created_at DESC, id DESC LIMIT ?
+    ''', ('2026-01-01 00:00:00', 100, 51)),
+    ('GET /api/reports/<id> 报告头', report_repository.REPORT_HEADER_SQL, (1,)),
+    ('GET /api/reports/<id> 检测数据', report_repository.DETECTION_DATA_SQL, (1,)),
+    ('批量检测数据', report_repository._detection_data_batch_sql(4), (1, 2, 3, 3)),
+    ('GET /api/reports/<id> 模板字段', report_repository.TEMPLATE_FIELD_VALUES_SQL, (1,)),
+    ('GET /api/reports/<id>/review-history', '''
+        SELECT rh.*, u.username as reviewer_name
+        FROM review_history rh
+        LEFT JOIN users u ON rh.reviewer_id = u.id
+        WHERE rh.report_id = ?
+        ORDER BY rh.reviewed_at DESC
+    ''', (1,)),
+    ('DELETE /api/sample-types/<id> 引用检查', 'SELECT id FROM reports WHERE sample_type_id = ?', (1,)),
+    ('DELETE /api/indicators/<id> 引用检查', 'SELECT COUNT(*) as count FROM report_data WHERE indicator_id = ?', (1,)),
+    ('GET /api/logs', '''
+        SELECT ol.*, u.username
+        FROM operation_logs ol
+        LEFT JOIN users u ON ol.user_id = u.id
+        WHERE 1=1 AND ol.user_id = ? AND ol.operation_type = ?
+        ORDER BY ol.created_at DESC LIMIT ? OFFSET ?
+    ''', (1, '登录', 50, 0)),
+    ('GET /api/raw-data/for-report', '''
+        SELECT record_id, column_name, value FROM raw_data_values
+        WHERE record_id IN (?, ?) ORDER BY id
+    ''', (1, 2)),
+]
+
+
+def _full_scans(conn, sql, params):
+    """执行计划中的整表扫描（SCAN t 或 SCAN t USING INDEX ...）"""
+    plan = conn.execute(f'EXPLAIN QUERY PLAN {sql}', params).fetchall()
+    return [row[3] for row in plan if row[3].startswith('SCAN ')]
+
+
+def test_catalog_applied_and_plans():
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'index.db')
+        migrate(db_path, verbose=False)
+        conn = db_backend.connect(db_path)
+        try:
+            indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+            assert {name for name, _, _ in INDEX_CATALOG} <= indexes
+
+            for endpoint, sql, params in HOT_QUERIES:
+                scans = _full_scans(conn, sql, params)
+                assert not scans, f'{endpoint} 出现全表扫描: {scans}'
+
+            # 同名索引字段与目录不一致时按目录重建，已对齐时不做变更
+            conn.execute('DROP INDEX idx_reports_created_by_created_at')
+            conn.execute('CREATE INDEX idx_reports_created_by_created_at ON reports(created_by)')
+            assert apply_index_catalog(conn.cursor()) == ['idx_reports_created_by_created_at']
+            assert apply_index_catalog(conn.cursor()) == []
+        finally:
+            conn.close()
+
+
+if __name__ == '__main__':
+    test_catalog_applied_and_plans()
+    print('✓ 索引目录测试通过')
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+指标解析器测试
+验证名称规范化、正向解析（原始列名→指标）、按样品类型限定候选、
+批量反查（指标→原始列名）、写入后缓存失效及新映射的攒批回写
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_backend
+from indicator_resolver import (IndicatorResolver, flush_learned_mappings, get_indicator_resolver,
+                                learn_mappings, name_chain)
+from models_v2 import create_cache_version_triggers
+
+INDICATORS = ['硝酸盐(以N计)', '铬(六价)', '挥发酚类(以苯酚计)', '三氯甲烷', 'pH', '浑浊度',
+              '氨(以N计)', '总硬度(以CaCO3计)', 'O3']
+
+
+def _resolver(mappings=None):
+    indicators = {
+        i: {'indicator_id': i, 'indicator_name': name, 'unit': '', 'limit_value': '', 'detection_method': ''}
+        for i, name in enumerate(INDICATORS, start=1)
+    }
+    return IndicatorResolver(indicators, mappings or {})
+
+
+def _name(resolver, ind_id):
+    return resolver.indicators[ind_id]['indicator_name'] if ind_id else None
+
+
+def test_name_chain():
+    """全角括号、空白、大小写统一，逐层去除末尾括号"""
+    assert name_chain('硝酸盐（以N计） (mg/L)') == ['硝酸盐(以n计)(mg/l)', '硝酸盐(以n计)', '硝酸盐']
+    assert name_chain('PH值') == ['ph']
+    assert name_chain('') == []
+
+
+def test_resolve():
+    """精确、去括号、别名、下标数字、笔误及已固化映射"""
+    resolver = _resolver({'自定义列': 3})
+    cases = {
+        '硝酸盐(以N计)(mg/L)': '硝酸盐(以N计)',
+        '硝酸盐(mg/L)': '硝酸盐(以N计)',
+        '六价铬(mg/L)': '铬(六价)',
+        '挥发酚': '挥发酚类(以苯酚计)',
+        '氨氮(mg/L)': '氨(以N计)',
+        'O₃': 'O3',
+        'PH值': 'pH',
+        '浊度(NTU)': '浑浊度',
+        '自定义列': '挥发酚类(以苯酚计)',
+        '未知指标': None,
+    }
+    assert {raw: _name(resolver, i) for raw, i in resolver.resolve_many(cases).items()} == cases
+    # 限定候选范围：固化映射不在范围内时按名称规则匹配
+    assert resolver.resolve('自定义列', allowed={1, 2}) is None
+    assert _name(resolver, resolver.resolve('硝酸盐', allowed={1})) == '硝酸盐(以N计)'
+    assert resolver.resolve('硝酸盐', allowed={2}) is None
+
+
+def test_match_columns():
+    """反查：固化映射、同名、去括号与反向别名"""
+    resolver = _resolver({'NO3-N': 1})
+    raw_columns = ['六价铬(mg/L)', '三氯甲烷(mg/L)', 'pH', '挥发酚(mg/L)']
+    assert resolver.match_columns(['硝酸盐(以N计)', '铬(六价)', '三氯甲烷', 'pH', '挥发酚类(以苯酚计)', '浑浊度'],
+                                  raw_columns) == {
+        '硝酸盐(以N计)': 'NO3-N',
+        '铬(六价)': '六价铬(mg/L)',
+        '三氯甲烷': '三氯甲烷(mg/L)',
+        'pH': 'pH',
+        '挥发酚类(以苯酚计)': '挥发酚(mg/L)',
+    }
+
+
+def _make_db(db_path):
+    conn = db_backend.connect(db_path)
+    conn.executescript('''
+        CREATE TABLE cache_versions (name TEXT PRIMARY KEY, version INTEGER NOT NULL DEFAULT 0,
+                                     updated_at TIMESTAMP);
+        CREATE TABLE indicators (id INTEGER PRIMARY KEY, name TEXT, unit TEXT,
+                                 limit_value TEXT, detection_method TEXT);
+        CREATE TABLE raw_data_field_mapping (id INTEGER PRIMARY KEY, raw_field_name TEXT UNIQUE,
+                                             indicator_id INTEGER, indicator_name TEXT);
+        INSERT INTO indicators (name) VALUES ('浑浊度'), ('色度');
+    ''')
+    create_cache_version_triggers(conn.cursor())
+    conn.commit()
+    return conn
+
+
+def test_cache_invalidation():
+    """新增字段映射后进程级解析器重建"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'indicators.db')
+        conn = _make_db(db_path)
+
+        first = get_indicator_resolver(db_path)
+        assert get_indicator_resolver(db_path) is first
+        assert first.resolve('色') is None
+
+        conn.execute("INSERT INTO raw_data_field_mapping (raw_field_name, indicator_id, indicator_name) "
+                     "VALUES ('色', 2, '色度')")
+        conn.commit()
+        conn.close()
+        second = get_indicator_resolver(db_path)
+        assert second is not first
+        assert second.resolve('色') == 2
+
+
+def test_learn_write_behind():
+    """新映射立即生效；攒批回写后本进程推进版本号而不重建，其他写入仍使缓存失效"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'indicators.db')
+        _make_db(db_path).close()
+
+        resolver = get_indicator_resolver(db_path)
+        assert resolver.resolve('色') is None
+        assert learn_mappings([('色', 2, '色度'), ('浊', 1, '浑浊度')], db_path) == 2
+        assert learn_mappings([('色', 1, '浑浊度')], db_path) == 0
+        assert resolver.resolve('色') == 2
+        assert resolver.id_to_raws == {2: ['色'], 1: ['浊']}
+
+        assert flush_learned_mappings(db_path) == 2
+        conn = db_backend.connect(db_path)
+        assert dict(conn.execute('SELECT raw_field_name, indicator_id FROM raw_data_field_mapping')) == {
+            '色': 2, '浊': 1}
+        assert get_indicator_resolver(db_path) is resolver
+
+        conn.execute("INSERT INTO raw_data_field_mapping (raw_field_name, indicator_id) VALUES ('色号', 2)")
+        conn.commit()
+        conn.close()
+        assert get_indicator_resolver(db_path) is not resolver
+
+
+if __name__ == '__main__':
+    test_name_chain()
+    test_resolve()
+    test_match_columns()
+    test_cache_invalidation()
+    test_learn_write_behind()
+    print('✓ 指标解析器测试通过')
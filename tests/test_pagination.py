@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+游标分页测试
+验证按 (created_at, id) 翻页不重复不遗漏（含同一时间的多条记录）、翻页期间新增记录不影响后续页、
+计数缓存在报告表写入后失效、列表从 remark 中提取客户信息，以及游标与日期参数校验
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_backend
+import pagination
+from blueprints.report_workflow_bp import REPORT_LIST_SELECT
+from pagination import PaginationError, cached_count, day_range, decode_cursor, keyset_page, page_args
+from schema_migrations import migrate
+
+
+def _insert(conn, number, created_at):
+    conn.execute("INSERT INTO reports (report_number, sample_number, sample_type_id, created_by, "
+                 "review_status, created_at) VALUES (?, ?, 1, 1, 'pending', ?)",
+                 (f'R{number}', f'S{number}', created_at))
+
+
+def test_keyset_pages():
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'pagination.db')
+        migrate(db_path, verbose=False)
+        conn = db_backend.connect(db_path)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("INSERT INTO sample_types (id, name, code) VALUES (1, '出厂水', 'CCS')")
+            # 每 3 条记录同一创建时间
+            for number in range(25):
+                _insert(conn, number, f'2026-01-{number // 3 + 1:02d} 08:00:00')
+            conn.commit()
+
+            conditions, params = ['r.review_status = ?'], ['pending']
+            seen = []
+            cursor = None
+            while True:
+                page = keyset_page(conn, REPORT_LIST_SELECT, conditions, params, 4, cursor,
+                                   sort=('r.created_at', 'r.id'))
+                seen.extend(item['id'] for item in page['items'])
+                if page['next_cursor'] is None:
+                    break
+                cursor = decode_cursor(page['next_cursor'])
+                if len(seen) == 8:
+                    # 翻页期间新增的较新记录不出现在后续页
+                    _insert(conn, 99, '2026-02-01 08:00:00')
+                    conn.commit()
+            assert len(seen) == 25 and len(set(seen)) == 25
+            assert set(page['items'][0]) >= {'id', 'report_number', 'sample_type_name', 'company_name',
+                                             'template_name', 'created_at'}
+
+            # 计数缓存：报告表写入后失效
+            pagination._counts.clear()
+            assert cached_count(conn, 'reports', 'FROM reports r', conditions, params) == 26
+            conn.execute("UPDATE reports SET review_status = 'approved' WHERE report_number = 'R0'")
+            conn.commit()
+            assert cached_count(conn, 'reports', 'FROM reports r', conditions, params) == 25
+
+            conn.execute('''UPDATE reports SET remark = '{"customer_unit": "城东供水", "customer_plant": "城东水厂"}'
+                            WHERE report_number = 'R4' ''')
+            conn.execute("UPDATE reports SET remark = '加急' WHERE report_number = 'R3'")
+            conn.commit()
+            start, end = day_range('2026-01-02')
+            assert (start, end) == ('2026-01-02', '2026-01-03')
+            day = keyset_page(conn, REPORT_LIST_SELECT, ['r.created_at >= ?', 'r.created_at < ?'],
+                              [start, end], 50, None, sort=('r.created_at', 'r.id'))
+            assert [item['report_number'] for item in day['items']] == ['R5', 'R4', 'R3']
+            assert [(item['customer_unit'], item['customer_plant']) for item in day['items']] == [
+                (None, None), ('城东供水', '城东水厂'), (None, None)]
+            assert 'remark' not in day['items'][0]
+        finally:
+            conn.close()
+
+    for args in ({'limit': 'x'}, {'limit': '0'}, {'cursor': 'not-a-cursor'}):
+        try:
+            page_args(args)
+            assert False, args
+        except PaginationError:
+            pass
+    assert page_args({'limit': '100000'})[0] == pagination.MAX_PAGE_SIZE
+    try:
+        day_range('2026-13-01')
+        assert False
+    except PaginationError:
+        pass
+
+
+if __name__ == '__main__':
+    test_keyset_pages()
+    print('✓ 游标分页测试通过')
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+历史基线统计测试
+验证 Welford 均值/方差、P² 分位数估计、分批增量更新与一次性计算一致，
+以及校核引擎对偏离本厂历史常态数值的识别（已导入样品按留一法比对）
+"""
+import os
+import random
+import sys
+import tempfile
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_backend
+from raw_data_baseline import (BASELINE_MIN_COUNT, IndicatorStats, load_indicator_stats, rebuild_indicator_stats,
+                               update_indicator_stats)
+from raw_data_validator import RawDataValidator
+from schema_migrations import migrate
+
+
+def _make_db(path):
+    conn = db_backend.connect(path)
+    conn.execute('''
+        CREATE TABLE raw_data_indicator_stats (
+            plant_name TEXT NOT NULL, sample_type TEXT NOT NULL DEFAULT '', indicator TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0, mean REAL NOT NULL DEFAULT 0, m2 REAL NOT NULL DEFAULT 0,
+            sketch TEXT, updated_at TIMESTAMP, PRIMARY KEY (plant_name, sample_type, indicator)
+        )
+    ''')
+    conn.commit()
+    return conn
+
+
+def test_streaming_stats_accuracy():
+    """Welford 与 numpy 一致，P² 分位数误差在容许范围内"""
+    rnd = np.random.default_rng(1)
+    values = rnd.lognormal(mean=-1.5, sigma=0.4, size=5000)
+    stats = IndicatorStats()
+    for v in values:
+        stats.add(float(v))
+
+    assert stats.count == len(values)
+    assert abs(stats.mean - values.mean()) < 1e-12
+    assert abs(stats.std - values.std(ddof=1)) < 1e-12
+    spread = np.percentile(values, 95) - np.percentile(values, 5)
+    for p in (0.05, 0.5, 0.95):
+        assert abs(stats.quantile(p) - np.percentile(values, p * 100)) < 0.05 * spread
+
+
+def test_incremental_update_matches_single_pass():
+    """分批写入数据库的增量结果与一次性计算一致"""
+    rnd = random.Random(3)
+    values = [rnd.gauss(0.2, 0.05) for _ in range(200)]
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = _make_db(os.path.join(tmp, 'stats.db'))
+        for i in range(0, len(values), 37):
+            update_indicator_stats(conn, [('一水厂', '出厂水', '浑浊度(NTU)', v) for v in values[i:i + 37]])
+        conn.commit()
+        stored = load_indicator_stats(conn, ['一水厂'])[('一水厂', '出厂水', '浑浊度(NTU)')]
+        conn.close()
+
+    expected = IndicatorStats()
+    for v in values:
+        expected.add(v)
+    assert stored.count == expected.count
+    assert abs(stored.mean - expected.mean) < 1e-12
+    assert abs(stored.m2 - expected.m2) < 1e-9
+    for p in (0.05, 0.5, 0.95):
+        assert abs(stored.quantile(p) - expected.quantile(p)) < 1e-12
+
+
+def test_validator_flags_baseline_outlier():
+    """限值内但为本厂常态十倍的浑浊度被标记，其他水厂与常规数值不受影响"""
+    rnd = random.Random(5)
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'stats.db')
+        conn = _make_db(db_path)
+        update_indicator_stats(conn, [('一水厂', '出厂水', '浑浊度(NTU)', rnd.uniform(0.08, 0.12))
+                                      for _ in range(100)])
+        conn.commit()
+        conn.close()
+
+        samples = [
+            {'样品编号': 'S1', '被检水厂': '一水厂', '样品类型': '出厂水', '采样日期': '2026-01-05'},
+            {'样品编号': 'S2', '被检水厂': '一水厂', '样品类型': '出厂水', '采样日期': '2026-01-05'},
+            {'样品编号': 'S3', '被检水厂': '二水厂', '样品类型': '出厂水', '采样日期': '2026-01-05'},
+        ]
+        data = {'S1': {'浑浊度(NTU)': '1.0'}, 'S2': {'浑浊度(NTU)': '0.11'}, 'S3': {'浑浊度(NTU)': '1.0'}}
+        for engine in RawDataValidator.ENGINES:
+            results = RawDataValidator(db_path, engine=engine).validate(samples, data)
+            flagged = [(r['sample'], r['level']) for r in results if r['category'] == '历史基线']
+            assert flagged == [('S1', 'warning')], engine
+
+
+def test_stored_outlier_scored_leave_one_out():
+    """已导入的离群值不计入自身的比对基线：恰好 BASELINE_MIN_COUNT 个历史值加一个离群值时仍被标记"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'stored.db')
+        migrate(db_path, verbose=False)
+        values = [0.09 if i % 2 else 0.11 for i in range(BASELINE_MIN_COUNT)] + [5.0]
+        conn = db_backend.connect(db_path)
+        for i, value in enumerate(values):
+            cur = conn.execute("INSERT INTO raw_data_records (sample_number, plant_name, sample_type, sampling_date) "
+                               "VALUES (?, '一水厂', '出厂水', '2026-01-05')", (f'S{i:02d}',))
+            conn.execute("INSERT INTO raw_data_values (record_id, column_name, value) VALUES (?, '浑浊度(NTU)', ?)",
+                         (cur.lastrowid, str(value)))
+        rebuild_indicator_stats(conn)
+        conn.commit()
+        conn.close()
+
+        numbers = [f'S{i:02d}' for i in range(len(values))]
+        for engine in RawDataValidator.ENGINES:
+            results = RawDataValidator(db_path, engine=engine).validate_from_db(numbers)
+            flagged = [r for r in results if r['category'] == '历史基线']
+            assert [(r['sample'], r['level']) for r in flagged] == [(numbers[-1], 'warning')], engine
+            # 比对基线为其余 20 个值（均值 0.1），不含离群值自身
+            message = flagged[0]['message']
+            assert '历史均值 0.1 ' in message and f'历史样本 {BASELINE_MIN_COUNT} 个' in message
+
+    stats = IndicatorStats()
+    for v in (1.0, 2.0, 3.0, 10.0):
+        stats.add(v)
+    rest = stats.without(10.0)
+    assert (rest.count, rest.mean) == (3, 2.0) and abs(rest.std - 1.0) < 1e-12
+
+
+if __name__ == '__main__':
+    test_streaming_stats_accuracy()
+    test_incremental_update_matches_single_pass()
+    test_validator_flags_baseline_outlier()
+    test_stored_outlier_scored_leave_one_out()
+    print('✓ 历史基线统计测试通过')
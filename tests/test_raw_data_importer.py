@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+原始数据导入测试
+验证 abort 模式遇到重复样品编号时整个文件不导入（开启与未开启写队列）、同一文件内重复样品按覆盖处理，
+导入后只读快照失效、导出能读到新导入的样品，以及覆盖与删除记录后历史基线统计按组重建
+"""
+import os
+import sys
+import tempfile
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import models_v2
+import raw_data_importer
+import read_snapshot
+import write_queue
+from raw_data_baseline import load_indicator_stats, rebuild_indicator_stats
+from raw_data_importer import RawDataImporter
+from schema_migrations import migrate
+
+
+def _write_excel(path, samples):
+    """转置布局：第一行为样品编号，第一列为字段名"""
+    fields = ['报告编号', '被检单位', '被检水厂', '样品类型', '采样日期', '浑浊度(NTU)']
+    rows = [[''] + [s[0] for s in samples]]
+    for i, field in enumerate(fields):
+        rows.append([field] + [s[1][i] for s in samples])
+    pd.DataFrame(rows).to_excel(path, sheet_name='数据导入', header=False, index=False)
+
+
+def _sample(number, turbidity, date='2026-01-05'):
+    return number, (f'R{number}', '供水公司', '一水厂', '出厂水', date, turbidity)
+
+
+def _records(conn):
+    return dict(conn.execute('''
+        SELECT r.sample_number, v.value FROM raw_data_records r
+        JOIN raw_data_values v ON v.record_id = r.id AND v.column_name = '浑浊度(NTU)'
+    ''').fetchall())
+
+
+def _turbidity_stats(conn):
+    stats = load_indicator_stats(conn, ['一水厂'])[('一水厂', '出厂水', '浑浊度(NTU)')]
+    return stats.count, round(stats.mean, 6)
+
+
+def test_import_abort_and_overwrite():
+    original = (models_v2.DATABASE_PATH, write_queue.DB_WRITE_QUEUE, raw_data_importer.IMPORT_WRITE_CHUNK)
+    with tempfile.TemporaryDirectory() as tmp:
+        models_v2.DATABASE_PATH = os.path.join(tmp, 'import.db')
+        try:
+            migrate(verbose=False)
+            first = os.path.join(tmp, 'first.xlsx')
+            _write_excel(first, [_sample('S1', '0.1')])
+            assert RawDataImporter().import_excel(first, strict_columns=False)['success_count'] == 1
+
+            # 重复样品位于文件中间：abort 时其前面的样品也不写入
+            second = os.path.join(tmp, 'second.xlsx')
+            _write_excel(second, [_sample('S2', '0.2'), _sample('S3', '0.3'), _sample('S1', '0.9')])
+            for queue in (False, True):
+                write_queue.DB_WRITE_QUEUE = queue
+                raw_data_importer.IMPORT_WRITE_CHUNK = 1
+                result = RawDataImporter().import_excel(second, on_duplicate='abort', strict_columns=False)
+                assert not result['success'] and result['success_count'] == 0
+                with models_v2.get_db() as conn:
+                    assert _records(conn) == {'S1': '0.1'}
+
+            with read_snapshot.snapshot_db() as (conn, _):
+                assert _records(conn) == {'S1': '0.1'}
+
+            # 同一文件内重复的样品编号：后出现的覆盖先出现的
+            third = os.path.join(tmp, 'third.xlsx')
+            _write_excel(third, [_sample('S4', '0.4'), _sample('S5', '0.5'), _sample('S4', '0.6')])
+            result = RawDataImporter().import_excel(third, on_duplicate='overwrite', strict_columns=False)
+            assert result['success'] and result['success_count'] == 3
+            with models_v2.get_db() as conn:
+                assert _records(conn) == {'S1': '0.1', 'S4': '0.6', 'S5': '0.5'}
+            # 导入后快照失效，导出读到新导入的样品
+            with read_snapshot.snapshot_db() as (conn, _):
+                assert _records(conn) == {'S1': '0.1', 'S4': '0.6', 'S5': '0.5'}
+
+            # 被覆盖的 S4 (0.4) 不再计入历史基线；删除记录后重建该组同样撤销其观测值
+            with models_v2.get_db() as conn:
+                assert _turbidity_stats(conn) == (3, 0.4)
+                conn.execute("DELETE FROM raw_data_records WHERE sample_number = 'S5'")
+                rebuild_indicator_stats(conn, [('一水厂', '出厂水')])
+                assert _turbidity_stats(conn) == (2, 0.35)
+        finally:
+            models_v2.close_pool()
+            (models_v2.DATABASE_PATH, write_queue.DB_WRITE_QUEUE,
+             raw_data_importer.IMPORT_WRITE_CHUNK) = original
+
+
+if __name__ == '__main__':
+    test_import_abort_and_overwrite()
+    print('✓ 原始数据导入测试通过')
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+原始数据匹配器测试
+验证批量读取、客户与样品类型回退匹配、客户信息、按样品类型限定指标及新映射的累积与保存
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_backend
+from indicator_resolver import IndicatorResolver
+from raw_data_matcher import RawDataMatcher
+
+
+def _make_db():
+    conn = db_backend.connect(':memory:')
+    conn.executescript('''
+        CREATE TABLE customers (id INTEGER PRIMARY KEY, inspected_unit TEXT, water_plant TEXT, unit_address TEXT,
+                                contact_person TEXT, contact_phone TEXT, email TEXT);
+        CREATE TABLE companies (id INTEGER PRIMARY KEY, name TEXT);
+        CREATE TABLE sample_types (id INTEGER PRIMARY KEY, name TEXT, code TEXT);
+        CREATE TABLE indicator_groups (id INTEGER PRIMARY KEY, name TEXT, sort_order INTEGER);
+        CREATE TABLE indicators (id INTEGER PRIMARY KEY, name TEXT, unit TEXT, limit_value TEXT,
+                                 detection_method TEXT, default_value TEXT, group_id INTEGER, sort_order INTEGER);
+        CREATE TABLE template_indicators (id INTEGER PRIMARY KEY, sample_type_id INTEGER, indicator_id INTEGER,
+                                          limit_value TEXT, sort_order INTEGER);
+        CREATE TABLE raw_data_records (id INTEGER PRIMARY KEY, sample_number TEXT, company_name TEXT,
+                                       plant_name TEXT, sample_type TEXT, sampling_date TEXT, report_number TEXT);
+        CREATE TABLE raw_data_values (id INTEGER PRIMARY KEY, record_id INTEGER, column_name TEXT, value TEXT);
+        CREATE TABLE raw_data_field_mapping (id INTEGER PRIMARY KEY, raw_field_name TEXT UNIQUE,
+                                             indicator_id INTEGER, indicator_name TEXT);
+
+        INSERT INTO customers (inspected_unit, water_plant, contact_person) VALUES ('城东供水', '城东水厂', '王工');
+        INSERT INTO companies (name) VALUES ('城西供水');
+        INSERT INTO sample_types (name, code) VALUES ('出厂水', 'CCS'), ('出厂水', 'CCS2');
+        INSERT INTO indicators (name, unit, default_value) VALUES ('浑浊度', 'NTU', ''), ('铬(六价)', 'mg/L', ''),
+                                                                  ('色度', '度', '<5');
+        INSERT INTO template_indicators (sample_type_id, indicator_id, sort_order) VALUES (2, 1, 1), (2, 2, 2);
+        INSERT INTO raw_data_records (sample_number, company_name, plant_name, sample_type, sampling_date)
+            VALUES ('S1', '城东供水', '其他水厂', '出厂水|CCS2', '2026-01-05'),
+                   ('S2', '城西供水', '城西水厂', '管网水', '2026-01-06');
+        INSERT INTO raw_data_values (record_id, column_name, value)
+            VALUES (1, '浑浊度(NTU)', '0.3'), (1, '六价铬(mg/L)', '<0.004'), (1, '色度', '5'),
+                   (2, '浑浊度', '0.2');
+    ''')
+    return conn
+
+
+def test_match_batch():
+    conn = _make_db()
+    cursor = conn.cursor()
+    indicators = {
+        row[0]: {'indicator_id': row[0], 'indicator_name': row[1], 'unit': row[2],
+                 'limit_value': '', 'detection_method': ''}
+        for row in conn.execute('SELECT id, name, unit FROM indicators')
+    }
+    matcher = RawDataMatcher(cursor, IndicatorResolver(indicators, {}))
+    records = matcher.load_records(['S1', 'S2', 'S3', 'S1'])
+    assert sorted(records) == ['S1', 'S2']
+
+    first = matcher.match(*records['S1'])
+    # 单位+水厂未命中时回退按单位匹配客户；"名称|代码" 按代码区分
+    assert (first['customer_id'], first['company_id']) == (1, None)
+    info = matcher.customer_info(first['customer_id'])
+    assert (info['customer_unit'], info['customer_plant'], info['customer_contact']) == ('城东供水', '城东水厂', '王工')
+    assert (first['sample_type'], first['sample_type_id']) == ('出厂水', 2)
+    assert [item['indicator_name'] for item in first['detection_items']] == ['浑浊度', '铬(六价)']
+    # 色度不在该样品类型的模板指标中
+    assert [item['indicator_name'] for item in first['unmatched_items']] == ['色度']
+
+    second = matcher.match(*records['S2'])
+    assert (second['customer_id'], second['company_id'], second['sample_type_id']) == (None, 1, None)
+    assert [item['indicator_name'] for item in second['detection_items']] == ['浑浊度']
+
+    assert matcher.save_mappings() == 2
+    assert dict(conn.execute('SELECT raw_field_name, indicator_id FROM raw_data_field_mapping')) == {
+        '浑浊度(NTU)': 1, '六价铬(mg/L)': 2}
+    assert matcher.save_mappings() == 0
+
+
+if __name__ == '__main__':
+    test_match_batch()
+    print('✓ 原始数据匹配器测试通过')
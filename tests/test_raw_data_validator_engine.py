@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+校核引擎测试
+以逐样品遍历的 loop 实现为参考，验证矩阵版校核引擎及其多进程模式输出完全一致（含顺序），进程池子进程不执行 app_v2 的启动流程；
+验证限值解析器按样品类型取值及缓存失效；验证校核结果持久化与增量重算
+"""
+import os
+import random
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_backend
+from models_v2 import create_cache_version_triggers
+from raw_data_validator import (
+    PARALLEL_MIN_SAMPLES, LimitResolver, RawDataValidator, build_keyword_index, count_stored_levels,
+    get_limit_resolver,
+)
+
+PARAMS = [
+    'pH', '水温(℃)', '电导率(μS/cm)', '浑浊度(NTU)', '铝(mg/L)', '氟化物(mg/L)',
+    '总硬度(以CaCO3计)(mg/L)', '钙(mg/L)', '镁(mg/L)', '氨氮(mg/L)', '六价铬(mg/L)',
+    '三卤甲烷', '三氯甲烷', '高锰酸盐指数', '溶解氧', '肉眼可见物', '审核',
+]
+
+VALUES = [
+    '7.2', '6.0', '9.1', '0.35', '12', '1.200', '450.5', '-3', '1e2', '0',
+    '<0.010', '<0.002', '<0.05', '＜0.05', '< 0.010', '< 0.01 mg', '＜检出',
+    '去', '大 ', '—', '未检出', 'abc', '', '  ', None, 8.4, 0.02,
+]
+
+LIMITS = [
+    ('pH', '6.5~8.5'), ('浑浊度', '1'), ('铝', '0.2'), ('氟化物', '≤1.0(II类)'),
+    ('总硬度(以CaCO3计)', '450'), ('氨(以N计)', '0.5'), ('铬(六价)', '不应检出'),
+    ('溶解氧', '≥6(II类)'), ('三氯甲烷', '0.06'),
+]
+
+
+# 样品类型限值：出厂水的浑浊度收严；管网水的铝未单独配置，回退指标库限值
+TYPE_LIMITS = [
+    ('出厂水', 'CCS', '浑浊度', '0.5'),
+    ('出厂水', 'CCS', '铝', '0.1'),
+    ('管网水', 'GWS', '铝', ''),
+]
+
+
+def _make_db(path):
+    conn = db_backend.connect(path)
+    conn.executescript('''
+        CREATE TABLE indicators (id INTEGER PRIMARY KEY, name TEXT, unit TEXT, limit_value TEXT);
+        CREATE TABLE sample_types (id INTEGER PRIMARY KEY, name TEXT, code TEXT);
+        CREATE TABLE template_indicators (
+            id INTEGER PRIMARY KEY, sample_type_id INTEGER, indicator_id INTEGER,
+            sort_order INTEGER DEFAULT 0, limit_value TEXT
+        );
+        CREATE TABLE cache_versions (name TEXT PRIMARY KEY, version INTEGER NOT NULL DEFAULT 0,
+                                     updated_at TIMESTAMP);
+        CREATE TABLE raw_data_records (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, sample_number TEXT NOT NULL UNIQUE,
+            company_name TEXT, plant_name TEXT, sample_type TEXT, sampling_date DATE
+        );
+        CREATE TABLE raw_data_values (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, record_id INTEGER NOT NULL,
+            column_name TEXT NOT NULL, value TEXT
+        );
+        CREATE TABLE raw_data_validation_results (
+            record_id INTEGER PRIMARY KEY, content_hash TEXT NOT NULL,
+            ruleset_version TEXT NOT NULL, results TEXT NOT NULL,
+            error_count INTEGER DEFAULT 0, warning_count INTEGER DEFAULT 0,
+            notice_count INTEGER DEFAULT 0, validated_at TIMESTAMP
+        );
+    ''')
+    conn.executemany('INSERT INTO indicators (name, limit_value) VALUES (?, ?)', LIMITS)
+    for st_name, st_code, ind_name, limit_value in TYPE_LIMITS:
+        conn.execute('INSERT OR IGNORE INTO sample_types (id, name, code) '
+                     'SELECT COALESCE(MAX(id), 0) + 1, ?, ? FROM sample_types '
+                     'WHERE NOT EXISTS (SELECT 1 FROM sample_types WHERE code = ?)',
+                     (st_name, st_code, st_code))
+        conn.execute('INSERT INTO template_indicators (sample_type_id, indicator_id, limit_value) '
+                     'SELECT st.id, i.id, ? FROM sample_types st, indicators i '
+                     'WHERE st.code = ? AND i.name = ?', (limit_value, st_code, ind_name))
+    create_cache_version_triggers(conn.cursor())
+    conn.commit()
+    conn.close()
+
+
+def _make_samples(seed, n_samples):
+    rnd = random.Random(seed)
+    samples = []
+    data = {}
+    for i in range(n_samples):
+        sid = f'{"K" if i % 7 == 0 else "S"}{i:04d}'
+        samples.append({
+            '样品编号': sid,
+            '被检单位': '测试单位',
+            '被检水厂': rnd.choice(['一水厂', '二水厂']),
+            '样品类型': rnd.choice(['出厂水', '管网水', '原水']),
+            '采样日期': '2026-01-05',
+        })
+        params = rnd.sample(PARAMS, rnd.randint(0, len(PARAMS)))
+        data[sid] = {p: rnd.choice(VALUES) for p in params}
+    # 重复样品与无数据样品
+    samples.append(dict(samples[1]))
+    samples.append({'样品编号': 'S9999', '采样日期': '2026-01-05'})
+    return samples, data
+
+
+def test_matrix_engine_matches_loop_engine():
+    """矩阵版与 loop 版输出完全一致"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'limits.db')
+        _make_db(db_path)
+        for seed in range(20):
+            samples, data = _make_samples(seed, 40)
+            expected = RawDataValidator(db_path, engine='loop').validate(samples, data, '2026-01-06')
+            actual = RawDataValidator(db_path, engine='matrix').validate(samples, data, '2026-01-06')
+            assert actual == expected, f'seed={seed}'
+
+
+def test_matrix_engine_non_str_values():
+    """非字符串取值（NaN、整数、浮点数，如 pandas 读入的 Excel）与 loop 版一致"""
+    samples = [{'样品编号': f'S{i}', '采样日期': '2026-01-05', '样品类型': '出厂水'} for i in range(3)]
+    data = {
+        'S0': {'pH': '7.1', '浑浊度(NTU)': float('nan'), '铝(mg/L)': 'abc'},
+        'S1': {'pH': float('nan'), '浑浊度(NTU)': 3, '铝(mg/L)': 0.35},
+        'S2': {'pH': 7, '浑浊度(NTU)': 0.1, '铝(mg/L)': float('nan')},
+    }
+    expected = RawDataValidator(engine='loop').validate(samples, data, '2026-01-06')
+    assert RawDataValidator(engine='matrix').validate(samples, data, '2026-01-06') == expected
+
+
+def test_matrix_engine_empty_input():
+    """空输入不报错"""
+    assert RawDataValidator(engine='matrix').validate([], {}) == []
+    samples = [{'样品编号': 'S1', '采样日期': '2026-01-05', '样品类型': '出厂水'}]
+    assert RawDataValidator(engine='matrix').validate(samples, {}) == \
+        RawDataValidator(engine='loop').validate(samples, {})
+
+
+def test_parallel_matches_serial():
+    """多进程校核与串行结果完全一致（含顺序）"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'limits.db')
+        _make_db(db_path)
+        samples, data = _make_samples(11, PARALLEL_MIN_SAMPLES + 500)
+        validator = RawDataValidator(db_path)
+        expected = validator.validate(samples, data, '2026-01-06', workers=1)
+        assert validator.validate(samples, data, '2026-01-06', workers=2) == expected
+
+
+def test_pool_child_skips_app_startup():
+    """以 python3 app_v2.py 启动时，进程池子进程以 __mp_main__ 重新导入 app_v2，但不执行其启动流程"""
+    repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    script = (
+        'import os, sys, threading\n'
+        f'sys.path.insert(0, {repo!r})\n'
+        'import __main__\n'
+        # spawn 子进程按 __main__.__file__ 重新导入主模块，与 python3 app_v2.py 启动时相同
+        f'__main__.__file__ = {os.path.join(repo, "app_v2.py")!r}\n'
+        'import raw_data_validator\n'
+        'print(raw_data_validator._get_pool(1).submit(threading.active_count).result(timeout=120))\n'
+    )
+    env = {k: v for k, v in os.environ.items() if k != 'SCHEMA_AUTO_MIGRATE'}
+    with tempfile.TemporaryDirectory() as tmp:
+        result = subprocess.run([sys.executable, '-c', script], cwd=tmp, env=env,
+                                capture_output=True, text=True, timeout=300)
+        assert result.returncode == 0, result.stderr
+        # 子进程未检查数据库结构（未创建导出等目录）、未启动清理与维护线程
+        assert result.stdout.split() == ['1']
+        assert os.listdir(tmp) == []
+
+
+def test_limit_resolver_by_sample_type():
+    """样品类型限值优先，未配置或为空时回退指标库限值"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'limits.db')
+        _make_db(db_path)
+        resolver = get_limit_resolver(db_path)
+        assert resolver.resolve('浑浊度(NTU)', '出厂水')['raw'] == '0.5'
+        assert resolver.resolve('浑浊度(NTU)', '出厂水|CCS')['raw'] == '0.5'
+        assert resolver.resolve('浑浊度(NTU)', '原水')['raw'] == '1'
+        assert resolver.resolve('铝(mg/L)', '管网水')['raw'] == '0.2'
+        assert resolver.resolve('氨氮(mg/L)', '出厂水')['raw'] == '0.5'
+        assert resolver.resolve('未知指标', '出厂水') is None
+
+
+def test_limit_resolver_one_way():
+    """限值只按 完整名 → 去除单位括号的列名 → 别名 单向匹配，不按指标的基础名匹配"""
+    hexavalent = {'bounds': (None, 0.05), 'unit': 'mg/L', 'raw': '0.05'}
+    resolver = LimitResolver({'铬(六价)': hexavalent})
+    assert resolver.resolve('铬(mg/L)') is None
+    assert resolver.resolve('铬(六价)') is hexavalent
+    assert resolver.resolve('六价铬(mg/L)') is hexavalent
+
+
+def test_keyword_index_absent_roles():
+    """表头中没有的预置角色记为 None，查找时不再逐列扫描"""
+    index = build_keyword_index(('总硬度(以CaCO3计)(mg/L)', '钙(mg/L)'))
+    assert index['总硬度'] == '总硬度(以CaCO3计)(mg/L)'
+    assert '三卤甲烷' in index and index['三卤甲烷'] is None
+    params = {'总硬度(以CaCO3计)(mg/L)': '120', '钙(mg/L)': '30', '三卤甲烷总量': '0.01'}
+    # 预置角色只查索引（索引中为 None 即视为缺失），非预置关键词仍按列名扫描
+    validator = RawDataValidator()
+    assert validator._find_param_value(params, '三卤甲烷', index) is None
+    assert validator._find_param_value(params, '总硬度', index) == '120'
+    assert validator._find_param_value(params, '三卤甲烷总', index) == '0.01'
+
+
+def test_limit_resolver_invalidation():
+    """限值修改后进程级解析器自动重建"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'limits.db')
+        _make_db(db_path)
+        first = get_limit_resolver(db_path)
+        assert get_limit_resolver(db_path) is first
+
+        conn = db_backend.connect(db_path)
+        conn.execute("UPDATE template_indicators SET limit_value = '0.3' WHERE limit_value = '0.5'")
+        conn.commit()
+        conn.close()
+
+        second = get_limit_resolver(db_path)
+        assert second is not first
+        assert second.resolve('浑浊度(NTU)', '出厂水')['raw'] == '0.3'
+
+
+def _import_samples(db_path, samples, data):
+    conn = db_backend.connect(db_path)
+    for s in samples:
+        cur = conn.execute(
+            'INSERT OR IGNORE INTO raw_data_records '
+            '(sample_number, company_name, plant_name, sample_type, sampling_date) VALUES (?, ?, ?, ?, ?)',
+            (s['样品编号'], s.get('被检单位'), s.get('被检水厂'), s.get('样品类型'), s.get('采样日期')))
+        if not cur.rowcount:
+            continue
+        conn.executemany(
+            'INSERT INTO raw_data_values (record_id, column_name, value) VALUES (?, ?, ?)',
+            [(cur.lastrowid, col, None if val is None else str(val))
+             for col, val in data.get(s['样品编号'], {}).items()])
+    conn.commit()
+    conn.close()
+
+
+def test_stored_results_incremental():
+    """已保存结果与全量校核一致，仅内容或限值变化的记录重新校核"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'store.db')
+        _make_db(db_path)
+        samples, data = _make_samples(7, 30)
+        _import_samples(db_path, samples, data)
+        numbers = [s['样品编号'] for s in samples]
+
+        validator = RawDataValidator(db_path)
+        expected = RawDataValidator(db_path, engine='loop').validate_from_db(numbers, '2026-01-06')
+        assert validator.validate_from_db(numbers, '2026-01-06') == expected
+        assert validator.last_run == {'cached': 0, 'validated': 31}
+        assert validator.validate_from_db(numbers, '2026-01-06') == expected
+        assert validator.last_run == {'cached': 31, 'validated': 0}
+
+        conn = db_backend.connect(db_path)
+        summary = count_stored_levels(conn)
+        assert summary['validated'] == summary['total'] == 31
+        conn.execute("UPDATE raw_data_values SET value = '99' WHERE id = "
+                     "(SELECT MIN(id) FROM raw_data_values WHERE record_id = 3)")
+        conn.commit()
+        conn.close()
+        expected = RawDataValidator(db_path, engine='loop').validate_from_db(numbers, '2026-01-06')
+        assert validator.validate_from_db(numbers, '2026-01-06') == expected
+        assert validator.last_run == {'cached': 30, 'validated': 1}
+
+        # 限值变化后全部重新校核
+        conn = db_backend.connect(db_path)
+        conn.execute("UPDATE indicators SET limit_value = '0.1' WHERE name = '浑浊度'")
+        conn.commit()
+        assert count_stored_levels(conn)['validated'] == 0
+        conn.close()
+        expected = RawDataValidator(db_path, engine='loop').validate_from_db(numbers, '2026-01-06')
+        assert validator.validate_from_db(numbers, '2026-01-06') == expected
+        assert validator.last_run == {'cached': 0, 'validated': 31}
+
+
+if __name__ == '__main__':
+    test_matrix_engine_matches_loop_engine()
+    test_matrix_engine_non_str_values()
+    test_matrix_engine_empty_input()
+    test_parallel_matches_serial()
+    test_pool_child_skips_app_startup()
+    test_limit_resolver_by_sample_type()
+    test_limit_resolver_one_way()
+    test_keyword_index_absent_roles()
+    test_limit_resolver_invalidation()
+    test_stored_results_incremental()
+    print('✓ 校核引擎测试通过')
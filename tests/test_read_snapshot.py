@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+只读快照测试
+验证快照在有效期内不随主库变化、过期后刷新、快照连接只读，
+维护调度器刷新过期快照，以及关闭快照时读取主库
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_backend
+import models_v2
+import read_snapshot
+from db_maintenance import run_once
+from schema_migrations import migrate
+
+
+def _count(conn):
+    return conn.execute('SELECT COUNT(*) FROM sample_types').fetchone()[0]
+
+
+def test_snapshot():
+    if db_backend.DB_BACKEND == 'sqlite-memory':
+        return  # 内存库不使用快照
+    original = models_v2.DATABASE_PATH
+    with tempfile.TemporaryDirectory() as tmp:
+        models_v2.DATABASE_PATH = os.path.join(tmp, 'snapshot.db')
+        try:
+            migrate(verbose=False)
+            with models_v2.get_db() as conn:
+                conn.execute("INSERT INTO sample_types (name, code) VALUES ('出厂水', 'CCS')")
+
+            with read_snapshot.snapshot_db() as (conn, snapshot):
+                assert snapshot['source'] == 'snapshot' and snapshot['age_seconds'] <= 1
+                assert _count(conn) == 1
+                try:
+                    conn.execute("INSERT INTO sample_types (name, code) VALUES ('管网水', 'GWS')")
+                    assert False, '快照应为只读'
+                except sqlite3.OperationalError:
+                    pass
+            assert read_snapshot.headers(snapshot)['X-Snapshot-Source'] == 'snapshot'
+
+            # 有效期内不刷新，读到的仍是快照时间点的数据
+            with models_v2.get_db() as conn:
+                conn.execute("INSERT INTO sample_types (name, code) VALUES ('管网水', 'GWS')")
+            with read_snapshot.snapshot_db() as (conn, snapshot):
+                assert _count(conn) == 1
+
+            # 过期后由维护调度器刷新
+            path = read_snapshot.snapshot_path()
+            stale = time.time() - read_snapshot.DB_SNAPSHOT_MAX_AGE - 1
+            os.utime(path, (stale, stale))
+            assert read_snapshot.due()
+            assert [run['task'] for run in run_once() if run['task'] == 'snapshot'] == ['snapshot']
+            with read_snapshot.snapshot_db() as (conn, snapshot):
+                assert _count(conn) == 2 and snapshot['age_seconds'] <= 1
+
+            # 过期后下一次使用前刷新
+            os.utime(path, (stale, stale))
+            with models_v2.get_db() as conn:
+                conn.execute("INSERT INTO sample_types (name, code) VALUES ('二次供水', 'ECGS')")
+            with read_snapshot.snapshot_db() as (conn, snapshot):
+                assert _count(conn) == 3
+
+            # 关闭快照时读取主库
+            max_age = read_snapshot.DB_SNAPSHOT_MAX_AGE
+            read_snapshot.DB_SNAPSHOT_MAX_AGE = 0
+            try:
+                with read_snapshot.snapshot_db() as (conn, snapshot):
+                    assert snapshot == {'source': 'live'} and _count(conn) == 3
+            finally:
+                read_snapshot.DB_SNAPSHOT_MAX_AGE = max_age
+        finally:
+            models_v2.close_pool()
+            models_v2.DATABASE_PATH = original
+
+
+if __name__ == '__main__':
+    test_snapshot()
+    print('✓ 只读快照测试通过')
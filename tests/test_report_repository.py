@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+报告热点查询测试
+验证检测数据按模板顺序返回、批量查询与逐张查询结果一致，
+以及批量 IN 列表按 2 的幂补齐后语句文本数量有限
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_backend
+import report_repository
+from schema_migrations import migrate
+
+
+def test_single_and_batch():
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'repository.db')
+        migrate(db_path, verbose=False)
+        conn = db_backend.connect(db_path)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.executescript('''
+                INSERT INTO sample_types (id, name, code) VALUES (1, '出厂水', 'CCS'), (2, '管网水', 'GWS');
+                INSERT INTO indicators (id, name, unit, limit_value) VALUES
+                    (101, '浑浊度', 'NTU', '1'), (102, '色度', '度', '15'), (103, '铝', 'mg/L', '0.2');
+                INSERT INTO template_indicators (sample_type_id, indicator_id, sort_order, limit_value) VALUES
+                    (1, 101, 2, NULL), (1, 102, 1, NULL), (1, 103, 3, '0.1'),
+                    (2, 101, 1, NULL), (2, 102, 2, NULL), (2, 103, 3, NULL);
+            ''')
+            for report_id, sample_type_id in [(1, 1), (2, 2), (3, 1)]:
+                conn.execute('INSERT INTO reports (id, report_number, sample_number, sample_type_id, created_by) '
+                             'VALUES (?, ?, ?, ?, 1)', (report_id, f'R{report_id}', f'S{report_id}', sample_type_id))
+                conn.executemany('INSERT INTO report_data (report_id, indicator_id, measured_value) VALUES (?, ?, ?)',
+                                 [(report_id, indicator_id, '0.1') for indicator_id in (101, 102, 103)])
+
+            report = report_repository.get_report(conn, 1)
+            assert (report['sample_type_name'], report['sample_type_code'], report['creator_name']) == \
+                ('出厂水', 'CCS', 'admin')
+            assert report_repository.get_report(conn, 99) is None
+
+            # 按各报告样品类型的模板顺序，模板限值优先
+            data = report_repository.get_detection_data(conn, 1)
+            assert [(row['indicator_name'], row['limit_value']) for row in data] == \
+                [('色度', '15'), ('浑浊度', '1'), ('铝', '0.1')]
+            assert [row['indicator_name'] for row in report_repository.get_detection_data(conn, 2)] == \
+                ['浑浊度', '色度', '铝']
+
+            batch = report_repository.get_detection_data_batch(conn, [3, 1, 2, 1, 99])
+            assert set(batch) == {1, 2, 3, 99} and batch[99] == []
+            for report_id in (1, 2, 3):
+                assert [dict(row) for row in batch[report_id]] == \
+                    [dict(row) for row in report_repository.get_detection_data(conn, report_id)]
+            assert set(report_repository.get_reports(conn, [1, 2, 99])) == {1, 2}
+
+            # 1..20 个 id 只对应 1、2、4、8、16、32 六种语句文本
+            report_repository._detection_data_batch_sql.cache_clear()
+            for count in range(1, 21):
+                report_repository.get_detection_data_batch(conn, list(range(1, count + 1)))
+            assert report_repository._detection_data_batch_sql.cache_info().currsize == 6
+        finally:
+            conn.close()
+
+
+if __name__ == '__main__':
+    test_single_and_batch()
+    print('✓ 报告热点查询测试通过')
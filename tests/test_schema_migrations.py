@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+数据库结构版本迁移测试
+验证新库迁移到最新版本、重复执行不再变更、以及 worker 启动时的版本检查（默认报错，显式开启才自动迁移）
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_backend
+import schema_migrations
+from schema_migrations import LATEST_VERSION, SchemaVersionError, current_version, ensure_schema, migrate
+
+
+def _columns(conn, table):
+    return {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+
+
+def test_migrate_fresh_and_rerun():
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'schema.db')
+        assert migrate(db_path, verbose=False) == [number for number, _, _ in schema_migrations.MIGRATIONS]
+        assert migrate(db_path, verbose=False) == []
+
+        conn = db_backend.connect(db_path)
+        try:
+            assert current_version(conn) == LATEST_VERSION
+            assert {'template_id', 'review_status', 'reviewed_at', 'sampling_date'} <= _columns(conn, 'reports')
+            assert {'field_code', 'is_required', 'default_value'} <= _columns(conn, 'template_field_mappings')
+            tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            assert {'review_history', 'report_field_values', 'excel_report_templates'} <= tables
+            assert conn.execute("SELECT COUNT(*) FROM users WHERE username = 'admin'").fetchone()[0] == 1
+        finally:
+            conn.close()
+
+
+def test_ensure_schema_check():
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'schema.db')
+        cwd = os.getcwd()
+        os.chdir(tmp)  # ensure_schema 会在当前目录创建导出与备份目录
+        original = os.environ.pop('SCHEMA_AUTO_MIGRATE', None)
+        try:
+            try:
+                ensure_schema(db_path)
+                assert False, '版本落后时应报错'
+            except SchemaVersionError:
+                pass
+
+            os.environ['SCHEMA_AUTO_MIGRATE'] = '1'
+            assert ensure_schema(db_path) == LATEST_VERSION
+            del os.environ['SCHEMA_AUTO_MIGRATE']
+            assert ensure_schema(db_path) == LATEST_VERSION
+        finally:
+            os.environ.pop('SCHEMA_AUTO_MIGRATE', None)
+            if original is not None:
+                os.environ['SCHEMA_AUTO_MIGRATE'] = original
+            os.chdir(cwd)
+
+
+if __name__ == '__main__':
+    test_migrate_fresh_and_rerun()
+    test_ensure_schema_check()
+    print('✓ 数据库结构版本迁移测试通过')
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+SQL 追踪测试
+验证连接池连接的查询计数（executemany 整批计一次、事务控制语句不计）、
+慢查询记录、N+1 检测与进程汇总
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import models_v2
+import sql_trace
+from sql_trace import normalize_sql, trace_queries
+
+
+def test_normalize_sql():
+    assert normalize_sql("SELECT * FROM t WHERE a = 'x''y' AND b IN (1, 2, 3)\n  AND c = ?") == \
+        'SELECT * FROM t WHERE a = ? AND b IN (...) AND c = ?'
+    assert normalize_sql('SELECT col2 FROM t2 WHERE id = -1.5') == 'SELECT col2 FROM t2 WHERE id = ?'
+
+
+def test_trace_pool_queries():
+    original = (models_v2.DATABASE_PATH, sql_trace.SQL_SLOW_MS, sql_trace.SQL_N_PLUS_ONE_THRESHOLD)
+    with tempfile.TemporaryDirectory() as tmp:
+        models_v2.DATABASE_PATH = os.path.join(tmp, 'trace.db')
+        sql_trace.enable()
+        sql_trace.reset_metrics()
+        sql_trace.SQL_SLOW_MS = 0
+        sql_trace.SQL_N_PLUS_ONE_THRESHOLD = 5
+        try:
+            with models_v2.get_db() as conn:
+                conn.execute('CREATE TABLE t (id INTEGER PRIMARY KEY, name TEXT)')
+
+            with trace_queries('测试') as trace:
+                with models_v2.get_db() as conn:
+                    conn.executemany('INSERT INTO t (name) VALUES (?)', [(str(i),) for i in range(100)])
+                    cursor = conn.cursor()
+                    for i in range(1, 11):
+                        cursor.execute('SELECT name FROM t WHERE id = ?', (i,))
+                        cursor.fetchone()
+            # 1 次批量插入 + 10 次查询；BEGIN/COMMIT 不计
+            assert trace.queries == 11
+            assert trace.repeated() == [(10, 'SELECT name FROM t WHERE id = ?')]
+            assert len(trace.slow) == 11 and trace.db_ms > 0
+
+            stats = sql_trace.metrics()
+            assert stats['endpoints']['测试']['queries'] == 11
+            assert stats['recent_repeated'][0]['count'] == 10
+        finally:
+            sql_trace.enable(False)
+            models_v2.close_pool()
+            models_v2.DATABASE_PATH, sql_trace.SQL_SLOW_MS, sql_trace.SQL_N_PLUS_ONE_THRESHOLD = original
+
+
+if __name__ == '__main__':
+    test_normalize_sql()
+    test_trace_pool_queries()
+    print('✓ SQL 追踪测试通过')
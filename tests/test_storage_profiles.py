@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+存储配置测试
+验证连接池连接按默认配置设置 PRAGMA、bulk_import() 块内借出的连接与写队列事务切换到 bulk-import 配置，
+退出后恢复默认配置
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import models_v2
+import storage_profiles
+import write_queue
+from storage_profiles import STORAGE_PROFILES, bulk_import
+
+
+def _settings(conn):
+    return (conn.execute('PRAGMA synchronous').fetchone()[0],
+            conn.execute('PRAGMA cache_size').fetchone()[0],
+            conn.execute('PRAGMA wal_autocheckpoint').fetchone()[0])
+
+
+def _expected(name):
+    profile = STORAGE_PROFILES[name]
+    synchronous = {'OFF': 0, 'NORMAL': 1, 'FULL': 2}[profile['synchronous']]
+    return synchronous, profile['cache_size'], profile['wal_autocheckpoint']
+
+
+def test_profiles_switch():
+    original = (models_v2.DATABASE_PATH, write_queue.DB_WRITE_QUEUE)
+    default = storage_profiles.DB_STORAGE_PROFILE
+    with tempfile.TemporaryDirectory() as tmp:
+        models_v2.DATABASE_PATH = os.path.join(tmp, 'profiles.db')
+        try:
+            with models_v2.get_db() as conn:
+                assert _settings(conn) == _expected(default)
+            with bulk_import():
+                with models_v2.get_db() as conn:
+                    assert _settings(conn) == _expected('bulk-import')
+            # 同一个空闲连接再次借出时恢复默认配置
+            with models_v2.get_db() as conn:
+                assert _settings(conn) == _expected(default)
+
+            write_queue.DB_WRITE_QUEUE = True
+            with bulk_import():
+                assert write_queue.run_write(_settings) == _expected('bulk-import')
+            assert write_queue.run_write(_settings) == _expected(default)
+        finally:
+            models_v2.close_pool()
+            models_v2.DATABASE_PATH, write_queue.DB_WRITE_QUEUE = original
+
+
+if __name__ == '__main__':
+    test_profiles_switch()
+    print('✓ 存储配置测试通过')
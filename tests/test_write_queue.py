@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+写入串行化测试
+验证写队列的结果返回、单个任务失败只回滚自身、嵌套调用，以及公平锁对已退出进程的排队清理
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_backend
+import write_queue
+from write_queue import FairFileLock, run_write
+
+
+def _insert(conn, value):
+    conn.execute('INSERT INTO t (v) VALUES (?)', (value,))
+    if value < 0:
+        raise ValueError('负数')
+    return value
+
+
+def test_write_queue():
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'queue.db')
+        conn = db_backend.connect(db_path)
+        conn.execute('CREATE TABLE t (v INTEGER)')
+        conn.commit()
+
+        original = write_queue.DB_WRITE_QUEUE
+        write_queue.DB_WRITE_QUEUE = True
+        try:
+            results = []
+            errors = []
+
+            def worker(value):
+                try:
+                    results.append(run_write(_insert, value, db_path=db_path))
+                except ValueError:
+                    errors.append(value)
+
+            threads = [threading.Thread(target=worker, args=(v,)) for v in list(range(1, 41)) + [-1, -2]]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+
+            assert sorted(results) == list(range(1, 41)) and sorted(errors) == [-2, -1]
+            # 失败任务只回滚自身，同批其他写入已提交
+            assert conn.execute('SELECT COUNT(*), MIN(v) FROM t').fetchone() == (40, 1)
+
+            # 写函数内嵌套 run_write 直接在写线程事务中执行
+            assert run_write(lambda c: run_write(_insert, 100, db_path=db_path), db_path=db_path) == 100
+
+            stats = write_queue.get_write_queue(db_path).stats()
+            assert stats['completed'] == 41 and stats['failed'] == 2
+            assert stats['transactions'] < 43  # 排队的任务合并提交
+        finally:
+            write_queue.DB_WRITE_QUEUE = original
+            conn.close()
+
+
+def test_fair_lock_reaps_dead_waiter():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'db.write.lock')
+        # 已退出进程留下的排队记录
+        dead = subprocess.Popen([sys.executable, '-c', 'pass'])
+        dead.wait()
+        with open(path, 'w') as f:
+            json.dump([[dead.pid, 1]], f)
+
+        lock = FairFileLock(path)
+        with lock:
+            with open(path) as f:
+                assert json.load(f) == [[os.getpid(), 1]]
+        with open(path) as f:
+            assert json.load(f) == []
+
+
+if __name__ == '__main__':
+    test_write_queue()
+    test_fair_lock_reaps_dead_waiter()
+    print('✓ 写入串行化测试通过')
@@ -0,0 +1,311 @@
+"""
+写入串行化：进程内单写线程 + 跨进程公平文件锁
+
+多个 gunicorn worker、后台线程与导入同时写库时，写事务在 SQLite 的写锁上互相等待
+（busy_timeout 最长 30 秒），且等待者的获取顺序没有保证：长时间导入期间审核等短事务可能一直抢不到锁。
+开启 DB_WRITE_QUEUE=1 后，经 run_write() 提交的写操作：
+  - 进入本进程的写队列，由唯一的写线程依次执行；写线程每次取出最多 WRITE_QUEUE_BATCH 个任务，
+    在一个 BEGIN IMMEDIATE 事务内逐个执行（每个任务一个 SAVEPOINT，失败只回滚该任务），一次提交
+  - 写线程在每个事务前获取跨进程公平锁（FairFileLock）：各进程按申请顺序排队，先到先得，
+    长导入拆成的多个小事务之间会让出给排在后面的审核等操作
+读操作不经过写队列，WAL 模式下与写入并发。
+
+未开启时 run_write() 直接在 get_db() 事务内执行，行为与之前相同。
+写函数签名为 fn(conn, *args)，不得自行 commit/rollback；在请求中调用时写线程内可使用 session/request。
+"""
+
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+try:
+    import fcntl
+except ImportError:  # Windows 下无 fcntl，只在进程内串行
+    fcntl = None
+
+import db_backend
+import models_v2
+import sql_trace
+import storage_profiles
+
+DB_WRITE_QUEUE = os.environ.get('DB_WRITE_QUEUE', '0') == '1'
+# 写线程单个事务内合并执行的最大任务数
+WRITE_QUEUE_BATCH = 32
+# 等待写入结果的最长秒数
+WRITE_QUEUE_TIMEOUT = 120
+# 排队等待公平锁时的轮询间隔上限（秒）
+WRITE_LOCK_POLL_MAX = 0.005
+# 保留的最近写入耗时样本数（用于 p50/p99）
+WRITE_LATENCY_SAMPLES = 2000
+
+
+class FairFileLock:
+    """
+    跨进程 FIFO 锁：排队信息保存在锁文件中（[[pid, 序号], ...]），读写时以 flock 短暂互斥。
+    申请者追加到队尾，轮询直到自己位于队首；队首进程已退出时由等待者移除，避免死锁。
+    同一进程内的多个线程先经线程锁串行。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._thread_lock = threading.Lock()
+        self._seq = 0
+        self._token = None
+
+    def _update(self, change):
+        """在 flock 保护下读出排队列表，调用 change(列表) 修改并写回，返回 change 的结果"""
+        with open(self.path, 'a+') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                content = f.read()
+                waiters = json.loads(content) if content else []
+                before = list(waiters)
+                result = change(waiters)
+                if waiters != before:
+                    f.seek(0)
+                    f.truncate()
+                    f.write(json.dumps(waiters))
+                    f.flush()
+                return result
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _alive(pid):
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        return True
+
+    def _head(self, waiters):
+        while waiters and waiters[0][0] != os.getpid() and not self._alive(waiters[0][0]):
+            waiters.pop(0)
+        return waiters[0] if waiters else None
+
+    def acquire(self, timeout=None):
+        if not self._thread_lock.acquire(timeout=-1 if timeout is None else timeout):
+            raise TimeoutError('等待写锁超时')
+        if fcntl is None:
+            return True
+        self._seq += 1
+        token = [os.getpid(), self._seq]
+        self._update(lambda waiters: waiters.append(token))
+        deadline = None if timeout is None else time.monotonic() + timeout
+        delay = 0.0002
+        try:
+            while self._update(self._head) != token:
+                if deadline is not None and time.monotonic() > deadline:
+                    raise TimeoutError('等待写锁超时')
+                time.sleep(delay)
+                delay = min(delay * 2, WRITE_LOCK_POLL_MAX)
+        except BaseException:
+            self._update(lambda waiters: token in waiters and waiters.remove(token))
+            self._thread_lock.release()
+            raise
+        self._token = token
+        return True
+
+    def release(self):
+        if fcntl is not None:
+            token, self._token = self._token, None
+            self._update(lambda waiters: token in waiters and waiters.remove(token))
+        self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class WriteQueue:
+    """单个数据库的进程内写队列与写线程"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.jobs = queue.Queue()
+        # 内存库只在本进程可见，无需跨进程锁
+        self.lock = threading.Lock() if db_backend.is_memory(db_path) else FairFileLock(f'{db_path}.write.lock')
+        self.local = threading.local()
+        self.profile = None  # 写连接当前的存储配置
+        self.latencies = deque(maxlen=WRITE_LATENCY_SAMPLES)
+        self.transactions = 0
+        self.completed = 0
+        self.failed = 0
+        self.thread = threading.Thread(target=self._run, name='db-writer', daemon=True)
+        self.thread.start()
+
+    def submit(self, fn, *args):
+        future = Future()
+        self.jobs.put((fn, args, future, time.perf_counter(), storage_profiles.active_profile()))
+        return future
+
+    def _connect(self):
+        self.generation = models_v2.pool_generation(self.db_path)
+        conn = sql_trace.connect(self.db_path, timeout=30.0, isolation_level=None, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA foreign_keys = ON')
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA busy_timeout = 30000')
+        return conn
+
+    def _run(self):
+        conn = self._connect()
+        self.local.conn = conn
+        while True:
+            batch = [self.jobs.get()]
+            while len(batch) < WRITE_QUEUE_BATCH:
+                try:
+                    batch.append(self.jobs.get_nowait())
+                except queue.Empty:
+                    break
+            outcomes = []
+            if models_v2.pool_generation(self.db_path) != self.generation:
+                # 数据库内容已被整体替换（models_v2.reset_pools），重新连接
+                conn.close()
+                conn = self._connect()
+                self.local.conn = conn
+                self.profile = None
+            try:
+                # 批内有导入任务时整个事务使用 bulk-import 配置，否则使用第一个任务提交时的配置
+                profiles = {job[4] for job in batch}
+                profile = storage_profiles.BULK_IMPORT_PROFILE \
+                    if storage_profiles.BULK_IMPORT_PROFILE in profiles else batch[0][4]
+                if profile != self.profile:
+                    self.profile = storage_profiles.apply_profile(conn, profile)
+                with self.lock:
+                    conn.execute('BEGIN IMMEDIATE')
+                    try:
+                        for fn, args, future, _, _ in batch:
+                            conn.execute('SAVEPOINT write_job')
+                            try:
+                                outcomes.append((fn(conn, *args), None))
+                                conn.execute('RELEASE write_job')
+                            except Exception as e:
+                                conn.execute('ROLLBACK TO write_job')
+                                conn.execute('RELEASE write_job')
+                                outcomes.append((None, e))
+                        conn.execute('COMMIT')
+                    except BaseException:
+                        if conn.in_transaction:
+                            conn.execute('ROLLBACK')
+                        raise
+            except Exception as e:
+                # 整个事务失败（如磁盘错误）：本批任务全部失败，写线程继续处理后续任务
+                outcomes = [(None, e)] * len(batch)
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+                conn = self._connect()
+                self.local.conn = conn
+                self.profile = None
+
+            now = time.perf_counter()
+            self.transactions += 1
+            for (fn, args, future, queued_at, _), (result, error) in zip(batch, outcomes):
+                self.latencies.append((now - queued_at) * 1000)
+                if error is None:
+                    self.completed += 1
+                    future.set_result(result)
+                else:
+                    self.failed += 1
+                    future.set_exception(error)
+
+    def writer_conn(self):
+        """当前线程为本队列写线程时返回其连接（用于写函数内再次调用 run_write）"""
+        return getattr(self.local, 'conn', None)
+
+    def stats(self):
+        samples = sorted(self.latencies)
+        return {
+            'path': self.db_path,
+            'queued': self.jobs.qsize(),
+            'transactions': self.transactions,
+            'completed': self.completed,
+            'failed': self.failed,
+            'latency_ms_p50': round(_percentile(samples, 50), 2),
+            'latency_ms_p99': round(_percentile(samples, 99), 2),
+        }
+
+
+def _percentile(samples, pct):
+    if not samples:
+        return 0.0
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+_queues = {}
+_queues_lock = threading.Lock()
+
+
+def get_write_queue(db_path=None):
+    """本进程该数据库的写队列（fork 后的子进程重新创建写线程）"""
+    db_path = db_path or models_v2.DATABASE_PATH
+    key = (db_path, os.getpid())
+    write_queue = _queues.get(key)
+    if write_queue is None:
+        with _queues_lock:
+            write_queue = _queues.get(key)
+            if write_queue is None:
+                write_queue = _queues[key] = WriteQueue(db_path)
+    return write_queue
+
+
+def enabled():
+    return DB_WRITE_QUEUE
+
+
+def run_write(fn, *args, db_path=None):
+    """
+    执行写操作 fn(conn, *args) 并返回其结果；fn 抛出的异常原样抛出，该次写入已回滚。
+    开启写队列时由写线程执行，否则在 get_db() 事务内直接执行。
+    """
+    if not DB_WRITE_QUEUE:
+        # 与写线程相同，事务开始即取得写锁，避免读后升级写锁时的 SQLITE_BUSY
+        if db_path is None:
+            with models_v2.get_db() as conn:
+                conn.execute('BEGIN IMMEDIATE')
+                return fn(conn, *args)
+        conn = db_backend.connect(db_path, timeout=30.0)
+        conn.row_factory = sqlite3.Row
+        storage_profiles.apply_profile(conn, storage_profiles.active_profile())
+        try:
+            with conn:
+                conn.execute('BEGIN IMMEDIATE')
+                return fn(conn, *args)
+        finally:
+            conn.close()
+
+    write_queue = get_write_queue(db_path)
+    conn = write_queue.writer_conn()
+    if conn is not None:
+        # 写函数内嵌套调用：已在写线程的事务中，直接执行
+        return fn(conn, *args)
+
+    try:
+        from flask import copy_current_request_context, has_request_context
+        if has_request_context():
+            fn = copy_current_request_context(fn)
+    except ImportError:
+        pass
+    return write_queue.submit(fn, *args).result(timeout=WRITE_QUEUE_TIMEOUT)
+
+
+def stats():
+    """本进程各写队列的状态与最近写入耗时（排队 + 执行 + 提交）"""
+    with _queues_lock:
+        queues = [q for (path, pid), q in _queues.items() if pid == os.getpid()]
+    return {'enabled': DB_WRITE_QUEUE, 'queues': [q.stats() for q in queues]}